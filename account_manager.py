@@ -1,5 +1,4 @@
 import json
-import queue
 
 from common import *
 from orders_logic.orders_common import final_order_status
@@ -10,15 +9,26 @@ from orders_logic.combined_order import CombinedOrder
 from orders_logic.custom_oco_order import CustomOcoOrder
 from orders_logic.basic_orders import MarketOrder, LimitOrder, StopLimitOrder, StopMarketOrder
 from input_cmd_validator import InputValidator
+from order_journal import OrderJournal
+from trailing_move_policy import TrailingMovePolicy
+from retry_policy import RetryPolicy
+from report_hub import ReportHub, PriceTopic, get_price_symbols, TOPIC_DEAL_REPORTS, TOPIC_ORDER_STATUS, TOPIC_ACCOUNT, TOPIC_REPLIES
+
+journaled_order_classes = {order_class.__name__: order_class for order_class in
+                           [MarketOrder, LimitOrder, StopLimitOrder, StopMarketOrder, CustomOcoOrder, TrailingStopOrder, CombinedOrder]}
 
-# TODO - if new symbol added at the moment reboot is needed
 class accountManager:
-    def __init__(self, username, public_key, private_key):
+    journal_dir = "./journal"  # None - orders are not journaled and not recovered after restart
+    retire_check_interval = 1  # s between active orders checks of a retiring account
+    market_data_dir = "./market_data"  # recordings of MARKET RECORDING cmd without path
+
+    def __init__(self, username, public_key, private_key, rest_transport=None):
         self.username = username
         self.public_key = public_key
         self.__private_key = private_key
         self.loop = None
-        self.out_ws_queue = queue.Queue()
+        self.report_hub = ReportHub()  # reports for ws clients by topic
+        self.price_topics = {}  # symbol:PriceTopic while clients subscribe its prices
 
         #TODO make separate loggers for each class
         self.tasks_to_be_awaited_to_finish = []
@@ -33,6 +43,12 @@ class accountManager:
         self.futures_balance_state = {}
         self.futures_positions_state = {}
         self.futures_api_handler = None
+        self.futures_rest_transport = rest_transport
+        self.order_journal = None
+
+        self.startup_timings = {}  # bootstrap phase:s
+        self.user_data = None  # users.json entry the account runs with
+        self.is_retiring = False  # removed from users.json: new orders are refused while active ones finish
 
         self.last_received_cmd = "No signals since OMS start"
         self.last_cmd_timestamp = time.time()
@@ -43,31 +59,130 @@ class accountManager:
         pass
 
     @classmethod
-    async def create(cls, username, public, private):
+    async def create(cls, username, public, private, rest_transport=None, api_handler_cls=BinanceFuturesApiHandler,
+                     trailing_move_policy=None, retry_policy=None, report_hub=None):
+        """api_handler_cls - BinanceFuturesApiHandler or its subclass, e.g. exchange simulator one
+           trailing_move_policy - TrailingMovePolicy params of the account (users.json), defaults if None
+           retry_policy - RetryPolicy params of the account (users.json), defaults if None
+           report_hub - gets reports for ws clients with publish(topic, data, key) and has_subscribers(topic),
+                        ReportHub of the account if None; update_topics is to be called when subscribed topics change"""
         try:
 
-            self = accountManager(username=username, public_key=public, private_key=private)
+            self = accountManager(username=username, public_key=public, private_key=private, rest_transport=rest_transport)
             self.loop = asyncio.get_event_loop()
-
-            self.futures_api_handler = await BinanceFuturesApiHandler.create(username=self.username,
-                                                                             public=self.public_key,
-                                                                             private=self.__private_key,
-                                                                             logger=self.futures_logger,
-                                                                             is_hedge=self.futures_is_hedge)
+            if report_hub is not None:
+                self.report_hub = report_hub
+            else:
+                self.report_hub.loop = self.loop
+                self.report_hub.topics_callbacks.append([accountManager.update_topics, self])
+            started = phase_started = time.perf_counter()
+
+            self.futures_api_handler = await api_handler_cls.create(username=self.username,
+                                                                    public=self.public_key,
+                                                                    private=self.__private_key,
+                                                                    logger=self.futures_logger,
+                                                                    is_hedge=self.futures_is_hedge,
+                                                                    rest_transport=self.futures_rest_transport)
+            if trailing_move_policy is not None:
+                self.futures_api_handler.trailing_move_policy = TrailingMovePolicy(**trailing_move_policy)
+            if retry_policy is not None:
+                self.futures_api_handler.retry_policy = RetryPolicy(**retry_policy)
 
             # self.position_monitor = asyncio.create_task(self.monitor_positions())
             self.futures_api_handler.ws_account_updates_callbacks["accountUpdate"].append(
                 [accountManager.process_futures_account_update, self])
             self.futures_api_handler.ws_account_updates_callbacks["leverageUpdate"].append(
                 [accountManager.process_futures_symbol_leverage_update, self])
+            phase_started = self.set_startup_timing("api_handler", phase_started)
+
+            recovered_orders = None
+            if accountManager.journal_dir is not None:
+                self.order_journal = OrderJournal(os.path.join(accountManager.journal_dir, self.username), logger=self.futures_logger)
+                recovered_orders = await self.loop.run_in_executor(None, self.order_journal.open)
+                self.futures_api_handler.order_journal = self.order_journal
+            phase_started = self.set_startup_timing("journal", phase_started)
 
             await self.futures_api_handler.start_ws_updates()
             await self.update_futures_account_state()
+            phase_started = self.set_startup_timing("account_state", phase_started)
 
+            if recovered_orders:
+                await self.recover_futures_orders(recovered_orders)
+            self.set_startup_timing("recovery", phase_started)
+            self.set_startup_timing("total", started)
+
+            self.logger.info(compose_log_msg(getframeinfo(currentframe()), f"Account {self.username} started: {self.startup_timings}"))
             return self
         except Exception as e:
             handle_exception(get_logger("default"), e)
 
+    def set_startup_timing(self, phase, phase_started):
+        now = time.perf_counter()
+        self.startup_timings[phase] = round(now - phase_started, 4)
+        return now
+
+    @classmethod
+    async def create_from_user_data(cls, user_data, **kwargs):
+        """user_data - account entry of users.json"""
+        self = await cls.create(username=user_data["user"], public=user_data["public"], private=user_data["private"],
+                                rest_transport=user_data.get("rest_transport"),
+                                trailing_move_policy=user_data.get("trailing_move_policy"),
+                                retry_policy=user_data.get("retry_policy"), **kwargs)
+        if self is not None:
+            self.user_data = user_data
+        return self
+
+    async def apply_user_data(self, user_data):
+        """Changed users.json entry of the running account: keys and REST transport are swapped in place,
+           policies are replaced, active orders keep running"""
+        try:
+            applied = self.user_data or {}
+            rest_transport = user_data.get("rest_transport")
+            if user_data["public"] != self.public_key or user_data["private"] != self.__private_key or \
+                    rest_transport != self.futures_rest_transport:
+                await self.futures_api_handler.rotate_keys(user_data["public"], user_data["private"], rest_transport)
+                self.public_key = user_data["public"]
+                self.__private_key = user_data["private"]
+                self.futures_rest_transport = rest_transport
+
+            if user_data.get("trailing_move_policy") != applied.get("trailing_move_policy"):
+                self.futures_api_handler.trailing_move_policy = TrailingMovePolicy(**(user_data.get("trailing_move_policy") or {}))
+            if user_data.get("retry_policy") != applied.get("retry_policy"):
+                self.futures_api_handler.retry_policy = RetryPolicy(**(user_data.get("retry_policy") or {}))
+            self.user_data = user_data
+            self.logger.info(compose_log_msg(getframeinfo(currentframe()), f"Account {self.username} settings updated"))
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def retire(self, drain_timeout=None):
+        """
+        Account removed from users.json: new orders are refused, active orders are left to finish, then
+        the account stops without cancelling anything on exchange. Orders still active after drain_timeout s
+        stay on exchange and in the order journal, so they are recovered if the account is added back
+        """
+        try:
+            self.is_retiring = True
+            started = time.time()
+            while len(self.futures_active_orders) != 0:
+                if drain_timeout is not None and time.time() - started > drain_timeout:
+                    active_orders = [f"{order.order_type} {order.symbol} {order_id} (exchange id {order.binance_order_id})"
+                                     for order_id, order in self.futures_active_orders.items()]
+                    self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                                        f"Account {self.username} retired after {drain_timeout} s drain timeout, "
+                                                        f"{len(active_orders)} orders left active on exchange: {active_orders}"))
+                    break
+                await asyncio.sleep(accountManager.retire_check_interval)
+
+            await self.update_topics(set())
+            await self.futures_api_handler.stop_account()
+            self.report_hub.close()
+            if self.order_journal is not None:
+                await self.loop.run_in_executor(None, self.order_journal.close)
+            self.logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                             f"Account {self.username} retired in {round(time.time() - started, 3)} s"))
+        except Exception as e:
+            handle_exception(self.logger, e)
+
     async def monitor_positions(self):
         try:
             futures_set_diff = None
@@ -115,6 +230,39 @@ class accountManager:
         except Exception as e:
             handle_exception(self.logger, e)
 
+    async def recover_futures_orders(self, recovered_orders):
+        """Rebuilds journaled orders which were not finished before restart and reconciles them with exchange open orders"""
+        try:
+            started = time.time()
+            open_orders = await self.loop.run_in_executor(None, self.futures_api_handler.futures_get_open_orders)
+            open_order_ids = {order["clientOrderId"] for order in open_orders}
+            journaled_order_ids = set()
+
+            for order_id, entry in recovered_orders.items():
+                journaled_order_ids.add(order_id)
+                journaled_order_ids.update(OrderJournal.get_children_ids(entry["state"]))
+
+                order_class = journaled_order_classes.get(entry["order_class"])
+                if order_class is None:
+                    self.futures_logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                                              f"Can't recover order {order_id} of unknown class {entry['order_class']}"))
+                    continue
+
+                order = order_class(api_handler=self.futures_api_handler, logger=self.futures_api_handler.logger, **entry["params"])
+                order.callbacks["readyToDie"].append([accountManager.on_futures_order_over, self])
+                self.futures_active_orders[order_id] = order
+                await order.recover_from_journal(entry["state"], open_order_ids)
+
+            not_journaled_ids = open_order_ids - journaled_order_ids
+            if len(not_journaled_ids) != 0:
+                self.futures_logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                                            f"Open orders not known to order journal: {sorted(not_journaled_ids)}"))
+
+            self.futures_logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                                     f"Recovered {len(recovered_orders)} orders in {round(time.time() - started, 3)} s"))
+        except Exception as e:
+            handle_exception(self.logger, e)
+
     async def cancel_orders(self, symbol, account="FUTURES"):
         try:
             if account == "FUTURES":
@@ -133,6 +281,9 @@ class accountManager:
 
             await self.loop.run_in_executor(None, functools.partial(self.futures_api_handler.cancel_all_active_orders))
             await self.loop.run_in_executor(None, functools.partial(self.futures_api_handler.close_all_positions))
+            await self.futures_api_handler.close_rest_transport()
+            if self.order_journal is not None:
+                await self.loop.run_in_executor(None, self.order_journal.close)
 
             BinanceFuturesApiHandler._is_shutdown = True
 
@@ -144,7 +295,10 @@ class accountManager:
         try:
             current_account_state = None
             try:
-                current_account_state = self.futures_api_handler.futures_account()
+                if self.futures_api_handler.rest_transport is not None:
+                    current_account_state = await self.futures_api_handler.rest_transport.futures_account()
+                else:
+                    current_account_state = await self.loop.run_in_executor(None, self.futures_api_handler.futures_account)
             except Exception as e:
                 handle_exception(self.futures_logger, e)
 
@@ -163,6 +317,48 @@ class accountManager:
         except Exception as e:
             handle_exception(self.logger, e)
 
+    async def update_topics(self, topics):
+        """Topics ws clients of the account subscribe: price updates of prices:<SYMBOL> symbols and exchange
+           order updates are subscribed only while some client waits for them"""
+        try:
+            price_symbols = get_price_symbols(topics)
+            for symbol in price_symbols - set(self.price_topics):
+                price_topic = PriceTopic(symbol, self.report_hub)
+                price_topic.callback_id = self.futures_api_handler.subscribe_for_price_update(symbol, [PriceTopic.on_price, price_topic])
+                self.price_topics[symbol] = price_topic
+            for symbol in set(self.price_topics) - price_symbols:
+                self.futures_api_handler.unsubscribe_from_price_update(symbol, self.price_topics.pop(symbol).callback_id)
+
+            order_status_callback = [accountManager.publish_order_status, self]
+            order_status_callbacks = self.futures_api_handler.ws_account_updates_callbacks["orderStatus"]
+            if TOPIC_ORDER_STATUS in topics and order_status_callback not in order_status_callbacks:
+                order_status_callbacks.append(order_status_callback)
+            elif TOPIC_ORDER_STATUS not in topics and order_status_callback in order_status_callbacks:
+                order_status_callbacks.remove(order_status_callback)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def publish_order_status(self, parsed_msg):
+        try:
+            client_order_id = parsed_msg.get("client_order_id")
+            report = {"type": "ORDER_STATUS", "symbol": parsed_msg.get("symbol"), "client_order_id": client_order_id,
+                      "status": parsed_msg.get("order_status"), "total_filled": parsed_msg.get("total_filled"),
+                      "avg_price": parsed_msg.get("avg_price"), "timestamp": parsed_msg.get("timestamp")}
+            self.report_hub.publish(TOPIC_ORDER_STATUS, json.dumps(report), key=f"order:{client_order_id}")
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def publish_account_state(self, assets, symbols):
+        """BALANCE of assets and POSITION of symbols to account topic subscribers"""
+        if not self.report_hub.has_subscribers(TOPIC_ACCOUNT):
+            return
+        for asset in assets:
+            report = dict(self.futures_balance_state.get(asset, {}), type="BALANCE", asset=asset)
+            self.report_hub.publish(TOPIC_ACCOUNT, json.dumps(report), key=f"balance:{asset}")
+        for symbol in symbols:
+            report = dict(self.futures_positions_state.get(symbol, {}), type="POSITION", symbol=symbol)
+            self.report_hub.publish(TOPIC_ACCOUNT, json.dumps(report), key=f"position:{symbol}")
+
     async def process_futures_account_update(self, update):
         try:
             print(update)
@@ -223,6 +419,9 @@ class accountManager:
                 existed_data["entryPrice"] = float(position_data["ep"])
                 print("After update:", existed_data)
 
+            self.publish_account_state([balance_data.get("a") for balance_data in changed_balances],
+                                       [position_data.get("s") for position_data in changed_positions])
+
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -254,6 +453,7 @@ class accountManager:
             self.futures_logger.info(compose_log_msg(getframeinfo(currentframe()),
                                              f"Leverage update for symbol {symbol}: {existed_data}"))
             print("After update:", existed_data)
+            self.publish_account_state([], [symbol])
 
         except Exception as e:
             handle_exception(self.logger, e)
@@ -265,6 +465,11 @@ class accountManager:
 
             new_order.callbacks["readyToDie"].append([accountManager.on_futures_order_over, self])
             self.futures_active_orders[new_order.order_id] = new_order
+            if self.order_journal is not None:
+                params = {key: value for key, value in args.items() if key not in ["api_handler", "logger"]}
+                params["order_id"] = new_order.order_id
+                self.order_journal.append("created", new_order.order_id, order_class=type(new_order).__name__,
+                                          params=params, state=new_order.journal_state())
             task = asyncio.create_task(new_order.place_order())
             self.tasks_to_be_awaited_to_finish.append(task)
             self.futures_logger.info(compose_log_msg(getframeinfo(currentframe()),
@@ -288,16 +493,18 @@ class accountManager:
                       "symbol": finished_order.symbol,
                       "type": "DEAL_REPORT",
                       "status": finished_order.current_order_status}
-            self.out_ws_queue.put_nowait(json.dumps(report))
+            self.report_hub.publish(TOPIC_DEAL_REPORTS, json.dumps(report))
 
             order_dump = finished_order.dump_order_data()
             if order_dump is not None:
                 self.futures_logger.info(order_dump)
 
             del self.futures_active_orders[order_id]
+            if self.order_journal is not None:
+                self.order_journal.append("finished", order_id, status=finished_order.current_order_status)
             order_dump["type"] = "DEAL_REPORT"
             str_report = json.dumps(order_dump).replace("\\", "")
-            self.out_ws_queue.put_nowait(str_report)
+            self.report_hub.publish(TOPIC_DEAL_REPORTS, str_report)
             self.futures_logger.debug(compose_log_msg(getframeinfo(currentframe()),
                                               f"Successfully finalized futures order {order_id}"))
         except Exception as e:
@@ -311,9 +518,7 @@ class accountManager:
                 "symbol": symbol,
                 "leverage": int(leverage)
             }
-            await self.loop.run_in_executor(None,
-                                       functools.partial(self.futures_api_handler.futures_change_leverage,
-                                                         **chg_leverage_args))
+            await self.futures_api_handler.change_leverage_async(**chg_leverage_args)
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -466,7 +671,7 @@ class accountManager:
                                                   f"Cancel order cmd: no active order with order_id specified: {command}"))
                 report = {"order_id": order_id, "symbol":command.get("symbol"),
                           "type": "DEAL_REPORT", "status": "Finalizing", "err": "order_unfound"}
-                self.out_ws_queue.put_nowait(json.dumps(report))
+                self.report_hub.publish(TOPIC_DEAL_REPORTS, json.dumps(report))
                 return
 
             if order.order_type in liquidate_possible:
@@ -502,7 +707,7 @@ class accountManager:
                     total = usdt_balance.get("total")
 
             command["balance"] = total
-            self.out_ws_queue.put_nowait(json.dumps(command))
+            self.report_hub.publish(TOPIC_REPLIES, json.dumps(command))
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -511,6 +716,13 @@ class accountManager:
             if not self.validator.validate_new_order_cmd(command):
                 return
 
+            if self.is_retiring:
+                self.logger.error(compose_log_msg(getframeinfo(currentframe()), f"New order cmd for retiring account: {command}"))
+                report = {"order_id": command.get("order_id"), "symbol": command.get("symbol"),
+                          "type": "DEAL_REPORT", "status": "FAILED", "err": "account_retiring"}
+                self.report_hub.publish(TOPIC_DEAL_REPORTS, json.dumps(report))
+                return
+
             order_type = command.get("order_type")
             cmd_account = command.get("account_type")
             symbol = command.get("symbol").upper()
@@ -594,6 +806,19 @@ class accountManager:
                 await self.process_price_update_cmd(command)
                 return
 
+            if cmd_type == "MARKET RECORDING":
+                if command.get("enable"):
+                    path = command.get("path") or os.path.join(accountManager.market_data_dir, f"{int(time.time())}.mdr")
+                    BinanceFuturesApiHandler.start_market_recording(path)
+                else:
+                    BinanceFuturesApiHandler.stop_market_recording()
+                return
+
+            if cmd_type == "MARKET REPLAY":
+                task = asyncio.create_task(BinanceFuturesApiHandler.replay_market_data(command.get("path"), command.get("speed", 1.0)))
+                self.tasks_to_be_awaited_to_finish.append(task)
+                return
+
             if cmd_type.upper() == "NEW ORDER":
                 await self.process_new_order_cmd(command)
                 return
@@ -602,6 +827,27 @@ class accountManager:
                 section = command.get("section")
                 if section == "BALANCE":
                     await self.process_get_balance_cmd(command)
+                if section == "MARKET_DATA":
+                    command["stats"] = BinanceFuturesApiHandler.get_market_data_stats()
+                    self.report_hub.publish(TOPIC_REPLIES, json.dumps(command))
+                if section == "ACCOUNT_STREAM":
+                    command["stats"] = {"message_filter": self.futures_api_handler.get_account_message_filter_stats(),
+                                        "update_mailbox": self.futures_api_handler.order_update_mailbox.get_stats(),
+                                        "order_journal": self.order_journal.get_stats() if self.order_journal is not None else None}
+                    self.report_hub.publish(TOPIC_REPLIES, json.dumps(command))
+                if section == "RATE_LIMITS":
+                    command["stats"] = self.futures_api_handler.get_rate_limit_stats()
+                    self.report_hub.publish(TOPIC_REPLIES, json.dumps(command))
+                if section == "SERVER_CLOCK":
+                    command["stats"] = self.futures_api_handler.get_server_clock_stats()
+                    self.report_hub.publish(TOPIC_REPLIES, json.dumps(command))
+                if section == "RETRIES":
+                    command["stats"] = self.futures_api_handler.retry_policy.get_stats()
+                    self.report_hub.publish(TOPIC_REPLIES, json.dumps(command))
+                if section == "TRAILING_STOPS":
+                    command["stats"] = {"move_policy": self.futures_api_handler.trailing_move_policy.get_stats(),
+                                        "engines": [engine.get_stats() for engine in BinanceFuturesApiHandler._trailing_stop_engines.values()]}
+                    self.report_hub.publish(TOPIC_REPLIES, json.dumps(command))
                 return
 
             if cmd_type == "CANCEL":
@@ -0,0 +1,72 @@
+from collections import OrderedDict
+
+from common import *
+
+
+class AccountMessageFilter:
+    """
+    Drops repeated account updates - the same update comes from both account ws connections,
+    the same REST response may come from a retried request.
+
+    Order updates are keyed on (source, client_order_id, exchange_order_id, order_status, total_filled, timestamp,
+    trigger_price, action_price), exchange order id tells apart an order re-placed with the same client order id
+    within the same ms, prices - an order modified in place within the same ms;
+    other account events on (source, event type, transaction time, message text).
+    REST responses are not posted to orders when new, so they must not hide the ws update with the same key
+    Keys are kept in insertion order, so expiration pops only the oldest ones - O(1) per key.
+
+    Called from the main loop and from executor threads (sync REST calls), so guarded by a lock
+    """
+    def __init__(self, ttl=600, max_size=20000, logger=None):
+        self.ttl = ttl
+        self.max_size = max_size
+        self.logger = get_logger('default') if logger is None else logger
+        self.lock = threading.Lock()
+        self.seen_keys = OrderedDict()  # key:local receive time
+
+        self.hits = 0  # repeated messages dropped
+        self.misses = 0  # new messages passed
+        self.evictions = 0
+
+    @staticmethod
+    def make_key(parsed_msg, source):
+        client_order_id = parsed_msg.get("client_order_id")
+        if client_order_id is not None:
+            return (source, client_order_id, parsed_msg.get("exchange_order_id"), parsed_msg.get("order_status"),
+                    parsed_msg.get("total_filled"), parsed_msg.get("timestamp"), parsed_msg.get("trigger_price"),
+                    parsed_msg.get("action_price"))
+        return (source, parsed_msg.get("e"), parsed_msg.get("T"), str(parsed_msg))
+
+    def expire(self, time_now):
+        seen_keys = self.seen_keys
+        expire_before = time_now - self.ttl
+        while len(seen_keys) != 0:
+            key, received_at = next(iter(seen_keys.items()))
+            if received_at > expire_before and len(seen_keys) <= self.max_size:
+                break
+            seen_keys.popitem(last=False)
+            self.evictions += 1
+
+    def check_new(self, parsed_msg, source="ws"):
+        """Returns True if message was not seen before from this source ("ws" | "rest") and remembers it"""
+        key = self.make_key(parsed_msg, source)
+        time_now = time.monotonic()
+        with self.lock:
+            received_at = self.seen_keys.get(key)
+            if received_at is not None:
+                self.hits += 1
+                return False
+
+            self.seen_keys[key] = time_now
+            self.misses += 1
+            self.expire(time_now)
+            return True
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "size": len(self.seen_keys),
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
@@ -0,0 +1,167 @@
+from common import *
+
+
+class AccountRegistry:
+    """
+    Running accounts against users.json. reload() diffs the file with the entries accounts were started with:
+        added   - started in background, bootstrap_concurrency at once
+        changed - applied in place with manager.apply_user_data (key rotation, policies), orders keep running
+        removed - retired in background with manager.retire: new orders refused, active ones drained, nothing cancelled;
+                  after retire_drain_timeout s the account stops with orders still active (resting GTC orders, stops),
+                  they stay on exchange and in the order journal
+    Account added back while its manager is still retiring starts once the retirement is over, so two managers never
+    run one account and its order journal; the new one recovers orders the old one left active.
+    Accounts keep running when the file can't be read or parsed.
+    watch() reloads whenever users.json modification time changes.
+
+    create_account - coroutine function(user_data) -> account manager (or AccountShardProxy), None if it failed
+    """
+    def __init__(self, managers, account_states, create_account, users_path="users.json", bootstrap_concurrency=8,
+                 retire_drain_timeout=600, logger=None):
+        self.managers = managers  # username:manager, shared with the websocket server
+        self.account_states = account_states  # username:{"status", "startup_timings"}
+        self.create_account = create_account
+        self.users_path = users_path
+        self.bootstrap_concurrency = bootstrap_concurrency
+        self.retire_drain_timeout = retire_drain_timeout
+        self.logger = get_logger('default') if logger is None else logger
+        self.loop = None
+        self.semaphore = None
+        self.applied_users = {}  # username:users.json entry the account runs (or starts) with
+        self.running_tasks = []
+        self.retirements = {}  # username:task retiring the account manager
+
+    def read_users(self):
+        with open(self.users_path, "r") as f:
+            users = json.loads(f.read())
+        return {user_data["user"]: user_data for user_data in users}
+
+    def diff_users(self, users):
+        """(added, changed, removed) entries of users - username:users.json entry - against applied ones"""
+        added = [user_data for username, user_data in users.items() if username not in self.applied_users]
+        changed = [user_data for username, user_data in users.items()
+                   if username in self.applied_users and user_data != self.applied_users[username]]
+        removed = [username for username in self.applied_users if username not in users]
+        return added, changed, removed
+
+    async def reload(self, wait_started=False):
+        """
+        Applies users.json to running accounts, may be called from any loop; returns
+        {"added": [...], "changed": [...], "removed": [...]} usernames, None if users.json is invalid.
+        wait_started - returns after added accounts have started (or failed)
+        """
+        if self.loop is None:
+            self.loop = asyncio.get_running_loop()
+            self.semaphore = asyncio.Semaphore(self.bootstrap_concurrency)
+        if asyncio.get_running_loop() is not self.loop:
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.reload(wait_started), self.loop))
+
+        try:
+            users = self.read_users()
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return None
+
+        self.running_tasks = clean_finished_tasks(self.running_tasks)
+        added, changed, removed = self.diff_users(users)
+
+        for user_data in changed:
+            self.applied_users[user_data["user"]] = user_data
+            manager = self.managers.get(user_data["user"])
+            if manager is not None:
+                await manager.apply_user_data(user_data)  # still starting one gets it when it is ready
+
+        for username in removed:
+            del self.applied_users[username]
+            self.start_retirement(username, self.retire_account(username))
+
+        for user_data in added:
+            self.applied_users[user_data["user"]] = user_data
+            self.account_states[user_data["user"]] = {"status": "starting", "startup_timings": None}
+        bootstrap_task = asyncio.create_task(self.start_accounts(added))
+        self.running_tasks.append(bootstrap_task)
+        if wait_started:
+            await bootstrap_task
+
+        summary = {"added": [user_data["user"] for user_data in added], "changed": [user_data["user"] for user_data in changed],
+                   "removed": removed}
+        if added or changed or removed:
+            self.logger.info(compose_log_msg(getframeinfo(currentframe()), f"users.json applied: {summary}"))
+        return summary
+
+    async def start_account(self, user_data):
+        username = user_data["user"]
+        retirement = self.retirements.get(username)
+        if retirement is not None:
+            self.logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                             f"Account {username} added back while retiring, starts when it is retired"))
+            await asyncio.wait([retirement])
+        async with self.semaphore:
+            manager = await self.create_account(user_data)
+        if manager is None:
+            self.account_states[username]["status"] = "failed"
+            self.applied_users.pop(username, None)  # next reload tries again
+            return
+        if self.applied_users.get(username) is None:
+            self.start_retirement(username, self.retire_manager(username, manager))  # removed while starting
+            return
+
+        self.managers[username] = manager
+        self.account_states[username] = {"status": "ready", "startup_timings": manager.startup_timings}
+        if self.applied_users[username] != user_data:
+            await manager.apply_user_data(self.applied_users[username])  # changed while starting
+
+    async def start_accounts(self, users):
+        if len(users) == 0:
+            return
+        started = time.perf_counter()
+        await asyncio.gather(*[self.start_account(user_data) for user_data in users])
+
+        timings = [self.account_states[user_data["user"]]["startup_timings"] for user_data in users]
+        timings = [account_timings for account_timings in timings if account_timings]
+        phases_max = {phase: max(account_timings[phase] for account_timings in timings) for phase in (timings[0] if timings else {})}
+        self.logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                         f"Accounts started: {len(timings)} of {len(users)} in {time.perf_counter() - started:.3f} s, "
+                                         f"concurrency {self.bootstrap_concurrency}, max per phase: {phases_max}"))
+
+    def start_retirement(self, username, retirement):
+        task = asyncio.create_task(retirement)
+        task.add_done_callback(functools.partial(self.end_retirement, username))
+        self.retirements[username] = task
+        self.running_tasks.append(task)
+
+    def end_retirement(self, username, task):
+        if self.retirements.get(username) is task:
+            del self.retirements[username]
+
+    async def retire_account(self, username):
+        manager = self.managers.get(username)
+        if manager is None:
+            return  # still starting, start_account retires it
+        self.account_states[username]["status"] = "retiring"
+        await self.retire_manager(username, manager)
+
+    async def retire_manager(self, username, manager):
+        try:
+            await manager.retire(self.retire_drain_timeout)
+        except Exception as e:
+            handle_exception(self.logger, e)
+        if self.managers.get(username) is manager:
+            del self.managers[username]
+        if username not in self.applied_users:
+            self.account_states.pop(username, None)
+
+    async def watch(self, interval=2.0):
+        """Reloads users.json when its modification time changes"""
+        last_mtime = None
+        while True:
+            try:
+                mtime = os.stat(self.users_path).st_mtime
+                if last_mtime is not None and mtime != last_mtime:
+                    await self.reload()
+                last_mtime = mtime
+            except FileNotFoundError:
+                pass
+            except Exception as e:
+                handle_exception(self.logger, e)
+            await asyncio.sleep(interval)
@@ -0,0 +1,309 @@
+import socket
+import zlib
+import multiprocessing
+
+from common import *
+from report_hub import ReportHub
+
+IPC_STREAM_LIMIT = 2 ** 24  # bytes of one message line, order dumps included
+
+
+def encode_message(message):
+    return json.dumps(message).encode() + b"\n"
+
+
+class ShardReportPublisher:
+    """report_hub of an account in a shard process: reports of topics front-end clients subscribe go to the front-end
+       over the shard stream, where the account proxy ReportHub publishes them"""
+    def __init__(self, username, writer, loop):
+        self.username = username
+        self.writer = writer
+        self.loop = loop
+        self.topics = set()  # subscribed by clients of the account proxy
+        self.reports = 0
+
+    def has_subscribers(self, topic):
+        return topic in self.topics
+
+    def publish(self, topic, data, key=None):
+        if topic not in self.topics:
+            return
+        self.reports += 1
+        line = encode_message({"type": "report", "username": self.username, "topic": topic, "key": key, "report": data})
+        if threading.current_thread() is threading.main_thread():
+            self.writer.write(line)
+        else:
+            self.loop.call_soon_threadsafe(self.writer.write, line)
+
+    def close(self):
+        pass  # clients are disconnected by the proxy ReportHub
+
+
+class AccountShardProxy:
+    """
+    Front-end stand-in of an accountManager running in a shard process, what input_websocket_server uses of it:
+    process_new_cmd on loop forwards the command, reports of the account come to report_hub
+    """
+    def __init__(self, username, shard, loop):
+        self.username = username
+        self.shard = shard
+        self.loop = loop
+        self.report_hub = ReportHub(loop)
+        self.report_hub.topics_callbacks.append([AccountShardProxy.update_topics, self])
+        self.startup_timings = None  # of the account in the shard
+
+    async def process_new_cmd(self, command):
+        await self.shard.send({"type": "cmd", "username": self.username, "cmd": command})
+
+    async def update_topics(self, topics):
+        await self.shard.send({"type": "topics", "username": self.username, "topics": sorted(topics)})
+
+    async def apply_user_data(self, user_data):
+        await self.shard.request({"type": "update_account", "user_data": user_data})
+
+    async def retire(self, drain_timeout=None):
+        await self.shard.retire_account(self.username, drain_timeout)
+        self.report_hub.close()
+
+
+class AccountShard:
+    """Front-end side of one shard process: its stream (unix socket pair) and proxies of its accounts"""
+    def __init__(self, shard_id, logger):
+        self.shard_id = shard_id
+        self.logger = logger
+        self.process = None
+        self.sock = None
+        self.reader = None
+        self.writer = None
+        self.reader_task = None
+        self.proxies = {}  # username:AccountShardProxy
+        self.replies = {}  # request id:future
+        self.commands_sent = 0
+        self.reports_received = 0
+
+    def start(self, context, market_data_attachment=None, shard_setup=None):
+        self.sock, child_sock = socket.socketpair()
+        self.process = context.Process(target=run_account_shard, args=(self.shard_id, child_sock, market_data_attachment, shard_setup),
+                                       name=f"account_shard_{self.shard_id}", daemon=True)
+        self.process.start()
+        child_sock.close()
+
+    async def connect(self):
+        self.reader, self.writer = await asyncio.open_connection(sock=self.sock, limit=IPC_STREAM_LIMIT)
+        self.reader_task = asyncio.create_task(self.read_messages())
+
+    async def send(self, message):
+        self.writer.write(encode_message(message))
+        self.commands_sent += 1
+        await self.writer.drain()
+
+    async def request(self, message, timeout=None):
+        """Sends message and waits for the shard reply to it"""
+        request_id = generate_id(10)
+        future = asyncio.get_running_loop().create_future()
+        self.replies[request_id] = future
+        try:
+            await self.send(dict(message, request_id=request_id))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self.replies.pop(request_id, None)
+
+    async def read_messages(self):
+        try:
+            while True:
+                line = await self.reader.readline()
+                if not line:
+                    self.logger.error(compose_log_msg(getframeinfo(currentframe()), f"Account shard {self.shard_id} stream closed"))
+                    return
+                message = json.loads(line)
+                if message["type"] == "report":
+                    proxy = self.proxies.get(message["username"])
+                    if proxy is not None:
+                        self.reports_received += 1
+                        proxy.report_hub.publish(message["topic"], message["report"], message["key"])
+                else:
+                    future = self.replies.get(message.get("request_id"))
+                    if future is not None and not future.done():
+                        future.set_result(message)
+        except asyncio.CancelledError:
+            pass
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def add_account(self, user_data, loop):
+        reply = await self.request({"type": "add_account", "user_data": user_data})
+        if not reply.get("is_ok"):
+            return None
+        proxy = AccountShardProxy(user_data["user"], self, loop)
+        proxy.startup_timings = reply.get("startup_timings")
+        self.proxies[proxy.username] = proxy
+        return proxy
+
+    async def retire_account(self, username, drain_timeout=None):
+        await self.request({"type": "retire_account", "username": username, "drain_timeout": drain_timeout})
+        self.proxies.pop(username, None)
+
+    async def shut_down(self, timeout):
+        try:
+            await self.request({"type": "shut_down"}, timeout)
+        except Exception as e:
+            handle_exception(self.logger, e)
+        if self.reader_task is not None:
+            self.reader_task.cancel()
+        if self.writer is not None:
+            self.writer.close()
+        self.process.join(timeout)
+
+    def get_stats(self):
+        return {"pid": self.process.pid if self.process is not None else None,
+                "is_alive": self.process is not None and self.process.is_alive(),
+                "accounts": sorted(self.proxies), "commands_sent": self.commands_sent, "reports_received": self.reports_received}
+
+
+class AccountShardRouter:
+    """
+    Accounts are spread over shards_num worker processes, each with its own loop, so a slow account
+    (heavy command handling, REST retries) delays only accounts of its shard. Account goes to the shard set as
+    "shard" in its users.json entry or to crc32(username) % shards_num.
+    Commands and replies go over a unix socket pair per shard, one json message per line; deal reports of shard
+    accounts come back the same way to report_hub of their AccountShardProxy, so input_websocket_server
+    routes to proxies as to local accounts; only topics some client subscribes are sent.
+
+    BinanceFuturesApiHandler class state (market stream, RateLimiter, ServerClockTracker) is per process:
+    IP request weight is shared through X-MBX-USED-WEIGHT response headers, market stream - through
+    the market data process when there is one (market_data_process.get_worker_attachment(shard id))
+    """
+    shut_down_timeout = 30
+
+    def __init__(self, shards_num, market_data_process=None, shard_setup=None, logger=None):
+        """shard_setup - picklable function(shard_id) called in every shard process first, returns extra
+           accountManager.create kwargs (e.g. api_handler_cls of the exchange simulator) or None"""
+        self.shards_num = shards_num
+        self.market_data_process = market_data_process
+        self.shard_setup = shard_setup
+        self.logger = get_logger('default') if logger is None else logger
+        self.shards = [AccountShard(shard_id, self.logger) for shard_id in range(shards_num)]
+        self.loop = None
+
+    async def start(self):
+        self.loop = asyncio.get_running_loop()
+        context = multiprocessing.get_context("spawn")  # parent has threads and a running loop
+        for shard in self.shards:
+            attachment = None
+            if self.market_data_process is not None:
+                attachment = self.market_data_process.get_worker_attachment(shard.shard_id)
+            shard.start(context, attachment, self.shard_setup)
+            await shard.connect()
+        self.logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                         f"Account shards started: {[shard.process.pid for shard in self.shards]}"))
+
+    def get_shard(self, user_data):
+        shard_id = user_data.get("shard")
+        if shard_id is None:
+            shard_id = zlib.crc32(user_data["user"].encode()) % self.shards_num
+        return self.shards[int(shard_id) % self.shards_num]
+
+    async def add_account(self, user_data):
+        """AccountShardProxy of the account created in its shard, None if creation failed; may be called from any loop"""
+        if asyncio.get_running_loop() is not self.loop:
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.add_account(user_data), self.loop))
+        try:
+            return await self.get_shard(user_data).add_account(user_data, self.loop)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def shut_down(self):
+        if asyncio.get_running_loop() is not self.loop:
+            return await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(self.shut_down(), self.loop))
+        await asyncio.gather(*[shard.shut_down(self.shut_down_timeout) for shard in self.shards])
+
+    def get_stats(self):
+        return {shard.shard_id: shard.get_stats() for shard in self.shards}
+
+
+def run_account_shard(shard_id, sock, market_data_attachment=None, shard_setup=None):
+    """Shard process entry"""
+    create_kwargs = shard_setup(shard_id) if shard_setup is not None else None
+    if market_data_attachment is not None:
+        from market_data_process import attach_worker
+        attach_worker(market_data_attachment[0], market_data_attachment[1], shard_id)
+    asyncio.run(serve_account_shard(shard_id, sock, create_kwargs or {}))
+
+
+async def serve_account_shard(shard_id, sock, create_kwargs):
+    from account_manager import accountManager  # not needed by the front-end process
+    logger = get_logger('default')
+    loop = asyncio.get_running_loop()
+    reader, writer = await asyncio.open_connection(sock=sock, limit=IPC_STREAM_LIMIT)
+    managers = {}
+    running_tasks = []
+
+    def reply(message, **fields):
+        writer.write(encode_message(dict(fields, type="reply", request_id=message.get("request_id"))))
+
+    async def add_account(message):
+        try:
+            user_data = message["user_data"]
+            username = user_data["user"]
+            manager = managers.get(username)
+            if manager is None:
+                manager = await accountManager.create_from_user_data(user_data, report_hub=ShardReportPublisher(username, writer, loop),
+                                                                    **create_kwargs)
+                if manager is not None:
+                    managers[username] = manager
+            reply(message, username=username, is_ok=manager is not None,
+                  startup_timings=manager.startup_timings if manager is not None else None)
+        except Exception as e:
+            handle_exception(logger, e)
+            reply(message, is_ok=False)
+
+    async def update_account(message):
+        manager = managers.get(message["user_data"]["user"])
+        if manager is not None:
+            await manager.apply_user_data(message["user_data"])
+        reply(message, is_ok=manager is not None)
+
+    async def retire_account(message):
+        manager = managers.get(message["username"])
+        if manager is not None:
+            await manager.retire(message.get("drain_timeout"))
+            managers.pop(message["username"], None)
+        reply(message, is_ok=True)
+
+    try:
+        while True:
+            line = await reader.readline()
+            if not line:
+                return  # front-end is gone
+            message = json.loads(line)
+            running_tasks = clean_finished_tasks(running_tasks)
+            message_type = message["type"]
+
+            if message_type == "cmd":
+                manager = managers.get(message["username"])
+                if manager is None:
+                    logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                                 f"Shard {shard_id}: cmd for not existing account {message['username']}"))
+                else:
+                    running_tasks.append(asyncio.create_task(manager.process_new_cmd(message["cmd"])))
+            elif message_type == "topics":
+                manager = managers.get(message["username"])
+                if manager is not None:
+                    manager.report_hub.topics = set(message["topics"])
+                    running_tasks.append(asyncio.create_task(manager.update_topics(manager.report_hub.topics)))
+            elif message_type == "add_account":
+                running_tasks.append(asyncio.create_task(add_account(message)))
+            elif message_type == "update_account":
+                running_tasks.append(asyncio.create_task(update_account(message)))
+            elif message_type == "retire_account":
+                running_tasks.append(asyncio.create_task(retire_account(message)))
+            elif message_type == "shut_down":
+                for username in list(managers):
+                    await managers.pop(username).finalize_service()
+                reply(message, is_ok=True)
+                await writer.drain()
+                return
+    except Exception as e:
+        handle_exception(logger, e)
+    finally:
+        writer.close()
@@ -0,0 +1,2 @@
+from .backtest_api_handler import BacktestApiHandler
+from .backtest_runner import BacktestRun, run_backtest, run_sweep, expand_parameter_grid, load_price_series
@@ -0,0 +1,43 @@
+from common import *
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from market_subscription_manager import MarketSubscriptionManager
+from exchange_simulator import SimulatedFuturesApiHandler
+
+
+class BacktestApiHandler(SimulatedFuturesApiHandler):
+    """
+    SimulatedFuturesApiHandler without threads: REST calls go to SimulatedExchange through the async
+    simulated transport, account events are processed by process_account_message right where exchange
+    publishes them, prices are fed by BacktestRun with set_price. Everything runs on one loop, so a tick
+    is over when all loop tasks are done - no wall clock waits.
+
+    Price subscriptions are class level as in the production handler, so one backtest per process at a time
+    """
+
+    @classmethod
+    def create_backtest(cls, exchange, username="backtest", logger=None):
+        cls.attach_exchange(exchange)
+        cls.reset_market_state()
+        self = cls(username=username, public_key=username, private_key=username, logger=logger)
+        self.rest_transport = self.create_rest_transport(username, username)
+        self.load_exchange_assets_info()
+        exchange.add_user_listener(username, self.process_account_message)
+        return self
+
+    @staticmethod
+    def reset_market_state():
+        """Drops prices and price subscriptions left by the previous backtest of the process"""
+        BinanceFuturesApiHandler._current_prices.clear()
+        BinanceFuturesApiHandler._price_trigger_indexes.clear()
+        BinanceFuturesApiHandler._trailing_stop_engines.clear()
+        BinanceFuturesApiHandler._on_price_update_callbacks.clear()
+        BinanceFuturesApiHandler._on_price_update_callbacks["update_finished"] = {}
+        BinanceFuturesApiHandler._market_subscriptions = MarketSubscriptionManager(max_multiplexed_symbols=50)
+
+    def set_price(self, symbol, price, running_tasks):
+        """Mark price tick: exchange matching first, then price update callbacks, as ws delivers it"""
+        type(self)._exchange.set_mark_prices({symbol: price})
+        BinanceFuturesApiHandler.dispatch_price_update(symbol, price, running_tasks)
+
+    async def start_ws_updates(self):
+        pass
@@ -0,0 +1,232 @@
+"""
+Backtest of the order classes on historical mark prices and parameter sweeps over a process pool.
+
+Run spec (json):
+    prices            - price file: .mdr market recording or csv with price in the last column
+    symbol            - symbol to take from .mdr recording and to trade
+    order_class       - MarketOrder | LimitOrder | StopLimitOrder | StopMarketOrder | CustomOcoOrder | TrailingStopOrder | CombinedOrder
+    params            - order constructor params, as order journal keeps them (stop_data is a list of dicts)
+    position          - optional signed position amount opened at the first price before the order is placed
+    price_tick, lot_size_step, min_lot_size, min_notional - symbol filters
+    taker_commission, maker_commission, slippage, balance - see SimulatedExchange
+    start, end        - optional tick range of the price series
+
+Sweep config: {"base": run spec, "grid": {"params.limit_price": [...], "slippage": [...], ...}};
+dotted keys address nested params, list items by index ("params.stop_data.0.price_step").
+Every grid combination is one run; report per run has PnL, fees and fills.
+
+    python -m backtest.backtest_runner sweep.json [--processes 8] [--output report.json] [--top 10]
+"""
+import io
+import csv
+import copy
+import argparse
+import itertools
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
+
+from common import *
+from account_manager import journaled_order_classes
+from market_data_recorder import MarketDataReader
+from exchange_simulator import SimulatedExchange
+from order_update_mailbox import OrderUpdateMailbox
+from orders_logic.custom_oco_order import CustomOcoOrder
+from backtest.backtest_api_handler import BacktestApiHandler
+
+_price_series_cache = {}  # (path, symbol):prices, kept by pool worker process between runs
+
+
+def load_price_series(path, symbol=None):
+    """List of float prices from .mdr recording (records of symbol) or csv (last column, header skipped)"""
+    key = (path, symbol)
+    prices = _price_series_cache.get(key)
+    if prices is not None:
+        return prices
+
+    if path.endswith(".mdr"):
+        reader = MarketDataReader(path)
+        try:
+            prices = [price for record_symbol, event_ms, received_ns, price in reader.iter_records() if record_symbol == symbol]
+        finally:
+            reader.close()
+    else:
+        prices = []
+        with open(path, "r", newline="") as f:
+            for row in csv.reader(f):
+                if len(row) == 0:
+                    continue
+                try:
+                    prices.append(float(row[-1]))
+                except ValueError:
+                    continue  # header
+    _price_series_cache[key] = prices
+    return prices
+
+
+class BacktestRun:
+    """One order of spec["order_class"] placed at the first price and driven tick by tick until it is finished"""
+    def __init__(self, spec, prices, logger):
+        self.spec = spec
+        self.prices = prices[spec.get("start", 0):spec.get("end")]
+        self.logger = logger
+        self.symbol = spec["symbol"].upper()
+        self.order = None
+        self.tick = 0
+        self.finished_tick = None
+
+    async def run(self):
+        spec = self.spec
+        symbol_filters = {key: str(spec[key]) for key in ["price_tick", "lot_size_step", "min_lot_size", "min_notional"] if key in spec}
+        exchange = SimulatedExchange({self.symbol: dict(symbol_filters, mark_price=self.prices[0])},
+                                     default_balance=spec.get("balance", 10000),
+                                     taker_commission=spec.get("taker_commission", 0.0004),
+                                     maker_commission=spec.get("maker_commission"),
+                                     slippage=spec.get("slippage", 0),
+                                     logger=self.logger)
+        api_handler = BacktestApiHandler.create_backtest(exchange, logger=self.logger)
+        account = exchange.get_account(api_handler.API_KEY)
+        if spec.get("position"):
+            account.positions[self.symbol] = [float(spec["position"]), self.prices[0]]
+        balance_before = account.wallet_balance
+
+        order_params = dict(spec.get("params", {}), symbol=self.symbol)
+        self.order = journaled_order_classes[spec["order_class"]](api_handler=api_handler, logger=self.logger, **order_params)
+        self.order.callbacks["readyToDie"].append([BacktestRun.on_order_over, self])
+
+        running_tasks = []
+        mailbox = api_handler.order_update_mailbox
+        api_handler.set_price(self.symbol, self.prices[0], running_tasks)
+        await self.order.place_order()
+        await self.settle()
+
+        for tick in range(1, len(self.prices)):
+            if self.finished_tick is not None:
+                break
+            self.tick = tick
+            updates_posted = mailbox.updates_posted
+            api_handler.set_price(self.symbol, self.prices[tick], running_tasks)
+            if len(running_tasks) != 0 or mailbox.updates_posted != updates_posted:
+                running_tasks.clear()
+                await self.settle()
+        mailbox.close()
+
+        last_price = self.prices[self.tick]
+        amount, entry_price = account.positions.get(self.symbol, [0.0, 0.0])
+        unrealized_pnl = amount * (last_price - entry_price)
+        return {
+            "order_status": self.order.current_order_status,
+            "filled_amount": self.order.filled_amount,
+            "finished_tick": self.finished_tick,
+            "ticks": self.tick + 1,
+            "last_price": last_price,
+            "position": amount,
+            "realized_pnl": account.wallet_balance - balance_before + account.commission_paid,
+            "commission": account.commission_paid,
+            "unrealized_pnl": unrealized_pnl,
+            "pnl": account.wallet_balance - balance_before + unrealized_pnl,
+            "fills": account.trades,
+        }
+
+    @staticmethod
+    async def settle():
+        """Waits until order tasks, the tasks they started and the account updates they caused are done"""
+        current_task = asyncio.current_task()
+        while True:
+            workers = OrderUpdateMailbox.get_all_worker_tasks()  # long-lived, done only when their account stops
+            pending = [task for task in asyncio.all_tasks()
+                       if task is not current_task and not task.done() and task not in workers]
+            if len(pending) != 0:
+                await asyncio.wait(pending)
+            elif not await OrderUpdateMailbox.join_all():
+                return
+
+    async def on_order_over(self, order_id, tasks):
+        self.finished_tick = self.tick
+
+
+def set_spec_value(spec, dotted_key, value):
+    keys = dotted_key.split(".")
+    target = spec
+    for key in keys[:-1]:
+        target = target[int(key)] if isinstance(target, list) else target.setdefault(key, {})
+    if isinstance(target, list):
+        target[int(keys[-1])] = value
+    else:
+        target[keys[-1]] = value
+
+
+def expand_parameter_grid(base_spec, grid):
+    """Run specs of every grid combination: [(overrides, spec)]"""
+    keys = list(grid)
+    specs = []
+    for values in itertools.product(*[grid[key] for key in keys]):
+        overrides = dict(zip(keys, values))
+        spec = copy.deepcopy(base_spec)
+        for key, value in overrides.items():
+            set_spec_value(spec, key, copy.deepcopy(value))
+        specs.append((overrides, spec))
+    return specs
+
+
+def run_backtest(spec, overrides=None):
+    """Runs one spec in a fresh loop; order logs below spec["log_level"] (ERROR) and prints are dropped"""
+    logging.getLogger("backtest").setLevel(spec.get("log_level", "ERROR"))
+    logger = get_logger("backtest")
+    CustomOcoOrder.price_subscription_delay = 0
+    started = time.perf_counter()
+    try:
+        prices = load_price_series(spec["prices"], spec["symbol"].upper())
+        with contextlib.redirect_stdout(io.StringIO()):
+            report = asyncio.run(BacktestRun(spec, prices, logger).run())
+    except Exception as e:
+        handle_exception(logger, e)
+        report = {"error": str(e)}
+    report["params"] = overrides if overrides is not None else spec.get("params")
+    report["elapsed_s"] = round(time.perf_counter() - started, 4)
+    return report
+
+
+def run_backtest_item(item):
+    overrides, spec = item
+    return run_backtest(spec, overrides)
+
+
+def run_sweep(base_spec, grid, processes=None):
+    """Reports of every grid combination, in grid order; processes=1 runs in this process"""
+    specs = expand_parameter_grid(base_spec, grid)
+    if processes == 1:
+        return [run_backtest_item(item) for item in specs]
+
+    with ProcessPoolExecutor(max_workers=processes) as executor:
+        chunksize = max(1, len(specs) // ((processes or os.cpu_count() or 1) * 4))
+        return list(executor.map(run_backtest_item, specs, chunksize=chunksize))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Order classes backtest over a parameter grid")
+    parser.add_argument("config", help="json: {\"base\": run spec, \"grid\": {dotted key: [values]}}")
+    parser.add_argument("--processes", type=int, default=None, help="pool size, cpu count by default")
+    parser.add_argument("--output", default=None, help="all run reports as json")
+    parser.add_argument("--top", type=int, default=10, help="best runs by pnl printed")
+    args = parser.parse_args()
+
+    with open(args.config, "r") as f:
+        config = json.load(f)
+
+    started = time.perf_counter()
+    reports = run_sweep(config["base"], config.get("grid", {}), args.processes)
+    elapsed = time.perf_counter() - started
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(reports, f, indent=1)
+
+    ranked = sorted([report for report in reports if "pnl" in report], key=lambda report: report["pnl"], reverse=True)
+    print(json.dumps({"runs": len(reports), "failed": len(reports) - len(ranked), "elapsed_s": round(elapsed, 3),
+                      "runs_per_s": round(len(reports) / max(elapsed, 1e-9), 1)}))
+    for report in ranked[:args.top]:
+        print(json.dumps({key: report[key] for key in ["params", "pnl", "commission", "order_status", "finished_tick"]}))
+
+
+if __name__ == "__main__":
+    main()
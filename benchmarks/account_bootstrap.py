@@ -0,0 +1,117 @@
+"""
+Startup of many accounts: total bootstrap time, time to the first ready account and main loop lag meanwhile.
+
+Accounts are created with accountManager.create against SimulatedExchange with rest_latency_ms per REST call
+(client construction with position mode call, account state, exchange info of the first account). Modes:
+    legacy     - as it was: one account after another, handler construction and account state REST calls on the loop
+    sequential - one account after another, blocking calls in executor
+    concurrent - bootstrap_concurrency accounts at once, as oms_main.update_managed_accounts does
+Every mode runs in a fresh process (handler class state is per process).
+Reported per mode: total s, first account ready s, max loop lag (lateness of a 10 ms timer), p50 / max per phase.
+
+Run from the repository root:
+    python -m benchmarks.account_bootstrap [accounts] [rest_latency_ms] [bootstrap_concurrency]
+"""
+import io
+import sys
+import multiprocessing
+
+from common import *
+
+BENCH_SYMBOL = "BENCHUSDT"
+LAG_TIMER_S = 0.01
+
+
+async def run_mode(mode, accounts_num, rest_latency_ms, concurrency):
+    from account_manager import accountManager
+    from exchange_simulator import SimulatedExchange, SimulatedFuturesApiHandler, FaultProfile
+
+    class LegacyBootstrapApiHandler(SimulatedFuturesApiHandler):
+        """handler constructed on the loop, as create did before"""
+        @classmethod
+        async def create(cls, username, public, private, logger=None, is_hedge=False, rest_transport=None):
+            self = cls(username=username, public_key=public, private_key=private, logger=logger, is_hedge=is_hedge)
+            self.account_loop = asyncio.get_running_loop()  # account frames are bridged as now, only bootstrap is legacy
+            self.account_async_queue = asyncio.Queue()
+            self.ws_process_tasks["account"] = asyncio.create_task(self.account_ws_messages_processor())
+            if cls._ws_market_updates_thread is None:
+                cls._ws_market_updates_thread = threading.Thread(target=BinanceFuturesApiHandler.run_market_updates, daemon=True)
+                self.load_exchange_assets_info()
+            return self
+
+    class LegacyBootstrapAccountManager(accountManager):
+        """account state requested on the loop, as update_futures_account_state did before"""
+        async def update_futures_account_state(self):
+            current_account_state = self.futures_api_handler.futures_account()
+            for asset_data in current_account_state["assets"]:
+                self.futures_balance_state[asset_data['asset']] = {"total": float(asset_data["walletBalance"]),
+                                                                   "cross": float(asset_data["crossWalletBalance"])}
+
+    from binance_futures_api_handler import BinanceFuturesApiHandler
+    for name in ["root", "futures", "futures_general", "default"]:
+        logging.getLogger(name).setLevel("CRITICAL")
+    accountManager.journal_dir = None
+    SimulatedFuturesApiHandler.attach_exchange(SimulatedExchange({BENCH_SYMBOL: {"mark_price": 100.0}},
+                                                                 fault_profile=FaultProfile(rest_latency_ms=rest_latency_ms)))
+    lags = []
+
+    async def measure_lag():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_TIMER_S)
+            lags.append(max(0.0, time.perf_counter() - started - LAG_TIMER_S))
+
+    lag_task = asyncio.create_task(measure_lag())
+    ready_at = []
+    started = time.perf_counter()
+    semaphore = asyncio.Semaphore(concurrency if mode == "concurrent" else 1)
+    manager_cls = LegacyBootstrapAccountManager if mode == "legacy" else accountManager
+    api_handler_cls = LegacyBootstrapApiHandler if mode == "legacy" else SimulatedFuturesApiHandler
+
+    async def start_account(i):
+        async with semaphore:
+            manager = await manager_cls.create(f"user{i}", f"user{i}_key", f"user{i}_secret", api_handler_cls=api_handler_cls)
+        ready_at.append(time.perf_counter() - started)
+        return manager
+
+    managers = await asyncio.gather(*[start_account(i) for i in range(accounts_num)])
+    total = time.perf_counter() - started
+    lag_task.cancel()
+
+    phases = {}
+    for manager in managers:
+        for phase, duration in manager.startup_timings.items():
+            phases.setdefault(phase, []).append(duration)
+    BinanceFuturesApiHandler._is_shutdown = True
+    return {
+        "accounts_ready": sum(1 for manager in managers if manager is not None),
+        "total_s": round(total, 3),
+        "first_ready_s": round(min(ready_at), 3),
+        "max_loop_lag_ms": round(max(lags, default=0) * 1000, 1),
+        "phases": {phase: {"p50_ms": round(sorted(durations)[len(durations) // 2] * 1000, 1), "max_ms": round(max(durations) * 1000, 1)}
+                   for phase, durations in phases.items()},
+    }
+
+
+def run_mode_process(mode, accounts_num, rest_latency_ms, concurrency, results):
+    sys.stdout = io.StringIO()
+    results.put(asyncio.run(run_mode(mode, accounts_num, rest_latency_ms, concurrency)))
+
+
+def main(accounts_num, rest_latency_ms, concurrency):
+    result = {"accounts": accounts_num, "rest_latency_ms": rest_latency_ms, "bootstrap_concurrency": concurrency}
+    context = multiprocessing.get_context("spawn")
+    for mode in ["legacy", "sequential", "concurrent"]:
+        results = context.Queue()
+        process = context.Process(target=run_mode_process, args=(mode, accounts_num, rest_latency_ms, concurrency, results))
+        process.start()
+        result[mode] = results.get()
+        process.join()
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 16
+    latency_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 50
+    bootstrap_concurrency = int(sys.argv[3]) if len(sys.argv) > 3 else 8
+    main(accounts, latency_ms, bootstrap_concurrency)
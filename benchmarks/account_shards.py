@@ -0,0 +1,135 @@
+"""
+Command latency isolation between accounts: one process for all accounts vs accounts sharded over processes.
+
+Accounts run in AccountShardRouter shard processes against a SimulatedExchange per shard. One noisy account gets
+a flood of NEW ORDER LIMIT commands (validation, order objects, REST, order update handling on its loop);
+quiet accounts send GET_INFO BALANCE every probe_interval_ms and measure the time until the reply report comes back
+to the front-end. Modes:
+    one_process - all accounts in one shard, as when they all run on the oms_main loop (plus the same IPC hop)
+    sharded     - noisy account alone in shard 0, quiet accounts spread over the other shards
+Reported per mode: quiet probes answered, p50 / p99 / max probe latency, noisy orders sent,
+both with and without the noisy flood (idle).
+
+Run from the repository root:
+    python -m benchmarks.account_shards [shards] [quiet_accounts] [noisy_orders_per_s] [seconds]
+"""
+import io
+import os
+import sys
+
+from common import *
+from account_shards import AccountShardRouter
+from report_hub import TOPIC_REPLIES
+
+BENCH_SYMBOL = "BENCHUSDT"
+BASE_PRICE = 100.0
+PROBE_INTERVAL = 0.02
+
+
+def setup_shard(shard_id):
+    """Shard process: simulated exchange instead of Binance, quiet logs"""
+    from account_manager import accountManager
+    from exchange_simulator import SimulatedExchange, SimulatedFuturesApiHandler, FaultProfile
+    for name in ["root", "futures", "futures_general", "default"]:
+        logging.getLogger(name).setLevel("CRITICAL")
+    sys.stdout = io.StringIO()
+    accountManager.journal_dir = None
+    SimulatedFuturesApiHandler.attach_exchange(SimulatedExchange({BENCH_SYMBOL: {"mark_price": BASE_PRICE}},
+                                                                 fault_profile=FaultProfile(rest_latency_ms=2, seed=shard_id)))
+    return {"api_handler_cls": SimulatedFuturesApiHandler}
+
+
+class ProbeQueue:
+    """report subscriber of a quiet account proxy: probe reply latency"""
+    def __init__(self, latencies):
+        self.latencies = latencies
+        self.topics = frozenset([TOPIC_REPLIES])
+        self.sent = {}  # probe id:perf_counter
+
+    def put(self, data, key=None):
+        probe_id = json.loads(data).get("probe_id")
+        sent_at = self.sent.pop(probe_id, None)
+        if sent_at is not None:
+            self.latencies.append(time.perf_counter() - sent_at)
+
+
+async def probe(proxy, probe_queue, seconds):
+    deadline = time.perf_counter() + seconds
+    probe_id = 0
+    while time.perf_counter() < deadline:
+        probe_id += 1
+        probe_queue.sent[probe_id] = time.perf_counter()
+        await proxy.process_new_cmd({"username": proxy.username, "type": "GET_INFO", "section": "BALANCE",
+                                     "asset": "USDT", "account": "FUTURES", "probe_id": probe_id})
+        await asyncio.sleep(PROBE_INTERVAL)
+
+
+async def flood(proxy, orders_per_s, seconds):
+    interval = 1 / orders_per_s
+    deadline = time.perf_counter() + seconds
+    next_at = time.perf_counter()
+    sent = 0
+    while time.perf_counter() < deadline:
+        sent += 1
+        await proxy.process_new_cmd({"username": proxy.username, "type": "NEW ORDER", "order_id": f"noisy{sent}",
+                                     "account_type": "FUTURES", "order_type": "LIMIT", "symbol": BENCH_SYMBOL, "side": "BUY",
+                                     "base": 0.01, "action_price": "90", "leverage": 10, "is_repay": False})
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+    return sent
+
+
+async def run_mode(is_sharded, shards_num, quiet_num, orders_per_s, seconds):
+    router = AccountShardRouter(shards_num if is_sharded else 1, shard_setup=setup_shard)
+    await router.start()
+    noisy = await router.add_account({"user": "noisy", "public": "noisy_key", "private": "noisy_secret", "shard": 0})
+    quiet = []
+    for i in range(quiet_num):
+        shard = 1 + i % (shards_num - 1) if is_sharded else 0
+        quiet.append(await router.add_account({"user": f"quiet{i}", "public": f"quiet{i}_key", "private": f"quiet{i}_secret", "shard": shard}))
+
+    result = {}
+    for phase, flood_rate in [("idle", None), ("noisy", orders_per_s)]:
+        latencies = []
+        probe_queues = [ProbeQueue(latencies) for _ in quiet]
+        for proxy, probe_queue in zip(quiet, probe_queues):
+            proxy.report_hub.subscribe(probe_queue)
+        await asyncio.sleep(0.1)  # shards know replies are subscribed
+        tasks = [probe(proxy, probe_queue, seconds) for proxy, probe_queue in zip(quiet, probe_queues)]
+        if flood_rate is not None:
+            tasks.append(flood(noisy, flood_rate, seconds))
+        sent = await asyncio.gather(*tasks)
+        await asyncio.sleep(1)  # late replies
+        for proxy, probe_queue in zip(quiet, probe_queues):
+            proxy.report_hub.unsubscribe(probe_queue)
+
+        latencies = sorted(latency * 1000 for latency in latencies)
+        probes_sent = sum(len(probe_queue.sent) for probe_queue in probe_queues) + len(latencies)
+        result[phase] = {
+            "probes_sent": probes_sent,
+            "probes_answered": len(latencies),
+            "p50_ms": round(latencies[len(latencies) // 2], 2) if latencies else None,
+            "p99_ms": round(latencies[int(len(latencies) * 0.99)], 2) if latencies else None,
+            "max_ms": round(latencies[-1], 2) if latencies else None,
+        }
+        if flood_rate is not None:
+            result[phase]["noisy_orders_sent"] = sent[-1]
+    await router.shut_down()
+    return result
+
+
+def main(shards_num, quiet_num, orders_per_s, seconds):
+    logging.getLogger("default").setLevel("CRITICAL")
+    result = {"shards": shards_num, "quiet_accounts": quiet_num, "noisy_orders_per_s": orders_per_s, "seconds": seconds,
+              "probe_interval_ms": PROBE_INTERVAL * 1000, "cpu_count": os.cpu_count()}
+    result["one_process"] = asyncio.run(run_mode(False, shards_num, quiet_num, orders_per_s, seconds))
+    result["sharded"] = asyncio.run(run_mode(True, shards_num, quiet_num, orders_per_s, seconds))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    shards = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    quiet_accounts = int(sys.argv[2]) if len(sys.argv) > 2 else 6
+    rate = float(sys.argv[3]) if len(sys.argv) > 3 else 1000
+    duration = float(sys.argv[4]) if len(sys.argv) > 4 else 5
+    main(shards, quiet_accounts, rate, duration)
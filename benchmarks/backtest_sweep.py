@@ -0,0 +1,81 @@
+"""
+Backtest sweep throughput.
+
+Sweeps TrailingStopOrder stop distance x trailing step and CustomOcoOrder limit x trigger prices
+over a synthetic mark price random walk, in this process and over a process pool.
+Reports runs/s and ticks/s of both and checks that pool reports are the same as in-process ones.
+
+Run from the repository root:
+    python -m benchmarks.backtest_sweep [ticks] [processes]
+"""
+import sys
+import random
+import shutil
+import tempfile
+
+from common import *
+from backtest import run_sweep
+
+BASE_PRICE = 100.0
+
+
+def write_random_walk(path, ticks_num):
+    rnd = random.Random(7)
+    price = BASE_PRICE
+    with open(path, "w") as f:
+        f.write("timestamp,price\n")
+        for tick in range(ticks_num):
+            price = max(BASE_PRICE / 2, price + rnd.gauss(0, 0.05))
+            f.write(f"{tick},{price:.2f}\n")
+
+
+def build_sweeps(prices_path):
+    common_spec = {"prices": prices_path, "symbol": "BENCHUSDT", "position": 1, "slippage": 0.0005,
+                   "taker_commission": 0.0004, "maker_commission": 0.0002}
+    trailing = (dict(common_spec, order_class="TrailingStopOrder",
+                     params={"side": "SELL", "position_entrance_price": BASE_PRICE, "base_amount": 1, "is_repay": True,
+                             "stop_data": [{"stop_price": 97.0, "price_step": 0.5, "is_trailing": True}]}),
+                {"params.stop_data.0.stop_price": [round(BASE_PRICE - 0.5 * i, 2) for i in range(2, 12)],
+                 "params.stop_data.0.price_step": [round(0.1 * i, 2) for i in range(1, 11)]})
+    oco = (dict(common_spec, order_class="CustomOcoOrder",
+                params={"side": "SELL", "stop_type": "STOP_MARKET", "limit_price": 103.0, "trigger_price": 97.0,
+                        "base_amount": 1, "is_repay": True}),
+           {"params.limit_price": [round(BASE_PRICE + 0.5 * i, 2) for i in range(2, 12)],
+            "params.trigger_price": [round(BASE_PRICE - 0.5 * i, 2) for i in range(2, 12)]})
+    return {"trailing_stop": trailing, "custom_oco": oco}
+
+
+def measure(base_spec, grid, processes):
+    started = time.perf_counter()
+    reports = run_sweep(base_spec, grid, processes)
+    elapsed = time.perf_counter() - started
+    ticks = sum(report.get("ticks", 0) for report in reports)
+    return reports, {"runs": len(reports), "failed": sum(1 for report in reports if "error" in report),
+                     "elapsed_s": round(elapsed, 3), "runs_per_s": round(len(reports) / elapsed, 1),
+                     "ticks_per_s": round(ticks / elapsed)}
+
+
+def main(ticks_num, processes):
+    directory = tempfile.mkdtemp()
+    try:
+        prices_path = os.path.join(directory, "prices.csv")
+        write_random_walk(prices_path, ticks_num)
+        result = {"ticks": ticks_num, "processes": processes}
+        for name, (base_spec, grid) in build_sweeps(prices_path).items():
+            serial_reports, serial = measure(base_spec, grid, 1)
+            pool_reports, pool = measure(base_spec, grid, processes)
+            key_fields = ["pnl", "commission", "finished_tick"]
+            mismatches = sum(1 for serial_report, pool_report in zip(serial_reports, pool_reports)
+                             if [serial_report.get(field) for field in key_fields] != [pool_report.get(field) for field in key_fields])
+            best = max(serial_reports, key=lambda report: report.get("pnl", float("-inf")))
+            result[name] = {"in_process": serial, "pool": pool, "pool_mismatches": mismatches,
+                            "best": {"params": best["params"], "pnl": round(best["pnl"], 4)}}
+        print(json.dumps(result, indent=2))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    processes = int(sys.argv[2]) if len(sys.argv) > 2 else (os.cpu_count() or 2)
+    main(ticks, processes)
@@ -0,0 +1,286 @@
+"""
+End-to-end benchmark of custom orders against the exchange simulator.
+
+Account manager with SimulatedFuturesApiHandler runs CustomOcoOrder, TrailingStopOrder and CombinedOrder
+instances on a synthetic mark price random walk; REST calls and ws events go through the production handler code.
+
+Reported:
+    placement     - orders per second from the first activation until every order has its first exchange order
+    tick_to_rest  - time from mark price publication to the cancel request of a moved / switched order reaching
+                    the exchange, and to the replacing new order request, p50/p99/p999 per order type
+    loop_lag      - lateness of a 10ms timer on the main loop while ticks are processed
+    memory        - RSS growth per 1k active orders, simulator side order state included
+
+Every tick is published after the previous one settled (nothing queued between exchange and orders
+and no requests for TICK_SETTLE_S), so each request is attributed to the tick that caused it.
+
+Run from the repository root:
+    python -m benchmarks.e2e_orders [--orders 300] [--ticks 300] [--transport aiohttp|executor] [--output result.json]
+"""
+import gc
+import random
+import argparse
+import platform
+import contextlib
+import subprocess
+
+from common import *
+from account_manager import accountManager
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from exchange_simulator import SimulatedExchange, SimulatedFuturesApiHandler, FaultProfile
+from orders_logic.orders_common import StopParams
+from orders_logic.custom_oco_order import CustomOcoOrder
+from orders_logic.trailing_stop_order import TrailingStopOrder
+from orders_logic.combined_order import CombinedOrder
+
+BASE_PRICE = 100.0
+PRICE_LOW, PRICE_HIGH = 91.0, 109.0  # walk range: OCO switches, trailing stops move, nothing gets filled
+TICK_SETTLE_S = 0.02
+TICK_TIMEOUT_S = 5
+LAG_TIMER_S = 0.01
+CHILD_ATTRIBUTES = ["stop_order", "limit_order", "open_position_order", "close_position_order", "liquidation_order"]
+
+
+def percentile(sorted_values, q):
+    if len(sorted_values) == 0:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * q))]
+
+
+def summarize_ms(values_s):
+    values = sorted(value * 1000 for value in values_s)
+    if len(values) == 0:
+        return {"count": 0}
+    return {"count": len(values),
+            "p50_ms": round(percentile(values, 0.5), 3),
+            "p99_ms": round(percentile(values, 0.99), 3),
+            "p999_ms": round(percentile(values, 0.999), 3),
+            "max_ms": round(values[-1], 3)}
+
+
+def get_rss_kb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    import resource
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss  # peak, where /proc is absent
+
+
+def get_git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=5).stdout.strip() or None
+    except Exception:
+        return None
+
+
+class RequestLog:
+    """Requests seen by the simulated exchange: (perf_counter, endpoint, client order id)"""
+    def __init__(self, exchange):
+        self.exchange = exchange
+        self.api_handler = None
+        self.requests = []
+        self.create_requests = 0
+        exchange.request_listeners.append(self.on_request)
+
+    def on_request(self, api_key, endpoint, params):
+        if endpoint == "create_order":
+            self.create_requests += 1
+        self.requests.append((time.perf_counter(), endpoint, params.get("newClientOrderId") or params.get("origClientOrderId")))
+
+    def get_last_request_at(self):
+        return self.requests[-1][0] if len(self.requests) != 0 else 0
+
+    def is_pipeline_idle(self):
+        """nothing is queued between exchange and orders, so no request is about to be sent"""
+        market_queue = BinanceFuturesApiHandler._market_async_queue
+        return all(ws_manager.events.empty() for ws_manager in self.exchange.ws_managers) and \
+            (market_queue is None or market_queue.empty()) and \
+            self.api_handler.account_async_queue.empty() and \
+            self.api_handler.order_update_mailbox.get_stats()["pending_updates"] == 0
+
+    async def wait_settled(self, since):
+        """Waits until pipeline is idle and no request arrived for TICK_SETTLE_S"""
+        while time.perf_counter() - since < TICK_TIMEOUT_S:
+            await asyncio.sleep(TICK_SETTLE_S / 2)
+            if time.perf_counter() - max(self.get_last_request_at(), since) >= TICK_SETTLE_S and self.is_pipeline_idle():
+                return True
+        return False
+
+
+class LoopLagMonitor:
+    def __init__(self):
+        self.lags = []
+        self.is_recording = False
+        self.task = None
+
+    def start(self):
+        self.task = asyncio.create_task(self.run())
+
+    async def run(self):
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_TIMER_S)
+            if self.is_recording:
+                self.lags.append(max(0.0, time.perf_counter() - started - LAG_TIMER_S))
+
+
+def collect_order_ids(order, order_type, order_types):
+    if order is None:
+        return
+    order_types[order.order_id] = order_type
+    for attribute in CHILD_ATTRIBUTES:
+        collect_order_ids(getattr(order, attribute, None), order_type, order_types)
+
+
+def create_orders(manager, symbols, orders_per_type, rnd):
+    api_handler = manager.futures_api_handler
+    orders = []
+    for i in range(orders_per_type):
+        symbol = symbols[i % len(symbols)]
+        common_args = {"api_handler": api_handler, "logger": api_handler.logger, "symbol": symbol, "base_amount": 0.1}
+
+        oco_args = dict(common_args, side="SELL", stop_type="STOP_MARKET", is_repay=False,
+                        limit_price=round(110 + rnd.uniform(0, 2), 2), trigger_price=round(90 - rnd.uniform(0, 2), 2))
+        orders.append(("CUSTOM_OCO", CustomOcoOrder(**oco_args), oco_args))
+
+        trailing_args = dict(common_args, side="SELL", position_entrance_price=BASE_PRICE, is_repay=False,
+                             stop_data=[StopParams(stop_price=80, price_step=round(0.3 + rnd.uniform(0, 0.4), 2), is_trailing=True)])
+        orders.append(("TRAILING_STOP", TrailingStopOrder(**trailing_args), trailing_args))
+
+        combined_args = dict(common_args, side="BUY", is_repay=False, open_order_params={"order_type": "MARKET"},
+                             close_order_params={"order_type": "TRAILING_STOP", "input_type": "PERC",
+                                                 "stop_conditions": [{"stop": -20}], "price_step": 0.5})
+        orders.append(("COMBINED", CombinedOrder(**combined_args), combined_args))
+    return orders
+
+
+async def run(args):
+    rnd = random.Random(args.seed)
+    symbols = [f"BENCH{i}USDT" for i in range(args.symbols)]
+    exchange = SimulatedExchange({symbol: {"mark_price": BASE_PRICE} for symbol in symbols},
+                                 fault_profile=FaultProfile(rest_latency_ms=args.rest_latency_ms, ws_latency_ms=args.ws_latency_ms))
+    SimulatedFuturesApiHandler.attach_exchange(exchange)
+    accountManager.journal_dir = args.journal_dir
+    request_log = RequestLog(exchange)
+    prices = {symbol: BASE_PRICE for symbol in symbols}
+
+    manager = await accountManager.create("bench", "bench_key", "bench_secret",
+                                          rest_transport=args.transport, api_handler_cls=SimulatedFuturesApiHandler)
+    request_log.api_handler = manager.futures_api_handler
+    lag_monitor = LoopLagMonitor()
+    lag_monitor.start()
+
+    gc.collect()
+    rss_before_kb = get_rss_kb()
+
+    # placement: trailing stops place their stop on the first price update, so prices are published meanwhile
+    started = time.perf_counter()
+    orders = create_orders(manager, symbols, args.orders, rnd)
+    for order_type, order, order_args in orders:
+        await manager.activate_new_futures_order(order, order_args, order_type)
+    expected_creates = 4 * args.orders  # oco stop, trailing stop, combined open market and its trailing stop
+    while request_log.create_requests < expected_creates and time.perf_counter() - started < 60:
+        exchange.set_mark_prices(prices)
+        await asyncio.sleep(0.05)
+    placement_elapsed = time.perf_counter() - started
+
+    while any(order.price_update_callback_id is None for order_type, order, order_args in orders if order_type == "CUSTOM_OCO"):
+        await asyncio.sleep(0.1)  # oco subscribes for price updates after its first child is placed
+    await request_log.wait_settled(time.perf_counter())
+
+    gc.collect()
+    active_orders = len(manager.futures_active_orders)
+    rss_after_kb = get_rss_kb()
+
+    order_types = {}
+    for order_type, order, order_args in orders:
+        collect_order_ids(order, order_type, order_types)
+
+    latencies = {}  # (order type, endpoint):[s]
+    unsettled_ticks = 0
+    lag_monitor.is_recording = True
+    ticks_started = time.perf_counter()
+    for tick_num in range(args.ticks):
+        for symbol in symbols:
+            prices[symbol] = round(min(PRICE_HIGH, max(PRICE_LOW, prices[symbol] + rnd.gauss(0, args.volatility))), 2)
+
+        first_request = len(request_log.requests)
+        tick_at = time.perf_counter()
+        exchange.set_mark_prices(prices)
+        if not await request_log.wait_settled(tick_at):
+            unsettled_ticks += 1
+
+        for request_at, endpoint, client_order_id in request_log.requests[first_request:]:
+            if endpoint not in ["cancel_order", "create_order"]:
+                continue
+            order_type = order_types.get(client_order_id)
+            if order_type is None:
+                for listed_type, order, order_args in orders:  # child created after the mapping was built
+                    collect_order_ids(order, listed_type, order_types)
+                order_type = order_types.get(client_order_id, "UNKNOWN")
+            latencies.setdefault((order_type, endpoint), []).append(request_at - tick_at)
+    ticks_elapsed = time.perf_counter() - ticks_started
+    lag_monitor.is_recording = False
+
+    tick_to_rest = {}
+    for (order_type, endpoint), values in sorted(latencies.items()):
+        tick_to_rest.setdefault(order_type, {})["cancel" if endpoint == "cancel_order" else "replace"] = summarize_ms(values)
+
+    result = {
+        "git_commit": get_git_commit(),
+        "python": platform.python_version(),
+        "config": {"orders_per_type": args.orders, "ticks": args.ticks, "symbols": args.symbols, "transport": args.transport or "executor",
+                   "rest_latency_ms": args.rest_latency_ms, "ws_latency_ms": args.ws_latency_ms, "volatility": args.volatility,
+                   "journal": args.journal_dir is not None, "seed": args.seed},
+        "placement": {"orders": len(orders), "elapsed_s": round(placement_elapsed, 3),
+                      "orders_per_s": round(len(orders) / placement_elapsed, 1)},
+        "tick_to_rest": tick_to_rest,
+        "ticks": {"elapsed_s": round(ticks_elapsed, 3), "unsettled": unsettled_ticks,
+                  "requests": sum(len(values) for values in latencies.values())},
+        "loop_lag": summarize_ms(lag_monitor.lags),
+        "memory": {"active_orders": active_orders, "rss_growth_kb": rss_after_kb - rss_before_kb,
+                   "rss_kb_per_1k_orders": round((rss_after_kb - rss_before_kb) / max(active_orders, 1) * 1000, 1)},
+        "exchange": exchange.get_stats(),
+        "update_mailbox": manager.futures_api_handler.order_update_mailbox.get_stats(),
+    }
+
+    lag_monitor.task.cancel()
+    BinanceFuturesApiHandler._is_shutdown = True
+    manager.futures_api_handler.account_async_queue.put_nowait(None)
+    if manager.order_journal is not None:
+        manager.order_journal.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="End-to-end custom orders benchmark against the exchange simulator")
+    parser.add_argument("--orders", type=int, default=300, help="orders of every type")
+    parser.add_argument("--ticks", type=int, default=300)
+    parser.add_argument("--symbols", type=int, default=10)
+    parser.add_argument("--transport", choices=["aiohttp", "executor"], default="aiohttp")
+    parser.add_argument("--rest-latency-ms", type=float, default=0)
+    parser.add_argument("--ws-latency-ms", type=float, default=0)
+    parser.add_argument("--volatility", type=float, default=0.6, help="price random walk step deviation")
+    parser.add_argument("--journal-dir", default=None, help="journal orders there, as account manager does in production")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--output", default=None, help="also write json result to the file")
+    args = parser.parse_args()
+    if args.transport == "executor":
+        args.transport = None
+
+    with open(os.devnull, "w") as devnull, contextlib.redirect_stdout(devnull):  # handler and orders print every update
+        result = asyncio.run(run(args))
+
+    output = json.dumps(result, indent=2)
+    print(output)
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            f.write(output)
+
+
+if __name__ == "__main__":
+    main()
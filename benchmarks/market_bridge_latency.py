@@ -0,0 +1,82 @@
+"""
+Tick-to-callback latency of the market data bridge.
+
+Feeds synthetic markPrice frames from a separate thread (like ThreadedWebsocketManager does)
+into BinanceFuturesApiHandler.market_websocket_process_new_msg and measures the time until
+the registered price update callback is running on the main loop.
+
+Run from the repository root:
+    python -m benchmarks.market_bridge_latency [ticks] [interval_ms]
+"""
+import sys
+import queue
+import statistics
+import threading
+
+from common import *
+from binance_futures_api_handler import BinanceFuturesApiHandler
+
+BENCH_SYMBOL = "BENCHUSDT"
+
+
+class LatencyProbe:
+    def __init__(self, ticks_num):
+        self.sent_ns = [0] * ticks_num
+        self.latencies_us = []
+        self.done = asyncio.Event()
+        self.ticks_num = ticks_num
+
+    async def price_update_handler(self, last_price):
+        tick_num = int(last_price)
+        self.latencies_us.append((time.perf_counter_ns() - self.sent_ns[tick_num]) / 1000)
+        if len(self.latencies_us) == self.ticks_num:
+            self.done.set()
+
+
+def feed_frames(probe, interval_s):
+    for tick_num in range(probe.ticks_num):
+        frame = {"stream": "!markPrice@arr@1s",
+                 "data": [{"e": "markPriceUpdate", "E": int(time.time() * 1000), "s": BENCH_SYMBOL, "p": str(tick_num)}]}
+        probe.sent_ns[tick_num] = time.perf_counter_ns()
+        BinanceFuturesApiHandler.market_websocket_process_new_msg(frame)
+        time.sleep(interval_s)
+
+
+async def run_mode(mode, ticks_num, interval_s):
+    BinanceFuturesApiHandler._market_bridge_mode = mode
+    BinanceFuturesApiHandler._market_message_queue = queue.Queue()
+    BinanceFuturesApiHandler.attach_market_bridge(asyncio.get_running_loop())
+
+    probe = LatencyProbe(ticks_num)
+    BinanceFuturesApiHandler._on_price_update_callbacks[BENCH_SYMBOL] = {"probe": [LatencyProbe.price_update_handler, probe]}
+    processor = asyncio.create_task(BinanceFuturesApiHandler.market_ws_messages_processor())
+
+    feeder = threading.Thread(target=feed_frames, args=(probe, interval_s), daemon=True)
+    feeder.start()
+    await probe.done.wait()
+
+    processor.cancel()
+    del BinanceFuturesApiHandler._on_price_update_callbacks[BENCH_SYMBOL]
+
+    latencies = sorted(probe.latencies_us)
+    return {
+        "mode": mode,
+        "ticks": ticks_num,
+        "mean_us": round(statistics.mean(latencies), 1),
+        "p50_us": round(latencies[len(latencies) // 2], 1),
+        "p99_us": round(latencies[int(len(latencies) * 0.99)], 1),
+        "max_us": round(latencies[-1], 1),
+    }
+
+
+async def main(ticks_num, interval_s):
+    results = []
+    for mode in ["executor", "asyncio"]:
+        results.append(await run_mode(mode, ticks_num, interval_s))
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    ticks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    interval_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    asyncio.run(main(ticks, interval_ms / 1000))
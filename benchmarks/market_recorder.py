@@ -0,0 +1,98 @@
+"""
+Market data recorder overhead and replay.
+
+Measures the cost added to market ws thread callback (market_websocket_process_new_msg) by recording,
+checks that every recorded price is read back unchanged, and replays the recording
+as fast as possible into a price update callback.
+
+Run from the repository root:
+    python -m benchmarks.market_recorder [frames] [symbols]
+"""
+import sys
+import queue
+import shutil
+import random
+import tempfile
+
+from common import *
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from market_data_recorder import MarketDataReader, RECORD
+
+
+class ReplayProbe:
+    def __init__(self):
+        self.updates = 0
+
+    async def price_update_handler(self, last_price):
+        self.updates += 1
+
+
+def build_frames(frames_num, symbols_num):
+    rnd = random.Random(1)
+    symbols = [f"SYM{i}USDT" for i in range(symbols_num)]
+    frames = []
+    for frame_num in range(frames_num):
+        frames.append({"stream": "!markPrice@arr@1s",
+                       "data": [{"e": "markPriceUpdate", "E": 1700000000000 + frame_num, "s": symbol, "p": f"{rnd.uniform(1, 100):.4f}"}
+                                for symbol in symbols]})
+    return frames
+
+
+def feed(frames):
+    """ns per frame spent in ws callback; executor bridge mode, so only queue.put happens besides recording"""
+    BinanceFuturesApiHandler._market_message_queue = queue.Queue()
+    started = time.perf_counter_ns()
+    for frame in frames:
+        BinanceFuturesApiHandler.market_websocket_process_new_msg(frame)
+    return (time.perf_counter_ns() - started) / len(frames)
+
+
+async def main(frames_num, symbols_num):
+    BinanceFuturesApiHandler._market_bridge_mode = "executor"
+    frames = build_frames(frames_num, symbols_num)
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench.mdr")
+    try:
+        feed(frames)  # warm up
+        without_ns = min(feed(frames) for i in range(3))
+
+        BinanceFuturesApiHandler.start_market_recording(path)
+        with_ns = feed(frames)
+        BinanceFuturesApiHandler.stop_market_recording()
+
+        reader = MarketDataReader(path)
+        mismatches = 0
+        for index, (symbol, event_ms, received_ns, price) in enumerate(reader.iter_records()):
+            expected = frames[index // symbols_num]["data"][index % symbols_num]
+            if symbol != expected["s"] or price != float(expected["p"]) or event_ms != expected["E"]:
+                mismatches += 1
+        records_num = reader.records_num
+        reader.close()
+
+        probe = ReplayProbe()
+        for i in range(symbols_num):
+            BinanceFuturesApiHandler._on_price_update_callbacks[f"SYM{i}USDT"] = {"probe": [ReplayProbe.price_update_handler, probe]}
+        replay_stats = await BinanceFuturesApiHandler.replay_market_data(path, speed=None)
+
+        result = {
+            "frames": frames_num,
+            "symbols": symbols_num,
+            "ws_callback_ns_per_frame": round(without_ns),
+            "ws_callback_ns_per_frame_recording": round(with_ns),
+            "records": records_num,
+            "record_bytes": RECORD.size,
+            "file_bytes": os.path.getsize(path),
+            "mismatches": mismatches,
+            "replay": replay_stats,
+            "replayed_updates": probe.updates,
+            "replay_records_per_s": round(records_num / max(replay_stats["elapsed_s"], 1e-9)),
+        }
+        print(json.dumps(result, indent=2))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    frames = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    symbols = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    asyncio.run(main(frames, symbols))
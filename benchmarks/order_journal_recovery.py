@@ -0,0 +1,123 @@
+"""
+Order journal write throughput and recovery time.
+
+Journals N orders (limit orders and custom OCO orders with children) the way account manager does,
+then measures journal replay, replay from compacted snapshot and rebuilding of order objects
+with reconciliation, all journaled orders being open on exchange (no REST calls).
+
+Run from the repository root:
+    python -m benchmarks.order_journal_recovery [orders]
+"""
+import sys
+import shutil
+import tempfile
+
+from common import *
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from order_update_mailbox import OrderUpdateMailbox
+from order_journal import OrderJournal
+from account_manager import journaled_order_classes
+from orders_logic.basic_orders import LimitOrder
+from orders_logic.custom_oco_order import CustomOcoOrder
+
+BENCH_SYMBOL = "BENCHUSDT"
+
+
+def create_api_handler():
+    api_handler = BinanceFuturesApiHandler.__new__(BinanceFuturesApiHandler)  # no exchange connection needed
+    api_handler.session = None
+    api_handler.logger = get_logger('default')
+    api_handler.username = "bench"
+    api_handler.account_type = "futures"
+    api_handler.order_journal = None
+    api_handler.ws_account_updates_callbacks = {"accountUpdate": [], "leverageUpdate": [], "orderUpdate": {}}
+    api_handler.order_update_mailbox = OrderUpdateMailbox(api_handler.logger)
+    return api_handler
+
+
+def journal_orders(journal, api_handler, orders_num):
+    api_handler.order_journal = journal
+    open_order_ids = set()
+    for i in range(orders_num):
+        if i % 2 == 0:
+            args = {"symbol": BENCH_SYMBOL, "side": "BUY", "action_price": 100 - i % 50, "base_amount": 1, "is_repay": False}
+            order = LimitOrder(api_handler=api_handler, logger=api_handler.logger, **args)
+            child = order
+        else:
+            args = {"symbol": BENCH_SYMBOL, "side": "SELL", "stop_type": "STOP_MARKET", "limit_price": 110,
+                    "trigger_price": 90, "action_price": None, "base_amount": 1, "is_repay": True}
+            order = CustomOcoOrder(api_handler=api_handler, logger=api_handler.logger, **args)
+            child = order.stop_order
+
+        args["order_id"] = order.order_id
+        journal.append("created", order.order_id, order_class=type(order).__name__, params=args, state=order.journal_state())
+        child.order_new_status_sync("INITIALIZED")
+        child.order_new_status_sync("NEW")
+        open_order_ids.add(child.order_id)
+    return open_order_ids
+
+
+async def rebuild_orders(recovered_orders, open_order_ids):
+    api_handler = create_api_handler()
+    orders = []
+    for order_id, entry in recovered_orders.items():
+        order = journaled_order_classes[entry["order_class"]](api_handler=api_handler, logger=api_handler.logger, **entry["params"])
+        await order.recover_from_journal(entry["state"], open_order_ids)
+        orders.append(order)
+
+    for order in orders:
+        if isinstance(order, CustomOcoOrder):
+            api_handler.unsubscribe_from_price_update(order.symbol, order.price_update_callback_id)
+    return orders
+
+
+async def main(orders_num):
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, "bench")
+    try:
+        journal = OrderJournal(path, snapshot_every=10 ** 9)
+        journal.open()
+        started = time.perf_counter()
+        open_order_ids = journal_orders(journal, create_api_handler(), orders_num)
+        create_elapsed = time.perf_counter() - started
+        journal.close()
+        write_elapsed = time.perf_counter() - started
+        write_stats = journal.get_stats()
+
+        started = time.perf_counter()
+        recovered_orders = OrderJournal(path).load_state()
+        replay_elapsed = time.perf_counter() - started
+
+        snapshot_journal = OrderJournal(path)
+        snapshot_journal.open()
+        snapshot_journal.write_snapshot()
+        snapshot_journal.close()
+
+        started = time.perf_counter()
+        recovered_orders = OrderJournal(path).load_state()
+        snapshot_load_elapsed = time.perf_counter() - started
+
+        started = time.perf_counter()
+        orders = await rebuild_orders(recovered_orders, open_order_ids)
+        rebuild_elapsed = time.perf_counter() - started
+
+        result = {
+            "orders": orders_num,
+            "snapshot_bytes": os.path.getsize(f"{path}.snapshot"),
+            "create_and_journal_orders_s": round(create_elapsed, 3),
+            "until_fsynced_s": round(write_elapsed, 3),
+            "write_stats": write_stats,
+            "replay_journal_s": round(replay_elapsed, 3),
+            "load_snapshot_s": round(snapshot_load_elapsed, 3),
+            "rebuild_and_reconcile_s": round(rebuild_elapsed, 3),
+            "recovered_orders": len(orders),
+            "recovered_placed_children": sum(1 for order in orders if (order.stop_order if isinstance(order, CustomOcoOrder) else order).is_placed),
+        }
+        print(json.dumps(result, indent=2))
+    finally:
+        shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    asyncio.run(main(orders))
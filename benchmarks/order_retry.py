@@ -0,0 +1,130 @@
+"""
+New order retries under exchange faults: double placements, orphaned orders and time to a final answer.
+
+Orders are placed with place_market_order_async / place_limit_order_async of BacktestApiHandler while SimulatedExchange
+injects faults: -1021 and -1007 before the call is executed, -4014 on new orders, and lost responses - order is
+executed, but the client times out (the case where a blind resend places it twice). Modes:
+    legacy       - retry loop as it was: text matched errors, instant resend of timed out orders, -1007 not retried
+    retry_policy - typed errors, RetryPolicy backoff, lookup by newClientOrderId before resending
+Reported per mode: orders placed ok / failed, orders the exchange executed more than once (double placed),
+failed orders the exchange executed anyway (orphaned), REST calls, p50 / p95 / max time to the final result.
+Fails if retry_policy mode leaves an orphaned order - one which may have been placed is looked up before it is reported failed.
+Simulator injects -4014 into MARKET orders as well, those fail in both modes - nothing to trim.
+
+Run from the repository root:
+    python -m benchmarks.order_retry [orders] [loss_rate] [rest_latency_ms]
+"""
+import io
+import sys
+import contextlib
+
+from common import *
+from exchange_simulator import SimulatedExchange
+from exchange_simulator.simulated_exchange import FaultProfile
+from backtest import BacktestApiHandler
+from retry_policy import RetryPolicy
+
+BENCH_SYMBOL = "BENCHUSDT"
+BASE_PRICE = 100.0
+LEGACY_MAX_RETRY_COUNTER = 5
+WAVE_SIZE = 20  # orders sent at once
+
+
+class LegacyRetryApiHandler(BacktestApiHandler):
+    """send_new_order_async as it was before RetryPolicy"""
+
+    def should_retry_new_order(self, result, order_parameters, retry_counter):
+        if "-4014" in result and order_parameters["type"] != "MARKET":
+            price_key = "stopPrice" if "stopPrice" in order_parameters else "price"
+            current_price = order_parameters[price_key]
+            if "." in current_price:
+                order_parameters[price_key] = current_price[:-1] if current_price[-2] != "." else current_price[:-2]
+            return True
+        return "Connection aborted" in result or "-1021" in result
+
+    async def send_new_order_async(self, order_parameters, should_retry_on_failure=True, should_filter_result=True):
+        result = None
+        retry_counter = -1
+        while retry_counter < LEGACY_MAX_RETRY_COUNTER:
+            retry_counter += 1
+            try:
+                result = await self.rest_transport.futures_create_order(**order_parameters)
+            except asyncio.TimeoutError as e:
+                result = f"Connection aborted: {e}"
+            except Exception as e:
+                result = str(e)
+
+            if should_retry_on_failure:
+                if "-4015" in result:
+                    result = await self.get_order_info_async(order_parameters["symbol"], order_parameters.get("newClientOrderId"))
+                if self.should_retry_new_order(result, order_parameters, retry_counter):
+                    continue
+            return self.complete_order_request(result, should_filter_result)
+        return result, None
+
+
+async def run_mode(handler_cls, orders_num, loss_rate, rest_latency_ms):
+    logging.getLogger("backtest").setLevel("CRITICAL")
+    logger = get_logger("backtest")
+    fault_profile = FaultProfile(rest_latency_ms=rest_latency_ms, rest_jitter_ms=rest_latency_ms / 2, seed=5, response_loss_rate=loss_rate,
+                                 error_rates={-1021: loss_rate / 2, -1007: loss_rate / 2, -4014: loss_rate / 2})
+    exchange = SimulatedExchange({BENCH_SYMBOL: {"mark_price": BASE_PRICE, "price_tick": "0.01"}}, fault_profile=fault_profile, logger=logger)
+    api_handler = handler_cls.create_backtest(exchange, logger=logger)
+    api_handler.retry_policy = RetryPolicy(seed=5)
+    executions = {}  # client order id:create_order calls executed by exchange
+    exchange.add_user_listener(api_handler.API_KEY, lambda msg: count_execution(msg, executions))
+
+    async def place(i):
+        started = time.perf_counter()
+        order_id = f"bench{i}"
+        if i % 2 == 0:
+            response, _ = await api_handler.place_market_order_async(BENCH_SYMBOL, "BUY", base_amount=0.01, order_id=order_id,
+                                                                     should_filter_result=False)
+        else:
+            response, _ = await api_handler.place_limit_order_async(BENCH_SYMBOL, "BUY", 90.0, base_amount=0.01, order_id=order_id,
+                                                                    should_filter_result=False)
+        return order_id, isinstance(response, dict) and response.get("order_status") is not None, time.perf_counter() - started
+
+    rest_calls_before = exchange.get_stats()["rest_calls"]
+    results = []
+    for wave_start in range(0, orders_num, WAVE_SIZE):
+        results += await asyncio.gather(*[place(i) for i in range(wave_start, min(wave_start + WAVE_SIZE, orders_num))])
+    rest_calls = exchange.get_stats()["rest_calls"] - rest_calls_before
+
+    latencies = sorted(latency for _, _, latency in results)
+    result = {
+        "placed_ok": sum(1 for _, is_ok, _ in results if is_ok),
+        "failed": sum(1 for _, is_ok, _ in results if not is_ok),
+        "double_placed": sum(1 for order_id, _, _ in results if executions.get(order_id, 0) > 1),
+        "orphaned": sum(1 for order_id, is_ok, _ in results if not is_ok and executions.get(order_id, 0) > 0),
+        "rest_calls": rest_calls,
+        "responses_lost": exchange.get_stats()["responses_lost"],
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+    }
+    if handler_cls is BacktestApiHandler:
+        result["retry_policy"] = api_handler.retry_policy.get_stats()
+    return result
+
+
+def count_execution(msg, executions):
+    order_update = msg.get("o") if msg.get("e") == "ORDER_TRADE_UPDATE" else None
+    if order_update is not None and order_update.get("x") == "NEW":
+        executions[order_update["c"]] = executions.get(order_update["c"], 0) + 1
+
+
+def main(orders_num, loss_rate, rest_latency_ms):
+    result = {"orders": orders_num, "loss_rate": loss_rate, "rest_latency_ms": rest_latency_ms}
+    with contextlib.redirect_stdout(io.StringIO()):
+        result["legacy"] = asyncio.run(run_mode(LegacyRetryApiHandler, orders_num, loss_rate, rest_latency_ms))
+        result["retry_policy"] = asyncio.run(run_mode(BacktestApiHandler, orders_num, loss_rate, rest_latency_ms))
+    print(json.dumps(result, indent=2))
+    assert result["retry_policy"]["orphaned"] == 0, "failed orders were executed by exchange"
+
+
+if __name__ == "__main__":
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    loss = float(sys.argv[2]) if len(sys.argv) > 2 else 0.05
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    main(orders, loss, latency_ms)
@@ -0,0 +1,115 @@
+"""
+Price / amount precision: string slicing vs precompiled SymbolQuantizer.
+
+Takes a futures exchangeInfo json (Client.futures_exchange_info() output),
+times both implementations and checks quantizer output against Decimal truncation
+for random prices and amounts of every symbol; exits with 1 if any quantizer output differs.
+Without a path it runs on benchmarks/data/exchange_info.json - exchangeInfo of 24 USDT / USDC perpetual and quarterly
+symbols with their full filter sets, ticks from 0.0000001 to 1 and steps from 0.001 to 1.
+The same check runs as a unit test: python -m unittest discover -s tests
+
+Run from the repository root:
+    python -m benchmarks.precision_quantizer [exchange_info.json] [samples_per_symbol]
+"""
+import sys
+import random
+from decimal import Decimal, ROUND_FLOOR
+
+from common import *
+from symbol_quantizer import SymbolQuantizer
+
+DEFAULT_EXCHANGE_INFO = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data", "exchange_info.json")
+
+
+def legacy_apply_precision(precision, value):
+    """apply_price_precision / apply_amount_precision before quantizers"""
+    if float(precision) < 1:
+        digits_num_after_comma_allowed = len(precision.strip("0")) - 1
+        str_value = str(value)
+        if "." in str_value:
+            value_digits_after_comma_num = len(str_value.split(".")[1])
+            delta = value_digits_after_comma_num - digits_num_after_comma_allowed
+            if delta > 0:
+                str_value = str_value[:-delta]
+        return str_value
+    return str(int(int(round(float(value) / float(precision), ROUND_PRECISION)) * round(float(precision), ROUND_PRECISION)))
+
+
+def decimal_truncate(value, step):
+    step = Decimal(step)
+    return (Decimal(repr(value)) / step).to_integral_value(rounding=ROUND_FLOOR) * step
+
+
+def load_symbols(path):
+    with open(path, "r") as f:
+        exchange_info = json.load(f)
+
+    symbols = []
+    for symbol_data in exchange_info["symbols"]:
+        data = {}
+        for filter in symbol_data["filters"]:
+            if filter["filterType"] == "LOT_SIZE":
+                data["lot_size_step"] = filter["stepSize"]
+            elif filter["filterType"] == "PRICE_FILTER":
+                data["price_tick"] = filter["tickSize"]
+        if "lot_size_step" in data and "price_tick" in data:
+            symbols.append((symbol_data["symbol"], data))
+    return symbols
+
+
+def main(path, samples_num):
+    random.seed(0)
+    symbols = load_symbols(path)
+    samples = []
+    for symbol, data in symbols:
+        quantizer = SymbolQuantizer.from_symbol_data(symbol, data)
+        tick = float(data["price_tick"])
+        step = float(data["lot_size_step"])
+        for i in range(samples_num):
+            price = round(random.uniform(1, 100000) * tick, random.randint(0, 12))
+            amount = round(random.uniform(1, 100000) * step, random.randint(0, 12))
+            samples.append((data, quantizer, price, amount))
+
+    started = time.perf_counter()
+    for data, quantizer, price, amount in samples:
+        legacy_apply_precision(data["price_tick"], price)
+        legacy_apply_precision(data["lot_size_step"], amount)
+    legacy_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for data, quantizer, price, amount in samples:
+        quantizer.price(price)
+        quantizer.amount(amount)
+    quantizer_elapsed = time.perf_counter() - started
+
+    legacy_mismatches = 0
+    quantizer_mismatches = []
+    for data, quantizer, price, amount in samples:
+        expected_price = decimal_truncate(price, data["price_tick"])
+        expected_amount = decimal_truncate(amount, data["lot_size_step"])
+
+        if Decimal(quantizer.price(price)) != expected_price or Decimal(quantizer.amount(amount)) != expected_amount:
+            quantizer_mismatches.append((quantizer.symbol, price, amount))
+        try:
+            if Decimal(legacy_apply_precision(data["price_tick"], price)) != expected_price:
+                legacy_mismatches += 1
+        except ArithmeticError:
+            legacy_mismatches += 1
+
+    result = {
+        "symbols": len(symbols),
+        "samples": len(samples),
+        "legacy_ns_per_call": round(legacy_elapsed / len(samples) / 2 * 1e9),
+        "quantizer_ns_per_call": round(quantizer_elapsed / len(samples) / 2 * 1e9),
+        "legacy_price_mismatches_vs_decimal": legacy_mismatches,
+        "quantizer_mismatches_vs_decimal": len(quantizer_mismatches),
+        "quantizer_mismatch_examples": quantizer_mismatches[:10],
+    }
+    print(json.dumps(result, indent=2))
+    return len(quantizer_mismatches) == 0
+
+
+if __name__ == "__main__":
+    exchange_info_path = sys.argv[1] if len(sys.argv) > 1 else DEFAULT_EXCHANGE_INFO
+    if not main(exchange_info_path, int(sys.argv[2]) if len(sys.argv) > 2 else 1000):
+        sys.exit(1)
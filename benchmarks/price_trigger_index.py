@@ -0,0 +1,86 @@
+"""
+Price dispatch cost with many resting custom orders on one symbol.
+
+Registers N price update subscribers that behave like trailing stops (each one has a price band
+it waits to be crossed and moves the band after being woken) and replays a random walk price stream
+through BinanceFuturesApiHandler.dispatch_price_update with and without the price trigger index.
+
+Run from the repository root:
+    python -m benchmarks.price_trigger_index [orders] [ticks]
+"""
+import sys
+import random
+
+from common import *
+from binance_futures_api_handler import BinanceFuturesApiHandler
+
+BENCH_SYMBOL = "BENCHUSDT"
+
+
+class FakeTrailingOrder:
+    def __init__(self, api_handler, enter_price, price_step):
+        self.api_handler = api_handler
+        self.extremal_price = enter_price
+        self.price_step = price_step
+        self.price_update_callback_id = None
+        self.calls_num = 0
+
+    def get_price_band(self):
+        return None, self.extremal_price + self.price_step
+
+    async def price_update_handler(self, last_price):
+        self.calls_num += 1
+        if last_price >= self.extremal_price + self.price_step:
+            self.extremal_price = last_price
+        self.api_handler.update_price_trigger_band(BENCH_SYMBOL, self.price_update_callback_id, *self.get_price_band())
+
+
+async def run(use_index, orders_num, prices):
+    BinanceFuturesApiHandler._use_price_trigger_index = use_index
+    api_handler = BinanceFuturesApiHandler.__new__(BinanceFuturesApiHandler)  # no exchange connection needed
+    api_handler.logger = get_logger('default')
+    api_handler.session = None
+
+    random.seed(1)
+    orders = []
+    for i in range(orders_num):
+        order = FakeTrailingOrder(api_handler, prices[0] * random.uniform(0.95, 1.05), prices[0] * random.uniform(0.001, 0.01))
+        order.price_update_callback_id = api_handler.subscribe_for_price_update(BENCH_SYMBOL,
+                                                                                [FakeTrailingOrder.price_update_handler, order],
+                                                                                order.get_price_band())
+        orders.append(order)
+
+    started = time.perf_counter()
+    for price in prices:
+        running_tasks = []
+        BinanceFuturesApiHandler.dispatch_price_update(BENCH_SYMBOL, price, running_tasks)
+        if len(running_tasks) != 0:
+            await asyncio.gather(*running_tasks)
+    elapsed = time.perf_counter() - started
+
+    for order in orders:
+        api_handler.unsubscribe_from_price_update(BENCH_SYMBOL, order.price_update_callback_id)
+
+    return {
+        "use_index": use_index,
+        "orders": orders_num,
+        "ticks": len(prices),
+        "handler_calls": sum(order.calls_num for order in orders),
+        "us_per_tick": round(elapsed / len(prices) * 1e6, 1),
+    }
+
+
+async def main(orders_num, ticks_num):
+    random.seed(0)
+    prices = [100.0]
+    for i in range(ticks_num - 1):
+        prices.append(prices[-1] * (1 + random.gauss(0, 0.0005)))
+
+    results = [await run(False, orders_num, prices), await run(True, orders_num, prices)]
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    asyncio.run(main(orders, ticks))
@@ -0,0 +1,122 @@
+"""
+Rate limiter under a burst from many accounts.
+
+Accounts send bursts of new entry orders, reduce only stops, cancels and open order queries to SimulatedExchange
+with exchange side rate limits (scaled down to short windows), once with REST calls going straight to the exchange
+and once through one shared RateLimiter. Reported per priority: calls done, rejected by the exchange with 429
+(-1003 / -1015 - what gets an IP banned on repeat), shed by the limiter, p50 / p95 latency including limiter waits.
+
+Run from the repository root:
+    python -m benchmarks.rate_limiter [accounts] [seconds]
+"""
+import sys
+import random
+
+from common import *
+from exchange_simulator import SimulatedExchange
+from exchange_simulator.simulated_clients import SimulatedAsyncRestClient
+from binance_futures_async_rest import AsyncRestApiException
+from rate_limiter import RateLimiter, get_request_priority, priority_names
+
+BENCH_SYMBOL = "BENCHUSDT"
+BASE_PRICE = 100.0
+RATE_LIMITS = {"ip_limits": [(240, 2)], "order_limits": [(20, 1), (60, 5)]}
+BURST_INTERVAL = 0.1  # s
+BURST = {"entry": 4, "protective": 1, "cancel": 1, "query": 1}
+
+
+class AccountLoad:
+    def __init__(self, exchange, api_key, rate_limiter, seed):
+        self.client = SimulatedAsyncRestClient(exchange, api_key, rate_limiter=rate_limiter)
+        self.random = random.Random(seed)
+        self.open_entries = []
+        self.results = []  # (priority, outcome, latency s)
+
+    async def call(self, endpoint, params):
+        priority = priority_names[get_request_priority(endpoint, params)]
+        started = time.perf_counter()
+        try:
+            result = await self.client.request(endpoint, **params)
+            outcome = "ok"
+        except AsyncRestApiException as e:
+            result = None
+            outcome = "shed" if "local rate limiter" in e.message else ("exchange_429" if e.status_code == 429 else "error")
+        self.results.append((priority, outcome, time.perf_counter() - started))
+        return result
+
+    async def send_entry(self):
+        price = round(BASE_PRICE * (0.8 + 0.1 * self.random.random()), 2)
+        result = await self.call("create_order", {"symbol": BENCH_SYMBOL, "side": "BUY", "type": "LIMIT", "quantity": "0.1",
+                                                  "price": str(price), "reduceOnly": "false", "newClientOrderId": generate_id(20)})
+        if result is not None:
+            self.open_entries.append(result["clientOrderId"])
+
+    async def send_protective(self):
+        stop_price = round(BASE_PRICE * (0.9 + 0.05 * self.random.random()), 2)
+        await self.call("create_order", {"symbol": BENCH_SYMBOL, "side": "SELL", "type": "STOP_MARKET", "quantity": "0.1",
+                                         "stopPrice": str(stop_price), "reduceOnly": "true", "newClientOrderId": generate_id(20)})
+
+    async def send_cancel(self):
+        if len(self.open_entries) == 0:
+            return
+        await self.call("cancel_order", {"symbol": BENCH_SYMBOL, "origClientOrderId": self.open_entries.pop(0)})
+
+    async def send_query(self):
+        await self.call("get_open_orders", {"symbol": BENCH_SYMBOL})
+
+    async def run(self, seconds):
+        tasks = []
+        senders = {"entry": self.send_entry, "protective": self.send_protective, "cancel": self.send_cancel, "query": self.send_query}
+        deadline = time.perf_counter() + seconds
+        while time.perf_counter() < deadline:
+            for name, count in BURST.items():
+                for i in range(count):
+                    tasks.append(asyncio.create_task(senders[name]()))
+            await asyncio.sleep(BURST_INTERVAL)
+        await asyncio.gather(*tasks)
+
+
+async def run_mode(accounts_num, seconds, use_limiter):
+    logger = get_logger("benchmark")
+    exchange = SimulatedExchange({BENCH_SYMBOL: {"mark_price": BASE_PRICE}}, rate_limits=RATE_LIMITS, logger=logger)
+    rate_limiter = RateLimiter(**RATE_LIMITS, logger=logger) if use_limiter else None
+    loads = []
+    for i in range(accounts_num):
+        api_key = f"account{i}"
+        exchange.get_account(api_key).positions[BENCH_SYMBOL] = [1000.0, BASE_PRICE]  # reduce only stops are accepted
+        loads.append(AccountLoad(exchange, api_key, rate_limiter, seed=i))
+
+    await asyncio.gather(*[load.run(seconds) for load in loads])
+
+    by_priority = {}
+    for load in loads:
+        for priority, outcome, latency in load.results:
+            stats = by_priority.setdefault(priority, {"calls": 0, "ok": 0, "exchange_429": 0, "shed": 0, "error": 0, "latencies": []})
+            stats["calls"] += 1
+            stats[outcome] += 1
+            if outcome == "ok":
+                stats["latencies"].append(latency)
+    for stats in by_priority.values():
+        latencies = sorted(stats.pop("latencies"))
+        stats["p50_ms"] = round(latencies[len(latencies) // 2] * 1000, 2) if latencies else None
+        stats["p95_ms"] = round(latencies[int(len(latencies) * 0.95)] * 1000, 2) if latencies else None
+
+    result = {"by_priority": by_priority, "exchange_rate_limited": exchange.get_stats()["rate_limited"]}
+    if rate_limiter is not None:
+        stats = rate_limiter.get_stats()
+        result["limiter"] = {key: stats[key] for key in ["waited", "wait_time_s", "shed", "rate_limited_responses"]}
+    return result
+
+
+def main(accounts_num, seconds):
+    result = {"accounts": accounts_num, "seconds": seconds, "exchange_limits": RATE_LIMITS,
+              "burst_per_account": {name: round(count / BURST_INTERVAL) for name, count in BURST.items()}}
+    result["no_limiter"] = asyncio.run(run_mode(accounts_num, seconds, False))
+    result["limiter"] = asyncio.run(run_mode(accounts_num, seconds, True))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    duration = float(sys.argv[2]) if len(sys.argv) > 2 else 4
+    main(accounts, duration)
@@ -0,0 +1,169 @@
+"""
+Reports to ws clients: single out_ws_queue per account (as it was) vs ReportHub topics with a buffer per subscriber.
+
+Publisher runs on the main loop, clients on a second loop thread as input_websocket_server does. Scenarios:
+    two_clients  - two clients of one account read reports as they come: reports each client got
+    stalled      - a connected client stops reading (legacy: a disconnected one, its queue stays): buffered reports
+    slow_prices  - a client subscribed to prices of symbols reads one batch per ms while prices of all symbols change
+                   every frame, per slow consumer policy: delivered, dropped, conflated, max buffer depth,
+                   symbols whose last delivered price is the last published one
+    publish_cost - ns per ReportHub.publish with subscribers of the topic that don't read (buffers full, oldest dropped)
+
+Run from the repository root:
+    python -m benchmarks.report_pubsub [reports] [symbols] [frames]
+"""
+import sys
+import queue
+
+from common import *
+from report_hub import ReportHub, ReportSubscriber, TOPIC_DEAL_REPORTS, PRICE_TOPIC_PREFIX
+
+MAX_BUFFER = 100
+
+
+class ClientLoop:
+    """loop thread of the clients, as the websocket server thread"""
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, daemon=True)
+        self.thread.start()
+
+    def run(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result()
+
+    def start(self, coroutine):
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+
+async def create_subscriber(topics, max_buffer=MAX_BUFFER, slow_consumer="drop_oldest"):
+    return ReportSubscriber(topics, max_buffer=max_buffer, slow_consumer=slow_consumer)
+
+
+async def read_subscriber(subscriber, received, read_delay=0.0):
+    while True:
+        batch = await subscriber.get_batch()
+        if batch is None:
+            return
+        received.extend(batch)
+        if read_delay:
+            await asyncio.sleep(read_delay)
+
+
+async def read_queue(acc_queue, received, stop):
+    loop = asyncio.get_running_loop()
+    while True:
+        data = await loop.run_in_executor(None, acc_queue.get)
+        if data is stop:
+            return
+        received.append(data)
+
+
+async def publish_reports(publish, reports_num):
+    for i in range(reports_num):
+        publish(json.dumps({"order_id": f"order{i}", "type": "DEAL_REPORT", "status": "FILLED"}))
+        if i % 50 == 0:
+            await asyncio.sleep(0.001)  # reports come in bursts
+    await asyncio.sleep(0.2)
+
+
+async def two_clients(client_loop, reports_num):
+    acc_queue = queue.Queue()
+    stop = object()
+    legacy = [[], []]
+    readers = [client_loop.start(read_queue(acc_queue, received, stop)) for received in legacy]
+    await publish_reports(acc_queue.put_nowait, reports_num)
+    for reader in readers:
+        acc_queue.put_nowait(stop)
+        await asyncio.wrap_future(reader)
+
+    hub = ReportHub(asyncio.get_running_loop())
+    subscribers = [client_loop.run(create_subscriber([TOPIC_DEAL_REPORTS], max_buffer=reports_num)) for _ in range(2)]
+    for subscriber in subscribers:
+        hub.subscribe(subscriber)
+    topics = [[], []]
+    readers = [client_loop.start(read_subscriber(subscriber, received)) for subscriber, received in zip(subscribers, topics)]
+    await publish_reports(lambda data: hub.publish(TOPIC_DEAL_REPORTS, data), reports_num)
+    for subscriber, reader in zip(subscribers, readers):
+        subscriber.close()
+        await asyncio.wrap_future(reader)
+    return {"published": reports_num, "legacy_received": [len(received) for received in legacy],
+            "topics_received": [len(received) for received in topics]}
+
+
+async def stalled(client_loop, reports_num):
+    acc_queue = queue.Queue()
+    await publish_reports(acc_queue.put_nowait, reports_num)
+    hub = ReportHub(asyncio.get_running_loop())
+    subscriber = client_loop.run(create_subscriber([TOPIC_DEAL_REPORTS]))
+    hub.subscribe(subscriber)
+    await publish_reports(lambda data: hub.publish(TOPIC_DEAL_REPORTS, data), reports_num)
+    return {"published": reports_num, "legacy_queued": acc_queue.qsize(),
+            "topics_buffered": subscriber.get_depth(), "topics_dropped": subscriber.dropped}
+
+
+async def slow_prices(client_loop, symbols_num, frames, slow_consumer):
+    hub = ReportHub(asyncio.get_running_loop())
+    symbols = [f"SYM{i}USDT" for i in range(symbols_num)]
+    subscriber = client_loop.run(create_subscriber([PRICE_TOPIC_PREFIX + symbol for symbol in symbols], slow_consumer=slow_consumer))
+    hub.subscribe(subscriber)
+    received = []
+    reader = client_loop.start(read_subscriber(subscriber, received, read_delay=0.001))
+    last_prices = {}
+    for frame in range(frames):
+        for symbol in symbols:
+            last_prices[symbol] = 100.0 + frame
+            topic = PRICE_TOPIC_PREFIX + symbol
+            hub.publish(topic, json.dumps({"type": "PRICE", "symbol": symbol, "price": last_prices[symbol]}), key=topic)
+        await asyncio.sleep(0)
+    await asyncio.sleep(0.2)
+    subscriber.close()
+    await asyncio.wrap_future(reader)
+
+    delivered_prices = {}
+    for data in received:
+        report = json.loads(data)
+        delivered_prices[report["symbol"]] = report["price"]
+    return {"published": symbols_num * frames, "delivered": len(received), "dropped": subscriber.dropped,
+            "conflated": subscriber.conflated, "max_depth": subscriber.max_depth,
+            "disconnected": subscriber.slow_consumer == "disconnect" and len(received) < symbols_num * frames,
+            "symbols_with_last_price": sum(1 for symbol in symbols if delivered_prices.get(symbol) == last_prices[symbol])}
+
+
+async def publish_cost(client_loop, subscribers_num, iterations=100000):
+    hub = ReportHub(asyncio.get_running_loop())
+    for _ in range(subscribers_num):
+        hub.subscribe(client_loop.run(create_subscriber([TOPIC_DEAL_REPORTS])))
+    data = json.dumps({"order_id": "order", "type": "DEAL_REPORT", "status": "FILLED"})
+    started = time.perf_counter()
+    for _ in range(iterations):
+        hub.publish(TOPIC_DEAL_REPORTS, data)
+    return round((time.perf_counter() - started) / iterations * 1e9)
+
+
+async def run(reports_num, symbols_num, frames):
+    client_loop = ClientLoop()
+    result = {"max_buffer": MAX_BUFFER,
+              "two_clients": await two_clients(client_loop, reports_num),
+              "stalled": await stalled(client_loop, reports_num),
+              "slow_prices": {policy: await slow_prices(client_loop, symbols_num, frames, policy)
+                              for policy in ["drop_oldest", "conflate", "disconnect"]},
+              "publish_cost_ns": {subscribers_num: await publish_cost(client_loop, subscribers_num) for subscribers_num in [0, 1, 4, 16]}}
+    client_loop.stop()
+    return result
+
+
+def main(reports_num, symbols_num, frames):
+    logging.getLogger("default").setLevel("CRITICAL")
+    result = dict({"reports": reports_num, "symbols": symbols_num, "frames": frames}, **asyncio.run(run(reports_num, symbols_num, frames)))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    reports = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    symbols_count = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    frames_count = int(sys.argv[3]) if len(sys.argv) > 3 else 200
+    main(reports, symbols_count, frames_count)
@@ -0,0 +1,89 @@
+"""
+Server clock offset tracking under local clock drift: -1021 rejections of signed requests.
+
+SimulatedExchange clock starts skewed vs local clock and drifts further (local clock runs fast), so after a few
+seconds timestamps of unsynced requests are more than 1000 ms ahead of exchange time and get -1021.
+An order is placed every interval with place_limit_order_async of BacktestApiHandler. Modes:
+    no_sync - timestamp_offset stays 0, -1021 is only retried (RetryPolicy backoff)
+    sync    - server_clock_syncer samples exchange time every sync_interval s (scaled down) and on -1021
+Reported per mode: orders placed ok, -1021 rejections, retries, p50 / p95 / max placement time,
+clock tracker metrics and the error of applied offset vs true exchange offset at the end.
+
+Run from the repository root:
+    python -m benchmarks.server_clock [seconds] [interval_ms] [drift_ms_per_s]
+"""
+import io
+import sys
+import contextlib
+
+from common import *
+from exchange_simulator import SimulatedExchange
+from exchange_simulator.simulated_exchange import FaultProfile
+from backtest import BacktestApiHandler
+from server_clock import ServerClockTracker
+
+BENCH_SYMBOL = "BENCHUSDT"
+BASE_PRICE = 100.0
+CLOCK_SKEW_MS = -800
+SYNC_INTERVAL = 2.0  # s, 60 s by default
+
+
+async def run_mode(seconds, interval, drift_ms_per_s, use_sync):
+    logging.getLogger("backtest").setLevel("CRITICAL")
+    logger = get_logger("backtest")
+    exchange = SimulatedExchange({BENCH_SYMBOL: {"mark_price": BASE_PRICE}}, logger=logger,
+                                 fault_profile=FaultProfile(rest_latency_ms=5, rest_jitter_ms=5, seed=7),
+                                 clock_skew_ms=CLOCK_SKEW_MS, clock_drift_ms_per_s=drift_ms_per_s)
+    api_handler = BacktestApiHandler.create_backtest(exchange, logger=logger)
+    server_clock = ServerClockTracker(sync_interval=SYNC_INTERVAL, logger=logger)
+    BacktestApiHandler._server_clock = server_clock
+    server_clock.add_client(api_handler)
+    server_clock.add_client(api_handler.rest_transport)
+    sync_task = asyncio.create_task(api_handler.server_clock_syncer()) if use_sync else None
+
+    async def place(i):
+        started = time.perf_counter()
+        response, _ = await api_handler.place_limit_order_async(BENCH_SYMBOL, "BUY", 90.0, base_amount=0.1, order_id=f"bench{i}",
+                                                                should_filter_result=False)
+        return isinstance(response, dict) and response.get("order_status") is not None, time.perf_counter() - started
+
+    tasks = []
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        tasks.append(asyncio.create_task(place(len(tasks))))
+        await asyncio.sleep(interval)
+    results = await asyncio.gather(*tasks)
+    if sync_task is not None:
+        sync_task.cancel()
+
+    latencies = sorted(latency for _, latency in results)
+    rejected = exchange.get_stats()["timestamps_rejected"]
+    true_offset = exchange.timestamp() - time.time() * 1000
+    return {
+        "orders": len(results),
+        "placed_ok": sum(1 for is_ok, _ in results if is_ok),
+        "timestamps_rejected": rejected,
+        "retries": api_handler.retry_policy.retries,
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 2),
+        "p95_ms": round(latencies[int(len(latencies) * 0.95)] * 1000, 2),
+        "max_ms": round(latencies[-1] * 1000, 2),
+        "true_offset_ms": round(true_offset, 1),
+        "applied_offset_error_ms": round(api_handler.rest_transport.timestamp_offset - true_offset, 1),
+        "server_clock": server_clock.get_stats(),
+    }
+
+
+def main(seconds, interval_ms, drift_ms_per_s):
+    result = {"seconds": seconds, "interval_ms": interval_ms, "clock_skew_ms": CLOCK_SKEW_MS, "drift_ms_per_s": drift_ms_per_s,
+              "sync_interval_s": SYNC_INTERVAL}
+    with contextlib.redirect_stdout(io.StringIO()):
+        result["no_sync"] = asyncio.run(run_mode(seconds, interval_ms / 1000, drift_ms_per_s, False))
+        result["sync"] = asyncio.run(run_mode(seconds, interval_ms / 1000, drift_ms_per_s, True))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    duration = float(sys.argv[1]) if len(sys.argv) > 1 else 10
+    interval_ms = float(sys.argv[2]) if len(sys.argv) > 2 else 20
+    drift = float(sys.argv[3]) if len(sys.argv) > 3 else -60
+    main(duration, interval_ms, drift)
@@ -0,0 +1,233 @@
+"""
+Shared market data process vs every worker process reading the full market stream.
+
+A feeder process random walks prices of all symbols and sends frames_per_s frames for seconds s. Account worker
+processes subscribe price callbacks with bands (+-band_width around the price, re-centered when crossed, like
+trailing stops) for their share of the symbols. Modes:
+    full_stream - every worker gets every frame as json (its own market ws connection), parses it and dispatches all prices
+    shared      - feeder publishes to a SharedPriceTable (market data process), workers are woken by the doorbell
+                  only for prices that crossed their bands and read them from shared memory
+Reported per mode: notifications (callbacks called), p50 / p99 / max latency from frame publish to callback,
+worker CPU time, seqlock torn reads; plus single process seqlock write / read cost.
+Event time of the benchmark frames is in us instead of ms for the latency resolution.
+
+Run from the repository root:
+    python -m benchmarks.shared_price_table [workers] [symbols] [frames_per_s] [seconds]
+"""
+import os
+import sys
+import random
+import functools
+import multiprocessing
+
+from common import *
+from shared_price_table import SharedPriceTable
+from market_data_process import MarketDataProcess, attach_worker
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from price_trigger_index import PriceTriggerIndex
+
+BASE_PRICE = 100.0
+BAND_WIDTH = 0.002
+STEP = 0.0004  # price change per frame, fraction of price
+SUBSCRIBERS_PER_SYMBOL = 5
+DRAIN_TIME = 0.5  # s workers keep running after the last frame
+
+
+def get_symbols(symbols_num):
+    return [f"SYM{i}USDT" for i in range(symbols_num)]
+
+
+def get_frames(symbols, frames_per_s, seconds):
+    """Yields prices of every frame in time, until seconds pass - slow feeder sends less frames"""
+    random_generator = random.Random(3)
+    prices = {symbol: BASE_PRICE for symbol in symbols}
+    interval = 1 / frames_per_s
+    next_frame_at = time.perf_counter()
+    deadline = next_frame_at + seconds
+    while time.perf_counter() < deadline:
+        for symbol in symbols:
+            prices[symbol] = round(prices[symbol] * (1 + random_generator.gauss(0, STEP)), 4)
+        yield prices
+        next_frame_at += interval
+        time.sleep(max(0.0, next_frame_at - time.perf_counter()))
+
+
+async def shared_feeder(publisher, symbols_num, frames_per_s, seconds, ready, done):
+    ready.wait()
+    for prices in get_frames(get_symbols(symbols_num), frames_per_s, seconds):
+        publisher.publish(prices, event_time=time.time_ns() // 1000)
+    done.set()
+
+
+def run_json_feeder(connections, symbols_num, frames_per_s, seconds, ready, done):
+    ready.wait()
+    for prices in get_frames(get_symbols(symbols_num), frames_per_s, seconds):
+        event_time = time.time_ns() // 1000
+        frame = json.dumps([{"e": "markPriceUpdate", "E": event_time, "s": symbol, "p": str(price)} for symbol, price in prices.items()]).encode()
+        for connection in connections:
+            connection.send_bytes(frame)  # blocks while the worker is behind, as a ws connection of the worker would
+    done.set()
+
+
+async def wait_done(done):
+    while not done.is_set():
+        await asyncio.sleep(0.05)
+    await asyncio.sleep(DRAIN_TIME)
+
+
+class BandSubscriber:
+    def __init__(self, symbol, get_event_time, latencies):
+        self.symbol = symbol
+        self.callback_id = None
+        self.get_event_time = get_event_time
+        self.latencies = latencies
+
+    async def on_price(self, price):
+        self.latencies.append(time.time_ns() // 1000 - self.get_event_time(self.symbol))
+        if price <= self.band[0] or price >= self.band[1]:
+            self.set_band(price)
+
+    def set_band(self, price):
+        self.band = (price * (1 - BAND_WIDTH), price * (1 + BAND_WIDTH))
+        BinanceFuturesApiHandler._price_trigger_indexes[self.symbol].set_band(self.callback_id, *self.band)
+
+
+def subscribe(symbols, get_event_time, latencies):
+    for symbol in symbols:
+        BinanceFuturesApiHandler._on_price_update_callbacks[symbol] = {}
+        BinanceFuturesApiHandler._price_trigger_indexes[symbol] = PriceTriggerIndex()
+        for i in range(SUBSCRIBERS_PER_SYMBOL):
+            subscriber = BandSubscriber(symbol, get_event_time, latencies)
+            subscriber.callback_id = f"{symbol}_{i}"
+            BinanceFuturesApiHandler._on_price_update_callbacks[symbol][subscriber.callback_id] = [BandSubscriber.on_price, subscriber]
+            subscriber.set_band(BASE_PRICE)
+
+
+async def run_shared_worker(table_name, doorbell, worker_id, symbols, ready, done):
+    latencies = []
+    client = attach_worker(table_name, doorbell, worker_id)
+    subscribe(symbols, client.get_event_time, latencies)
+    cpu_started = time.process_time()
+    task = asyncio.create_task(client.run())
+    await asyncio.sleep(0.1)  # attached, bands are synced on the first prices
+    await asyncio.get_running_loop().run_in_executor(None, ready.wait)
+    await wait_done(done)
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    return latencies, time.process_time() - cpu_started, client.table.torn_reads
+
+
+async def run_full_stream_worker(connection, symbols, ready, done):
+    latencies = []
+    event_times = {}
+    subscribe(symbols, event_times.get, latencies)
+    running_tasks = []
+
+    def on_frame():
+        nonlocal running_tasks
+        while connection.poll():
+            running_tasks = clean_finished_tasks(running_tasks)
+            for update in json.loads(connection.recv_bytes()):
+                event_times[update["s"]] = update["E"]
+                BinanceFuturesApiHandler.dispatch_price_update(update["s"], float(update["p"]), running_tasks)
+
+    loop = asyncio.get_running_loop()
+    cpu_started = time.process_time()
+    loop.add_reader(connection.fileno(), on_frame)
+    await loop.run_in_executor(None, ready.wait)
+    await wait_done(done)
+    loop.remove_reader(connection.fileno())
+    return latencies, time.process_time() - cpu_started, 0
+
+
+def run_worker(mode, attachment, worker_id, symbols, ready, done, results):
+    logging.getLogger("futures_general").setLevel("CRITICAL")
+    if mode == "shared":
+        result = asyncio.run(run_shared_worker(attachment[0], attachment[1], worker_id, symbols, ready, done))
+    else:
+        result = asyncio.run(run_full_stream_worker(attachment, symbols, ready, done))
+    results.put(result)
+
+
+def run_mode(mode, workers_num, symbols_num, frames_per_s, seconds):
+    context = multiprocessing.get_context("spawn")
+    symbols = get_symbols(symbols_num)
+    results = context.Queue()
+    ready = context.Barrier(workers_num + 1)  # workers and feeder
+    done = context.Event()
+    market_data_process = None
+    feeder = None
+    if mode == "shared":
+        market_data_process = MarketDataProcess(workers_num=workers_num, capacity=max(symbols_num, 16),
+                                                feeder=functools.partial(shared_feeder, symbols_num=symbols_num,
+                                                                         frames_per_s=frames_per_s, seconds=seconds, ready=ready, done=done))
+        attachments = [market_data_process.get_worker_attachment(worker_id) for worker_id in range(workers_num)]
+    else:
+        pipes = [context.Pipe(duplex=False) for _ in range(workers_num)]
+        attachments = [read_end for read_end, _ in pipes]
+        feeder = context.Process(target=run_json_feeder, args=([write_end for _, write_end in pipes], symbols_num, frames_per_s, seconds, ready, done))
+
+    workers = [context.Process(target=run_worker, args=(mode, attachments[worker_id], worker_id, symbols[worker_id::workers_num],
+                                                        ready, done, results))
+               for worker_id in range(workers_num)]
+    for worker in workers:
+        worker.start()
+    if market_data_process is not None:
+        market_data_process.start()
+    else:
+        feeder.start()
+
+    worker_results = [results.get() for _ in workers]
+    for worker in workers:
+        worker.join()
+    if market_data_process is not None:
+        market_data_process.process.join()
+        market_data_process.stop()
+    else:
+        feeder.join()
+
+    latencies = sorted(latency for worker_latencies, _, _ in worker_results for latency in worker_latencies)
+    cpu_times = [cpu_time for _, cpu_time, _ in worker_results]
+    return {
+        "notifications": len(latencies),
+        "p50_latency_us": latencies[len(latencies) // 2] if latencies else None,
+        "p99_latency_us": latencies[int(len(latencies) * 0.99)] if latencies else None,
+        "max_latency_us": latencies[-1] if latencies else None,
+        "worker_cpu_s_total": round(sum(cpu_times), 3),
+        "worker_cpu_s_max": round(max(cpu_times), 3),
+        "torn_reads": sum(torn_reads for _, _, torn_reads in worker_results),
+    }
+
+
+def measure_seqlock(iterations=200000):
+    table = SharedPriceTable.create(capacity=16, max_workers=1)
+    try:
+        slot = table.add_symbol("BENCHUSDT")
+        started = time.perf_counter()
+        for i in range(iterations):
+            table.write_price(slot, BASE_PRICE + i, i)
+        write_ns = (time.perf_counter() - started) / iterations * 1e9
+        started = time.perf_counter()
+        for _ in range(iterations):
+            table.read_slot(slot)
+        read_ns = (time.perf_counter() - started) / iterations * 1e9
+        return {"write_ns": round(write_ns), "read_ns": round(read_ns)}
+    finally:
+        table.close()
+
+
+def main(workers_num, symbols_num, frames_per_s, seconds):
+    result = {"workers": workers_num, "symbols": symbols_num, "frames_per_s": frames_per_s, "seconds": seconds,
+              "subscribers_per_symbol": SUBSCRIBERS_PER_SYMBOL, "band_width": BAND_WIDTH, "cpu_count": os.cpu_count(),
+              "seqlock": measure_seqlock()}
+    result["full_stream"] = run_mode("full_stream", workers_num, symbols_num, frames_per_s, seconds)
+    result["shared"] = run_mode("shared", workers_num, symbols_num, frames_per_s, seconds)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    symbols_count = int(sys.argv[2]) if len(sys.argv) > 2 else 300
+    frames = float(sys.argv[3]) if len(sys.argv) > 3 else 50
+    duration = float(sys.argv[4]) if len(sys.argv) > 4 else 5
+    main(workers, symbols_count, frames, duration)
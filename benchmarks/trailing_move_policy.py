@@ -0,0 +1,109 @@
+"""
+Trailing stop move policy: REST calls per stop move.
+
+N SELL TrailingStopOrder instances (STOP_MARKET stops) on BacktestApiHandler follow a mark price uptrend
+fed in real time (one tick per tick interval) while SimulatedExchange answers REST calls with latency,
+so stop cancels are still in flight when the next moves come. Modes:
+    legacy           - every move is cancel + new, moves during cancel re-place the old price and are replaced again
+    coalesce         - default policy: moves during cancel go with the re-placed stop
+    throttled        - coalesce + min_interval / min_improvement
+    throttled_modify - throttled + stops modified in place (exchange is told STOP_MARKET is modifiable,
+                       Binance modifies LIMIT orders only - shows what in place moves would save)
+Reported per mode: exchange REST calls, policy counters and how far exchange stops are behind
+the stops trailing logic wants at the end (mean, fraction of price).
+
+Run from the repository root:
+    python -m benchmarks.trailing_move_policy [orders] [ticks] [tick_ms] [rest_latency_ms]
+"""
+import io
+import sys
+import random
+import contextlib
+
+from common import *
+from exchange_simulator import SimulatedExchange
+from exchange_simulator.simulated_exchange import FaultProfile
+from backtest import BacktestApiHandler, BacktestRun
+from orders_logic.trailing_stop_order import TrailingStopOrder
+from trailing_move_policy import TrailingMovePolicy
+
+BENCH_SYMBOL = "BENCHUSDT"
+BASE_PRICE = 100.0
+
+MODES = {
+    "legacy": ({"coalesce_moves": False, "use_modify_order": False}, ("LIMIT",)),
+    "coalesce": ({}, ("LIMIT",)),
+    "throttled": ({"min_interval": 0.2, "min_improvement": 0.001}, ("LIMIT",)),
+    "throttled_modify": ({"min_interval": 0.2, "min_improvement": 0.001}, ("LIMIT", "STOP", "STOP_MARKET")),
+}
+
+
+async def run_mode(orders_num, ticks_num, tick_interval, rest_latency_ms, policy_params, modifiable_order_types):
+    logging.getLogger("backtest").setLevel("ERROR")
+    logger = get_logger("backtest")
+    fault_profile = FaultProfile(rest_latency_ms=rest_latency_ms, rest_jitter_ms=rest_latency_ms / 2, seed=3)
+    exchange = SimulatedExchange({BENCH_SYMBOL: {"mark_price": BASE_PRICE}}, fault_profile=fault_profile, logger=logger,
+                                 modifiable_order_types=modifiable_order_types)
+    api_handler = BacktestApiHandler.create_backtest(exchange, logger=logger)
+    api_handler.trailing_move_policy = TrailingMovePolicy(**policy_params)
+    account = exchange.get_account(api_handler.API_KEY)
+    account.positions[BENCH_SYMBOL] = [float(orders_num), BASE_PRICE]
+
+    orders = []
+    for i in range(orders_num):
+        stop_data = [{"stop_price": BASE_PRICE - 2 - (i % 5) * 0.5, "price_step": 0.02 + (i % 7) * 0.02, "is_trailing": True}]
+        orders.append(TrailingStopOrder(api_handler, logger, BENCH_SYMBOL, "SELL", BASE_PRICE, stop_data, base_amount=1, is_repay=True))
+
+    running_tasks = []
+    api_handler.set_price(BENCH_SYMBOL, BASE_PRICE, running_tasks)
+    for order in orders:
+        await order.place_order()
+    await BacktestRun.settle()
+    api_handler.set_price(BENCH_SYMBOL, BASE_PRICE, running_tasks)  # initial stops are placed on the first update
+    await BacktestRun.settle()
+
+    rnd = random.Random(11)
+    price = BASE_PRICE
+    rest_calls_before = exchange.get_stats()["rest_calls"]
+    for tick in range(ticks_num):
+        price = round(price + rnd.gauss(0.01, 0.03), 2)
+        running_tasks.clear()
+        api_handler.set_price(BENCH_SYMBOL, price, running_tasks)
+        await asyncio.sleep(tick_interval)
+    await BacktestRun.settle()
+    rest_calls = exchange.get_stats()["rest_calls"] - rest_calls_before
+
+    lags = []
+    for order in orders:
+        exchange_order = account.orders.get(order.stop_order.order_id)
+        exchange_stop = float(exchange_order["stopPrice"]) if exchange_order is not None and exchange_order["status"] == "NEW" else 0.0
+        lags.append((order.current_stop_price - exchange_stop) / price)
+
+    policy_stats = api_handler.trailing_move_policy.get_stats()
+    return {
+        "rest_calls": rest_calls,
+        "rest_calls_per_requested_move": round(rest_calls / max(policy_stats["moves_requested"], 1), 3),
+        "stops_on_exchange": exchange.get_stats()["resting_orders"],
+        "mean_stop_lag": round(sum(lags) / len(lags), 6),
+        "max_stop_lag": round(max(lags), 6),
+        "policy": policy_stats,
+    }
+
+
+def main(orders_num, ticks_num, tick_ms, rest_latency_ms):
+    result = {"orders": orders_num, "ticks": ticks_num, "tick_ms": tick_ms, "rest_latency_ms": rest_latency_ms}
+    with contextlib.redirect_stdout(io.StringIO()):
+        for name, (policy_params, modifiable_order_types) in MODES.items():
+            result[name] = asyncio.run(run_mode(orders_num, ticks_num, tick_ms / 1000, rest_latency_ms, policy_params, modifiable_order_types))
+    legacy_calls = result["legacy"]["rest_calls"]
+    for name in MODES:
+        result[name]["rest_calls_vs_legacy"] = round(result[name]["rest_calls"] / max(legacy_calls, 1), 3)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 400
+    tick_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    latency_ms = float(sys.argv[4]) if len(sys.argv) > 4 else 20
+    main(orders, ticks, tick_ms, latency_ms)
@@ -0,0 +1,168 @@
+"""
+Trailing stop engine vs per order price subscriptions.
+
+End to end: N TrailingStopOrder instances on one symbol (varied trailing steps) run on BacktestApiHandler against
+a mark price random walk, first woken one by one by price trigger index, then by the shared TrailingStopEngine.
+Reported per mode: CPU time per tick (price dispatch, order logic, stop replacement on the simulator),
+price update handler calls and stop moves, and whether the final stops of both modes are the same.
+
+Wake step only: which of N trailing stops move on a tick and their new wake levels, by price trigger index
+(get_woken + set_band per moved order) and by TrailingStopEngine.update + band, without stop replacement.
+
+Run from the repository root:
+    python -m benchmarks.trailing_stop_engine [orders] [ticks]
+"""
+import io
+import sys
+import random
+import contextlib
+from types import SimpleNamespace
+
+from common import *
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from exchange_simulator import SimulatedExchange
+from backtest import BacktestApiHandler, BacktestRun
+from orders_logic.trailing_stop_order import TrailingStopOrder
+from price_trigger_index import PriceTriggerIndex
+from trailing_stop_engine import TrailingStopEngine
+
+BENCH_SYMBOL = "BENCHUSDT"
+BASE_PRICE = 100.0
+
+
+class HandlerCallCounter:
+    def __init__(self):
+        self.calls = 0
+        self.original = TrailingStopOrder.price_update_handler
+
+    def __enter__(self):
+        counter = self
+        original = self.original
+
+        async def counting_handler(order, last_price):
+            counter.calls += 1
+            await original(order, last_price)
+
+        TrailingStopOrder.price_update_handler = counting_handler
+        return self
+
+    def __exit__(self, *args):
+        TrailingStopOrder.price_update_handler = self.original
+
+
+async def run_mode(orders_num, ticks_num, use_engine):
+    BinanceFuturesApiHandler._use_trailing_stop_engine = use_engine
+    logging.getLogger("backtest").setLevel("ERROR")
+    logger = get_logger("backtest")
+    exchange = SimulatedExchange({BENCH_SYMBOL: {"mark_price": BASE_PRICE}}, logger=logger)
+    api_handler = BacktestApiHandler.create_backtest(exchange, logger=logger)
+    exchange.get_account(api_handler.API_KEY).positions[BENCH_SYMBOL] = [float(orders_num), BASE_PRICE]
+
+    counter = HandlerCallCounter().__enter__()  # before orders subscribe, so their callbacks are counted
+    rnd = random.Random(5)
+    orders = []
+    for i in range(orders_num):
+        stop_data = [{"stop_price": BASE_PRICE - 3 - (i % 7) * 0.5, "price_step": 0.05 + (i % 13) * 0.05, "is_trailing": True}]
+        orders.append(TrailingStopOrder(api_handler, logger, BENCH_SYMBOL, "SELL", BASE_PRICE, stop_data, base_amount=1, is_repay=True))
+
+    running_tasks = []
+    api_handler.set_price(BENCH_SYMBOL, BASE_PRICE, running_tasks)
+    for order in orders:
+        await order.place_order()
+    await BacktestRun.settle()
+    api_handler.set_price(BENCH_SYMBOL, BASE_PRICE, running_tasks)  # initial stops are placed on the first update
+    await BacktestRun.settle()
+
+    price = BASE_PRICE
+    counter.calls = 0
+    try:
+        started = time.process_time()
+        for tick in range(ticks_num):
+            price = round(price + rnd.gauss(0.004, 0.03), 2)  # slow uptrend, stops keep moving and are not hit
+            running_tasks.clear()
+            api_handler.set_price(BENCH_SYMBOL, price, running_tasks)
+            if len(running_tasks) != 0:
+                await BacktestRun.settle()
+        elapsed = time.process_time() - started
+    finally:
+        counter.__exit__()
+
+    engine = BinanceFuturesApiHandler._trailing_stop_engines.get(BENCH_SYMBOL)
+    result = {
+        "cpu_us_per_tick": round(elapsed / ticks_num * 1e6, 1),
+        "handler_calls": counter.calls,
+        "engine": engine.get_stats() if use_engine else None,
+        "exchange": exchange.get_stats(),
+        "last_price": price,
+    }
+    return result, [round(order.current_stop_price, 8) for order in orders]
+
+
+class BandSink:
+    """Api handler stand-in for TrailingStopEngine: takes the subscription and band updates"""
+    logger = None
+
+    def subscribe_for_price_update(self, symbol, callback, price_band):
+        return "engine"
+
+    def update_price_trigger_band(self, symbol, callback_id, lower, upper):
+        pass
+
+
+def measure_wake_step(orders_num, ticks_num):
+    rnd = random.Random(5)
+    prices = []
+    price = BASE_PRICE
+    for tick in range(ticks_num):
+        price = round(price + rnd.gauss(0.004, 0.03), 2)
+        prices.append(price)
+    min_steps = [0.05 + (i % 13) * 0.05 for i in range(orders_num)]
+
+    trigger_index = PriceTriggerIndex()
+    for i in range(orders_num):
+        trigger_index.set_band(str(i), None, BASE_PRICE + min_steps[i])  # callback ids are strings
+    index_moves = 0
+    started = time.process_time()
+    for price in prices:
+        for callback_id in trigger_index.get_woken(price):
+            trigger_index.set_band(callback_id, None, price + min_steps[int(callback_id)])
+            index_moves += 1
+    index_elapsed = time.process_time() - started
+
+    engine = TrailingStopEngine(BandSink(), BENCH_SYMBOL)
+    for i in range(orders_num):
+        engine.add(SimpleNamespace(order_id=i, side="SELL", stop_conditions=[], current_extremal_price_reached=BASE_PRICE,
+                                   current_stop_price_delta=3.0, current_price_min_step=min_steps[i],
+                                   should_process_initial_stop=False, update_needed=False))
+    engine_moves = 0
+    started = time.process_time()
+    for price in prices:
+        moved_slots, called_slots = engine.update(price)
+        engine_moves += len(moved_slots)
+        engine.refresh_price_band()
+    engine_elapsed = time.process_time() - started
+
+    return {
+        "index_us_per_tick": round(index_elapsed / ticks_num * 1e6, 1),
+        "engine_us_per_tick": round(engine_elapsed / ticks_num * 1e6, 1),
+        "moves_per_tick": round(engine_moves / ticks_num, 1),
+        "same_moves": index_moves == engine_moves,
+        "speedup": round(index_elapsed / max(engine_elapsed, 1e-9), 2),
+    }
+
+
+def main(orders_num, ticks_num):
+    result = {"orders": orders_num, "ticks": ticks_num}
+    with contextlib.redirect_stdout(io.StringIO()):
+        result["per_order"], per_order_stops = asyncio.run(run_mode(orders_num, ticks_num, False))
+        result["engine"], engine_stops = asyncio.run(run_mode(orders_num, ticks_num, True))
+    result["same_stops"] = per_order_stops == engine_stops
+    result["speedup"] = round(result["per_order"]["cpu_us_per_tick"] / max(result["engine"]["cpu_us_per_tick"], 1e-9), 2)
+    result["wake_step"] = {str(n): measure_wake_step(n, ticks_num) for n in [orders_num, orders_num * 10, orders_num * 100]}
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    orders = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    ticks = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    main(orders, ticks)
@@ -0,0 +1,179 @@
+"""
+users.json hot reload against the exchange simulator: key rotation, retirement and new accounts while orders rest.
+
+Accounts are started by AccountRegistry from a temporary users.json, every account places resting_orders BUY LIMIT
+orders below the mark price. Then users.json is changed - keys of rotated accounts are replaced (exchange knows
+both keys), removed accounts are dropped, new ones added - and reload() is called. After it old keys are revoked,
+rotated accounts place one more order each, a new order is sent to a retiring account, and the mark price drops
+through the order prices so every resting order fills and retiring accounts drain.
+Reported: reload call time and max loop lag meanwhile, time until added accounts are ready, cancel requests sent
+by the reload (a restart cancels every active order), rotated accounts orders kept / filled / placed with the new key,
+new orders refused by retiring accounts, time from the fill until removed accounts are retired,
+requests sent with revoked keys.
+
+Run from the repository root:
+    python -m benchmarks.users_reload [accounts] [resting_orders] [rest_latency_ms]
+"""
+import io
+import sys
+import tempfile
+
+from common import *
+from account_manager import accountManager
+from account_registry import AccountRegistry
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from exchange_simulator import SimulatedExchange, SimulatedFuturesApiHandler, FaultProfile
+
+BENCH_SYMBOL = "BENCHUSDT"
+BASE_PRICE = 100.0
+ORDER_PRICE = 90.0
+LAG_TIMER_S = 0.01
+WAIT_TIMEOUT_S = 30
+
+
+class ReportCollector:
+    """report_hub of a benchmark account"""
+    def __init__(self):
+        self.reports = []
+
+    def publish(self, topic, data, key=None):
+        self.reports.append(json.loads(data))
+
+    def has_subscribers(self, topic):
+        return True
+
+    def close(self):
+        pass
+
+    def count(self, **fields):
+        return sum(1 for report in self.reports if all(report.get(key) == value for key, value in fields.items()))
+
+
+def get_user(i, key_version=0):
+    return {"user": f"user{i}", "public": f"user{i}_key{key_version}", "private": f"user{i}_secret{key_version}"}
+
+
+def write_users(path, users):
+    with open(path, "w") as f:
+        f.write(json.dumps(users))
+
+
+def new_order_cmd(username, order_id):
+    return {"username": username, "type": "NEW ORDER", "order_id": order_id, "account_type": "FUTURES", "order_type": "LIMIT",
+            "symbol": BENCH_SYMBOL, "side": "BUY", "base": 0.1, "action_price": str(ORDER_PRICE), "leverage": 10, "is_repay": False}
+
+
+async def wait_for(condition):
+    deadline = time.perf_counter() + WAIT_TIMEOUT_S
+    while not condition():
+        if time.perf_counter() > deadline:
+            raise TimeoutError("benchmark condition not reached")
+        await asyncio.sleep(0.01)
+
+
+async def run(accounts_num, resting_orders, rest_latency_ms):
+    exchange = SimulatedExchange({BENCH_SYMBOL: {"mark_price": BASE_PRICE}}, fault_profile=FaultProfile(rest_latency_ms=rest_latency_ms))
+    SimulatedFuturesApiHandler.attach_exchange(exchange)
+    SimulatedFuturesApiHandler.retired_transport_grace = 0.5
+    accountManager.journal_dir = None
+    accountManager.retire_check_interval = 0.05
+    cancel_requests = []
+    revoked_key_requests = []
+    exchange.request_listeners.append(lambda api_key, endpoint, params: endpoint == "cancel_order" and cancel_requests.append(api_key))
+    exchange.request_listeners.append(lambda api_key, endpoint, params: api_key in exchange.revoked_api_keys and
+                                      revoked_key_requests.append(endpoint))
+    collectors = {}
+
+    async def create_account(user_data):
+        collectors[user_data["user"]] = ReportCollector()
+        return await accountManager.create_from_user_data(user_data, report_hub=collectors[user_data["user"]],
+                                                          api_handler_cls=SimulatedFuturesApiHandler)
+
+    users_path = os.path.join(tempfile.mkdtemp(), "users.json")
+    users = [dict(get_user(i), rest_transport="aiohttp") for i in range(accounts_num)]
+    write_users(users_path, users)
+    managers, account_states = {}, {}
+    registry = AccountRegistry(managers, account_states, create_account, users_path=users_path)
+    await registry.reload(wait_started=True)
+
+    for username, manager in managers.items():
+        for i in range(resting_orders):
+            await manager.process_new_cmd(new_order_cmd(username, f"{username}_rest{i}"))
+    await wait_for(lambda: all(len(manager.futures_active_orders) == resting_orders for manager in managers.values()))
+
+    rotated = list(range(accounts_num // 4))
+    removed = list(range(accounts_num // 4, accounts_num // 2))
+    added = list(range(accounts_num, accounts_num + accounts_num // 4))
+    for i in rotated:
+        exchange.add_api_key(f"user{i}_key0", f"user{i}_key1")
+    new_users = [dict(get_user(i, 1 if i in rotated else 0), rest_transport="aiohttp")
+                 for i in list(range(accounts_num)) + added if i not in removed]
+    write_users(users_path, new_users)
+
+    lags = []
+
+    async def measure_lag():
+        while True:
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_TIMER_S)
+            lags.append(max(0.0, time.perf_counter() - started - LAG_TIMER_S))
+
+    lag_task = asyncio.create_task(measure_lag())
+    cancels_before = len(cancel_requests)
+    reload_started = time.perf_counter()
+    summary = await registry.reload()
+    reload_time = time.perf_counter() - reload_started
+    await wait_for(lambda: all(account_states.get(f"user{i}", {}).get("status") == "ready" for i in added))
+    added_ready_time = time.perf_counter() - reload_started
+    lag_task.cancel()
+
+    for i in rotated:
+        exchange.revoke_api_key(f"user{i}_key0")
+    rotated_orders_kept = sum(len(managers[f"user{i}"].futures_active_orders) for i in rotated)
+    for i in rotated:
+        await managers[f"user{i}"].process_new_cmd(new_order_cmd(f"user{i}", f"user{i}_after_rotation"))
+    await wait_for(lambda: all(len(managers[f"user{i}"].futures_active_orders) == resting_orders + 1 for i in rotated))
+    for i in removed:
+        await managers[f"user{i}"].process_new_cmd(new_order_cmd(f"user{i}", f"user{i}_while_retiring"))
+
+    fill_started = time.perf_counter()
+    exchange.set_mark_prices({BENCH_SYMBOL: ORDER_PRICE - 1})
+    await wait_for(lambda: all(f"user{i}" not in managers for i in removed))
+    retire_time = time.perf_counter() - fill_started
+    await wait_for(lambda: all(len(managers[f"user{i}"].futures_active_orders) == 0 for i in rotated))
+    cancels_by_reload = len(cancel_requests) - cancels_before
+
+    BinanceFuturesApiHandler._is_shutdown = True
+    return {
+        "applied": summary,
+        "reload_ms": round(reload_time * 1000, 2),
+        "max_loop_lag_ms": round(max(lags, default=0) * 1000, 2),
+        "added_ready_ms": round(added_ready_time * 1000, 1),
+        "cancel_requests_by_reload": cancels_by_reload,
+        "active_orders_a_restart_would_cancel": accounts_num * resting_orders,
+        "rotated_orders_kept": rotated_orders_kept,
+        "rotated_orders_filled": sum(collectors[f"user{i}"].count(type="DEAL_REPORT", status="FILLED") for i in rotated),
+        "rotated_orders_expected": len(rotated) * (resting_orders + 1),
+        "retiring_new_orders_refused": sum(collectors[f"user{i}"].count(err="account_retiring") for i in removed),
+        "removed_orders_filled": sum(collectors[f"user{i}"].count(type="DEAL_REPORT", status="FILLED") for i in removed),
+        "retire_after_fill_ms": round(retire_time * 1000, 1),
+        "requests_with_revoked_keys": len(revoked_key_requests),
+    }
+
+
+def main(accounts_num, resting_orders, rest_latency_ms):
+    for name in ["root", "futures", "futures_general", "default"]:
+        logging.getLogger(name).setLevel("CRITICAL")
+    stdout = sys.stdout
+    sys.stdout = io.StringIO()
+    result = asyncio.run(run(accounts_num, resting_orders, rest_latency_ms))
+    sys.stdout = stdout
+    result = dict({"accounts": accounts_num, "resting_orders": resting_orders, "rest_latency_ms": rest_latency_ms}, **result)
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    accounts = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    orders = int(sys.argv[2]) if len(sys.argv) > 2 else 5
+    latency_ms = float(sys.argv[3]) if len(sys.argv) > 3 else 5
+    main(accounts, orders, latency_ms)
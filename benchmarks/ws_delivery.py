@@ -0,0 +1,163 @@
+"""
+Report delivery to ws clients: executor thread per client and a frame per report (as forward_data_to_user was)
+vs forward_data_to_user on the server loop with reports pending together batched into one frame.
+
+A websockets server runs on its own loop thread as input_websocket_server does, clients connect to it from the
+main loop, where reports are published in bursts of burst reports every interval_ms for seconds s.
+Modes:
+    legacy  - queue.Queue per client, run_in_executor(queue.get) and websocket.send per report
+    batched - ReportSubscriber per client of one ReportHub, forward_data_to_user
+Reported per mode: reports published / received by the slowest and the fastest client, frames received,
+p50 / p99 / max publish to receive latency, server executor threads.
+
+Run from the repository root:
+    python -m benchmarks.ws_delivery [clients] [burst] [interval_ms] [seconds]
+"""
+import sys
+import queue
+
+import websockets
+
+from common import *
+from report_hub import ReportHub, ReportSubscriber, TOPIC_DEAL_REPORTS
+from input_websocket_server import forward_data_to_user, ClientDeliveryStats
+
+
+async def legacy_forward(websocket, acc_queue):
+    """forward_data_to_user as it was"""
+    loop = asyncio.get_event_loop()
+    while True:
+        data = await loop.run_in_executor(None, acc_queue.get)
+        if data is None:
+            return  # benchmark is over
+        await websocket.send(data)
+
+
+class DeliveryServer:
+    def __init__(self, mode, hub):
+        self.mode = mode
+        self.hub = hub
+        self.queues = []
+        self.stats = []
+        self.loop = asyncio.new_event_loop()
+        self.ready = threading.Event()
+        self.port = None
+        self.server = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+        self.ready.wait()
+
+    def run(self):
+        asyncio.set_event_loop(self.loop)
+        self.loop.run_until_complete(self.serve())
+        self.ready.set()
+        self.loop.run_forever()
+
+    async def serve(self):
+        self.server = await websockets.serve(self.handle, "127.0.0.1", 0)
+        self.port = next(iter(self.server.sockets)).getsockname()[1]
+
+    async def close(self):
+        for acc_queue in self.queues:
+            acc_queue.put_nowait(None)  # executor threads blocked in get return
+        self.server.close()
+        await self.server.wait_closed()
+
+    def stop(self):
+        asyncio.run_coroutine_threadsafe(self.close(), self.loop).result(10)
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self.thread.join()
+
+    async def handle(self, websocket):
+        if self.mode == "legacy":
+            acc_queue = queue.Queue()
+            self.queues.append(acc_queue)
+            task = asyncio.create_task(legacy_forward(websocket, acc_queue))
+        else:
+            subscriber = ReportSubscriber([TOPIC_DEAL_REPORTS], max_buffer=100000)
+            self.hub.subscribe(subscriber)
+            stats = ClientDeliveryStats("bench", subscriber)
+            self.stats.append(stats)
+            task = asyncio.create_task(forward_data_to_user(websocket, self.hub, subscriber, stats))
+        try:
+            await websocket.wait_closed()
+        finally:
+            task.cancel()
+
+    def publish(self, data):
+        if self.mode == "legacy":
+            for acc_queue in self.queues:
+                acc_queue.put_nowait(data)
+        else:
+            self.hub.publish(TOPIC_DEAL_REPORTS, data)
+
+    def get_executor_threads(self):
+        executor = getattr(self.loop, "_default_executor", None)
+        return 0 if executor is None else len(executor._threads)
+
+
+async def receive(websocket, latencies, counters):
+    async for frame in websocket:
+        counters["frames"] += 1
+        reports = json.loads(frame)
+        reports = reports if isinstance(reports, list) else [reports]
+        now = time.perf_counter()
+        for report in reports:
+            counters["reports"] += 1
+            latencies.append(now - report["published_at"])
+
+
+async def run_mode(mode, clients_num, burst, interval, seconds):
+    server = DeliveryServer(mode, ReportHub())
+    connections = [await websockets.connect(f"ws://127.0.0.1:{server.port}", max_size=None) for _ in range(clients_num)]
+    await asyncio.sleep(0.2)  # handlers subscribed
+    latencies = []
+    counters = [{"frames": 0, "reports": 0} for _ in connections]
+    receivers = [asyncio.create_task(receive(connection, latencies, client_counters)) for connection, client_counters in zip(connections, counters)]
+
+    published = 0
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        for _ in range(burst):
+            published += 1
+            server.publish(json.dumps({"order_id": f"order{published}", "type": "DEAL_REPORT", "status": "FILLED",
+                                       "published_at": time.perf_counter()}))
+        await asyncio.sleep(interval)
+    await asyncio.sleep(1)  # late reports
+
+    for connection in connections:
+        await connection.close()
+    for receiver in receivers:
+        receiver.cancel()
+    latencies = sorted(latency * 1000 for latency in latencies)
+    result = {
+        "published_per_client": published,
+        "received_min": min(client_counters["reports"] for client_counters in counters),
+        "received_max": max(client_counters["reports"] for client_counters in counters),
+        "frames_received": sum(client_counters["frames"] for client_counters in counters),
+        "p50_ms": round(latencies[len(latencies) // 2], 2) if latencies else None,
+        "p99_ms": round(latencies[int(len(latencies) * 0.99)], 2) if latencies else None,
+        "max_ms": round(latencies[-1], 2) if latencies else None,
+        "server_executor_threads": server.get_executor_threads(),
+    }
+    if server.stats:
+        result["server_send_ms_p99"] = max(stats.get_stats()["send_ms"]["p99"] for stats in server.stats if stats.frames)
+        result["server_max_depth"] = max(stats.subscriber.max_depth for stats in server.stats)
+    server.stop()
+    return result
+
+
+def main(clients_num, burst, interval_ms, seconds):
+    logging.getLogger("default").setLevel("CRITICAL")
+    result = {"clients": clients_num, "burst": burst, "interval_ms": interval_ms, "seconds": seconds, "cpu_count": os.cpu_count()}
+    for mode in ["legacy", "batched"]:
+        result[mode] = asyncio.run(run_mode(mode, clients_num, burst, interval_ms / 1000, seconds))
+    print(json.dumps(result, indent=2))
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    burst_size = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+    interval = float(sys.argv[3]) if len(sys.argv) > 3 else 20
+    duration = float(sys.argv[4]) if len(sys.argv) > 4 else 5
+    main(clients, burst_size, interval, duration)
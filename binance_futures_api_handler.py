@@ -5,33 +5,83 @@ import threading
 from common import *
 from binance.client import Client
 from binance import ThreadedWebsocketManager
+from market_subscription_manager import MarketSubscriptionManager
+from price_trigger_index import PriceTriggerIndex
+from trailing_stop_engine import TrailingStopEngine
+from trailing_move_policy import TrailingMovePolicy
+from rate_limiter import RateLimiter
+from retry_policy import RetryPolicy
+from server_clock import ServerClockTracker
+from exchange_errors import ExchangeError, UnknownOrderError, DuplicateOrderIdError, PriceFilterError, TimestampError
+from price_conflator import ConflatingPriceBuffer
+from binance_futures_async_rest import AsyncFuturesRestClient
+from symbol_quantizer import SymbolQuantizer
+from exchange_info_cache import ExchangeInfoCache
+from account_message_filter import AccountMessageFilter
+from order_update_mailbox import OrderUpdateMailbox
+from market_data_recorder import MarketDataRecorder, MarketDataReader
 
 
 # TODO generalize account message processor
 class BinanceFuturesApiHandler(Client):
     _market_ws_client = None
+    _ws_manager_factory = ThreadedWebsocketManager  # market and account ws connections, replaced by exchange simulator
+    _client_ping = True  # ping exchange when Client is constructed
+    _market_ws_socket_name = None
+    _market_subscriptions = MarketSubscriptionManager(max_multiplexed_symbols=50)  # above it all symbols firehose is used
     _ws_market_updates_thread = None
     _current_prices = {}
     _on_price_update_callbacks = {"update_finished": {}}  # callback_id:[callback, self]
+    _price_trigger_indexes = {}  # symbol:PriceTriggerIndex - which callbacks should be woken by the price
+    _use_price_trigger_index = True
+    _trailing_stop_engines = {}  # symbol:TrailingStopEngine shared by trailing stop orders of all accounts
+    _use_trailing_stop_engine = TrailingStopEngine.is_available()  # needs numpy
 
     _market_message_queue = queue.Queue()
+    _market_bridge_mode = "asyncio"  # "asyncio" - ws thread hands frames to main loop directly; "executor" - loop polls queue.Queue
+                                     # "conflate" - only the newest price per symbol is kept until main loop takes it
+    _market_async_queue = None
+    _market_conflator = ConflatingPriceBuffer()
+    _market_recorder = None  # MarketDataRecorder while mark price frames are recorded
+    _shared_market_data = None  # SharedMarketDataClient if prices come from the market data process (worker process)
+    _main_loop = None
     _assets_precision = {}
     _symbols_data = {}
+    _symbol_quantizers = {}  # symbol:SymbolQuantizer
+    _exchange_info_cache = ExchangeInfoCache(ttl=3600)
+    _use_exchange_info_cache = True
+    _exchange_info_refresh_interval = 15 * 60  # new listings appear within it
+    _exchange_info_check_interval = 30
+    _exchange_info_loaded_at = 0  # last download time
+    _exchange_info_task = None
+    _exchange_info_loading = None  # future while the first handler loads exchange info, handlers created meanwhile wait for it
     _market_ws_task = None
     _logger = get_logger('futures_general')
     _should_skip_price_update_msg = False  # for debug
     _is_shutdown = False
+    order_modify_types = ("LIMIT",)  # exchange order types PUT /fapi/v1/order can change in place
+    retired_transport_grace = 30  # s REST transport replaced by key rotation stays open for requests in flight
+    _rate_limiter = RateLimiter()  # request weight and order rate of all accounts of the process, None - not limited
+    _server_clock = ServerClockTracker()  # exchange clock offset for signed requests of all accounts
+    _server_clock_task = None
 
     def __init__(self, username, public_key=None, private_key=None, logger=None, is_hedge=False):
-        super().__init__(api_key=public_key, api_secret=private_key)
+        super().__init__(api_key=public_key, api_secret=private_key, ping=type(self)._client_ping)
         self.logger = get_logger('default', public_key) if logger is None else logger
+        type(self)._server_clock.add_client(self)
+        self.rest_transport = None  # AsyncFuturesRestClient if orders should be sent from the loop via aiohttp
+        self.order_journal = None  # OrderJournal of account orders, set by account manager
+        self.trailing_move_policy = TrailingMovePolicy()  # when trailing stops of the account send stop moves
+        self.retry_policy = RetryPolicy()  # how failed new orders of the account are retried
 
         self.username = username
         self.account_type = "futures"
-        self.max_retry_counter = 5
         self.account_ws_clients = None
         self.is_hedge = is_hedge
-        self.filter_clean_mutex = threading.Lock()
+        self.is_stopped = False  # account retired, its ws connections are closed and not relaunched
+        self.is_account_ws_rotation_requested = False  # API keys rotated, ws connections are relaunched with new ones
+        self.account_ws_wakeup = threading.Event()  # account ws supervision checks connections now instead of in 10 s
+        self.retired_transport_tasks = set()  # REST transports replaced by key rotation waiting to be closed
 
         try:
             self.futures_coin_change_position_mode(dualSidePosition=self.is_hedge)
@@ -44,31 +94,78 @@ class BinanceFuturesApiHandler(Client):
             else:
                 handle_exception(self.logger, e)
 
-        self.ws_account_updates_callbacks = {"accountUpdate": [], "leverageUpdate": [], "orderUpdate": {}}
+        self.ws_account_updates_callbacks = {"accountUpdate": [], "leverageUpdate": [], "orderUpdate": {}, "orderStatus": []}
         self.ws_account_updates_thread = threading.Thread(target=self.run_account_updates, daemon=True)
 
-        self.last_clean_msg_filter_timestamp = time.time()
-        self.account_message_filter = {}
+        self.account_message_filter = AccountMessageFilter(logger=self.logger)
+        self.order_update_mailbox = OrderUpdateMailbox(logger=self.logger)  # account updates are delivered in order per order id
         self.account_message_queue = queue.Queue()
+        self.account_loop = None  # loop of the handler - account ws frames go straight to account_async_queue
+        self.account_async_queue = None
         self.ws_process_tasks = {}
 
     @classmethod
-    async def create(cls, username, public, private, logger=None, is_hedge=False):
+    async def create(cls, username, public, private, logger=None, is_hedge=False, rest_transport=None):
+        """rest_transport: None - python-binance Client in executor; "aiohttp" - AsyncFuturesRestClient"""
         try:
-            self = BinanceFuturesApiHandler(username=username, public_key=public, private_key=private, logger=logger, is_hedge=is_hedge)
+            # Client init pings exchange and position mode is set with blocking calls, so not on the loop
+            self = await asyncio.get_running_loop().run_in_executor(None, functools.partial(cls, username=username, public_key=public,
+                                                                                            private_key=private, logger=logger,
+                                                                                            is_hedge=is_hedge))
+            self.account_loop = asyncio.get_running_loop()
+            self.account_async_queue = asyncio.Queue()
+            if rest_transport == "aiohttp":
+                self.rest_transport = self.create_rest_transport(public, private)
+                cls._server_clock.add_client(self.rest_transport)
+                await self.rest_transport.start()
             self.ws_process_tasks["account"] = asyncio.create_task(self.account_ws_messages_processor())
 
             if cls._ws_market_updates_thread is None:
                 cls._ws_market_updates_thread = threading.Thread(target=BinanceFuturesApiHandler.run_market_updates, daemon=True)
-                cls.load_exchange_assets_info(self)
-                cls._market_ws_task = asyncio.create_task(BinanceFuturesApiHandler.market_ws_messages_processor())
+                cls._exchange_info_loading = asyncio.get_running_loop().create_future()
+                try:
+                    if not self.load_cached_exchange_assets_info():
+                        await asyncio.get_running_loop().run_in_executor(None, self.load_exchange_assets_info)
+                finally:
+                    cls._exchange_info_loading.set_result(None)
+                    cls._exchange_info_loading = None
+                cls._exchange_info_task = asyncio.create_task(cls.exchange_info_refresher())
+                cls._server_clock_task = asyncio.create_task(cls.server_clock_syncer())
+                BinanceFuturesApiHandler.attach_market_bridge(asyncio.get_running_loop())
+                if cls._shared_market_data is not None:
+                    cls._market_ws_task = asyncio.create_task(cls._shared_market_data.run())
+                else:
+                    cls._market_ws_task = asyncio.create_task(BinanceFuturesApiHandler.market_ws_messages_processor())
+            elif cls._exchange_info_loading is not None:
+                await asyncio.shield(cls._exchange_info_loading)
             return self
         except Exception as e:
             handle_exception(get_logger('default'), e)
 
+    def create_rest_transport(self, public, private):
+        return AsyncFuturesRestClient(public, private, logger=self.logger, rate_limiter=type(self)._rate_limiter)
+
+    def _request_futures_api(self, method, path, signed=False, version=1, **kwargs):
+        """python-binance Client futures calls wait for rate limiter and report response headers to it"""
+        rate_limiter = type(self)._rate_limiter
+        if rate_limiter is None:
+            return super()._request_futures_api(method, path, signed, version, **kwargs)
+
+        rate_limiter.acquire_blocking(self.API_KEY, rate_limiter.get_rest_endpoint(method, path), kwargs.get("data") or {})
+        self.response = None
+        try:
+            return super()._request_futures_api(method, path, signed, version, **kwargs)
+        finally:
+            if self.response is not None:
+                rate_limiter.on_response(self.API_KEY, self.response.headers, self.response.status_code)
+
+    def get_rate_limit_stats(self):
+        rate_limiter = type(self)._rate_limiter
+        return None if rate_limiter is None else rate_limiter.get_stats(self.API_KEY)
+
     async def start_ws_updates(self):
         try:
-            if not type(self)._ws_market_updates_thread.is_alive():
+            if type(self)._shared_market_data is None and not type(self)._ws_market_updates_thread.is_alive():
                 type(self)._ws_market_updates_thread.start()
 
             self.ws_account_updates_thread.start()
@@ -77,26 +174,75 @@ class BinanceFuturesApiHandler(Client):
 
     @staticmethod
     def run_market_updates():
+        applied_version = None
         while True:
             try:
                 if BinanceFuturesApiHandler._market_ws_client is None or not BinanceFuturesApiHandler._market_ws_client.is_alive():
-                    BinanceFuturesApiHandler._market_ws_client = ThreadedWebsocketManager()
+                    BinanceFuturesApiHandler._market_ws_client = BinanceFuturesApiHandler._ws_manager_factory()
                     BinanceFuturesApiHandler._market_ws_client.daemon = True
                     BinanceFuturesApiHandler._market_ws_client.start()
-                    BinanceFuturesApiHandler._market_ws_client.start_all_mark_price_socket(callback=BinanceFuturesApiHandler.market_websocket_process_new_msg)
+                    BinanceFuturesApiHandler._market_ws_socket_name = None
+                    applied_version = None
                 if BinanceFuturesApiHandler._is_shutdown:
                     print("Futures Api handler run market updates shutdown")
                     BinanceFuturesApiHandler._market_ws_client.stop()
                     return
 
-                time.sleep(5)
+                version, streams = BinanceFuturesApiHandler._market_subscriptions.get_subscription_state()
+                if version != applied_version:
+                    BinanceFuturesApiHandler.apply_market_subscriptions(streams)
+                    applied_version = version
+
+                if BinanceFuturesApiHandler._market_subscriptions.wait_for_changes(5):
+                    time.sleep(0.2)  # let a burst of subscription changes settle before reconnecting
             except Exception as e:
                 handle_exception(BinanceFuturesApiHandler._logger, e)
+                time.sleep(1)
+
+    @staticmethod
+    def apply_market_subscriptions(streams):
+        """New socket is started before the old one is stopped, so subscribed symbols do not miss updates"""
+        ws_client = BinanceFuturesApiHandler._market_ws_client
+        old_socket_name = BinanceFuturesApiHandler._market_ws_socket_name
+        new_socket_name = None
+
+        if streams is None:
+            BinanceFuturesApiHandler._logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                                                  "Market updates: all symbols mark price stream"))
+            new_socket_name = ws_client.start_all_mark_price_socket(callback=BinanceFuturesApiHandler.market_websocket_process_new_msg)
+        elif len(streams) != 0:
+            BinanceFuturesApiHandler._logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                                                  f"Market updates: multiplexed streams {streams}"))
+            new_socket_name = ws_client.start_futures_multiplex_socket(callback=BinanceFuturesApiHandler.market_websocket_process_new_msg,
+                                                                       streams=streams)
+
+        if old_socket_name is not None and old_socket_name != new_socket_name:
+            ws_client.stop_socket(old_socket_name)
+        BinanceFuturesApiHandler._market_ws_socket_name = new_socket_name
+
+    @staticmethod
+    def attach_market_bridge(loop):
+        """Main loop that receives market frames in "asyncio" bridge mode"""
+        BinanceFuturesApiHandler._main_loop = loop
+        BinanceFuturesApiHandler._market_async_queue = asyncio.Queue()
+        BinanceFuturesApiHandler._market_conflator.attach(loop)
 
     @staticmethod
     def market_websocket_process_new_msg(message):
         try:
-            BinanceFuturesApiHandler._market_message_queue.put(message)
+            if BinanceFuturesApiHandler._is_shutdown:
+                return
+
+            recorder = BinanceFuturesApiHandler._market_recorder
+            if recorder is not None:
+                recorder.put_frame(message)
+
+            if BinanceFuturesApiHandler._market_bridge_mode == "asyncio" and BinanceFuturesApiHandler._main_loop is not None:
+                BinanceFuturesApiHandler._main_loop.call_soon_threadsafe(BinanceFuturesApiHandler._market_async_queue.put_nowait, message)
+            elif BinanceFuturesApiHandler._market_bridge_mode == "conflate" and BinanceFuturesApiHandler._main_loop is not None:
+                BinanceFuturesApiHandler._market_conflator.put_frame(message)
+            else:
+                BinanceFuturesApiHandler._market_message_queue.put(message)
         except Exception as e:
             handle_exception(BinanceFuturesApiHandler._logger, e)
 
@@ -119,51 +265,169 @@ class BinanceFuturesApiHandler(Client):
             loop = asyncio.get_running_loop()
             running_tasks = []
             while True:
-                message = await loop.run_in_executor(None, BinanceFuturesApiHandler.get_new_market_websocket_message)
+                if BinanceFuturesApiHandler._market_bridge_mode == "conflate" and BinanceFuturesApiHandler._main_loop is not None:
+                    latest_prices = await BinanceFuturesApiHandler._market_conflator.take()
+                    running_tasks = BinanceFuturesApiHandler.process_conflated_prices(latest_prices, running_tasks)
+                    continue
+
+                if BinanceFuturesApiHandler._market_bridge_mode == "asyncio" and BinanceFuturesApiHandler._market_async_queue is not None:
+                    message = await BinanceFuturesApiHandler._market_async_queue.get()
+                else:
+                    message = await loop.run_in_executor(None, BinanceFuturesApiHandler.get_new_market_websocket_message)
+
                 if message is None:
                     if BinanceFuturesApiHandler._is_shutdown:
                         return
                     else:
                         continue
-                running_tasks = clean_finished_tasks(running_tasks)
-                msg_data = message.get("data")
-                if msg_data is None or not isinstance(msg_data, list) or msg_data[0].get("e") != "markPriceUpdate":
-                    BinanceFuturesApiHandler._logger.debug(compose_log_msg(getframeinfo(currentframe()),
-                                                      f"Got not futures ticker update message: {message}"))
-                    continue
-
-                if BinanceFuturesApiHandler._should_skip_price_update_msg:
-                    continue
+                running_tasks = BinanceFuturesApiHandler.process_market_message(message, running_tasks)
+        except Exception as e:
+            handle_exception(BinanceFuturesApiHandler._logger, e)
 
-                for symbol_data in msg_data:
-                    symbol = symbol_data["s"]
-                    last_price = float(symbol_data["p"])
-                    BinanceFuturesApiHandler._current_prices[symbol] = last_price
+    @staticmethod
+    def process_market_message(message, running_tasks):
+        try:
+            running_tasks = clean_finished_tasks(running_tasks)
+            msg_data = message.get("data")
+            if isinstance(msg_data, dict):  # single symbol stream of a combined connection
+                msg_data = [msg_data]
+            if msg_data is None or not isinstance(msg_data, list) or msg_data[0].get("e") != "markPriceUpdate":
+                BinanceFuturesApiHandler._logger.debug(compose_log_msg(getframeinfo(currentframe()),
+                                                  f"Got not futures ticker update message: {message}"))
+                return running_tasks
+
+            if BinanceFuturesApiHandler._should_skip_price_update_msg:
+                return running_tasks
+
+            for symbol_data in msg_data:
+                symbol = symbol_data["s"]
+                last_price = float(symbol_data["p"])
+                BinanceFuturesApiHandler.dispatch_price_update(symbol, last_price, running_tasks)
+
+            BinanceFuturesApiHandler.dispatch_update_finished(running_tasks)
+            return running_tasks
+        except Exception as e:
+            handle_exception(BinanceFuturesApiHandler._logger, e)
+            return running_tasks
 
-                    symbol_price_update_callbacks = BinanceFuturesApiHandler._on_price_update_callbacks.get(symbol)
+    @staticmethod
+    def process_conflated_prices(latest_prices, running_tasks):
+        try:
+            running_tasks = clean_finished_tasks(running_tasks)
+            if BinanceFuturesApiHandler._should_skip_price_update_msg:
+                return running_tasks
 
-                    if symbol_price_update_callbacks is not None:
-                        for key in symbol_price_update_callbacks:
-                            callback_data = symbol_price_update_callbacks[key]
-                            func_to_call = callback_data[0]
-                            task = asyncio.create_task(func_to_call(callback_data[1], last_price))
-                            running_tasks.append(task)
+            for symbol in latest_prices:
+                BinanceFuturesApiHandler.dispatch_price_update(symbol, float(latest_prices[symbol]), running_tasks)
 
-                price_update_over_callbacks = BinanceFuturesApiHandler._on_price_update_callbacks["update_finished"]
-                if price_update_over_callbacks is not None:
-                    for key in price_update_over_callbacks:
-                        callback_data = price_update_over_callbacks[key]
-                        func_to_call = callback_data[0]
-                        task = asyncio.create_task(func_to_call(callback_data[1], BinanceFuturesApiHandler._current_prices))
-                        running_tasks.append(task)
+            BinanceFuturesApiHandler.dispatch_update_finished(running_tasks)
+            return running_tasks
         except Exception as e:
             handle_exception(BinanceFuturesApiHandler._logger, e)
+            return running_tasks
 
-    def load_exchange_assets_info(self):
+    @staticmethod
+    def get_market_data_stats():
+        stats = {
+            "bridge_mode": BinanceFuturesApiHandler._market_bridge_mode,
+            "executor_queue_depth": BinanceFuturesApiHandler._market_message_queue.qsize(),
+            "asyncio_queue_depth": BinanceFuturesApiHandler._market_async_queue.qsize() if BinanceFuturesApiHandler._market_async_queue is not None else 0,
+            "conflation": BinanceFuturesApiHandler._market_conflator.get_stats(),
+            "recorder": BinanceFuturesApiHandler._market_recorder.get_stats() if BinanceFuturesApiHandler._market_recorder is not None else None,
+            "shared_price_table": BinanceFuturesApiHandler._shared_market_data.get_stats() if BinanceFuturesApiHandler._shared_market_data is not None else None
+        }
+        return stats
+
+    @staticmethod
+    def start_market_recording(path):
+        BinanceFuturesApiHandler.stop_market_recording()
+        recorder = MarketDataRecorder(path, logger=BinanceFuturesApiHandler._logger)
+        recorder.start()
+        BinanceFuturesApiHandler._market_recorder = recorder
+        BinanceFuturesApiHandler._logger.info(compose_log_msg(getframeinfo(currentframe()), f"Market data recording to {path}"))
+
+    @staticmethod
+    def stop_market_recording():
+        recorder = BinanceFuturesApiHandler._market_recorder
+        if recorder is None:
+            return
+        BinanceFuturesApiHandler._market_recorder = None
+        recorder.stop()
+        BinanceFuturesApiHandler._logger.info(compose_log_msg(getframeinfo(currentframe()), f"Market data recording stopped: {recorder.get_stats()}"))
+
+    @staticmethod
+    async def replay_market_data(path, speed=1.0):
+        """
+        Feeds recorded mark prices to price update callbacks as market ws frames would.
+        speed - 1.0 recorded pace, 10 - ten times faster, None - as fast as callbacks take them.
+        Live frames should be switched off meanwhile (SWITCH PRICE SOURCE cmd)
+        """
+        reader = MarketDataReader(path)
+        running_tasks = []
+        frames_num = 0
+        started = time.perf_counter()
+        try:
+            first_received_ns = None
+            frame_received_ns = None
+            for symbol, event_ms, received_ns, price in reader.iter_records():
+                if received_ns != frame_received_ns:
+                    if frame_received_ns is not None:
+                        BinanceFuturesApiHandler.dispatch_update_finished(running_tasks)
+                    frame_received_ns = received_ns
+                    frames_num += 1
+                    if first_received_ns is None:
+                        first_received_ns = received_ns
+
+                    delay = 0
+                    if speed:
+                        delay = (received_ns - first_received_ns) / 1e9 / speed - (time.perf_counter() - started)
+                    await asyncio.sleep(max(delay, 0))  # price update tasks of the previous frame run meanwhile
+                    running_tasks = clean_finished_tasks(running_tasks)
+
+                BinanceFuturesApiHandler.dispatch_price_update(symbol, price, running_tasks)
+
+            if frame_received_ns is not None:
+                BinanceFuturesApiHandler.dispatch_update_finished(running_tasks)
+            if len(running_tasks) != 0:
+                await asyncio.wait(running_tasks)
+        finally:
+            reader.close()
+        return {"frames": frames_num, "records": reader.records_num, "elapsed_s": round(time.perf_counter() - started, 3)}
+
+    @staticmethod
+    def dispatch_price_update(symbol, last_price, running_tasks):
+        BinanceFuturesApiHandler._current_prices[symbol] = last_price
+
+        symbol_price_update_callbacks = BinanceFuturesApiHandler._on_price_update_callbacks.get(symbol)
+
+        if symbol_price_update_callbacks is not None:
+            keys = symbol_price_update_callbacks
+            trigger_index = BinanceFuturesApiHandler._price_trigger_indexes.get(symbol)
+            if trigger_index is not None and BinanceFuturesApiHandler._use_price_trigger_index:
+                keys = trigger_index.get_woken(last_price)
+
+            for key in keys:
+                callback_data = symbol_price_update_callbacks.get(key)
+                if callback_data is None:
+                    continue
+                func_to_call = callback_data[0]
+                task = asyncio.create_task(func_to_call(callback_data[1], last_price))
+                running_tasks.append(task)
+
+    @staticmethod
+    def dispatch_update_finished(running_tasks):
+        price_update_over_callbacks = BinanceFuturesApiHandler._on_price_update_callbacks["update_finished"]
+        if price_update_over_callbacks is not None:
+            for key in price_update_over_callbacks:
+                callback_data = price_update_over_callbacks[key]
+                func_to_call = callback_data[0]
+                task = asyncio.create_task(func_to_call(callback_data[1], BinanceFuturesApiHandler._current_prices))
+                running_tasks.append(task)
+
+    @staticmethod
+    def parse_exchange_info(exchange_info):
         """
-        Fills dicts of
-            symbols_data:dict
-            assets_precision:dict
+        Returns (symbols_data:dict, assets_precision:dict) from futures_exchange_info() response
 
         symbols_data include:
             lot_size_step;
@@ -182,71 +446,202 @@ class BinanceFuturesApiHandler(Client):
         assets_precision is dict include
             asset:significant_digits_num  - example: ETH:8 (valuable digits)
         """
-        try:
-            symbols_information = self.futures_exchange_info()
-            assets_precision = {}
-            symbols_data = {}
-            symbols_information = symbols_information["symbols"]
+        assets_precision = {}
+        symbols_data = {}
+        symbols_information = exchange_info["symbols"]
+
+        for symbol_data in symbols_information:
+            symbol = symbol_data['symbol']
+            base_asset = symbol_data['baseAsset']
+            base_asset_precision = symbol_data['baseAssetPrecision']
+            quote_asset = symbol_data['quoteAsset']
+            quote_asset_precision = symbol_data['quotePrecision']
+
+            if assets_precision.get(base_asset) is None:
+                assets_precision[base_asset] = base_asset_precision
+
+            if assets_precision.get(quote_asset) is None:
+                assets_precision[quote_asset] = quote_asset_precision
+
+            data = {}
+            filter_information = symbol_data["filters"]
+
+            for filter in filter_information:
+                if filter["filterType"] == "LOT_SIZE":
+                    data['lot_size_step'] = filter["stepSize"]
+                    data['min_lot_size'] = filter["minQty"]  # min base in order
+                    data['max_lot_size'] = filter["maxQty"]
+                elif filter["filterType"] == "PRICE_FILTER":
+                    data['price_tick'] = filter["tickSize"]
+                elif filter["filterType"] == "MIN_NOTIONAL":
+                    data['min_notional'] = filter["notional"]  # min quote in order: price * quantity >= minNotional
+
+            data['base'] = base_asset
+            data['quote'] = quote_asset
+
+            symbols_data[symbol] = data
+        return symbols_data, assets_precision
 
-            for symbol_data in symbols_information:
-                symbol = symbol_data['symbol']
-                base_asset = symbol_data['baseAsset']
-                base_asset_precision = symbol_data['baseAssetPrecision']
-                quote_asset = symbol_data['quoteAsset']
-                quote_asset_precision = symbol_data['quotePrecision']
+    @classmethod
+    def apply_exchange_assets_info(cls, symbols_data, assets_precision):
+        """
+        Swaps symbol tables at once - readers see either the old or the new table, never a half filled one.
+        symbol_quantizers - symbol:SymbolQuantizer used by apply_price_precision / apply_amount_precision
+        """
+        symbol_quantizers = {}
+        for symbol, data in symbols_data.items():
+            quantizer = SymbolQuantizer.from_symbol_data(symbol, data)
+            if quantizer is not None:
+                symbol_quantizers[symbol] = quantizer
+
+        added_symbols = set(symbols_data) - set(BinanceFuturesApiHandler._symbols_data)
+        BinanceFuturesApiHandler._symbols_data = symbols_data
+        BinanceFuturesApiHandler._symbol_quantizers = symbol_quantizers
+        BinanceFuturesApiHandler._assets_precision = assets_precision
+        return added_symbols
 
-                if assets_precision.get(base_asset) is None:
-                    assets_precision[base_asset] = base_asset_precision
+    def load_exchange_assets_info(self):
+        """Downloads exchangeInfo, swaps symbol tables if content changed and saves it to exchange info cache"""
+        try:
+            exchange_info = self.futures_exchange_info()
+            symbols_data, assets_precision = BinanceFuturesApiHandler.parse_exchange_info(exchange_info)
+            BinanceFuturesApiHandler._exchange_info_loaded_at = time.time()
+
+            cache = BinanceFuturesApiHandler._exchange_info_cache
+            fingerprint = cache.compute_fingerprint(symbols_data, assets_precision)
+            if cache.is_changed(fingerprint) or len(BinanceFuturesApiHandler._symbols_data) == 0:
+                added_symbols = BinanceFuturesApiHandler.apply_exchange_assets_info(symbols_data, assets_precision)
+                if cache.fingerprint is not None and len(added_symbols) != 0:
+                    self.logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                                     f"Exchange info refreshed, new symbols: {sorted(added_symbols)}"))
+            if type(self)._use_exchange_info_cache:
+                cache.save(symbols_data, assets_precision, fingerprint)
+            else:
+                cache.fingerprint = fingerprint
+        except Exception as e:
+            handle_exception(self.logger, e)
 
-                if assets_precision.get(quote_asset) is None:
-                    assets_precision[quote_asset] = quote_asset_precision
+    def load_cached_exchange_assets_info(self):
+        """Returns True if symbol tables are taken from exchange info cache"""
+        try:
+            if not type(self)._use_exchange_info_cache:
+                return False
+            cached = BinanceFuturesApiHandler._exchange_info_cache.load()
+            if cached is None:
+                return False
+            BinanceFuturesApiHandler.apply_exchange_assets_info(*cached)
+            BinanceFuturesApiHandler._exchange_info_loaded_at = BinanceFuturesApiHandler._exchange_info_cache.saved_at
+            self.logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                             f"Exchange info loaded from cache, {len(cached[0])} symbols"))
+            return True
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return False
 
-                data = {}
-                filter_information = symbol_data["filters"]
+    @classmethod
+    def get_live_handler(cls):
+        """Handler of an account that is not retired, process-wide requests are sent with it; None if there is none"""
+        for client in list(cls._server_clock.clients):
+            if isinstance(client, BinanceFuturesApiHandler) and not client.is_stopped:
+                return client
+        return None
 
-                for filter in filter_information:
-                    if filter["filterType"] == "LOT_SIZE":
-                        data['lot_size_step'] = filter["stepSize"]
-                        data['min_lot_size'] = filter["minQty"]  # min base in order
-                        data['max_lot_size'] = filter["maxQty"]
-                    elif filter["filterType"] == "PRICE_FILTER":
-                        data['price_tick'] = filter["tickSize"]
-                    elif filter["filterType"] == "MIN_NOTIONAL":
-                        data['min_notional'] = filter["notional"]  # min quote in order: price * quantity >= minNotional
+    @classmethod
+    async def exchange_info_refresher(cls):
+        """Background exchangeInfo refresh, so new listings appear without restart; sent by any live account"""
+        cache = BinanceFuturesApiHandler._exchange_info_cache
+        while not BinanceFuturesApiHandler._is_shutdown:
+            try:
+                if not cache.is_fresh() or \
+                        time.time() - BinanceFuturesApiHandler._exchange_info_loaded_at >= BinanceFuturesApiHandler._exchange_info_refresh_interval:
+                    handler = cls.get_live_handler()
+                    if handler is not None:
+                        await asyncio.get_running_loop().run_in_executor(None, handler.load_exchange_assets_info)
+                await asyncio.sleep(BinanceFuturesApiHandler._exchange_info_check_interval)
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                handle_exception(cls._logger, e)
+                await asyncio.sleep(BinanceFuturesApiHandler._exchange_info_check_interval)
 
-                data['base'] = base_asset
-                data['quote'] = quote_asset
+    async def measure_server_clock(self):
+        server_clock = type(self)._server_clock
+        if self.rest_transport is not None:
+            return await server_clock.measure_async(self.rest_transport.futures_time)
+        return await asyncio.get_running_loop().run_in_executor(None, server_clock.measure, self.futures_time)
 
-                symbols_data[symbol] = data
-            type(self)._symbols_data = symbols_data
-            type(self)._assets_precision = assets_precision
-        except Exception as e:
-            handle_exception(self.logger, e)
+    @classmethod
+    async def server_clock_syncer(cls):
+        """Background server time sampling, keeps timestamps of signed requests within recvWindow; sampled by any live account"""
+        server_clock = cls._server_clock
+        while not BinanceFuturesApiHandler._is_shutdown:
+            try:
+                handler = cls.get_live_handler()
+                if handler is None:
+                    await server_clock.wait_next_sync(timeout=min(server_clock.sync_interval, 5))
+                    continue
+                samples = [await handler.measure_server_clock() for i in range(server_clock.samples_per_sync)]
+                server_clock.update(samples)
+                await server_clock.wait_next_sync()
+            except asyncio.CancelledError:
+                return
+            except Exception as e:
+                handle_exception(cls._logger, e)
+                server_clock.sync_failures += 1
+                await server_clock.wait_next_sync(timeout=min(server_clock.sync_interval, 5))
 
-    def subscribe_for_price_update(self, symbol, callback: list):
-        """Sub to 'update_finished' for all symbols data"""
+    def get_server_clock_stats(self):
+        return type(self)._server_clock.get_stats()
+
+    def subscribe_for_price_update(self, symbol, callback: list, price_band=None):
+        """Sub to 'update_finished' for all symbols data
+           price_band - (lower, upper) - callback is called only when price <= lower or price >= upper,
+                        None - on every price update; see update_price_trigger_band"""
         try:
             callback_id = generate_id(10)
-            symbol = symbol.upper()
+            symbol = symbol.upper() if symbol != "update_finished" else symbol
             callbacks_data = type(self)._on_price_update_callbacks.get(symbol)
             if callbacks_data is None:
                 type(self)._on_price_update_callbacks[symbol] = {callback_id: callback}
             else:
                 callbacks_data[callback_id] = callback
+
+            if symbol == "update_finished":
+                type(self)._market_subscriptions.set_full_market_required(True)
+            else:
+                type(self)._market_subscriptions.add_symbol(symbol)
+                trigger_index = type(self)._price_trigger_indexes.get(symbol)
+                if trigger_index is None:
+                    trigger_index = PriceTriggerIndex()
+                    type(self)._price_trigger_indexes[symbol] = trigger_index
+                if price_band is None:
+                    trigger_index.set_band(callback_id)
+                else:
+                    trigger_index.set_band(callback_id, price_band[0], price_band[1])
             return callback_id
         except Exception as e:
             handle_exception(self.logger, e)
 
     def unsubscribe_from_price_update(self, symbol, callback_id):
         try:
-            symbol = symbol.upper()
+            symbol = symbol.upper() if symbol != "update_finished" else symbol
             callbacks_data = type(self)._on_price_update_callbacks.get(symbol)
             if callbacks_data is not None:
                 callback = callbacks_data.get(callback_id)
                 if callback is not None:
                     del callbacks_data[callback_id]
-                    if len(callbacks_data) == 0:
-                        del type(self)._on_price_update_callbacks[symbol]
+                    if symbol == "update_finished":
+                        type(self)._market_subscriptions.set_full_market_required(len(callbacks_data) != 0)
+                    else:
+                        trigger_index = type(self)._price_trigger_indexes.get(symbol)
+                        if trigger_index is not None:
+                            trigger_index.remove(callback_id)
+                        is_symbol_dropped = type(self)._market_subscriptions.remove_symbol(symbol)
+                        if is_symbol_dropped and not type(self)._market_subscriptions.is_firehose_needed():
+                            type(self)._current_prices.pop(symbol, None)  # would not be updated anymore
+                        if len(callbacks_data) == 0:
+                            del type(self)._on_price_update_callbacks[symbol]
+                            type(self)._price_trigger_indexes.pop(symbol, None)
                 else:
                     self.logger.error(compose_log_msg(getframeinfo(currentframe()),
                                                       f"Unsubscribe price update - no callback for symbol {symbol} with provided id: {callback_id}, {callbacks_data}"))
@@ -256,6 +651,27 @@ class BinanceFuturesApiHandler(Client):
         except Exception as e:
             handle_exception(self.logger, e)
 
+    def update_price_trigger_band(self, symbol, callback_id, lower, upper):
+        """Callback will be called only when price <= lower or price >= upper; None - no such limit"""
+        try:
+            trigger_index = type(self)._price_trigger_indexes.get(symbol.upper())
+            if trigger_index is None or callback_id not in trigger_index.bands:
+                return
+            trigger_index.set_band(callback_id, lower, upper)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def get_trailing_stop_engine(self, symbol):
+        """None if trailing stops should subscribe for price updates one by one"""
+        if not type(self)._use_trailing_stop_engine:
+            return None
+        symbol = symbol.upper()
+        engine = BinanceFuturesApiHandler._trailing_stop_engines.get(symbol)
+        if engine is None:
+            engine = TrailingStopEngine(self, symbol)
+            BinanceFuturesApiHandler._trailing_stop_engines[symbol] = engine
+        return engine
+
     def calculate_quantity(self, symbol, quote_amount, price=None):
         try:
             if price is None:
@@ -272,31 +688,13 @@ class BinanceFuturesApiHandler(Client):
     def apply_price_precision(self, symbol, price):
         try:
             symbol = symbol.upper()
-            data = type(self)._symbols_data.get(symbol)
-            if data is None:
+            quantizer = type(self)._symbol_quantizers.get(symbol)
+            if quantizer is None:
                 self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                  f"Get precision - no data for symbol: {symbol}"))
+                                                  f"Get price precision - no precision data for symbol: {symbol}"))
                 return price
 
-            precision = data.get('price_tick')
-            if precision is None:
-                self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                  f"Get price precision - no data for symbol: {symbol} has no precision: {data}"))
-                return price
-
-            if float(precision) < 1:
-                digits_num_after_comma_allowed = len(precision.strip("0")) - 1
-                str_price = str(price)
-                if "." in str_price:
-                    price_digits_after_comma_num = len(str_price.split(".")[1])
-                    delta = price_digits_after_comma_num - digits_num_after_comma_allowed
-                    if delta > 0:
-                        str_price = str_price[:-delta]
-
-                return str_price
-            else:
-                return str(int(int(round(float(price) / float(precision), ROUND_PRECISION)) * round(float(precision),
-                                                                                                    ROUND_PRECISION)))
+            return quantizer.price(price)
         except Exception as e:
             handle_exception(self.logger, e)
             return price
@@ -304,43 +702,47 @@ class BinanceFuturesApiHandler(Client):
     def apply_amount_precision(self, symbol, amount, is_base=True):
         try:
             symbol = symbol.upper()
-            data = type(self)._symbols_data.get(symbol)
-            if data is None:
+            quantizer = type(self)._symbol_quantizers.get(symbol)
+            if quantizer is None:
                 self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                  f"Get amount precision - no data for symbol: {symbol}"))
+                                                  f"Get amount precision - no precision data for symbol: {symbol}"))
                 return amount
 
-            precision = None
             if is_base:
-                precision = data.get('lot_size_step')
-            else:
-                precision = data.get('price_tick')
-
-            if precision is None:
-                self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                  f"Get precision = None amount precision - no data for symbol: {symbol} has no precision: {data}"))
-                return amount
-
-            if float(precision) < 1:
-                digits_num_after_comma_allowed = len(precision.strip("0")) - 1
-                str_amount = str(amount)
-                if "." in str_amount:
-                    amount_digits_after_comma_num = len(str_amount.split(".")[1])
-                    delta = amount_digits_after_comma_num - digits_num_after_comma_allowed
-                    if delta > 0:
-                        str_amount = str_amount[:-delta]
-                return str_amount
-            else:
-                return str(int(int(round(float(amount) / float(precision), ROUND_PRECISION)) * round(float(precision),
-                                                                                                     ROUND_PRECISION)))
+                return quantizer.amount(amount)
+            return quantizer.price(amount)
         except Exception as e:
             handle_exception(self.logger, e)
             return amount
 
+    def get_streamed_price(self, symbol):
+        """Latest price of the market stream, read from the shared table in a worker process"""
+        shared_market_data = type(self)._shared_market_data
+        if shared_market_data is not None:
+            return shared_market_data.get_price(symbol)
+        return type(self)._current_prices.get(symbol)
+
     def get_current_price(self, symbol):
         try:
             symbol = symbol.upper()
-            return type(self)._current_prices.get(symbol)
+            price = self.get_streamed_price(symbol)
+            if price is None and not type(self)._market_subscriptions.is_symbol_streamed(symbol):
+                price = float(self.futures_mark_price(symbol=symbol)["markPrice"])  # symbol is not streamed, ask exchange
+            return price
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def get_current_price_async(self, symbol):
+        try:
+            symbol = symbol.upper()
+            price = self.get_streamed_price(symbol)
+            if price is None and not type(self)._market_subscriptions.is_symbol_streamed(symbol):
+                if self.rest_transport is not None:
+                    price = float((await self.rest_transport.futures_mark_price(symbol=symbol))["markPrice"])
+                else:
+                    loop = asyncio.get_running_loop()
+                    price = await loop.run_in_executor(None, self.get_current_price, symbol)
+            return price
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -364,7 +766,7 @@ class BinanceFuturesApiHandler(Client):
             print("Launching new futures account ws connection")
             self.logger.debug(compose_log_msg(getframeinfo(currentframe()),
                                               f"Launching new futures account ws connection"))
-            ws_manager = ThreadedWebsocketManager(api_key=self.API_KEY, api_secret=self.API_SECRET)
+            ws_manager = type(self)._ws_manager_factory(api_key=self.API_KEY, api_secret=self.API_SECRET)
             ws_manager.daemon = True
             ws_manager.start()
             ws_manager.start_futures_socket(callback=self.account_websocket_process_new_msg)
@@ -386,6 +788,9 @@ class BinanceFuturesApiHandler(Client):
                 ws_to_drop = []
                 cleaned_ws = []
                 time_now = int(time.time())
+                is_stopping = type(self)._is_shutdown or self.is_stopped
+                is_rotating = self.is_account_ws_rotation_requested
+                self.is_account_ws_rotation_requested = False
 
                 for ws in self.account_ws_clients:
                     if not ws.is_alive():
@@ -401,41 +806,48 @@ class BinanceFuturesApiHandler(Client):
                                                           f"Dropping ws account connection - regular update"))
                         ws_to_drop.append(ws)
                         last_dropped_ts = time_now
-                    elif type(self)._is_shutdown:
+                    elif is_stopping:
                         print("Drop ws due shutdown")
                         self.logger.debug(compose_log_msg(getframeinfo(currentframe()), "Drop ws due to shutdown"))
                         ws_to_drop.append(ws)
+                    elif is_rotating:
+                        self.logger.info(compose_log_msg(getframeinfo(currentframe()), "Reconnecting account ws with rotated API key"))
+                        ws_to_drop.append(ws)
                     else:
                         cleaned_ws.append(ws)
 
                 self.account_ws_clients = cleaned_ws
                 for ws in ws_to_drop:
-                    if not type(self)._is_shutdown:
+                    if not is_stopping:
                         print("Creating new account WS handler due to drop")
-                        cleaned_ws.append(self.launch_account_websocket())
+                        cleaned_ws.append(self.launch_account_websocket())  # new one is up before the old one stops
                     ws.stop()
 
                 dropped_ws_count = len(ws_to_drop)
                 ws_to_drop.clear()
 
-                if type(self)._is_shutdown:
+                if is_stopping:
                     print("Futures Api handler run account updates shutdown")
                     return
 
-                time.sleep(10)
+                self.account_ws_wakeup.wait(10)
+                self.account_ws_wakeup.clear()
                 if dropped_ws_count:
                     gc.collect()
                     dropped_ws_count = 0
 
             except Exception as e:
-                if type(self)._is_shutdown:
+                if type(self)._is_shutdown or self.is_stopped:
                     return
                 handle_exception(self.logger, e)
 
     def account_websocket_process_new_msg(self, message):
         try:
             print(f"New msg: {message}")
-            self.account_message_queue.put(message)
+            if self.account_loop is not None:
+                self.account_loop.call_soon_threadsafe(self.account_async_queue.put_nowait, message)
+            else:
+                self.account_message_queue.put(message)
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -457,140 +869,127 @@ class BinanceFuturesApiHandler(Client):
         except Exception as e:
             handle_exception(self.logger, e)
 
-        running_tasks = []
         while True:
             try:
                 self.logger.info(compose_log_msg(getframeinfo(currentframe()), "Wait futures WS account update msg"))
 
-                message = await loop.run_in_executor(None, BinanceFuturesApiHandler.get_new_account_websocket_message, self)
+                if self.account_async_queue is not None:
+                    message = await self.account_async_queue.get()  # no executor thread held per account
+                else:
+                    message = await loop.run_in_executor(None, BinanceFuturesApiHandler.get_new_account_websocket_message, self)
                 if message is None:
                     if not BinanceFuturesApiHandler._is_shutdown:
                         continue
                     else:
                         return
 
-                transaction_timestamp = message.get("T") #transaction time - time that the data (e.g. account, order related) got updated
-                event_timestamp = message.get("E") #event time - represents the time a certain data was pushed out from the server
+                self.process_account_message(message)
+            except Exception as e:
+                if type(self)._is_shutdown:
+                    return
+                handle_exception(self.logger, e)
 
-                try:
-                    del message["E"]
-                except:
-                    self.logger.error(f"(Not a real error) No transaction timestamp for msg {message}")
-
-                event_type = message.get("e")
-                parsed_msg = message
-                if event_type == "ORDER_TRADE_UPDATE":
-                    order_info = message.get("o")
-                    parsed_msg = {
-                        "event_type": event_type,
-                        "timestamp": transaction_timestamp,
-                        "symbol": order_info.get("s"),
-                        "exchange_order_id": order_info.get("i"),
-                        "client_order_id": order_info.get("c"),
-                        "side": order_info.get("S"),
-                        "position_side": order_info.get("ps"),
-                        "order_type": order_info.get("o"),
-                        "quantity": order_info.get("q"),
-                        "action_price": order_info.get("p"),
-                        "trigger_price": order_info.get("sp"),
-                        "avg_price": order_info.get("ap"),
-                        "order_status": order_info.get("X"),
-                        "total_filled": order_info.get("z"),
-                        "is_repay": order_info.get("R")  # absent for margin and in hedge mode
-                    }
-
-                if not self.filter_account_msg(parsed_msg):
-                    continue
+    def process_account_message(self, message):
+        """Parses account ws message and posts it to subscribed handlers, main loop only"""
+        try:
+            transaction_timestamp = message.get("T") #transaction time - time that the data (e.g. account, order related) got updated
+            event_timestamp = message.get("E") #event time - represents the time a certain data was pushed out from the server
 
-                #did not append b4 cause of get_order_info - there is no such info in it
-                if event_type == "ORDER_TRADE_UPDATE":
-                    parsed_msg["commission_asset"] = order_info.get("N")
-                    parsed_msg["commission"] = order_info.get("n")
+            try:
+                del message["E"]
+            except:
+                self.logger.error(f"(Not a real error) No transaction timestamp for msg {message}")
+
+            event_type = message.get("e")
+            parsed_msg = message
+            if event_type == "ORDER_TRADE_UPDATE":
+                order_info = message.get("o")
+                parsed_msg = {
+                    "event_type": event_type,
+                    "timestamp": transaction_timestamp,
+                    "symbol": order_info.get("s"),
+                    "exchange_order_id": order_info.get("i"),
+                    "client_order_id": order_info.get("c"),
+                    "side": order_info.get("S"),
+                    "position_side": order_info.get("ps"),
+                    "order_type": order_info.get("o"),
+                    "quantity": order_info.get("q"),
+                    "action_price": order_info.get("p"),
+                    "trigger_price": order_info.get("sp"),
+                    "avg_price": order_info.get("ap"),
+                    "order_status": order_info.get("X"),
+                    "total_filled": order_info.get("z"),
+                    "is_repay": order_info.get("R")  # absent for margin and in hedge mode
+                }
+
+            if not self.filter_account_msg(parsed_msg):
+                return
 
-                self.logger.debug(compose_log_msg(getframeinfo(currentframe()),
-                                                  f"Got new WS futures upd: {message}"))
+            #did not append b4 cause of get_order_info - there is no such info in it
+            if event_type == "ORDER_TRADE_UPDATE":
+                parsed_msg["commission_asset"] = order_info.get("N")
+                parsed_msg["commission"] = order_info.get("n")
 
-                running_tasks = clean_finished_tasks(running_tasks)
+            self.logger.debug(compose_log_msg(getframeinfo(currentframe()),
+                                              f"Got new WS futures upd: {message}"))
 
-                if event_type is None:
-                    self.logger.error(f"Message had NO event type field: {message}")
+            if event_type is None:
+                self.logger.error(f"Message had NO event type field: {message}")
 
-                elif event_type == "ACCOUNT_UPDATE":
-                    callbacks = self.ws_account_updates_callbacks.get("accountUpdate")
-                    if len(callbacks) != 0:
-                        for elem in callbacks:
-                            func_to_call = elem[0]
-                            task = asyncio.create_task(func_to_call(elem[1], message))
-                            running_tasks.append(task)
-                    else:
-                        self.logger.debug(
-                            compose_log_msg(getframeinfo(currentframe()), "No callbacks on accountUpdate"))
-
-                elif event_type == "ORDER_TRADE_UPDATE":
-                    order_update_callbacks = self.ws_account_updates_callbacks.get("orderUpdate")
-                    order_id = parsed_msg.get("client_order_id")
-
-                    if len(order_update_callbacks) != 0:
-                        callback_data = order_update_callbacks.get(order_id)
-                        if callback_data is None:
-                            self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
-                                                                f"No handler for order update: {message}"))
-                        else:
-                            func_to_call = callback_data[0]
-                            task = asyncio.create_task(func_to_call(callback_data[1], parsed_msg))
-                            running_tasks.append(task)
+            elif event_type == "ACCOUNT_UPDATE":
+                callbacks = self.ws_account_updates_callbacks.get("accountUpdate")
+                if len(callbacks) != 0:
+                    for elem in callbacks:
+                        self.order_update_mailbox.post(event_type, elem[0], elem[1], message)
+                else:
+                    self.logger.debug(
+                        compose_log_msg(getframeinfo(currentframe()), "No callbacks on accountUpdate"))
+
+            elif event_type == "ORDER_TRADE_UPDATE":
+                order_update_callbacks = self.ws_account_updates_callbacks.get("orderUpdate")
+                order_id = parsed_msg.get("client_order_id")
+
+                if len(order_update_callbacks) != 0:
+                    callback_data = order_update_callbacks.get(order_id)
+                    if callback_data is None:
+                        self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                                            f"No handler for order update: {message}"))
                     else:
-                        self.logger.debug(compose_log_msg(getframeinfo(currentframe()),
-                                                          f"No callbacks on 'executionReport' for order {order_id}"))
+                        self.order_update_mailbox.post(order_id, callback_data[0], callback_data[1], parsed_msg)
+                else:
+                    self.logger.debug(compose_log_msg(getframeinfo(currentframe()),
+                                                      f"No callbacks on 'executionReport' for order {order_id}"))
 
-                elif event_type == "ACCOUNT_CONFIG_UPDATE":
-                    leverage_update_callbacks = self.ws_account_updates_callbacks.get("leverageUpdate")
+                for callback in self.ws_account_updates_callbacks["orderStatus"]:  # every order update, e.g. to clients
+                    self.order_update_mailbox.post(order_id, callback[0], callback[1], parsed_msg)
 
-                    for callback in leverage_update_callbacks:
-                        func_to_call = callback[0]
-                        task = asyncio.create_task(func_to_call(callback[1], message))
-                        running_tasks.append(task)
-            except Exception as e:
-                if type(self)._is_shutdown:
-                    return
-                handle_exception(self.logger, e)
+            elif event_type == "ACCOUNT_CONFIG_UPDATE":
+                leverage_update_callbacks = self.ws_account_updates_callbacks.get("leverageUpdate")
 
-    def clean_msg_filter(self):
-        try:
-            successfully_acquired = self.filter_clean_mutex.acquire(False)
-            if successfully_acquired:
-                try:
-                    time_now = time.time()
-
-                    if len(self.account_message_filter) > 5000 or time_now - self.last_clean_msg_filter_timestamp > 300:  # 5 min
-                        self.last_clean_msg_filter_timestamp = time_now
-                        keys = list(self.account_message_filter.keys())
-                        for key in keys:
-                            if time_now - self.account_message_filter[key] > 500:
-                                del self.account_message_filter[key]
-                finally:
-                    self.filter_clean_mutex.release()
+                for callback in leverage_update_callbacks:
+                    self.order_update_mailbox.post(event_type, callback[0], callback[1], message)
         except Exception as e:
             handle_exception(self.logger, e)
 
-    def filter_account_msg(self, parsed_msg):
+    def filter_account_msg(self, parsed_msg, source="ws"):
+        """Returns True if the account update is new, False if it was already received from this source"""
         try:
-            self.clean_msg_filter()
-            msg_hash = hash(str(parsed_msg))
-            message_present = self.account_message_filter.get(msg_hash)
-            if message_present:  # 800 mil sec
-                print("Drop repeated msg")
-                if int(time.time()*1000) - int(message_present) < 0.8:
-                    self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
-                                                        f"Got similar upd message for order {parsed_msg.get('client_order_id')} since {time.time()*1000 - message_present} seconds after 1 such msg arrived : {parsed_msg}"))
-                return False
+            if self.account_message_filter.check_new(parsed_msg, source):
+                return True
 
-            timestamp = parsed_msg.get("timestamp") if parsed_msg.get("timestamp") else parsed_msg.get("T")
-            self.account_message_filter[msg_hash] = timestamp
-            return True
+            self.logger.debug(compose_log_msg(getframeinfo(currentframe()),
+                                              f"Drop repeated upd message for order {parsed_msg.get('client_order_id')}: {parsed_msg}"))
+            return False
         except Exception as e:
             handle_exception(self.logger, e)
 
+    def get_account_message_filter_stats(self):
+        return self.account_message_filter.get_stats()
+
+    def post_order_update(self, order_id, updates_handler, update_msg):
+        """Order update got not from account ws (REST response) - delivered in order with ws updates of this order"""
+        self.order_update_mailbox.post(order_id, updates_handler, update_msg)
+
     def subscribe_on_order_update(self, order_id, callback: list):
         try:
             callbacks_data = self.ws_account_updates_callbacks["orderUpdate"]
@@ -616,69 +1015,219 @@ class BinanceFuturesApiHandler(Client):
 
 
 
+    def build_order_parameters(self, symbol: str, side: str, order_type: str,
+                               base_amount=None, quote_amount=None, order_id: str = None, is_repay: bool = False,
+                               action_price=None, trigger_price=None, time_in_force: str = None, reference_price=None):
+        """
+        Returns (order_parameters, None) or (None, error_str)
+        order_type: MARKET | LIMIT | STOP_MARKET (STOP if action_price provided)
+        reference_price - price to calculate quantity of quote sized MARKET/STOP_MARKET orders, current price if None
+        """
+        symbol = symbol.upper()
+        side = side.upper()
+        reduce_only = "false"
+
+        if side != "SELL" and side != "BUY":
+            return None, f"Invalid side: {side}; Allowed: SELL | BUY"
+
+        if is_repay:
+            reduce_only = "true"
+
+        position_side = "SHORT" if (side == "BUY" and is_repay) or (side == "SELL" and not is_repay) else "LONG"
+        order_parameters = {
+            "symbol": symbol,
+            "side": side,
+            "type": order_type,
+            "positionSide": position_side if self.is_hedge else "BOTH",
+        }
+
+        if order_type == "LIMIT":
+            order_parameters["price"] = self.apply_price_precision(symbol, action_price)
+        elif order_type == "STOP_MARKET":
+            order_parameters["stopPrice"] = self.apply_price_precision(symbol, trigger_price)
+            if action_price is not None:
+                order_parameters["type"] = "STOP"
+                order_parameters["price"] = self.apply_price_precision(symbol, action_price)
+
+        if time_in_force is not None:
+            order_parameters["timeInForce"] = time_in_force
+
+        if not self.is_hedge:
+            order_parameters["reduceOnly"] = reduce_only
+
+        if base_amount is not None:
+            order_parameters["quantity"] = self.apply_amount_precision(symbol, base_amount)
+        elif quote_amount is not None:
+            price = action_price if action_price is not None else reference_price
+            order_parameters["quantity"] = self.calculate_quantity(symbol, quote_amount, price)
+        else:
+            return None, "Both Base and Quote order amount are None"
+
+        if order_id is not None:
+            order_parameters["newClientOrderId"] = order_id
+
+        return order_parameters, None
+
+    def trim_order_price(self, order_parameters):
+        """Drops the last digit of the order price after price filter error; False if there is nothing to trim"""
+        if order_parameters["type"] == "MARKET":
+            return False
+        price_key = "stopPrice" if "stopPrice" in order_parameters else "price"
+        current_price = order_parameters[price_key]
+        if "." not in current_price:
+            return False
+        if current_price[-2] != ".":
+            order_parameters[price_key] = current_price[:-1]
+        else:
+            order_parameters[price_key] = current_price[:-2]
+
+        if order_parameters["type"] == "STOP":
+            order_parameters["price"] = order_parameters["stopPrice"]
+        return True
+
+    def get_new_order_next_step(self, result, last_step, order_parameters, attempt, started_at, last_error, should_retry_on_failure,
+                                final_lookup=0):
+        """
+        Decides what send_new_order does after a placement ("place") or lookup ("look_up", "final_look_up") request.
+        Returns (next step, s to wait before it, error of the last placement); next step None - result is final.
+        Order which may have been placed (send status unknown, duplicate id) is looked up by newClientOrderId
+        and sent again only if exchange doesn't know it. When it is not retried anymore, it is looked up with
+        final lookups outside of the retry limits before it is reported failed.
+        final_lookup - final lookups made
+        """
+        error = ExchangeError.from_result(result)
+        if error is None:
+            self.retry_policy.on_success()
+            if last_step != "place":
+                self.retry_policy.on_lookup(True)
+                self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                                    f"Order {order_parameters.get('newClientOrderId')} was placed by previous attempt, not sent again"))
+            return None, 0, None
+
+        order_id = order_parameters.get("newClientOrderId")
+        immediate = False
+        if isinstance(error, TimestampError):
+            type(self)._server_clock.on_timestamp_error()  # resynced while the retry backs off
+        if last_step != "place" and isinstance(error, UnknownOrderError):
+            self.retry_policy.on_lookup(False)
+            if last_step == "final_look_up":
+                return None, 0, last_error
+            next_step, immediate = "place", True  # not placed - backoff was done before lookup
+        elif last_step != "place":
+            if not error.is_retryable:
+                return None, 0, last_error
+            if last_step == "final_look_up":
+                return self.get_final_lookup_step(order_id, final_lookup, last_error)
+            next_step, error = "look_up", last_error
+        else:
+            self.logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                              f"Order {order_id} failed to be placed: {error}; Attempt: {attempt}"))
+            may_be_placed = error.is_send_status_unknown or isinstance(error, DuplicateOrderIdError)
+            if not should_retry_on_failure:
+                return self.get_final_lookup_step(order_id, final_lookup, error) if may_be_placed else (None, 0, error)
+            if may_be_placed:
+                next_step, immediate = "look_up", isinstance(error, DuplicateOrderIdError)
+            elif isinstance(error, PriceFilterError) and self.trim_order_price(order_parameters):
+                next_step, immediate = "place", True
+            elif error.is_retryable:
+                next_step = "place"
+            else:
+                return None, 0, error
+
+        delay = self.retry_policy.get_retry_delay(attempt, started_at, immediate)
+        if delay is None:
+            self.logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                              f"Order {order_id} is not retried anymore after {attempt + 1} attempts: {error}"))
+            if next_step == "look_up":
+                return self.get_final_lookup_step(order_id, final_lookup, error)
+            return None, 0, error
+        return next_step, delay, error
+
+    def get_final_lookup_step(self, order_id, final_lookup, error):
+        """Final lookup of an order which may have been placed, see get_new_order_next_step"""
+        delay = self.retry_policy.get_final_lookup_delay(final_lookup)
+        if delay is None:
+            self.logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                              f"Order {order_id} may have been placed, {final_lookup} final lookups failed: {error}"))
+            return None, 0, error
+        if final_lookup == 0:
+            self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                                f"Order {order_id} may have been placed, looked up before it is reported failed"))
+        return "final_look_up", delay, error
+
+    def complete_order_request(self, result, should_filter_result=True):
+        """Returns (parsed_msg, filtered_result) for successful request or (raw result, None)"""
+        result_status = result.get("status") if isinstance(result, dict) else None
+        if result_status is None:
+            return result, None
+
+        parsed_msg = self.parse_order_update_msg(result)
+        if should_filter_result:
+            filtered_result = self.filter_account_msg(parsed_msg, "rest")
+            return parsed_msg, filtered_result
+        else:
+            return parsed_msg, None
+
+    def send_new_order(self, order_parameters, should_retry_on_failure=True, should_filter_result=True):
+        """Failed placement is retried by retry_policy; see get_new_order_next_step"""
+        order_parameters.setdefault("newClientOrderId", generate_id(22))  # retries can find the order by it
+        self.retry_policy.on_request()
+        started_at = self.retry_policy.clock()
+        attempt, step, error, final_lookup = 0, "place", None, 0
+        while True:
+            try:
+                if step == "place":
+                    result = self.futures_create_order(**order_parameters)
+                else:
+                    result = self.futures_get_order(symbol=order_parameters["symbol"], origClientOrderId=order_parameters["newClientOrderId"])
+            except Exception as e:
+                result = e
+
+            if step == "final_look_up":
+                final_lookup += 1
+            step, delay, error = self.get_new_order_next_step(result, step, order_parameters, attempt, started_at, error, should_retry_on_failure,
+                                                              final_lookup)
+            if step is None:
+                return self.complete_order_request(result if error is None else str(error), should_filter_result)
+            attempt += 1
+            if delay:
+                time.sleep(delay)
+
+    async def send_new_order_async(self, order_parameters, should_retry_on_failure=True, should_filter_result=True):
+        order_parameters.setdefault("newClientOrderId", generate_id(22))
+        self.retry_policy.on_request()
+        started_at = self.retry_policy.clock()
+        attempt, step, error, final_lookup = 0, "place", None, 0
+        while True:
+            try:
+                if step == "place":
+                    result = await self.rest_transport.futures_create_order(**order_parameters)
+                else:
+                    result = await self.rest_transport.futures_get_order(symbol=order_parameters["symbol"],
+                                                                         origClientOrderId=order_parameters["newClientOrderId"])
+            except Exception as e:
+                result = e
+
+            if step == "final_look_up":
+                final_lookup += 1
+            step, delay, error = self.get_new_order_next_step(result, step, order_parameters, attempt, started_at, error, should_retry_on_failure,
+                                                              final_lookup)
+            if step is None:
+                return self.complete_order_request(result if error is None else str(error), should_filter_result)
+            attempt += 1
+            if delay:
+                await asyncio.sleep(delay)
+
     def place_market_order(self, symbol: str, side: str,
                            base_amount=None, quote_amount=None,
                            order_id: str = None, is_repay: bool = False,
                            should_retry_on_failure=True, should_filter_result=True):
         try:
-            symbol = symbol.upper()
-            side = side.upper()
-            reduce_only = "false"
-
-            if side != "SELL" and side != "BUY":
-                return None, f"Invalid side: {side}; Allowed: SELL | BUY"
-
-            if is_repay:
-                reduce_only = "true"
-
-            position_side = "SHORT" if (side == "BUY" and is_repay) or (side == "SELL" and not is_repay) else "LONG"
-
-            order_parameters = {
-
-                "symbol": symbol,
-                "side": side,
-                "type": "MARKET",
-                "positionSide": position_side if self.is_hedge else "BOTH",
-            }
-
-            if not self.is_hedge:
-                order_parameters["reduceOnly"] = reduce_only
-
-            if base_amount is not None:
-                order_parameters["quantity"] = self.apply_amount_precision(symbol, base_amount)
-            elif quote_amount is not None:
-                order_parameters["quantity"] = self.calculate_quantity(symbol, quote_amount)
-            else:
-                return None, "Both Base and Quote order amount are None"
-
-            if order_id is not None:
-                order_parameters["newClientOrderId"] = order_id
-
-            retry_counter = -1
-            while retry_counter < self.max_retry_counter:
-                retry_counter += 1
-                try:
-                    result = self.futures_create_order(**order_parameters)
-                except Exception as e:
-                    handle_exception(self.logger, e)
-                    result = str(e)
-
-                if should_retry_on_failure:
-                    if "Connection aborted" in result or "-1021" in result:
-                        self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                       f"Order {order_parameters['newClientOrderId']} failed to be placed: {result}; Retry num: {retry_counter}"))
-                        continue
-
-                result_status = result.get("status") if isinstance(result, dict) else None
-                if result_status is None:
-                    return result, None
-
-                parsed_msg = self.parse_order_update_msg(result)
-                if should_filter_result:
-                    filtered_result = self.filter_account_msg(parsed_msg)
-                    return parsed_msg, filtered_result
-                else:
-                    return parsed_msg, None
+            order_parameters, error = self.build_order_parameters(symbol, side, "MARKET", base_amount, quote_amount,
+                                                                  order_id, is_repay)
+            if order_parameters is None:
+                return None, error
+            return self.send_new_order(order_parameters, should_retry_on_failure, should_filter_result)
         except Exception as e:
             handle_exception(self.logger, e)
             return str(e), None
@@ -689,79 +1238,12 @@ class BinanceFuturesApiHandler(Client):
                           is_repay: bool = False, should_retry_on_failure=True,
                           should_filter_result=True):
         try:
-            symbol = symbol.upper()
-            side = side.upper()
-            reduce_only = "false"
-
-            if side != "SELL" and side != "BUY":
-                return None, f"Invalid side: {side}; Allowed: SELL | BUY"
-
-            if is_repay:
-                reduce_only = "true"
-
-            position_side = "SHORT" if (side == "BUY" and is_repay) or (side == "SELL" and not is_repay) else "LONG"
-            order_parameters = {
-                "symbol": symbol,
-                "side": side,
-                "positionSide": position_side if self.is_hedge else "BOTH",
-                "price": self.apply_price_precision(symbol, action_price),
-                "type": "LIMIT",
-                "timeInForce": time_in_force
-            }
-
-            if not self.is_hedge:
-                order_parameters["reduceOnly"] = reduce_only
-
-            if base_amount is not None:
-                order_parameters["quantity"] = self.apply_amount_precision(symbol, base_amount)
-            elif quote_amount is not None:
-                order_parameters["quantity"] = self.calculate_quantity(symbol, quote_amount, action_price)
-            else:
-                return None, "Both Base and Quote order amount are None"
-
-            if order_id is not None:
-                order_parameters["newClientOrderId"] = order_id
-
-            retry_counter = -1
-            while retry_counter < self.max_retry_counter:
-                retry_counter += 1
-                try:
-                    result = self.futures_create_order(**order_parameters)
-                except Exception as e:
-                    handle_exception(self.logger, e)
-                    result = str(e)
-
-                if should_retry_on_failure:
-                    if "-4015" in result: #Client order id is not valid - probably order with such ID exists
-                        args = {"symbol": symbol, "client_order_id": order_id, "apply_msg_filter": False}
-                        result = self.get_order_info(**args)
-
-                    if "-4014" in result:
-                        self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                          f"Order {order_parameters['newClientOrderId']} failed to be placed: {result}; Retry num: {retry_counter}"))
-                        current_price = order_parameters["price"]
-                        if "." in current_price:
-                            if current_price[-2] != ".":
-                                order_parameters["price"] = current_price[:-1]
-                            else:
-                                order_parameters["price"] = current_price[:-2]
-                        continue
-                    elif "Connection aborted" in result or "-1021" in result:
-                        self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                          f"Order {order_parameters['newClientOrderId']} failed to be placed: {result}; Retry num: {retry_counter}"))
-                        continue
-
-                result_status = result.get("status") if isinstance(result, dict) else None
-                if result_status is None:
-                    return result, None
-
-                parsed_msg = self.parse_order_update_msg(result)
-                if should_filter_result:
-                    filtered_result = self.filter_account_msg(parsed_msg)
-                    return parsed_msg, filtered_result
-                else:
-                    return parsed_msg, None
-
+            order_parameters, error = self.build_order_parameters(symbol, side, "LIMIT", base_amount, quote_amount,
+                                                                  order_id, is_repay, action_price=action_price,
+                                                                  time_in_force=time_in_force)
+            if order_parameters is None:
+                return None, error
+            return self.send_new_order(order_parameters, should_retry_on_failure, should_filter_result)
         except Exception as e:
             handle_exception(self.logger, e)
             return str(e), None
@@ -772,85 +1254,85 @@ class BinanceFuturesApiHandler(Client):
                          is_repay: bool = False, should_retry_on_failure=True,
                          should_filter_result=True):
         try:
-            symbol = symbol.upper()
-            side = side.upper()
-            reduce_only = "false"
-
-            if side != "SELL" and side != "BUY":
-                return None, f"Invalid side: {side}; Allowed: SELL | BUY"
-
-            if is_repay:
-                reduce_only = "true"
-
-            position_side = "SHORT" if (side == "BUY" and is_repay) or (side == "SELL" and not is_repay) else "LONG"
-            order_parameters = {
-                "symbol": symbol,
-                "side": side,
-                "positionSide": position_side if self.is_hedge else "BOTH",
-                "stopPrice": self.apply_price_precision(symbol, trigger_price),
-                "type": "STOP_MARKET",
-                "timeInForce": time_in_force
-            }
-
-            if not self.is_hedge:
-                order_parameters["reduceOnly"] = reduce_only
-
-            if action_price is not None:
-                order_parameters["type"] = "STOP"
-                order_parameters["price"] = self.apply_price_precision(symbol, action_price)
-
-            if base_amount is not None:
-                order_parameters["quantity"] = self.apply_amount_precision(symbol, base_amount)
-            elif quote_amount is not None:
-                order_parameters["quantity"] = self.calculate_quantity(symbol, quote_amount, action_price)
-            else:
-                return None, "Both Base and Quote order amount are None"
-
-            if order_id is not None:
-                order_parameters["newClientOrderId"] = order_id
+            order_parameters, error = self.build_order_parameters(symbol, side, "STOP_MARKET", base_amount, quote_amount,
+                                                                  order_id, is_repay, action_price=action_price,
+                                                                  trigger_price=trigger_price, time_in_force=time_in_force)
+            if order_parameters is None:
+                return None, error
+            return self.send_new_order(order_parameters, should_retry_on_failure, should_filter_result)
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return str(e), None
 
-            retry_counter = -1
-            while retry_counter < self.max_retry_counter:
-                retry_counter += 1
-                try:
-                    result = self.futures_create_order(**order_parameters)
-                except Exception as e:
-                    handle_exception(self.logger, e)
-                    result = str(e)
-
-                if should_retry_on_failure:
-                    if "-4015" in result: #Client order id is not valid - probably order with such ID exists
-                        args = {"symbol": symbol, "client_order_id": order_id, "apply_msg_filter": False}
-                        result = self.get_order_info(**args)
-
-                    if "-4014" in result:
-                        self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                          f"Order {order_parameters['newClientOrderId']} failed to be placed: {result}; Retry num: {retry_counter}"))
-                        current_price = order_parameters["stopPrice"]
-                        if "." in current_price:
-                            if current_price[-2] != ".":
-                                order_parameters["stopPrice"] = current_price[:-1]
-                            else:
-                                order_parameters["stopPrice"] = current_price[:-2]
-
-                            if action_price is not None:
-                                order_parameters["price"] = order_parameters["stopPrice"]
-                        continue
-                    elif "Connection aborted" in result or "-1021" in result:
-                        self.logger.error(compose_log_msg(getframeinfo(currentframe()),
-                                                          f"Order {order_parameters['newClientOrderId']} failed to be placed: {result}; Retry num: {retry_counter}"))
-                        continue
+    async def place_market_order_async(self, symbol: str, side: str,
+                                       base_amount=None, quote_amount=None,
+                                       order_id: str = None, is_repay: bool = False,
+                                       should_retry_on_failure=True, should_filter_result=True):
+        """Same as place_market_order; awaited on the loop with async transport, in executor otherwise"""
+        try:
+            if self.rest_transport is None:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, functools.partial(self.place_market_order, symbol, side, base_amount, quote_amount,
+                                                                          order_id, is_repay, should_retry_on_failure, should_filter_result))
+
+            reference_price = None
+            if base_amount is None:
+                reference_price = await self.get_current_price_async(symbol)
+            order_parameters, error = self.build_order_parameters(symbol, side, "MARKET", base_amount, quote_amount,
+                                                                  order_id, is_repay, reference_price=reference_price)
+            if order_parameters is None:
+                return None, error
+            return await self.send_new_order_async(order_parameters, should_retry_on_failure, should_filter_result)
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return str(e), None
 
-                result_status = result.get("status") if isinstance(result, dict) else None
-                if result_status is None:
-                    return result, None
+    async def place_limit_order_async(self, symbol: str, side: str, action_price,
+                                      base_amount=None, quote_amount=None,
+                                      order_id: str = None, time_in_force: str = "GTC",
+                                      is_repay: bool = False, should_retry_on_failure=True,
+                                      should_filter_result=True):
+        """Same as place_limit_order; awaited on the loop with async transport, in executor otherwise"""
+        try:
+            if self.rest_transport is None:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, functools.partial(self.place_limit_order, symbol, side, action_price, base_amount,
+                                                                          quote_amount, order_id, time_in_force, is_repay,
+                                                                          should_retry_on_failure, should_filter_result))
+
+            order_parameters, error = self.build_order_parameters(symbol, side, "LIMIT", base_amount, quote_amount,
+                                                                  order_id, is_repay, action_price=action_price,
+                                                                  time_in_force=time_in_force)
+            if order_parameters is None:
+                return None, error
+            return await self.send_new_order_async(order_parameters, should_retry_on_failure, should_filter_result)
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return str(e), None
 
-                parsed_msg = self.parse_order_update_msg(result)
-                if should_filter_result:
-                    filtered_result = self.filter_account_msg(parsed_msg)
-                    return parsed_msg, filtered_result
-                else:
-                    return parsed_msg, None
+    async def place_stop_order_async(self, symbol: str, side: str, trigger_price, action_price=None,
+                                     base_amount=None, quote_amount=None,
+                                     order_id: str = None, time_in_force: str = "GTC",
+                                     is_repay: bool = False, should_retry_on_failure=True,
+                                     should_filter_result=True):
+        """Same as place_stop_order; awaited on the loop with async transport, in executor otherwise"""
+        try:
+            if self.rest_transport is None:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, functools.partial(self.place_stop_order, symbol, side, trigger_price, action_price,
+                                                                          base_amount, quote_amount, order_id, time_in_force,
+                                                                          is_repay, should_retry_on_failure, should_filter_result))
+
+            reference_price = None
+            if base_amount is None and action_price is None:
+                reference_price = await self.get_current_price_async(symbol)
+            order_parameters, error = self.build_order_parameters(symbol, side, "STOP_MARKET", base_amount, quote_amount,
+                                                                  order_id, is_repay, action_price=action_price,
+                                                                  trigger_price=trigger_price, time_in_force=time_in_force,
+                                                                  reference_price=reference_price)
+            if order_parameters is None:
+                return None, error
+            return await self.send_new_order_async(order_parameters, should_retry_on_failure, should_filter_result)
         except Exception as e:
             handle_exception(self.logger, e)
             return str(e), None
@@ -890,35 +1372,181 @@ class BinanceFuturesApiHandler(Client):
             except Exception as e:
                 return str(e)
 
-            parsed_msg = self.parse_order_update_msg(result)
+            return self.complete_order_info_request(result, apply_msg_filter)
+        except Exception as e:
+            handle_exception(self.logger, e)
 
-            if apply_msg_filter:
-                if not self.filter_account_msg(parsed_msg):
-                    self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
-                                                        f"Order {parsed_msg['client_order_id']} already has last update received"))
-                    return None
-            else:
-                return parsed_msg
+    async def get_order_info_async(self, symbol: str, client_order_id: str, apply_msg_filter=False):
+        try:
+            if self.rest_transport is None:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, functools.partial(self.get_order_info, symbol, client_order_id, apply_msg_filter))
+
+            try:
+                result = await self.rest_transport.futures_get_order(symbol=symbol, origClientOrderId=client_order_id)
+            except Exception as e:
+                return str(e)
+
+            return self.complete_order_info_request(result, apply_msg_filter)
         except Exception as e:
             handle_exception(self.logger, e)
 
+    def complete_order_info_request(self, result, apply_msg_filter):
+        parsed_msg = self.parse_order_update_msg(result)
+
+        if apply_msg_filter and not self.filter_account_msg(parsed_msg, "rest"):
+            self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                                f"Order {parsed_msg['client_order_id']} already has last update received"))
+            return None
+        return parsed_msg
+
     def cancel_running_order(self, symbol, order_id, should_apply_filter=True):
         try:
             response = self.futures_cancel_order(symbol=symbol, origClientOrderId=order_id)
-            response_status = response.get("status") if isinstance(response, dict) else None
-            if response_status is None:
-                return response, None
-
-            parsed_msg = self.parse_order_update_msg(response)
-            if should_apply_filter:
-                filtered_result = self.filter_account_msg(parsed_msg)
-                return parsed_msg, filtered_result
-            else:
-                return parsed_msg, None
+            return self.complete_order_request(response, should_apply_filter)
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return e, None
+
+    async def cancel_running_order_async(self, symbol, order_id, should_apply_filter=True):
+        """Same as cancel_running_order; awaited on the loop with async transport, in executor otherwise"""
+        try:
+            if self.rest_transport is None:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, functools.partial(self.cancel_running_order, symbol, order_id, should_apply_filter))
+
+            response = await self.rest_transport.futures_cancel_order(symbol=symbol, origClientOrderId=order_id)
+            return self.complete_order_request(response, should_apply_filter)
         except Exception as e:
             handle_exception(self.logger, e)
             return e, None
 
+    def build_modify_parameters(self, symbol, side, order_id, order_type, base_amount, trigger_price=None, action_price=None):
+        """Returns (order_parameters, None) or (None, error_str); order_type - exchange type of the order to modify"""
+        if not self.supports_order_modify(order_type):
+            return None, f"Order type {order_type} can't be modified"
+        symbol = symbol.upper()
+        order_parameters = {
+            "symbol": symbol,
+            "side": side.upper(),
+            "origClientOrderId": order_id,
+            "quantity": self.apply_amount_precision(symbol, base_amount),
+        }
+        if action_price is not None:
+            order_parameters["price"] = self.apply_price_precision(symbol, action_price)
+        if order_type in ["STOP", "STOP_MARKET"]:
+            order_parameters["stopPrice"] = self.apply_price_precision(symbol, trigger_price)
+        return order_parameters, None
+
+    def supports_order_modify(self, order_type):
+        return order_type in self.order_modify_types
+
+    def modify_order(self, symbol, side, order_id, order_type, base_amount, trigger_price=None, action_price=None, should_apply_filter=True):
+        try:
+            order_parameters, error = self.build_modify_parameters(symbol, side, order_id, order_type, base_amount, trigger_price, action_price)
+            if order_parameters is None:
+                return error, None
+            try:
+                response = self.futures_modify_order(**order_parameters)
+            except Exception as e:
+                return str(e), None
+            return self.complete_order_request(response, should_apply_filter)
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return str(e), None
+
+    async def modify_order_async(self, symbol, side, order_id, order_type, base_amount, trigger_price=None, action_price=None,
+                                 should_apply_filter=True):
+        """Same as modify_order; awaited on the loop with async transport, in executor otherwise"""
+        try:
+            if self.rest_transport is None:
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(None, functools.partial(self.modify_order, symbol, side, order_id, order_type, base_amount,
+                                                                          trigger_price, action_price, should_apply_filter))
+
+            order_parameters, error = self.build_modify_parameters(symbol, side, order_id, order_type, base_amount, trigger_price, action_price)
+            if order_parameters is None:
+                return error, None
+            try:
+                response = await self.rest_transport.futures_modify_order(**order_parameters)
+            except Exception as e:
+                return str(e), None
+            return self.complete_order_request(response, should_apply_filter)
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return str(e), None
+
+    async def change_leverage_async(self, symbol, leverage):
+        if self.rest_transport is None:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(None, functools.partial(self.futures_change_leverage, symbol=symbol, leverage=leverage))
+        return await self.rest_transport.futures_change_leverage(symbol=symbol, leverage=leverage)
+
+    async def close_rest_transport(self):
+        if self.rest_transport is not None:
+            rest_transport = self.rest_transport
+            self.rest_transport = None
+            type(self)._server_clock.remove_client(rest_transport)
+            await rest_transport.close()
+
+    async def rotate_keys(self, public, private, rest_transport=None):
+        """
+        New API keys of the same exchange account: requests sent from now on are signed with them, account ws
+        connections are relaunched with them (new one up before the old one stops), orders and their subscriptions stay.
+        Replaced REST transport is closed after retired_transport_grace s, so requests in flight on it complete
+        """
+        try:
+            self.API_KEY = public
+            self.API_SECRET = private
+            self.session.headers.update({"X-MBX-APIKEY": public})
+
+            retired_transport = self.rest_transport
+            self.rest_transport = None
+            if rest_transport == "aiohttp":
+                new_transport = self.create_rest_transport(public, private)
+                type(self)._server_clock.add_client(new_transport)
+                await new_transport.start()
+                self.rest_transport = new_transport
+            if retired_transport is not None:
+                task = asyncio.create_task(self.close_retired_transport(retired_transport))
+                self.retired_transport_tasks.add(task)
+                task.add_done_callback(self.retired_transport_tasks.discard)
+
+            self.is_account_ws_rotation_requested = True
+            self.account_ws_wakeup.set()
+            self.logger.info(compose_log_msg(getframeinfo(currentframe()), f"API keys of {self.username} rotated"))
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def close_retired_transport(self, transport):
+        """Closes transport after retired_transport_grace s, right away if cancelled by stop_account"""
+        try:
+            try:
+                await asyncio.sleep(self.retired_transport_grace)
+            finally:
+                type(self)._server_clock.remove_client(transport)
+                await transport.close()
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def stop_account(self):
+        """Account retired: its ws connections and REST transport are closed, nothing is cancelled on exchange"""
+        try:
+            self.is_stopped = True
+            type(self)._server_clock.remove_client(self)  # process-wide requests go through live accounts
+            self.account_ws_wakeup.set()
+            task = self.ws_process_tasks.pop("account", None)
+            if task is not None:
+                task.cancel()
+            retired_transport_tasks = list(self.retired_transport_tasks)
+            for task in retired_transport_tasks:
+                task.cancel()
+            await asyncio.gather(*retired_transport_tasks, return_exceptions=True)
+            await self.close_rest_transport()
+            self.order_update_mailbox.close()
+        except Exception as e:
+            handle_exception(self.logger, e)
+
     def cancel_all_active_orders(self, symbol=None):
         try:
             if symbol is None:
@@ -951,7 +1579,8 @@ class BinanceFuturesApiHandler(Client):
                 try:
                     min_base = float(self.get_min_base_order_amount(pos_symbol))
                 except TypeError:
-                    self.load_exchange_assets_info()
+                    if time.time() - BinanceFuturesApiHandler._exchange_info_loaded_at >= BinanceFuturesApiHandler._exchange_info_check_interval:
+                        self.load_exchange_assets_info()  # symbol may be listed after the last background refresh
                     min_base = float(self.get_min_base_order_amount(pos_symbol))
 
                 if abs(position_amount) >= min_base:
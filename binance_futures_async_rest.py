@@ -0,0 +1,128 @@
+import hmac
+import hashlib
+import urllib.parse
+
+import aiohttp
+
+from common import *
+
+
+class AsyncRestApiException(Exception):
+    """Same text format as binance.exceptions.BinanceAPIException, so error code checks work for both transports"""
+    def __init__(self, status_code, code, message):
+        super().__init__(message)
+        self.status_code = status_code
+        self.code = code
+        self.message = message
+
+    def __str__(self):
+        return f"APIError(code={self.code}): {self.message}"
+
+
+class AsyncFuturesRestClient:
+    """
+    Signed Binance USD-M futures REST transport running on the event loop.
+    One aiohttp session with a keep-alive connection pool per account,
+    so each call is a single awaited request without thread handoff.
+
+    Method names and params follow python-binance Client, results are the same parsed json.
+    With rate_limiter every call waits for its turn first and reports response headers to it
+    """
+    FUTURES_URL = "https://fapi.binance.com/fapi"
+
+    def __init__(self, api_key, api_secret, logger=None, pool_size=20, keepalive_timeout=60,
+                 request_timeout=10, recv_window=5000, base_url=None, rate_limiter=None):
+        self.api_key = api_key
+        self.api_secret = api_secret.encode() if api_secret else b""
+        self.logger = get_logger('default', api_key) if logger is None else logger
+        self.pool_size = pool_size
+        self.keepalive_timeout = keepalive_timeout
+        self.request_timeout = request_timeout
+        self.recv_window = recv_window
+        self.base_url = self.FUTURES_URL if base_url is None else base_url
+        self.timestamp_offset = 0  # ms to add to local time to get exchange time
+        self.last_response_headers = None
+        self.rate_limiter = rate_limiter  # RateLimiter shared by accounts of the process
+        self.session = None
+
+    async def start(self):
+        if self.session is not None and not self.session.closed:
+            return
+        connector = aiohttp.TCPConnector(limit=self.pool_size, keepalive_timeout=self.keepalive_timeout,
+                                         ttl_dns_cache=300)
+        self.session = aiohttp.ClientSession(connector=connector,
+                                             headers={"X-MBX-APIKEY": self.api_key or ""},
+                                             timeout=aiohttp.ClientTimeout(total=self.request_timeout))
+
+    async def close(self):
+        try:
+            if self.session is not None:
+                await self.session.close()
+                self.session = None
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def sign_params(self, params):
+        params = {key: value for key, value in params.items() if value is not None}
+        params["recvWindow"] = self.recv_window
+        params["timestamp"] = int(time.time() * 1000 + self.timestamp_offset)
+        query = urllib.parse.urlencode(params)
+        signature = hmac.new(self.api_secret, query.encode(), hashlib.sha256).hexdigest()
+        return f"{query}&signature={signature}"
+
+    async def request(self, method, path, signed=False, **params):
+        if self.session is None:
+            await self.start()
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(self.api_key, self.rate_limiter.get_rest_endpoint(method, path), params)
+
+        if signed:
+            query = self.sign_params(params)
+        else:
+            query = urllib.parse.urlencode({key: value for key, value in params.items() if value is not None})
+
+        url = f"{self.base_url}{path}"
+        if query:
+            url = f"{url}?{query}"
+
+        async with self.session.request(method, url) as response:
+            self.last_response_headers = response.headers
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_response(self.api_key, response.headers, response.status)
+            try:
+                result = await response.json(content_type=None)
+            except ValueError:
+                raise AsyncRestApiException(response.status, None, f"Invalid response: {await response.text()}")
+
+            if response.status >= 400 or (isinstance(result, dict) and "code" in result and int(result["code"]) < 0):
+                if isinstance(result, dict):
+                    raise AsyncRestApiException(response.status, result.get("code"), result.get("msg"))
+                raise AsyncRestApiException(response.status, None, str(result))  # body is not an exchange error object
+            return result
+
+    async def futures_time(self):
+        return await self.request("GET", "/v1/time")
+
+    async def futures_mark_price(self, **params):
+        return await self.request("GET", "/v1/premiumIndex", **params)
+
+    async def futures_create_order(self, **params):
+        return await self.request("POST", "/v1/order", signed=True, **params)
+
+    async def futures_cancel_order(self, **params):
+        return await self.request("DELETE", "/v1/order", signed=True, **params)
+
+    async def futures_modify_order(self, **params):
+        return await self.request("PUT", "/v1/order", signed=True, **params)
+
+    async def futures_get_order(self, **params):
+        return await self.request("GET", "/v1/order", signed=True, **params)
+
+    async def futures_get_open_orders(self, **params):
+        return await self.request("GET", "/v1/openOrders", signed=True, **params)
+
+    async def futures_account(self, **params):
+        return await self.request("GET", "/v2/account", signed=True, **params)
+
+    async def futures_change_leverage(self, **params):
+        return await self.request("POST", "/v1/leverage", signed=True, **params)
@@ -0,0 +1,118 @@
+import re
+
+import aiohttp
+import requests
+
+from common import *
+
+
+class ExchangeError(Exception):
+    """
+    Failed exchange request, typed by Binance error code.
+    ExchangeError.from_result turns whatever a REST call gave back - BinanceAPIException, AsyncRestApiException,
+    connection errors, error json or error string returned by api handler methods - into one of the subclasses.
+        is_send_status_unknown - request may have been executed by exchange (connection lost, timeout, 5xx, -1007),
+                                 so its state has to be looked up before the same request is sent again
+        is_retryable           - same request may succeed if it is sent again
+    str() is the same as of BinanceAPIException, so error code checks on result strings keep working
+    """
+    codes = ()
+    is_send_status_unknown = False
+    is_retryable = False
+
+    def __init__(self, code=None, message="", status_code=None):
+        super().__init__(message)
+        self.code = code
+        self.message = message
+        self.status_code = status_code
+
+    def __str__(self):
+        if self.code is None:
+            return self.message
+        return f"APIError(code={self.code}): {self.message}"
+
+    @staticmethod
+    def from_result(result):
+        """ExchangeError of a failed request, None if result is a successful response"""
+        if isinstance(result, ExchangeError):
+            return result
+        if isinstance(result, dict):
+            code = result.get("code")
+            if code is None or code == 200:
+                return None
+            return get_error_class(int(code))(int(code), result.get("msg", ""))
+        if isinstance(result, (aiohttp.ClientError, asyncio.TimeoutError, requests.exceptions.ConnectionError,
+                               requests.exceptions.Timeout, ConnectionError, TimeoutError)):
+            return SendStatusUnknownError(None, f"Connection aborted: {result!r}")
+        if isinstance(result, Exception):
+            code = getattr(result, "code", None)
+            status_code = getattr(result, "status_code", None)
+            if code is None and status_code is None:
+                return ExchangeError(None, str(result))
+            code = int(code) if code else None  # 0 - exchange answered with no json
+            return get_error_class(code, status_code)(code, getattr(result, "message", str(result)), status_code)
+        if result is None:
+            return SendStatusUnknownError(None, "No response")
+
+        match = _api_error_pattern.search(str(result))
+        if match is not None:
+            code = int(match.group(1))
+            return get_error_class(code)(code, match.group(2))
+        if any(text in str(result) for text in _connection_error_texts):
+            return SendStatusUnknownError(None, str(result))
+        return ExchangeError(None, str(result))
+
+
+class SendStatusUnknownError(ExchangeError):
+    """-1000 unknown error, -1001 disconnected, -1006 / -1007 execution status unknown; connection errors and 5xx"""
+    codes = (-1000, -1001, -1006, -1007)
+    is_send_status_unknown = True
+    is_retryable = True
+
+
+class TimestampError(ExchangeError):
+    """Request timestamp is outside of recvWindow - request was not executed"""
+    codes = (-1021,)
+    is_retryable = True
+
+
+class RateLimitError(ExchangeError):
+    """Request weight / order rate exceeded, by exchange or shed by local RateLimiter; retries would make it worse"""
+    codes = (-1003, -1015)
+
+
+class PriceFilterError(ExchangeError):
+    """Price is not a multiple of tick size - retryable with price trimmed"""
+    codes = (-4014,)
+
+
+class DuplicateOrderIdError(ExchangeError):
+    """Open order with this client order id exists - likely placed by a previous attempt"""
+    codes = (-4015, -4116)
+
+
+class UnknownOrderError(ExchangeError):
+    codes = (-2011, -2013)
+
+
+class OrderRejectedError(ExchangeError):
+    """Order is not acceptable as is: would trigger immediately, reduce only rejected, margin insufficient, bad quantity..."""
+    codes = (-2010, -2019, -2021, -2022, -4003, -4164)
+
+
+_error_classes = {code: error_class for error_class in [SendStatusUnknownError, TimestampError, RateLimitError, PriceFilterError,
+                                                        DuplicateOrderIdError, UnknownOrderError, OrderRejectedError]
+                  for code in error_class.codes}
+_api_error_pattern = re.compile(r"APIError\(code=(-?\d+)\): ?(.*)", re.DOTALL)
+_connection_error_texts = ["Connection aborted", "Read timed out", "timed out"]
+
+
+def get_error_class(code, status_code=None):
+    error_class = _error_classes.get(code)
+    if error_class is not None:
+        return error_class
+    if status_code in [418, 429]:
+        return RateLimitError
+    if status_code is not None and status_code >= 500:
+        return SendStatusUnknownError
+    return ExchangeError
@@ -0,0 +1,75 @@
+import hashlib
+
+from common import *
+
+
+class ExchangeInfoCache:
+    """
+    On-disk copy of the parsed futures symbol table, so startup does not wait for exchangeInfo download.
+
+    File keeps symbols_data, assets_precision, saved_at and a fingerprint of the content.
+    Entry older than ttl is still returned by load, but is_fresh tells the caller to refresh it.
+    Fingerprint plays ETag role - unchanged exchangeInfo only renews saved_at and is not swapped in
+    """
+    def __init__(self, path="./exchange_info_cache.json", ttl=3600, logger=None):
+        self.path = path
+        self.ttl = ttl
+        self.logger = get_logger('futures_general') if logger is None else logger
+        self.saved_at = None
+        self.fingerprint = None
+
+    @staticmethod
+    def compute_fingerprint(symbols_data, assets_precision):
+        content = json.dumps([symbols_data, assets_precision], sort_keys=True, separators=(",", ":"))
+        return hashlib.sha256(content.encode()).hexdigest()
+
+    def is_fresh(self):
+        return self.saved_at is not None and time.time() - self.saved_at < self.ttl
+
+    def is_changed(self, fingerprint):
+        return fingerprint != self.fingerprint
+
+    def load(self):
+        """returns (symbols_data, assets_precision) or None if there is no valid cache file"""
+        try:
+            if not os.path.exists(self.path):
+                return None
+
+            with open(self.path, "r") as f:
+                cached = json.load(f)
+
+            symbols_data = cached["symbols_data"]
+            assets_precision = cached["assets_precision"]
+            if cached.get("fingerprint") != self.compute_fingerprint(symbols_data, assets_precision):
+                self.logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                                  f"Exchange info cache {self.path} is corrupted, ignored"))
+                return None
+
+            self.saved_at = float(cached["saved_at"])
+            self.fingerprint = cached["fingerprint"]
+            return symbols_data, assets_precision
+        except Exception as e:
+            handle_exception(self.logger, e, f"Exchange info cache {self.path} can't be loaded")
+            return None
+
+    def save(self, symbols_data, assets_precision, fingerprint=None):
+        """written to temp file and renamed, so a crash never leaves half written cache"""
+        try:
+            if fingerprint is None:
+                fingerprint = self.compute_fingerprint(symbols_data, assets_precision)
+            saved_at = time.time()
+
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "w") as f:
+                json.dump({"saved_at": saved_at,
+                           "fingerprint": fingerprint,
+                           "symbols_data": symbols_data,
+                           "assets_precision": assets_precision}, f)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+
+            self.saved_at = saved_at
+            self.fingerprint = fingerprint
+        except Exception as e:
+            handle_exception(self.logger, e, f"Exchange info cache {self.path} can't be saved")
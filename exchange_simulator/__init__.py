@@ -0,0 +1,2 @@
+from .simulated_exchange import SimulatedExchange, FaultProfile
+from .simulated_clients import SimulatedFuturesApiHandler, SimulatedWebsocketManager, SimulatedAsyncRestClient
@@ -0,0 +1,257 @@
+import queue
+
+from common import *
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from binance_futures_async_rest import AsyncRestApiException
+from rate_limiter import RateLimiter
+from server_clock import ServerClockTracker
+from exchange_simulator.simulated_exchange import unsigned_endpoints
+
+
+class SimulatedWebsocketManager:
+    """
+    ThreadedWebsocketManager stand-in connected to SimulatedExchange.
+    Exchange events are queued and delivered to callbacks from manager thread after fault_profile.ws_latency_ms;
+    dropped connection makes is_alive() False, so handler reconnects the same way it does for the real one
+    """
+    def __init__(self, exchange, api_key=None, api_secret=None):
+        self.exchange = exchange
+        self.api_key = api_key
+        self.daemon = True
+        self.sockets = {}  # socket name:(listener, is_user_stream)
+        self.socket_counter = 0
+        self.events = queue.Queue()
+        self.is_dropped = False
+        self.is_stopped = False
+        self.thread = None
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run_delivery, daemon=self.daemon)
+        self.thread.start()
+        self.exchange.add_ws_manager(self)
+
+    def stop(self):
+        self.is_stopped = True
+        self.close_sockets()
+        self.exchange.remove_ws_manager(self)
+        self.events.put(None)
+
+    def drop(self):
+        """connection lost, undelivered events are lost with it"""
+        self.is_dropped = True
+        self.close_sockets()
+        self.events.put(None)
+
+    def is_alive(self):
+        return self.thread is not None and self.thread.is_alive() and not self.is_dropped
+
+    def close_sockets(self):
+        for socket_name in list(self.sockets):
+            self.stop_socket(socket_name)
+
+    def create_listener(self, callback):
+        def listener(message):
+            self.events.put((time.monotonic(), callback, message))
+        return listener
+
+    def add_socket(self, listener, is_user_stream):
+        self.socket_counter += 1
+        socket_name = f"simulated_socket_{self.socket_counter}"
+        self.sockets[socket_name] = (listener, is_user_stream)
+        return socket_name
+
+    def start_futures_socket(self, callback):
+        listener = self.create_listener(callback)
+        self.exchange.add_user_listener(self.api_key, listener)
+        return self.add_socket(listener, True)
+
+    def start_all_mark_price_socket(self, callback, fast=True):
+        listener = self.create_listener(callback)
+        self.exchange.add_market_listener(listener)
+        return self.add_socket(listener, False)
+
+    def start_futures_multiplex_socket(self, callback, streams):
+        listener = self.create_listener(callback)
+        self.exchange.add_market_listener(listener, streams)
+        return self.add_socket(listener, False)
+
+    def stop_socket(self, socket_name):
+        socket = self.sockets.pop(socket_name, None)
+        if socket is None:
+            return
+        listener, is_user_stream = socket
+        if is_user_stream:
+            self.exchange.remove_user_listener(self.api_key, listener)
+        else:
+            self.exchange.remove_market_listener(listener)
+
+    def run_delivery(self):
+        fault_profile = self.exchange.fault_profile
+        while not self.is_stopped and not self.is_dropped:
+            event = self.events.get()
+            if event is None:
+                continue
+            try:
+                queued_at, callback, message = event
+                if fault_profile.ws_latency_ms:
+                    delay = queued_at + fault_profile.ws_latency_ms / 1000 - time.monotonic()
+                    if delay > 0:
+                        time.sleep(delay)
+                if fault_profile.should_drop_socket():
+                    self.drop()
+                    return
+                callback(message)
+            except Exception as e:
+                handle_exception(self.exchange.logger, e)
+
+
+class SimulatedAsyncRestClient:
+    """AsyncFuturesRestClient stand-in: same methods, requests are executed by SimulatedExchange on the loop"""
+    def __init__(self, exchange, api_key, api_secret=None, logger=None, rate_limiter=None):
+        self.exchange = exchange
+        self.api_key = api_key
+        self.logger = get_logger('default', api_key) if logger is None else logger
+        self.timestamp_offset = 0
+        self.recv_window = 5000
+        self.last_response_headers = None
+        self.rate_limiter = rate_limiter
+
+    async def start(self):
+        pass
+
+    async def close(self):
+        pass
+
+    async def request(self, endpoint, **params):
+        if self.rate_limiter is not None:
+            await self.rate_limiter.acquire(self.api_key, endpoint, params)
+        if endpoint not in unsigned_endpoints:
+            params.update(timestamp=int(time.time() * 1000 + self.timestamp_offset), recvWindow=self.recv_window)
+        status = 200
+        try:
+            return await self.exchange.request_async(self.api_key, endpoint, **params)
+        except AsyncRestApiException as e:
+            status = e.status_code
+            raise
+        finally:
+            self.last_response_headers = self.exchange.get_rate_limit_headers(self.api_key)
+            if self.rate_limiter is not None:
+                self.rate_limiter.on_response(self.api_key, self.last_response_headers, status)
+
+    async def futures_time(self):
+        return await self.request("time")
+
+    async def futures_mark_price(self, **params):
+        return await self.request("mark_price", **params)
+
+    async def futures_create_order(self, **params):
+        return await self.request("create_order", **params)
+
+    async def futures_cancel_order(self, **params):
+        return await self.request("cancel_order", **params)
+
+    async def futures_modify_order(self, **params):
+        return await self.request("modify_order", **params)
+
+    async def futures_get_order(self, **params):
+        return await self.request("get_order", **params)
+
+    async def futures_get_open_orders(self, **params):
+        return await self.request("get_open_orders", **params)
+
+    async def futures_account(self, **params):
+        return await self.request("account", **params)
+
+    async def futures_change_leverage(self, **params):
+        return await self.request("change_leverage", **params)
+
+
+class SimulatedFuturesApiHandler(BinanceFuturesApiHandler):
+    """
+    BinanceFuturesApiHandler talking to SimulatedExchange instead of Binance:
+    python-binance Client REST methods used by the handler, account manager and orders, async transport
+    and ws connections are replaced, everything else is the production code.
+
+        SimulatedFuturesApiHandler.attach_exchange(exchange)
+        api_handler = await SimulatedFuturesApiHandler.create(username, public, private, rest_transport="aiohttp")
+
+    Market ws connection is shared by all handlers, so one exchange per process
+    """
+    _exchange = None
+    _client_ping = False
+    _use_exchange_info_cache = False
+
+    @classmethod
+    def attach_exchange(cls, exchange):
+        cls._exchange = exchange
+        cls.order_modify_types = tuple(exchange.modifiable_order_types)
+        cls._rate_limiter = None if exchange.rate_limits is None else RateLimiter(**exchange.rate_limits, logger=exchange.logger)
+        cls._server_clock = ServerClockTracker(logger=exchange.logger)
+        ws_manager_factory = functools.partial(SimulatedWebsocketManager, exchange)
+        cls._ws_manager_factory = ws_manager_factory
+        BinanceFuturesApiHandler._ws_manager_factory = ws_manager_factory  # market ws thread is started by the base class
+
+    def create_rest_transport(self, public, private):
+        return SimulatedAsyncRestClient(type(self)._exchange, public, private, logger=self.logger, rate_limiter=type(self)._rate_limiter)
+
+    def simulated_request(self, endpoint, **params):
+        exchange = type(self)._exchange
+        rate_limiter = type(self)._rate_limiter
+        if rate_limiter is not None:
+            rate_limiter.acquire_blocking(self.API_KEY, endpoint, params)
+        if endpoint not in unsigned_endpoints:
+            params.update(timestamp=int(time.time() * 1000 + self.timestamp_offset), recvWindow=self.REQUEST_RECVWINDOW)
+        status = 200
+        try:
+            return exchange.request(self.API_KEY, endpoint, **params)
+        except AsyncRestApiException as e:
+            status = e.status_code
+            raise
+        finally:
+            if rate_limiter is not None:
+                rate_limiter.on_response(self.API_KEY, exchange.get_rate_limit_headers(self.API_KEY), status)
+
+    def futures_time(self):
+        return self.simulated_request("time")
+
+    def futures_exchange_info(self):
+        return self.simulated_request("exchange_info")
+
+    def futures_mark_price(self, **params):
+        return self.simulated_request("mark_price", **params)
+
+    def futures_change_position_mode(self, **params):
+        return self.simulated_request("change_position_mode", **params)
+
+    def futures_coin_change_position_mode(self, **params):
+        return self.simulated_request("change_position_mode", **params)
+
+    def futures_change_leverage(self, **params):
+        return self.simulated_request("change_leverage", **params)
+
+    def futures_account(self, **params):
+        return self.simulated_request("account", **params)
+
+    def futures_position_information(self, **params):
+        return self.simulated_request("position_information", **params)
+
+    def futures_create_order(self, **params):
+        return self.simulated_request("create_order", **params)
+
+    def futures_cancel_order(self, **params):
+        return self.simulated_request("cancel_order", **params)
+
+    def futures_modify_order(self, **params):
+        return self.simulated_request("modify_order", **params)
+
+    def futures_get_order(self, **params):
+        return self.simulated_request("get_order", **params)
+
+    def futures_get_open_orders(self, **params):
+        return self.simulated_request("get_open_orders", **params)
+
+    def futures_get_all_orders(self, **params):
+        return self.simulated_request("get_all_orders", **params)
+
+    def futures_cancel_all_open_orders(self, **params):
+        return self.simulated_request("cancel_all_open_orders", **params)
@@ -0,0 +1,653 @@
+import random
+import itertools
+
+from common import *
+from price_trigger_index import PriceTriggerIndex
+from rate_limiter import get_request_weight, get_window_suffix
+from binance_futures_async_rest import AsyncRestApiException
+
+final_order_status = ["FILLED", "CANCELED", "EXPIRED"]
+unsigned_endpoints = ["time", "exchange_info", "mark_price"]
+
+api_errors = {
+    -1003: "Too many requests; current limit of IP is exceeded.",
+    -1015: "Too many new orders; current limit of account is exceeded.",
+    -1007: "Timeout waiting for response from backend server. Send status unknown; execution status unknown.",
+    -1021: "Timestamp for this request is outside of the recvWindow.",
+    -2015: "Invalid API-key, IP, or permissions for action.",
+    -2011: "Unknown order sent.",
+    -2013: "Order does not exist.",
+    -2021: "Order would immediately trigger.",
+    -2022: "ReduceOnly Order is rejected.",
+    -4014: "Price not increased by tick size.",
+    -4116: "ClientOrderId is duplicated.",
+    -1121: "Invalid symbol.",
+    -1102: "Mandatory parameter was not sent, was empty/null, or malformed.",
+    -4003: "Quantity less than or equal to zero.",
+}
+
+
+class FaultProfile:
+    """
+    Latency and failures added by SimulatedExchange
+        rest_latency_ms, rest_jitter_ms - delay of every REST call: latency + uniform(0, jitter)
+        ws_latency_ms - delay of every ws event delivery
+        error_rates - {error code: probability}; -1021 and -1007 may hit any signed call,
+                      -2011 - cancel, -4014 - new order; error is returned before the call is executed
+        response_loss_rate - probability that the call is executed, but its response is lost: client gets asyncio.TimeoutError
+        socket_drop_rate - probability that ws connection dies on event delivery
+    """
+    def __init__(self, rest_latency_ms=0, rest_jitter_ms=0, ws_latency_ms=0, error_rates=None, socket_drop_rate=0, seed=None,
+                 response_loss_rate=0):
+        self.rest_latency_ms = rest_latency_ms
+        self.rest_jitter_ms = rest_jitter_ms
+        self.ws_latency_ms = ws_latency_ms
+        self.error_rates = {} if error_rates is None else {int(code): rate for code, rate in error_rates.items()}
+        self.socket_drop_rate = socket_drop_rate
+        self.response_loss_rate = response_loss_rate
+        self.random = random.Random(seed)
+
+    def get_rest_delay(self):
+        delay_ms = self.rest_latency_ms
+        if self.rest_jitter_ms:
+            delay_ms += self.random.uniform(0, self.rest_jitter_ms)
+        return delay_ms / 1000
+
+    def pick_error(self, endpoint):
+        for code, endpoints in [(-1021, None), (-1007, None), (-2011, ["cancel_order"]), (-4014, ["create_order"])]:
+            rate = self.error_rates.get(code)
+            if not rate or endpoints is not None and endpoint not in endpoints:
+                continue
+            if self.random.random() < rate:
+                return code
+        return None
+
+    def should_lose_response(self):
+        return self.response_loss_rate > 0 and self.random.random() < self.response_loss_rate
+
+    def should_drop_socket(self):
+        return self.socket_drop_rate > 0 and self.random.random() < self.socket_drop_rate
+
+
+class SimulatedAccount:
+    def __init__(self, api_key, balance):
+        self.api_key = api_key
+        self.wallet_balance = float(balance)
+        self.positions = {}  # symbol:[amount, entry_price]
+        self.leverages = {}
+        self.orders = {}  # client order id:order, open and finished ones
+        self.trades = []  # fills: {"client_order_id", "symbol", "side", "price", "quantity", "commission"}
+        self.commission_paid = 0.0
+        self.listeners = []  # user data ws delivery callbacks
+
+
+class SimulatedExchange:
+    """
+    In-process stand-in of Binance USD-M futures for load and latency testing, no network involved.
+
+    Keeps accounts, positions and orders; mark prices are set by the test with set_mark_prices,
+    which runs matching: LIMIT fill when price crosses the limit price, STOP / STOP_MARKET trigger
+    when mark price reaches stop price (STOP_MARKET is EXPIRED and filled as MARKET, STOP turns to LIMIT,
+    as account stream of the real exchange shows it). MARKET orders fill at mark price moved against the order
+    by slippage (fraction of price); LIMIT orders pay maker_commission (taker_commission if None), others - taker one, in USDT.
+    modify_order changes price / stopPrice / quantity of open orders of modifiable_order_types in place
+    (LIMIT only, as on the exchange; stop types can be allowed to see what in place stop moves would save).
+    rate_limits - {"ip_limits": [(weight, window_s)], "order_limits": [(orders, window_s)]} as RateLimiter takes them,
+    counted in fixed windows like the exchange does (429 with -1003 / -1015 when exceeded) and returned
+    as X-MBX-USED-WEIGHT-* / X-MBX-ORDER-COUNT-* headers by get_rate_limit_headers; None - no limits.
+    Exchange clock is local clock + clock_skew_ms + clock_drift_ms_per_s * s since start; signed requests with timestamp
+    more than 1000 ms ahead of it or recvWindow behind it are rejected with -1021, as the exchange does.
+
+    REST endpoints are called by SimulatedFuturesApiHandler / SimulatedAsyncRestClient and return
+    the same json as the exchange; errors are raised as AsyncRestApiException with exchange error codes.
+    Market and user data events are pushed to SimulatedWebsocketManager connections
+    """
+    def __init__(self, symbols=None, fault_profile=None, default_balance=10000, taker_commission=0.0004, logger=None,
+                 maker_commission=None, slippage=0, modifiable_order_types=("LIMIT",), rate_limits=None,
+                 clock_skew_ms=0, clock_drift_ms_per_s=0):
+        self.logger = get_logger('default') if logger is None else logger
+        self.lock = threading.RLock()
+        self.fault_profile = FaultProfile() if fault_profile is None else fault_profile
+        self.default_balance = default_balance
+        self.taker_commission = taker_commission
+        self.maker_commission = taker_commission if maker_commission is None else maker_commission
+        self.slippage = slippage
+        self.modifiable_order_types = modifiable_order_types
+        self.rate_limits = rate_limits
+        self.rate_counters = {}  # (api key or "ip", window_s):[window number, used]
+        self.clock_skew_ms = clock_skew_ms
+        self.clock_drift_ms_per_s = clock_drift_ms_per_s
+        self.clock_started_at = time.time()
+
+        self.symbols = {}  # symbol:{"price_tick", "lot_size_step", "min_lot_size", "min_notional"}
+        self.mark_prices = {}
+        self.trigger_indexes = {}  # symbol:PriceTriggerIndex of resting orders
+        self.resting_orders = {}  # index key:(account, order)
+        self.accounts = {}  # api key:SimulatedAccount, several keys may share one account
+        self.revoked_api_keys = set()
+        self.market_listeners = []  # (callback, streams or None for all market array)
+        self.ws_managers = []
+        self.request_listeners = []  # called with (api_key, endpoint, params) when request arrives, before latency
+        self.order_id_counter = itertools.count(1)
+
+        self.rest_calls = 0
+        self.errors_injected = 0
+        self.responses_lost = 0
+        self.timestamps_rejected = 0
+        self.orders_filled = 0
+        self.rate_limited = 0
+
+        for symbol, symbol_params in (symbols or {"BTCUSDT": {}}).items():
+            self.add_symbol(symbol, **symbol_params)
+
+    def add_symbol(self, symbol, price_tick="0.01", lot_size_step="0.001", min_lot_size="0.001", min_notional="5", mark_price=None):
+        with self.lock:
+            self.symbols[symbol] = {"price_tick": price_tick, "lot_size_step": lot_size_step,
+                                    "min_lot_size": min_lot_size, "min_notional": min_notional}
+            self.trigger_indexes[symbol] = PriceTriggerIndex()
+            if mark_price is not None:
+                self.mark_prices[symbol] = float(mark_price)
+
+    def get_account(self, api_key):
+        account = self.accounts.get(api_key)
+        if account is None:
+            account = SimulatedAccount(api_key, self.default_balance)
+            self.accounts[api_key] = account
+        return account
+
+    def add_api_key(self, api_key, new_api_key):
+        """new_api_key gets access to the account of api_key (key rotation)"""
+        with self.lock:
+            self.accounts[new_api_key] = self.get_account(api_key)
+
+    def revoke_api_key(self, api_key):
+        """requests with api_key fail with -2015 from now on"""
+        with self.lock:
+            self.revoked_api_keys.add(api_key)
+
+    def timestamp(self):
+        now = time.time()
+        return int(now * 1000 + self.clock_skew_ms + self.clock_drift_ms_per_s * (now - self.clock_started_at))
+
+    # ----- REST -----
+
+    def check_request(self, endpoint):
+        """fault injection, called before the endpoint is executed"""
+        self.rest_calls += 1
+        error_code = self.fault_profile.pick_error(endpoint)
+        if error_code is not None:
+            self.errors_injected += 1
+            raise AsyncRestApiException(400, error_code, api_errors[error_code])
+
+    def check_timestamp(self, timestamp, recv_window):
+        if timestamp is None:
+            return
+        server_time = self.timestamp()
+        if int(timestamp) >= server_time + 1000 or server_time - int(timestamp) > int(recv_window or 5000):
+            self.timestamps_rejected += 1
+            raise AsyncRestApiException(400, -1021, api_errors[-1021])
+
+    def request(self, api_key, endpoint, **params):
+        """blocking call with simulated latency, for executor based client"""
+        self.notify_request(api_key, endpoint, params)
+        delay = self.fault_profile.get_rest_delay()
+        if delay:
+            time.sleep(delay)
+        return self.execute(api_key, endpoint, **params)
+
+    async def request_async(self, api_key, endpoint, **params):
+        self.notify_request(api_key, endpoint, params)
+        delay = self.fault_profile.get_rest_delay()
+        if delay:
+            await asyncio.sleep(delay)
+        return self.execute(api_key, endpoint, **params)
+
+    def notify_request(self, api_key, endpoint, params):
+        for listener in self.request_listeners:
+            listener(api_key, endpoint, params)
+
+    def execute(self, api_key, endpoint, **params):
+        with self.lock:
+            self.check_request(endpoint)
+            if api_key in self.revoked_api_keys:
+                raise AsyncRestApiException(401, -2015, api_errors[-2015])
+            self.check_timestamp(params.pop("timestamp", None), params.pop("recvWindow", None))
+            self.count_request(api_key, endpoint, params)
+            result = getattr(self, f"endpoint_{endpoint}")(self.get_account(api_key), **params)
+            if self.fault_profile.should_lose_response():
+                self.responses_lost += 1
+                raise asyncio.TimeoutError(f"{endpoint} response lost")
+            return result
+
+    def get_rate_limit_scopes(self, api_key):
+        """[(counter key, limit, window_s, header, error code)]"""
+        if self.rate_limits is None:
+            return []
+        scopes = [(("ip", window_s), limit, window_s, f"X-MBX-USED-WEIGHT-{get_window_suffix(window_s)}", -1003)
+                  for limit, window_s in self.rate_limits.get("ip_limits", [])]
+        scopes += [((api_key, window_s), limit, window_s, f"X-MBX-ORDER-COUNT-{get_window_suffix(window_s)}", -1015)
+                   for limit, window_s in self.rate_limits.get("order_limits", [])]
+        return scopes
+
+    def get_rate_counter(self, key, window_s, now):
+        window = int(now // window_s)
+        counter = self.rate_counters.get(key)
+        if counter is None or counter[0] != window:
+            counter = [window, 0]
+            self.rate_counters[key] = counter
+        return counter
+
+    def count_request(self, api_key, endpoint, params):
+        if self.rate_limits is None:
+            return
+        ip_weight, order_count = get_request_weight(endpoint, params)
+        now = time.time()
+        demands = []
+        for key, limit, window_s, header, error_code in self.get_rate_limit_scopes(api_key):
+            amount = ip_weight if error_code == -1003 else order_count
+            if amount == 0:
+                continue
+            counter = self.get_rate_counter(key, window_s, now)
+            if counter[1] + amount > limit:
+                self.rate_limited += 1
+                raise AsyncRestApiException(429, error_code, api_errors[error_code])
+            demands.append((counter, amount))
+        for counter, amount in demands:
+            counter[1] += amount
+
+    def get_rate_limit_headers(self, api_key):
+        """Response headers with counters of the current windows, Retry-After while some of them is full"""
+        headers = {}
+        with self.lock:
+            now = time.time()
+            retry_after = 0
+            for key, limit, window_s, header, error_code in self.get_rate_limit_scopes(api_key):
+                counter = self.get_rate_counter(key, window_s, now)
+                headers[header] = str(counter[1])
+                if counter[1] >= limit:
+                    retry_after = max(retry_after, (counter[0] + 1) * window_s - now)
+            if retry_after:
+                headers["Retry-After"] = str(max(1, int(retry_after + 0.999)))
+        return headers
+
+    def raise_error(self, code):
+        raise AsyncRestApiException(400, code, api_errors[code])
+
+    def endpoint_time(self, account):
+        return {"serverTime": self.timestamp()}
+
+    def endpoint_exchange_info(self, account):
+        symbols = []
+        for symbol, data in self.symbols.items():
+            quote = "USDT" if symbol.endswith("USDT") else symbol[-4:]
+            symbols.append({
+                "symbol": symbol, "status": "TRADING",
+                "baseAsset": symbol[:-len(quote)], "baseAssetPrecision": 8,
+                "quoteAsset": quote, "quotePrecision": 8,
+                "filters": [
+                    {"filterType": "PRICE_FILTER", "tickSize": data["price_tick"]},
+                    {"filterType": "LOT_SIZE", "stepSize": data["lot_size_step"], "minQty": data["min_lot_size"], "maxQty": "1000000"},
+                    {"filterType": "MIN_NOTIONAL", "notional": data["min_notional"]},
+                ]
+            })
+        return {"serverTime": self.timestamp(), "symbols": symbols}
+
+    def endpoint_mark_price(self, account, symbol=None):
+        if symbol is not None:
+            return {"symbol": symbol, "markPrice": str(self.mark_prices.get(symbol, 0)), "time": self.timestamp()}
+        return [{"symbol": symbol, "markPrice": str(price), "time": self.timestamp()} for symbol, price in self.mark_prices.items()]
+
+    def endpoint_change_position_mode(self, account, dualSidePosition=False):
+        return {"code": 200, "msg": "success"}
+
+    def endpoint_change_leverage(self, account, symbol, leverage):
+        account.leverages[symbol] = int(leverage)
+        self.publish_user_event(account, {"e": "ACCOUNT_CONFIG_UPDATE", "E": self.timestamp(), "T": self.timestamp(),
+                                          "ac": {"s": symbol, "l": int(leverage)}})
+        return {"symbol": symbol, "leverage": int(leverage), "maxNotionalValue": "1000000"}
+
+    def endpoint_account(self, account):
+        wallet_balance = str(account.wallet_balance)
+        positions = []
+        for symbol in self.symbols:
+            amount, entry_price = account.positions.get(symbol, [0.0, 0.0])
+            positions.append({"symbol": symbol, "positionAmt": str(amount), "entryPrice": str(entry_price),
+                              "leverage": str(account.leverages.get(symbol, 20)), "positionSide": "BOTH"})
+        return {"assets": [{"asset": "USDT", "walletBalance": wallet_balance, "crossWalletBalance": wallet_balance}],
+                "positions": positions}
+
+    def endpoint_position_information(self, account, symbol=None):
+        return [position for position in self.endpoint_account(account)["positions"] if symbol is None or position["symbol"] == symbol]
+
+    def endpoint_get_order(self, account, symbol=None, origClientOrderId=None, orderId=None):
+        order = account.orders.get(origClientOrderId)
+        if order is None or symbol is not None and order["symbol"] != symbol:
+            self.raise_error(-2013)
+        return dict(order)
+
+    def endpoint_get_open_orders(self, account, symbol=None):
+        return [dict(order) for order in account.orders.values()
+                if order["status"] not in final_order_status and (symbol is None or order["symbol"] == symbol)]
+
+    def endpoint_get_all_orders(self, account, symbol, limit=500):
+        orders = [dict(order) for order in account.orders.values() if order["symbol"] == symbol]
+        return orders[-int(limit):]
+
+    def endpoint_cancel_order(self, account, symbol, origClientOrderId=None, orderId=None):
+        order = account.orders.get(origClientOrderId)
+        if order is None or order["symbol"] != symbol or order["status"] in final_order_status:
+            self.raise_error(-2011)
+        self.finish_order(account, order, "CANCELED", "CANCELED")
+        return dict(order)
+
+    def endpoint_modify_order(self, account, symbol, side, quantity, price=None, stopPrice=None, origClientOrderId=None, orderId=None,
+                              **params):
+        order = account.orders.get(origClientOrderId)
+        if order is None or order["symbol"] != symbol or order["status"] in final_order_status:
+            self.raise_error(-2013)
+        if order["type"] not in self.modifiable_order_types or order["side"] != side:
+            self.raise_error(-1102)
+        if float(quantity) <= 0:
+            self.raise_error(-4003)
+        for value in [price, stopPrice]:
+            if value is not None and not self.is_step_multiple(value, self.symbols[symbol]["price_tick"]):
+                self.raise_error(-4014)
+
+        mark_price = self.mark_prices.get(symbol)
+        is_stop = order["type"] in ["STOP", "STOP_MARKET"]
+        if is_stop and stopPrice is not None and mark_price is not None and self.is_stop_triggered(side, float(stopPrice), mark_price):
+            self.raise_error(-2021)
+
+        if price is not None:
+            order["price"] = str(price)
+        if is_stop and stopPrice is not None:
+            order["stopPrice"] = str(stopPrice)
+        order["origQty"] = str(quantity)
+        order["updateTime"] = self.timestamp()
+        self.unrest_order(account, order)
+        self.publish_order_update(account, order, "AMENDMENT")
+        response = self.get_order_response(order)
+
+        self.rest_order(account, order)
+        if mark_price is not None:
+            self.match_order(account, order, mark_price)
+        return response
+
+    def endpoint_cancel_all_open_orders(self, account, symbol):
+        for order in list(account.orders.values()):
+            if order["symbol"] == symbol and order["status"] not in final_order_status:
+                self.finish_order(account, order, "CANCELED", "CANCELED")
+        return {"code": 200, "msg": "The operation of cancel all open order is done."}
+
+    def endpoint_create_order(self, account, symbol, side, type, quantity, price=None, stopPrice=None,
+                              newClientOrderId=None, reduceOnly=None, timeInForce=None, positionSide=None, **params):
+        symbol_data = self.symbols.get(symbol)
+        if symbol_data is None:
+            self.raise_error(-1121)
+        if float(quantity) <= 0:
+            self.raise_error(-4003)
+        for value in [price, stopPrice]:
+            if value is not None and not self.is_step_multiple(value, symbol_data["price_tick"]):
+                self.raise_error(-4014)
+
+        client_order_id = newClientOrderId if newClientOrderId is not None else generate_id(22)
+        existing_order = account.orders.get(client_order_id)
+        if existing_order is not None and existing_order["status"] not in final_order_status:
+            self.raise_error(-4116)
+
+        is_reduce_only = str(reduceOnly).lower() == "true"
+        position_amount = account.positions.get(symbol, [0.0, 0.0])[0]
+        if is_reduce_only and (position_amount == 0 or (position_amount > 0) == (side == "BUY")):
+            self.raise_error(-2022)
+
+        mark_price = self.mark_prices.get(symbol)
+        if type in ["STOP", "STOP_MARKET"] and mark_price is not None and self.is_stop_triggered(side, float(stopPrice), mark_price):
+            self.raise_error(-2021)
+
+        timestamp = self.timestamp()
+        order = {
+            "orderId": next(self.order_id_counter),
+            "clientOrderId": client_order_id,
+            "symbol": symbol,
+            "side": side,
+            "positionSide": "BOTH",
+            "type": type,
+            "origType": type,
+            "status": "NEW",
+            "price": str(price if price is not None else 0),
+            "stopPrice": str(stopPrice if stopPrice is not None else 0),
+            "origQty": str(quantity),
+            "executedQty": "0",
+            "avgPrice": "0",
+            "reduceOnly": is_reduce_only,
+            "timeInForce": timeInForce or "GTC",
+            "updateTime": timestamp,
+            "is_triggered": False,
+        }
+        account.orders[client_order_id] = order
+        self.publish_order_update(account, order, "NEW")
+        response = self.get_order_response(order)  # newOrderRespType=ACK, as exchange answers before matching
+
+        if type == "MARKET":
+            if mark_price is None:
+                self.finish_order(account, order, "EXPIRED", "EXPIRED")
+            else:
+                self.fill_order(account, order, self.get_market_fill_price(order, mark_price))
+        else:
+            self.rest_order(account, order)
+            if mark_price is not None:
+                self.match_order(account, order, mark_price)
+        return response
+
+    @staticmethod
+    def get_order_response(order):
+        response = dict(order)
+        del response["is_triggered"]
+        return response
+
+    @staticmethod
+    def is_step_multiple(value, step):
+        units = float(value) / float(step)
+        return abs(units - round(units)) < 1e-6
+
+    # ----- matching -----
+
+    @staticmethod
+    def is_stop_triggered(side, stop_price, mark_price):
+        return mark_price >= stop_price if side == "BUY" else mark_price <= stop_price
+
+    @staticmethod
+    def get_index_key(account, order):
+        return f"{account.api_key}:{order['clientOrderId']}"
+
+    def rest_order(self, account, order):
+        """puts order into trigger index with band where nothing happens to it"""
+        key = self.get_index_key(account, order)
+        self.resting_orders[key] = (account, order)
+
+        if order["type"] in ["STOP", "STOP_MARKET"] and not order["is_triggered"]:
+            level = float(order["stopPrice"])
+            band = (None, level) if order["side"] == "BUY" else (level, None)
+        else:
+            level = float(order["price"])
+            band = (level, None) if order["side"] == "BUY" else (None, level)
+        self.trigger_indexes[order["symbol"]].set_band(key, *band)
+
+    def unrest_order(self, account, order):
+        key = self.get_index_key(account, order)
+        if self.resting_orders.pop(key, None) is not None:
+            self.trigger_indexes[order["symbol"]].remove(key)
+
+    def match_order(self, account, order, mark_price):
+        if order["status"] in final_order_status:
+            return
+
+        if order["type"] in ["STOP", "STOP_MARKET"] and not order["is_triggered"]:
+            if not self.is_stop_triggered(order["side"], float(order["stopPrice"]), mark_price):
+                return
+            order["is_triggered"] = True
+            self.publish_order_update(account, order, "EXPIRED", status="EXPIRED")
+            order["type"] = "MARKET" if order["origType"] == "STOP_MARKET" else "LIMIT"
+            self.publish_order_update(account, order, "NEW")
+            if order["type"] == "MARKET":
+                self.fill_order(account, order, self.get_market_fill_price(order, mark_price))
+                return
+            self.rest_order(account, order)
+
+        limit_price = float(order["price"])
+        if mark_price <= limit_price if order["side"] == "BUY" else mark_price >= limit_price:
+            self.fill_order(account, order, limit_price)
+
+    def get_market_fill_price(self, order, mark_price):
+        if not self.slippage:
+            return mark_price
+        return mark_price * (1 + self.slippage if order["side"] == "BUY" else 1 - self.slippage)
+
+    def set_mark_prices(self, prices):
+        """{symbol: price} - runs matching and publishes mark price frames"""
+        with self.lock:
+            for symbol, price in prices.items():
+                price = float(price)
+                self.mark_prices[symbol] = price
+                trigger_index = self.trigger_indexes.get(symbol)
+                if trigger_index is None:
+                    continue
+                for key in trigger_index.get_woken(price):
+                    resting = self.resting_orders.get(key)
+                    if resting is not None:
+                        self.match_order(resting[0], resting[1], price)
+            self.publish_mark_prices(prices)
+
+    def fill_order(self, account, order, fill_price):
+        self.unrest_order(account, order)
+        quantity = float(order["origQty"])
+        signed_quantity = quantity if order["side"] == "BUY" else -quantity
+
+        amount, entry_price = account.positions.get(order["symbol"], [0.0, 0.0])
+        new_amount = amount + signed_quantity
+        if amount == 0 or (amount > 0) == (signed_quantity > 0):
+            entry_price = (abs(amount) * entry_price + quantity * fill_price) / abs(new_amount)
+        else:
+            closed_quantity = min(abs(amount), quantity)
+            account.wallet_balance += closed_quantity * (fill_price - entry_price) * (1 if amount > 0 else -1)
+            if abs(new_amount) < 1e-12:
+                new_amount, entry_price = 0.0, 0.0
+            elif (new_amount > 0) != (amount > 0):
+                entry_price = fill_price
+        account.positions[order["symbol"]] = [new_amount, entry_price]
+
+        commission_rate = self.maker_commission if order["origType"] == "LIMIT" else self.taker_commission
+        commission = quantity * fill_price * commission_rate
+        account.wallet_balance -= commission
+        account.commission_paid += commission
+        account.trades.append({"client_order_id": order["clientOrderId"], "symbol": order["symbol"], "side": order["side"],
+                               "price": fill_price, "quantity": quantity, "commission": commission})
+
+        order["executedQty"] = order["origQty"]
+        order["avgPrice"] = str(fill_price)
+        self.orders_filled += 1
+        self.finish_order(account, order, "FILLED", "TRADE", commission=commission, last_price=fill_price)
+        self.publish_account_update(account, order["symbol"])
+
+    def finish_order(self, account, order, status, execution_type, commission=0, last_price=0):
+        self.unrest_order(account, order)
+        order["status"] = status
+        order["updateTime"] = self.timestamp()
+        self.publish_order_update(account, order, execution_type, commission=commission, last_price=last_price)
+
+    # ----- streams -----
+
+    def add_user_listener(self, api_key, callback):
+        with self.lock:
+            self.get_account(api_key).listeners.append(callback)
+
+    def remove_user_listener(self, api_key, callback):
+        with self.lock:
+            listeners = self.get_account(api_key).listeners
+            if callback in listeners:
+                listeners.remove(callback)
+
+    def add_market_listener(self, callback, streams=None):
+        with self.lock:
+            self.market_listeners.append((callback, None if streams is None else set(streams)))
+
+    def remove_market_listener(self, callback):
+        with self.lock:
+            self.market_listeners = [listener for listener in self.market_listeners if listener[0] != callback]
+
+    def add_ws_manager(self, ws_manager):
+        with self.lock:
+            self.ws_managers.append(ws_manager)
+
+    def remove_ws_manager(self, ws_manager):
+        with self.lock:
+            if ws_manager in self.ws_managers:
+                self.ws_managers.remove(ws_manager)
+
+    def drop_sockets(self):
+        """all ws connections are lost at once, as on exchange side disconnect"""
+        with self.lock:
+            ws_managers = self.ws_managers
+            self.ws_managers = []
+        for ws_manager in ws_managers:
+            ws_manager.drop()
+
+    def publish_user_event(self, account, event):
+        encoded = json.dumps(event)  # every connection gets its own parsed frame
+        for callback in account.listeners:
+            callback(json.loads(encoded))
+
+    def publish_order_update(self, account, order, execution_type, status=None, commission=0, last_price=0):
+        timestamp = self.timestamp()
+        event = {
+            "e": "ORDER_TRADE_UPDATE", "E": timestamp, "T": timestamp,
+            "o": {
+                "s": order["symbol"], "c": order["clientOrderId"], "S": order["side"], "o": order["type"],
+                "ot": order["origType"], "f": order["timeInForce"], "q": order["origQty"], "p": order["price"],
+                "ap": order["avgPrice"], "sp": order["stopPrice"], "x": execution_type,
+                "X": order["status"] if status is None else status, "i": order["orderId"],
+                "l": order["executedQty"] if execution_type == "TRADE" else "0", "z": order["executedQty"],
+                "L": str(last_price), "N": "USDT", "n": str(commission), "T": timestamp,
+                "R": order["reduceOnly"], "ps": order["positionSide"]
+            }
+        }
+        self.publish_user_event(account, event)
+
+    def publish_account_update(self, account, symbol):
+        timestamp = self.timestamp()
+        amount, entry_price = account.positions.get(symbol, [0.0, 0.0])
+        wallet_balance = str(account.wallet_balance)
+        event = {
+            "e": "ACCOUNT_UPDATE", "E": timestamp, "T": timestamp,
+            "a": {"m": "ORDER",
+                  "B": [{"a": "USDT", "wb": wallet_balance, "cw": wallet_balance}],
+                  "P": [{"s": symbol, "pa": str(amount), "ep": str(entry_price), "ps": "BOTH"}]}
+        }
+        self.publish_user_event(account, event)
+
+    def publish_mark_prices(self, prices):
+        if len(self.market_listeners) == 0:
+            return
+        timestamp = self.timestamp()
+        updates = [{"e": "markPriceUpdate", "E": timestamp, "s": symbol, "p": str(price)} for symbol, price in prices.items()]
+
+        for callback, streams in self.market_listeners:
+            if streams is None:
+                callback(json.loads(json.dumps({"stream": "!markPrice@arr@1s", "data": updates})))
+                continue
+            for update in updates:
+                stream = f"{update['s'].lower()}@markPrice@1s"
+                if stream in streams:
+                    callback({"stream": stream, "data": dict(update)})
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "rest_calls": self.rest_calls,
+                "errors_injected": self.errors_injected,
+                "responses_lost": self.responses_lost,
+                "timestamps_rejected": self.timestamps_rejected,
+                "orders_filled": self.orders_filled,
+                "rate_limited": self.rate_limited,
+                "resting_orders": len(self.resting_orders),
+            }
@@ -20,6 +20,16 @@ class InputValidator():
             if cmd_type == "SWITCH PRICE SOURCE":
                 return True
 
+            if cmd_type == "MARKET RECORDING":
+                return True
+
+            if cmd_type == "MARKET REPLAY":
+                if command.get("path") is None:
+                    self.logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                                      f"Market replay: recording path is None: {command}"))
+                    return False
+                return True
+
             if cmd_type == "PRICE ADJUST":
                 order_id = command.get("order_id")
                 if order_id is None:
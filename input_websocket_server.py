@@ -1,5 +1,5 @@
-import queue
 from common import *
+from report_hub import ReportSubscriber, default_topics
 
 should_be_canceled = False
 tcp_connections_count = 0
@@ -9,6 +9,7 @@ clients = {}
 
 import asyncio
 import json
+import collections
 import websockets
 
 def run_socket_server():
@@ -26,32 +27,90 @@ def run_socket_server():
                                 "socket server connection closed"))
 
 
-async def forward_data_to_user(websocket, acc_queue):
-    loop = asyncio.get_event_loop()
+class ClientDeliveryStats:
+    """Outbound delivery of one client connection: frames, batch sizes, send latency and report queue depth"""
+    latency_window = 1000  # last frames percentiles are taken over
+
+    def __init__(self, username, subscriber):
+        self.username = username
+        self.subscriber = subscriber
+        self.connected_at = time.time()
+        self.frames = 0
+        self.reports = 0
+        self.max_batch = 0
+        self.send_latencies = collections.deque(maxlen=self.latency_window)  # s websocket.send took, write buffer drain included
+        self.queue_latencies = collections.deque(maxlen=self.latency_window)  # s the oldest report of the frame waited in the buffer
+        self.batch_depths = collections.deque(maxlen=self.latency_window)  # reports pending when the frame was taken
+
+    def on_frame_sent(self, batch_size, queued_s, send_s):
+        self.frames += 1
+        self.reports += batch_size
+        self.max_batch = max(self.max_batch, batch_size)
+        self.batch_depths.append(batch_size)
+        self.queue_latencies.append(queued_s)
+        self.send_latencies.append(send_s)
+
+    @staticmethod
+    def get_percentiles_ms(values):
+        values = sorted(values)
+        if len(values) == 0:
+            return None
+        return {"p50": round(values[len(values) // 2] * 1000, 3), "p99": round(values[int(len(values) * 0.99)] * 1000, 3),
+                "max": round(values[-1] * 1000, 3)}
+
+    def get_stats(self):
+        return {"username": self.username, "connected_s": round(time.time() - self.connected_at), "frames": self.frames,
+                "reports": self.reports, "max_batch": self.max_batch,
+                "avg_batch": round(sum(self.batch_depths) / len(self.batch_depths), 2) if self.batch_depths else None,
+                "send_ms": self.get_percentiles_ms(self.send_latencies), "queued_ms": self.get_percentiles_ms(self.queue_latencies),
+                "buffer": self.subscriber.get_stats()}
+
+
+async def forward_data_to_user(websocket, report_hub, subscriber, stats=None, max_batch=100):
+    """
+    Sends reports of the subscriber as they come. Reports pending together go in one frame as a json array
+    of up to max_batch reports, a single one as it is. The next frame is taken after websocket.send returned,
+    which waits while the connection write buffer is above its high water mark, so a slow client makes its
+    reports wait in its subscriber buffer (bounded, slow consumer policy) and nothing else.
+    When sending stops (send failed, subscriber closed) the subscriber leaves report_hub and the client is disconnected
+    """
     logger = get_logger('default')
-    fail_counter = 0
+    close_code, close_reason = 1011, "report delivery failed"
 
-    while True:
-        data = await loop.run_in_executor(None, acc_queue.get)
-        print(f"New data for the user: {data}")
+    try:
         while True:
+            batch = await subscriber.get_batch(max_batch)
+            if batch is None:
+                logger.warning(compose_log_msg(getframeinfo(currentframe()), "Report subscriber closed, disconnecting client"))
+                close_code, close_reason = 1008, "slow consumer" if subscriber.slow_consumer == "disconnect" else "account retired"
+                return
+
+            data = batch[0] if len(batch) == 1 else "[" + ",".join(batch) + "]"
+            send_started = time.perf_counter()
             try:
                 await websocket.send(data)
-                break
             except Exception as e:
                 handle_exception(logger, e)
-                print("Failure on sending data:", data)
-                fail_counter += 1
-
-                if fail_counter > 5:
-                    logger.error("WS failed to forward data. Killing WS sender")
-                    return
+                logger.error(compose_log_msg(getframeinfo(currentframe()), f"WS failed to forward {len(batch)} reports, stopping sender"))
+                return
+            if stats is not None:
+                now = time.perf_counter()
+                stats.on_frame_sent(len(batch), send_started - subscriber.batch_put_at, now - send_started)
+    finally:
+        report_hub.unsubscribe(subscriber)
+        subscriber.close()
+        try:
+            await websocket.close(code=close_code, reason=close_reason)
+        except Exception as e:
+            handle_exception(logger, e)
 
 async def handle_new_connection(websocket, path):
     logger = get_logger('default')
     logger.info(compose_log_msg(getframeinfo(currentframe()),
                                 "New socket connection"))
 
+    subscriber = None
+    task = None
     try:
         unparsed_data = await websocket.recv()
         parsed = json.loads(unparsed_data)
@@ -61,10 +120,23 @@ async def handle_new_connection(websocket, path):
         account_manager = websocket_handlers["managers"].get(acc_username)
 
         if account_manager is None:
-            await websocket.send("Requested account not found")
+            account_state = websocket_handlers.get("account_states", {}).get(acc_username)
+            if account_state is not None:
+                await websocket.send(json.dumps({"username": acc_username, "status": account_state["status"]}))
+            else:
+                await websocket.send("Requested account not found")
             return
 
-        task = asyncio.create_task(forward_data_to_user(websocket, account_manager.out_ws_queue))
+        try:
+            subscriber = ReportSubscriber(parsed.get("topics") or default_topics, max_buffer=int(parsed.get("max_buffer", 1000)),
+                                          slow_consumer=parsed.get("slow_consumer", "drop_oldest"))
+        except ValueError as e:
+            await websocket.send(str(e))
+            return
+        account_manager.report_hub.subscribe(subscriber)
+        stats = ClientDeliveryStats(acc_username, subscriber)
+        clients[id(websocket)] = stats
+        task = asyncio.create_task(forward_data_to_user(websocket, account_manager.report_hub, subscriber, stats, max_batch=100 if parsed.get("batch", True) else 1))
         await websocket.send("Success connection")
 
         while True:
@@ -82,8 +154,27 @@ async def handle_new_connection(websocket, path):
                 if "exit" == cmd:
                     break
 
+                if "subscribe" == cmd:
+                    account_manager.report_hub.subscribe(subscriber, decrypted_cmd.get("topics") or [])
+                    await websocket.send(json.dumps({"cmd": "subscribe", "topics": sorted(subscriber.topics)}))
+                    continue
+
+                if "unsubscribe" == cmd:
+                    account_manager.report_hub.unsubscribe(subscriber, decrypted_cmd.get("topics") or [])
+                    await websocket.send(json.dumps({"cmd": "unsubscribe", "topics": sorted(subscriber.topics)}))
+                    continue
+
                 if "update_accounts" == cmd:
-                    await websocket_handlers["update_accounts"]()
+                    summary = await websocket_handlers["update_accounts"]()
+                    await websocket.send(json.dumps({"cmd": "update_accounts", "applied": summary}))
+                    continue
+
+                if "clients_status" == cmd:
+                    await websocket.send(json.dumps([client_stats.get_stats() for client_stats in list(clients.values())]))
+                    continue
+
+                if "accounts_status" == cmd:
+                    await websocket.send(json.dumps(dict(websocket_handlers.get("account_states", {}))))
                     continue
 
                 if "shut_down" == cmd:
@@ -116,6 +207,12 @@ async def handle_new_connection(websocket, path):
     except Exception as e:
         handle_exception(logger, e)
     finally:
+        if subscriber is not None:
+            account_manager.report_hub.unsubscribe(subscriber)
+            subscriber.close()
+        if task is not None:
+            task.cancel()
+        clients.pop(id(websocket), None)
         logger.info(compose_log_msg(getframeinfo(currentframe()),
                                     "Closed socket connection"))
 
@@ -0,0 +1,254 @@
+import os
+import multiprocessing
+
+from common import *
+from shared_price_table import SharedPriceTable, WORKER_ATTACHED, WORKER_FULL_MARKET, INFINITY
+from binance_futures_api_handler import BinanceFuturesApiHandler
+
+
+class SharedPricePublisher:
+    """
+    Market data process side: prices of every frame go to the SharedPriceTable, workers whose band a price crossed
+    get the slot flagged as pending and a doorbell byte. Doorbell pipes are non blocking - a full pipe means
+    the worker has not woken up yet and will see all pending flags anyway, so a slow worker never stalls the market stream
+    """
+    def __init__(self, table, doorbells, logger=None):
+        self.table = table
+        self.doorbells = doorbells  # worker id:write end Connection
+        self.logger = get_logger('futures_general') if logger is None else logger
+        self.last_prices = {}
+        self.frames = 0
+        self.prices_written = 0
+        self.wakes = 0
+        for doorbell in doorbells.values():
+            os.set_blocking(doorbell.fileno(), False)
+
+    def publish(self, prices, event_time=None):
+        """symbol:price of one market frame"""
+        table = self.table
+        event_time = int(time.time() * 1000) if event_time is None else event_time
+        workers = [worker_id for worker_id in self.doorbells if table.get_worker_flags(worker_id) & WORKER_ATTACHED]
+        woken = set()
+        for symbol, price in prices.items():
+            if self.last_prices.get(symbol) == price:
+                continue
+            slot = table.add_symbol(symbol)
+            if slot is None:
+                continue
+            self.last_prices[symbol] = price
+            table.write_price(slot, price, event_time)
+            self.prices_written += 1
+            for worker_id in workers:
+                if table.is_woken(worker_id, slot, price):
+                    table.set_pending(worker_id, slot)
+                    woken.add(worker_id)
+        table.finish_frame()
+        self.frames += 1
+
+        for worker_id in workers:
+            if worker_id in woken or table.get_worker_flags(worker_id) & WORKER_FULL_MARKET:
+                self.ring(worker_id)
+
+    def ring(self, worker_id):
+        try:
+            os.write(self.doorbells[worker_id].fileno(), b"\x01")
+            self.table.count_doorbell(worker_id)
+            self.wakes += 1
+        except BlockingIOError:
+            pass  # unread doorbell bytes are there already
+        except OSError as e:
+            handle_exception(self.logger, e)
+
+    async def on_update_finished(self, prices):
+        """"update_finished" price callback of the market data process handler"""
+        try:
+            self.publish(prices)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+
+class SharedMarketDataClient:
+    """
+    Worker process side: prices are read from the SharedPriceTable in place, price callbacks of the worker
+    are dispatched for pending slots when the doorbell rings. Wake bands of the worker - union of its price trigger index
+    bands per symbol - are written to the table after every dispatch and every band_sync_interval s,
+    so market data process wakes the worker only for prices some of its subscribers wait for
+    """
+    band_sync_interval = 0.02
+
+    def __init__(self, table_name, doorbell, worker_id, logger=None):
+        self.table = SharedPriceTable.attach(table_name)
+        self.doorbell = doorbell  # read end Connection
+        self.worker_id = worker_id
+        self.logger = get_logger('futures_general') if logger is None else logger
+        self.published_bands = {}  # symbol:(lower, upper) written to the table
+        self.is_full_market = False
+        self.wake_event = None
+        self.wakes = 0
+        self.prices_dispatched = 0
+
+    def get_price(self, symbol):
+        return self.table.get_price(symbol)
+
+    def get_event_time(self, symbol):
+        slot = self.table.find_slot(symbol)
+        return None if slot is None else self.table.read_slot(slot)[1]
+
+    def on_doorbell(self):
+        try:
+            os.read(self.doorbell.fileno(), 4096)
+        except BlockingIOError:
+            pass
+        self.wake_event.set()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        self.wake_event = asyncio.Event()
+        os.set_blocking(self.doorbell.fileno(), False)
+        loop.add_reader(self.doorbell.fileno(), self.on_doorbell)
+        self.sync_bands()
+        self.table.set_worker_flags(self.worker_id, WORKER_ATTACHED | (WORKER_FULL_MARKET if self.is_full_market else 0))
+        running_tasks = []
+        try:
+            while not BinanceFuturesApiHandler._is_shutdown:
+                try:
+                    await asyncio.wait_for(self.wake_event.wait(), self.band_sync_interval)
+                except asyncio.TimeoutError:
+                    self.sync_bands()
+                    continue
+                self.wake_event.clear()
+                running_tasks = self.dispatch_pending(running_tasks)
+                self.sync_bands()
+        except asyncio.CancelledError:
+            pass
+        finally:
+            loop.remove_reader(self.doorbell.fileno())
+            self.table.set_worker_flags(self.worker_id, 0)
+
+    def dispatch_pending(self, running_tasks):
+        try:
+            running_tasks = clean_finished_tasks(running_tasks)
+            self.wakes += 1
+            self.table.refresh_symbols()
+            for slot in self.table.take_pending(self.worker_id):
+                price = self.table.read_slot(slot)[0]
+                BinanceFuturesApiHandler.dispatch_price_update(self.table.symbols[slot], price, running_tasks)
+                self.prices_dispatched += 1
+            if self.is_full_market:
+                BinanceFuturesApiHandler._current_prices.update(self.table.get_prices())
+                BinanceFuturesApiHandler.dispatch_update_finished(running_tasks)
+            return running_tasks
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return running_tasks
+
+    def sync_bands(self):
+        """Writes changed wake bands of the worker's price trigger indexes to the table"""
+        try:
+            table = self.table
+            bands = {}
+            for symbol, trigger_index in BinanceFuturesApiHandler._price_trigger_indexes.items():
+                if not BinanceFuturesApiHandler._use_price_trigger_index:
+                    bands[symbol] = (INFINITY, INFINITY)  # every price
+                    continue
+                lower = trigger_index.lowers[-1][0] if trigger_index.lowers else -INFINITY
+                upper = trigger_index.uppers[0][0] if trigger_index.uppers else INFINITY
+                bands[symbol] = (lower, upper)
+            for symbol in self.published_bands:
+                bands.setdefault(symbol, (-INFINITY, INFINITY))
+
+            for symbol, band in bands.items():
+                if self.published_bands.get(symbol) == band:
+                    continue
+                slot = table.find_slot(symbol)
+                if slot is None:
+                    continue  # not published yet, next sync retries
+                table.write_band(self.worker_id, slot, band[0], band[1])
+                self.published_bands[symbol] = band
+                price = table.read_slot(slot)[0]
+                if price is not None and (price <= band[0] or price >= band[1]):
+                    table.set_pending(self.worker_id, slot)  # already crossed before the band got there
+                    self.wake_event.set()
+
+            is_full_market = len(BinanceFuturesApiHandler._on_price_update_callbacks.get("update_finished") or {}) != 0
+            if is_full_market != self.is_full_market:
+                self.is_full_market = is_full_market
+                self.table.set_worker_flags(self.worker_id, WORKER_ATTACHED | (WORKER_FULL_MARKET if is_full_market else 0))
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def get_stats(self):
+        stats = self.table.get_stats()
+        stats.update({"worker_id": self.worker_id, "wakes": self.wakes, "prices_dispatched": self.prices_dispatched,
+                      "bands": sum(1 for band in self.published_bands.values() if band != (-INFINITY, INFINITY))})
+        return stats
+
+
+def run_market_data_process(table_name, doorbells, feeder=None):
+    """
+    Market data process entry: mark price stream of all symbols goes to the shared table.
+    feeder - optional coroutine function(publisher) producing prices instead of the exchange stream (simulator, benchmarks)
+    """
+    asyncio.run(serve_market_data(table_name, doorbells, feeder))
+
+
+async def serve_market_data(table_name, doorbells, feeder=None):
+    table = SharedPriceTable.attach(table_name)
+    publisher = SharedPricePublisher(table, doorbells)
+    try:
+        if feeder is not None:
+            await feeder(publisher)
+            return
+
+        BinanceFuturesApiHandler._on_price_update_callbacks["update_finished"]["shared_price_table"] = [SharedPricePublisher.on_update_finished, publisher]
+        BinanceFuturesApiHandler._market_subscriptions.set_full_market_required(True)
+        BinanceFuturesApiHandler.attach_market_bridge(asyncio.get_running_loop())
+        BinanceFuturesApiHandler._ws_market_updates_thread = threading.Thread(target=BinanceFuturesApiHandler.run_market_updates, daemon=True)
+        BinanceFuturesApiHandler._ws_market_updates_thread.start()
+        await BinanceFuturesApiHandler.market_ws_messages_processor()
+    finally:
+        table.close()
+
+
+def attach_worker(table_name, doorbell, worker_id, logger=None):
+    """Worker process gets prices from the shared table instead of its own market stream; before handlers are created"""
+    BinanceFuturesApiHandler._shared_market_data = SharedMarketDataClient(table_name, doorbell, worker_id, logger=logger)
+    return BinanceFuturesApiHandler._shared_market_data
+
+
+class MarketDataProcess:
+    """
+    Owner of the shared price table and the market data process, created by the main process before workers start.
+    Worker attaches with get_worker_attachment(worker_id) -> (table name, doorbell read end) passed to
+    attach_worker in the worker process
+    """
+    def __init__(self, workers_num=1, capacity=4096, feeder=None, logger=None):
+        self.workers_num = workers_num
+        self.logger = get_logger('futures_general') if logger is None else logger
+        self.table = SharedPriceTable.create(capacity=capacity, max_workers=workers_num)
+        self.feeder = feeder
+        self.doorbells = {}  # worker id:(read end, write end)
+        self.process = None
+        for worker_id in range(workers_num):
+            self.doorbells[worker_id] = multiprocessing.Pipe(duplex=False)
+
+    def start(self):
+        context = multiprocessing.get_context("spawn")  # parent may have threads running already
+        write_ends = {worker_id: write_end for worker_id, (read_end, write_end) in self.doorbells.items()}
+        self.process = context.Process(target=run_market_data_process, args=(self.table.name, write_ends, self.feeder),
+                                       name="market_data", daemon=True)
+        self.process.start()
+        self.logger.info(compose_log_msg(getframeinfo(currentframe()),
+                                         f"Market data process {self.process.pid} started, shared price table {self.table.name}"))
+
+    def get_worker_attachment(self, worker_id):
+        return self.table.name, self.doorbells[worker_id][0]
+
+    def stop(self):
+        try:
+            if self.process is not None and self.process.is_alive():
+                self.process.terminate()
+                self.process.join(5)
+            self.table.close()
+        except Exception as e:
+            handle_exception(self.logger, e)
@@ -0,0 +1,164 @@
+import mmap
+import struct
+from collections import deque
+
+from common import *
+
+# file: header, then fixed width records; symbol names are in <path>.symbols json list, record holds index in it
+HEADER = struct.Struct("<4sHHQ")  # magic, version, record size, recording start time ns
+RECORD = struct.Struct("<IqQd")  # symbol id, exchange event time ms, local receive time ns, mark price
+MAGIC = b"OMSM"
+VERSION = 1
+
+
+class MarketDataRecorder:
+    """
+    Records every received mark price frame into compact binary file for incident replay.
+
+    put_frame is called from market ws thread and only appends the frame with its receive time to a deque;
+    writer thread packs queued frames into records and writes them in batches.
+    New symbols are written to the symbols file before the first record that refers to them.
+    If writer falls behind by max_pending_frames, new frames are dropped and counted, live path is never blocked
+    """
+    def __init__(self, path, logger=None, flush_interval=0.05, max_pending_frames=100000):
+        self.path = path
+        self.symbols_path = f"{path}.symbols"
+        self.logger = get_logger('default') if logger is None else logger
+        self.flush_interval = flush_interval
+        self.max_pending_frames = max_pending_frames
+
+        self.pending_frames = deque()
+        self.symbol_ids = {}
+        self.symbols = []
+        self.file = None
+        self.writer_thread = None
+        self.is_stopped = threading.Event()
+
+        self.frames_recorded = 0
+        self.records_written = 0
+        self.frames_dropped = 0
+
+    def start(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self.file = open(self.path, "wb")
+        self.file.write(HEADER.pack(MAGIC, VERSION, RECORD.size, time.time_ns()))
+        self.file.flush()
+        self.write_symbols()
+        self.is_stopped.clear()
+        self.writer_thread = threading.Thread(target=self.run_writer, daemon=True)
+        self.writer_thread.start()
+
+    def stop(self):
+        try:
+            self.is_stopped.set()
+            if self.writer_thread is not None:
+                self.writer_thread.join()
+                self.writer_thread = None
+            if self.file is not None:
+                self.file.close()
+                self.file = None
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def put_frame(self, message):
+        if len(self.pending_frames) >= self.max_pending_frames:
+            self.frames_dropped += 1
+            return
+        self.pending_frames.append((time.time_ns(), message))
+
+    def run_writer(self):
+        while True:
+            is_last_flush = self.is_stopped.wait(self.flush_interval)
+            try:
+                self.write_pending()
+            except Exception as e:
+                handle_exception(self.logger, e)
+            if is_last_flush:
+                return
+
+    def write_pending(self):
+        pending_frames = self.pending_frames
+        records = []
+        symbols_num = len(self.symbols)
+        while len(pending_frames) != 0:
+            received_ns, message = pending_frames.popleft()
+            msg_data = message.get("data")
+            if isinstance(msg_data, dict):
+                msg_data = [msg_data]
+            if not isinstance(msg_data, list):
+                continue
+
+            for symbol_data in msg_data:
+                if symbol_data.get("e") != "markPriceUpdate":
+                    continue
+                symbol = symbol_data["s"]
+                symbol_id = self.symbol_ids.get(symbol)
+                if symbol_id is None:
+                    symbol_id = len(self.symbols)
+                    self.symbol_ids[symbol] = symbol_id
+                    self.symbols.append(symbol)
+                records.append(RECORD.pack(symbol_id, int(symbol_data.get("E") or 0), received_ns, float(symbol_data["p"])))
+            self.frames_recorded += 1
+
+        if len(records) == 0:
+            return
+        if len(self.symbols) != symbols_num:
+            self.write_symbols()
+        self.file.write(b"".join(records))
+        self.file.flush()
+        self.records_written += len(records)
+
+    def write_symbols(self):
+        tmp_path = f"{self.symbols_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.symbols, f)
+        os.replace(tmp_path, self.symbols_path)
+
+    def get_stats(self):
+        return {
+            "path": self.path,
+            "pending_frames": len(self.pending_frames),
+            "frames_recorded": self.frames_recorded,
+            "records_written": self.records_written,
+            "frames_dropped": self.frames_dropped,
+            "symbols": len(self.symbols),
+        }
+
+
+class MarketDataReader:
+    """
+    Memory mapped recording: records_num, get_record(i) and iter_records() -> (symbol, event_ms, received_ns, price).
+    Records of one ws frame share received_ns. A torn last record of an interrupted recording is ignored
+    """
+    def __init__(self, path):
+        with open(f"{path}.symbols", "r") as f:
+            self.symbols = json.load(f)
+
+        self.file = open(path, "rb")
+        self.mmap = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, record_size, self.started_ns = HEADER.unpack_from(self.mmap, 0)
+        if magic != MAGIC or version != VERSION or record_size != RECORD.size:
+            self.close()
+            raise ValueError(f"{path} is not a market data recording of version {VERSION}")
+        self.records_num = (len(self.mmap) - HEADER.size) // RECORD.size
+
+    def close(self):
+        self.mmap.close()
+        self.file.close()
+
+    def get_record(self, index):
+        symbol_id, event_ms, received_ns, price = RECORD.unpack_from(self.mmap, HEADER.size + index * RECORD.size)
+        return self.symbols[symbol_id], event_ms, received_ns, price
+
+    def iter_records(self, start=0):
+        symbols = self.symbols
+        mmap_view = memoryview(self.mmap)
+        records_view = mmap_view[HEADER.size + start * RECORD.size:HEADER.size + self.records_num * RECORD.size]
+        try:
+            for symbol_id, event_ms, received_ns, price in RECORD.iter_unpack(records_view):
+                yield symbols[symbol_id], event_ms, received_ns, price
+        finally:
+            records_view.release()  # mmap can't be closed while views exist
+            mmap_view.release()
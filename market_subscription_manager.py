@@ -0,0 +1,84 @@
+from common import *
+
+
+class MarketSubscriptionManager:
+    """
+    Tracks symbols that have price update callbacks and decides what mark price
+    streams the market ws connection has to run:
+        per-symbol streams multiplexed on one combined-stream connection
+        or all symbols firehose (!markPrice@arr) if too many symbols are needed
+
+    Changed from the event loop thread (subscribe/unsubscribe), applied from the market ws thread
+    """
+    def __init__(self, max_multiplexed_symbols=50, stream_suffix="@markPrice@1s"):
+        self.max_multiplexed_symbols = max_multiplexed_symbols
+        self.stream_suffix = stream_suffix
+        self.symbols_refcount = {}
+        self.full_market_required = False  # e.g. there are "update_finished" subscribers
+        self.version = 0
+        self.lock = threading.Lock()
+        self.changed_event = threading.Event()
+        self.logger = get_logger('futures_general')
+
+    def add_symbol(self, symbol):
+        try:
+            with self.lock:
+                refcount = self.symbols_refcount.get(symbol, 0)
+                self.symbols_refcount[symbol] = refcount + 1
+                if refcount == 0:
+                    self.version += 1
+                    self.changed_event.set()
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def remove_symbol(self, symbol):
+        """returns True if symbol has no subscribers anymore"""
+        try:
+            with self.lock:
+                refcount = self.symbols_refcount.get(symbol)
+                if refcount is None:
+                    return True
+                if refcount <= 1:
+                    del self.symbols_refcount[symbol]
+                    self.version += 1
+                    self.changed_event.set()
+                    return True
+                self.symbols_refcount[symbol] = refcount - 1
+                return False
+        except Exception as e:
+            handle_exception(self.logger, e)
+            return False
+
+    def set_full_market_required(self, is_required):
+        with self.lock:
+            if self.full_market_required != is_required:
+                self.full_market_required = is_required
+                self.version += 1
+                self.changed_event.set()
+
+    def is_firehose_needed(self):
+        return self.full_market_required or len(self.symbols_refcount) > self.max_multiplexed_symbols
+
+    def get_subscription_state(self):
+        """
+        returns (version, streams)
+            streams is None - all symbols firehose should be used
+            streams is [] - nothing to subscribe
+        """
+        with self.lock:
+            self.changed_event.clear()
+            if self.is_firehose_needed():
+                return self.version, None
+            streams = [f"{symbol.lower()}{self.stream_suffix}" for symbol in sorted(self.symbols_refcount)]
+            return self.version, streams
+
+    def wait_for_changes(self, timeout):
+        return self.changed_event.wait(timeout)
+
+    def is_symbol_streamed(self, symbol):
+        with self.lock:
+            return self.is_firehose_needed() or symbol in self.symbols_refcount
+
+    def get_subscribed_symbols(self):
+        with self.lock:
+            return list(self.symbols_refcount.keys())
@@ -2,21 +2,39 @@
 #TODO - maybe should make 2 types of account balance - actual and within ordr manager one, which will consider amounts to be used in orders
 import asyncio
 import time
+import argparse
 
 from common import *
 import threading
 from account_manager import accountManager
 from input_websocket_server import *
+from market_data_process import MarketDataProcess, attach_worker
+from account_shards import AccountShardRouter
+from account_registry import AccountRegistry
 
 managers = {}
 tcp_connections_count = 0
+market_data_process = None  # MarketDataProcess if market stream is read by a separate process
+account_router = None  # AccountShardRouter if accounts run in shard processes
+bootstrap_concurrency = 8  # accounts started at once
+account_states = {}  # username:{"status": "starting" | "ready" | "failed" | "retiring", "startup_timings": {phase:s}}
+account_registry = None  # AccountRegistry applying users.json to managers
+users_watch_interval = None  # s between users.json modification checks, None - reloaded by update_accounts cmd only
+retire_drain_timeout = 600  # s an account removed from users.json waits for its active orders before it stops
 
 async def shut_system():
     try:
+        if account_router is not None:
+            await account_router.shut_down()  # shards finalize their accounts
+            managers.clear()
+
         for manager_id in list(managers.keys()):
             await managers[manager_id].finalize_service()  # ?should a task be created for this?
             del managers[manager_id]
 
+        if market_data_process is not None:
+            market_data_process.stop()
+
         tasks = asyncio.all_tasks()
 
         for _task in tasks:
@@ -31,42 +49,60 @@ async def shut_system():
     except Exception as e:
         print(e)
 
-async def update_managed_accounts():
-    with open("users.json", "r") as f:
-        users = f.read()
-
-    users = json.loads(users)
-
-    global managers
-    managers_to_drop = []
-    for user_data in users:
-        username = user_data["user"]
+async def create_account(user_data):
+    if account_router is not None:
+        return await account_router.add_account(user_data)
+    return await accountManager.create_from_user_data(user_data)
 
-        if managers.get(username) is None:
-            public = user_data["public"]
-            secret = user_data["private"]
-            manager = await accountManager.create(username=username, public=public, private=secret)
-            managers[username] = manager
 
-        # if managers.get(username) is not None:
-        #     managers_to_drop.append(username)
-
-    for username in managers_to_drop:
-        await managers[username].finalize_service() #?should a task be created for this?
-        del managers[username]
+async def update_managed_accounts():
+    """Applies users.json: new accounts start, changed ones are updated in place, removed ones retire"""
+    return await account_registry.reload()
 
 async def main():
+    global account_registry
 
-    await update_managed_accounts()
+    if account_router is not None:
+        await account_router.start()
+    account_registry = AccountRegistry(managers, account_states, create_account, bootstrap_concurrency=bootstrap_concurrency,
+                                       retire_drain_timeout=retire_drain_timeout)
     websocket_handlers["shut_down"] = shut_system
     websocket_handlers["update_accounts"] = update_managed_accounts
     websocket_handlers["managers"] = managers
+    websocket_handlers["account_states"] = account_states
 
-    x = threading.Thread(target=run_socket_server)
+    x = threading.Thread(target=run_socket_server)  # accepts connections while accounts are starting
     x.start()
 
+    await account_registry.reload(wait_started=True)
+    if users_watch_interval is not None:
+        account_registry.running_tasks.append(asyncio.create_task(account_registry.watch(users_watch_interval)))
+
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--market-data-process", action="store_true",
+                        help="read mark price stream in a separate process, prices are shared through shared memory")
+    parser.add_argument("--shards", type=int, default=0,
+                        help="run accounts in this many worker processes, 0 - in this process")
+    parser.add_argument("--bootstrap-concurrency", type=int, default=bootstrap_concurrency,
+                        help="accounts started at once")
+    parser.add_argument("--watch-users", type=float, nargs="?", const=2.0, default=None, metavar="INTERVAL",
+                        help="apply users.json changes when the file is modified, checked every INTERVAL s (2 by default)")
+    parser.add_argument("--retire-drain-timeout", type=float, default=retire_drain_timeout,
+                        help="s an account removed from users.json waits for its active orders to finish before it stops")
+    args = parser.parse_args()
+    bootstrap_concurrency = args.bootstrap_concurrency
+    users_watch_interval = args.watch_users
+    retire_drain_timeout = args.retire_drain_timeout
+    if args.market_data_process:
+        market_data_process = MarketDataProcess(workers_num=max(args.shards, 1))
+        market_data_process.start()
+        if args.shards == 0:
+            attach_worker(*market_data_process.get_worker_attachment(0))
+    if args.shards > 0:
+        account_router = AccountShardRouter(args.shards, market_data_process=market_data_process)
+
     main_loop = asyncio.new_event_loop()
     asyncio.set_event_loop(main_loop)
     main_loop.run_until_complete(main())
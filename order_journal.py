@@ -0,0 +1,262 @@
+import copy
+
+from common import *
+
+
+class OrderJournal:
+    """
+    Append-only journal of order lifecycle, one json record per line:
+        created  - order activated: order_class, constructor params and state
+        status   - order_new_status of an order or of a child order
+        state    - order state changed: children placed, trailing stop moved, etc
+        finished - order is over and should not be recovered
+
+    append is called from the main loop and only queues the record, json encoded right away, so order params and state
+    changed after it are not written under its seq; writer thread writes queued records as one batch with one fsync
+    and folds decoded copies of them. Journal is folded into orders - last state of every not finished
+    top order with its children - which is written as snapshot every snapshot_every records,
+    after that journal file is truncated.
+
+    Recovery reads snapshot and replays journal records newer than it, a torn last line is ignored
+    """
+    def __init__(self, path, logger=None, flush_interval=0.01, snapshot_every=20000):
+        self.journal_path = f"{path}.journal"
+        self.snapshot_path = f"{path}.snapshot"
+        self.logger = get_logger('default') if logger is None else logger
+        self.flush_interval = flush_interval
+        self.snapshot_every = snapshot_every
+
+        self.condition = threading.Condition()
+        self.pending_records = []  # json lines
+        self.seq = 0
+        self.is_stopped = False
+        self.writer_thread = None
+        self.journal_file = None
+
+        # folded state, owned by writer thread after open
+        self.orders = {}  # top order id:{"order_id", "order_class", "params", "state"}
+        self.child_index = {}  # child order id:top order id
+        self.applied_seq = 0
+        self.records_since_snapshot = 0
+
+        self.records_written = 0
+        self.batches_written = 0
+        self.max_batch_size = 0
+        self.snapshots_written = 0
+
+    def open(self):
+        """Returns recovered not finished orders: {order_id: entry}; starts writer thread"""
+        directory = os.path.dirname(self.journal_path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        self.load_state()
+        self.journal_file = open(self.journal_path, "a")
+        self.is_stopped = False
+        self.writer_thread = threading.Thread(target=self.run_writer, daemon=True)
+        self.writer_thread.start()
+        return copy.deepcopy(self.orders)  # writer thread keeps folding its own copy
+
+    def close(self):
+        try:
+            with self.condition:
+                self.is_stopped = True
+                self.condition.notify()
+            if self.writer_thread is not None:
+                self.writer_thread.join()
+                self.writer_thread = None
+            if self.journal_file is not None:
+                self.journal_file.close()
+                self.journal_file = None
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def append(self, record_type, order_id, **fields):
+        with self.condition:
+            self.seq += 1
+            fields["seq"] = self.seq
+            fields["type"] = record_type
+            fields["order_id"] = order_id
+            fields["ts"] = time.time()
+            self.pending_records.append(json.dumps(fields, default=vars))
+            if len(self.pending_records) == 1:
+                self.condition.notify()
+
+    def run_writer(self):
+        while True:
+            try:
+                with self.condition:
+                    while len(self.pending_records) == 0 and not self.is_stopped:
+                        self.condition.wait()
+                    if len(self.pending_records) == 0 and self.is_stopped:
+                        return
+
+                if not self.is_stopped:
+                    time.sleep(self.flush_interval)  # let a burst of records join the batch
+
+                with self.condition:
+                    records = self.pending_records
+                    self.pending_records = []
+
+                self.write_batch(records)
+            except Exception as e:
+                handle_exception(self.logger, e)
+                time.sleep(1)
+
+    def write_batch(self, records):
+        self.journal_file.write("\n".join(records + [""]))
+        self.journal_file.flush()
+        os.fsync(self.journal_file.fileno())
+
+        for record in records:
+            self.apply_record(json.loads(record))
+
+        self.records_written += len(records)
+        self.batches_written += 1
+        if len(records) > self.max_batch_size:
+            self.max_batch_size = len(records)
+
+        self.records_since_snapshot += len(records)
+        if self.records_since_snapshot >= self.snapshot_every:
+            self.write_snapshot()
+
+    def write_snapshot(self):
+        """Snapshot holds seq it includes, so journal records written before truncation are skipped on replay"""
+        tmp_path = f"{self.snapshot_path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({"seq": self.applied_seq, "orders": self.orders}, f, default=vars)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+        self.journal_file.truncate(0)
+        self.journal_file.seek(0)
+        self.records_since_snapshot = 0
+        self.snapshots_written += 1
+
+    def load_state(self):
+        self.orders = {}
+        self.child_index = {}
+        self.applied_seq = 0
+
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "r") as f:
+                snapshot = json.load(f)
+            self.applied_seq = snapshot["seq"]
+            for order_id, entry in snapshot["orders"].items():
+                self.orders[order_id] = entry
+                self.index_children(order_id, entry["state"])
+
+        replayed_num = 0
+        if os.path.exists(self.journal_path):
+            valid_size = 0
+            with open(self.journal_path, "rb") as f:
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("no line end")
+                        record = json.loads(line)
+                    except ValueError:
+                        self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                                            f"Order journal {self.journal_path} has torn record, replay stopped: {line}"))
+                        break
+                    valid_size += len(line)
+                    if record["seq"] <= self.applied_seq:
+                        continue
+                    self.apply_record(record)
+                    replayed_num += 1
+
+            if valid_size < os.path.getsize(self.journal_path):
+                os.truncate(self.journal_path, valid_size)  # so new records are not glued to the torn one
+
+        self.seq = self.applied_seq
+        self.records_since_snapshot = replayed_num
+        return self.orders
+
+    def index_children(self, top_order_id, state):
+        for child in state.get("children", {}).values():
+            if child is None:
+                continue
+            self.child_index[child["order_id"]] = top_order_id
+            self.index_children(top_order_id, child["state"])
+
+    def drop_children(self, state):
+        for child in state.get("children", {}).values():
+            if child is None:
+                continue
+            self.child_index.pop(child["order_id"], None)
+            self.drop_children(child["state"])
+
+    @staticmethod
+    def get_children_ids(state):
+        children_ids = []
+        for child in state.get("children", {}).values():
+            if child is None:
+                continue
+            children_ids.append(child["order_id"])
+            children_ids += OrderJournal.get_children_ids(child["state"])
+        return children_ids
+
+    @staticmethod
+    def find_child(state, order_id):
+        for child in state.get("children", {}).values():
+            if child is None:
+                continue
+            if child["order_id"] == order_id:
+                return child
+            found = OrderJournal.find_child(child["state"], order_id)
+            if found is not None:
+                return found
+        return None
+
+    def find_state_holder(self, order_id):
+        """returns entry or child dict which "state" belongs to order_id and id of its top order"""
+        entry = self.orders.get(order_id)
+        if entry is not None:
+            return entry, order_id
+
+        top_order_id = self.child_index.get(order_id)
+        if top_order_id is None or self.orders.get(top_order_id) is None:
+            return None, None
+        return self.find_child(self.orders[top_order_id]["state"], order_id), top_order_id
+
+    def apply_record(self, record):
+        self.applied_seq = record["seq"]
+        record_type = record["type"]
+        order_id = record["order_id"]
+
+        if record_type == "created":
+            entry = {"order_id": order_id, "order_class": record["order_class"],
+                     "params": record["params"], "state": record["state"]}
+            self.orders[order_id] = entry
+            self.index_children(order_id, entry["state"])
+            return
+
+        if record_type == "finished":
+            entry = self.orders.pop(order_id, None)
+            if entry is not None:
+                self.drop_children(entry["state"])
+            return
+
+        holder, top_order_id = self.find_state_holder(order_id)
+        if holder is None:
+            return  # not journaled order or already finished one
+
+        if record_type == "state":
+            self.drop_children(holder["state"])
+            holder["state"] = record["state"]
+            self.index_children(top_order_id, holder["state"])
+        elif record_type == "status":
+            holder["state"]["status"] = record["status"]
+
+    def get_stats(self):
+        with self.condition:
+            pending_num = len(self.pending_records)
+        return {
+            "pending_records": pending_num,
+            "records_written": self.records_written,
+            "batches_written": self.batches_written,
+            "max_batch_size": self.max_batch_size,
+            "snapshots_written": self.snapshots_written,
+            "active_orders": len(self.orders),
+        }
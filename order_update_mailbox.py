@@ -0,0 +1,111 @@
+import weakref
+from collections import deque
+
+from common import *
+
+
+class OrderUpdateMailbox:
+    """
+    Serialized delivery of account updates.
+
+    Updates posted with the same key (client order id) are handled one by one in arrival order,
+    so NEW / PARTIALLY_FILLED / FILLED of one order can't overtake each other.
+    Different keys are handled concurrently by long-lived worker tasks taking keys from a ready queue:
+    a key is queued when its mailbox goes from empty to non-empty and the worker taking it handles everything
+    queued for it. A worker is added only when a key is queued while every worker is busy, so the pool grows
+    to the peak number of orders handled at once and posting an update allocates no task.
+
+    Main loop only
+    """
+    _mailboxes = weakref.WeakSet()  # of the process, see join_all
+
+    def __init__(self, logger=None):
+        self.logger = get_logger('default') if logger is None else logger
+        self.loop = None  # of the workers, set by the first post
+        self.pending = {}  # key:deque of (callback, args)
+        self.ready_keys = asyncio.Queue()  # keys with pending updates no worker has taken yet
+        self.workers = []
+        self.idle_workers = 0
+        self.is_drained = asyncio.Event()  # nothing pending
+        self.is_drained.set()
+        type(self)._mailboxes.add(self)
+
+        self.updates_posted = 0
+        self.workers_started = 0
+        self.max_mailbox_depth = 0
+
+    def post(self, key, callback, *args):
+        mailbox = self.pending.get(key)
+        if mailbox is None:
+            mailbox = deque()
+            self.pending[key] = mailbox
+            self.is_drained.clear()
+            self.ready_keys.put_nowait(key)
+            if self.ready_keys.qsize() > self.idle_workers:
+                self.start_worker()
+        mailbox.append((callback, args))
+        self.updates_posted += 1
+
+        if len(mailbox) > self.max_mailbox_depth:
+            self.max_mailbox_depth = len(mailbox)
+
+    def start_worker(self):
+        self.loop = asyncio.get_running_loop()
+        self.workers_started += 1
+        self.workers.append(asyncio.create_task(self.run_worker()))
+
+    async def run_worker(self):
+        while True:
+            self.idle_workers += 1
+            try:
+                key = await self.ready_keys.get()
+            finally:
+                self.idle_workers -= 1
+            await self.drain(key)
+
+    async def drain(self, key):
+        mailbox = self.pending[key]
+        try:
+            while len(mailbox) != 0:
+                callback, args = mailbox.popleft()
+                try:
+                    await callback(*args)
+                except Exception as e:
+                    handle_exception(self.logger, e, f"Update handler of {key} failed")
+        finally:
+            # no await since the last emptiness check, so nothing could be posted in between
+            del self.pending[key]
+            if len(self.pending) == 0:
+                self.is_drained.set()
+
+    def close(self):
+        """Account stopped: workers are cancelled, updates not handled yet are dropped"""
+        for worker in self.workers:
+            worker.cancel()
+        self.workers = []
+        self.ready_keys = asyncio.Queue()
+        self.pending.clear()
+        self.is_drained.set()
+
+    @classmethod
+    async def join_all(cls):
+        """Waits until mailboxes of the running loop are drained; returns False if they were drained already"""
+        loop = asyncio.get_running_loop()
+        busy = [mailbox for mailbox in list(cls._mailboxes) if mailbox.loop is loop and len(mailbox.pending) != 0]
+        for mailbox in busy:
+            await mailbox.is_drained.wait()
+        return len(busy) != 0
+
+    @classmethod
+    def get_all_worker_tasks(cls):
+        return {worker for mailbox in list(cls._mailboxes) for worker in mailbox.workers}
+
+    def get_stats(self):
+        return {
+            "active_mailboxes": len(self.pending),
+            "pending_updates": sum(len(mailbox) for mailbox in self.pending.values()),
+            "max_mailbox_depth": self.max_mailbox_depth,
+            "updates_posted": self.updates_posted,
+            "workers": len(self.workers),
+            "workers_started": self.workers_started,
+        }
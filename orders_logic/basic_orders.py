@@ -52,11 +52,89 @@ class Order:
         self.logger.info(f"Order {self.order_type} {self.order_id} update: {status}")
         self.current_order_status = status
         self.order_status_history[time.time()] = self.current_order_status
+        self.journal("status", status=status)
 
     def order_new_status_sync(self, status: str):
         self.current_order_status = status
         self.order_status_history[time.time()] = self.current_order_status
         self.logger.info(f"Order {self.order_type} {self.order_id} update: {status}")
+        self.journal("status", status=status)
+
+    def journal(self, record_type, **fields):
+        try:
+            order_journal = self.api_handler.order_journal
+            if order_journal is not None:
+                order_journal.append(record_type, self.order_id, **fields)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def journal_state(self):
+        """Everything needed to rebuild the order after restart, besides constructor params"""
+        return {
+            "status": self.current_order_status,
+            "is_placed": self.is_placed,
+            "exchange_order_id": self.binance_order_id,
+            "filled_amount": self.filled_amount,
+            "commission": self.commission,
+            "commission_asset": self.commission_asset,
+            "children": {}
+        }
+
+    def journal_order_state(self):
+        self.journal("state", state=self.journal_state())
+
+    @staticmethod
+    def journal_child(order):
+        if order is None:
+            return None
+        return {"order_id": order.order_id, "state": order.journal_state()}
+
+    def assign_order_id(self, order_id):
+        self.order_id = order_id
+        self.order_data["text_order_id"] = order_id
+
+    def restore_journal_state(self, state):
+        self.binance_order_id = state.get("exchange_order_id")
+        self.filled_amount = state.get("filled_amount", 0)
+        self.commission = state.get("commission")
+        self.commission_asset = state.get("commission_asset")
+
+    async def recover_from_journal(self, state, open_order_ids):
+        """
+        Reconciles order resting on exchange with journaled state:
+            open on exchange - only subscribes for its updates again
+            journaled as final or not open anymore - its last status is handled by updates_handler
+            unknown to exchange - was not placed before restart, so placed now
+        """
+        try:
+            self.restore_journal_state(state)
+            journaled_status = state.get("status")
+            self.api_handler.subscribe_on_order_update(self.order_id, [type(self).updates_handler, self])
+
+            if self.order_id in open_order_ids:
+                self.current_order_status = journaled_status
+                self.is_placed = True
+                return
+
+            self.current_order_status = "RECOVERED"
+            if journaled_status in final_order_status:
+                upd_msg = {"order_status": journaled_status, "client_order_id": self.order_id,
+                           "total_filled": self.filled_amount}
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, upd_msg)
+                return
+
+            order_info = await self.api_handler.get_order_info_async(symbol=self.symbol, client_order_id=self.order_id)
+            if isinstance(order_info, dict) and order_info.get("order_status") is not None:
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, order_info)
+            elif "-2013" in str(order_info):  # order does not exist
+                self.api_handler.unsubscribe_from_order_update(self.order_id)
+                await self.order_new_status("INITIALIZED")
+                await self.place_order()
+            else:
+                self.logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                                  f"Order {self.order_id} status can't be recovered: {order_info}"))
+        except Exception as e:
+            handle_exception(self.logger, e)
 
     async def create_task(self, task_func, *args, **kwargs):
         try:
@@ -80,8 +158,7 @@ class Order:
         try:
             if "-2011" in str(response):  # unknown order:
                 args = {"symbol": self.symbol, "client_order_id": self.order_id, "apply_msg_filter": True}
-                loop = asyncio.get_event_loop()
-                order_result = await loop.run_in_executor(None, functools.partial(self.api_handler.get_order_info, **args))
+                order_result = await self.api_handler.get_order_info_async(**args)
 
                 if order_result is None: #order was filtered - there is - should be - an update for it; what should I do now??
                     self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
@@ -91,7 +168,7 @@ class Order:
                 if "-2013" in order_result:
                     order_result = {"order_status": "FAILED", "client_order_id": self.order_id}
 
-                await self.create_task(updates_handler, order_result)
+                self.api_handler.post_order_update(self.order_id, updates_handler, order_result)
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -152,8 +229,7 @@ class MarketOrder(Order):
                 "is_repay": self.is_repay
             }
 
-            loop = asyncio.get_event_loop()
-            response, is_filtered = await loop.run_in_executor(None, functools.partial(self.api_handler.place_market_order, **arguments))
+            response, is_filtered = await self.api_handler.place_market_order_async(**arguments)
 
             status = response.get("order_status") if isinstance(response, dict) else None
             upd_msg = {"order_status": status, "client_order_id": self.order_id, "returned_status": response}
@@ -164,7 +240,7 @@ class MarketOrder(Order):
                 self.logger.error(compose_log_msg(getframeinfo(currentframe()), error_msg))
                 is_filtered = False
             if not is_filtered:
-                await self.create_task(self.updates_handler, upd_msg)
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, upd_msg)
 
             return upd_msg
         except Exception as e:
@@ -222,6 +298,15 @@ class MarketOrder(Order):
     async def cancel_order(self):
         self.logger.warning(compose_log_msg(getframeinfo(currentframe()), "Tried to cancel market order, nothing to do"))
 
+    def journal_state(self):
+        state = super().journal_state()
+        state["avg_price"] = self.average_price
+        return state
+
+    def restore_journal_state(self, state):
+        super().restore_journal_state(state)
+        self.average_price = state.get("avg_price")
+
     def dump_order_data(self):
         try:
             output = super().dump_order_data()
@@ -255,9 +340,7 @@ class LimitOrder(Order):
                 "is_repay": self.is_repay
             }
 
-            loop = asyncio.get_event_loop()
-            response, is_filtered = await loop.run_in_executor(None,
-                                                               functools.partial(self.api_handler.place_limit_order, **arguments))
+            response, is_filtered = await self.api_handler.place_limit_order_async(**arguments)
             status = response.get("order_status") if isinstance(response, dict) else None
 
             upd_msg = {"order_status": status, "client_order_id": self.order_id, "returned_status": response}
@@ -267,16 +350,14 @@ class LimitOrder(Order):
                 self.logger.error(compose_log_msg(getframeinfo(currentframe()), error_msg))
                 is_filtered = False
             if not is_filtered:
-                await self.create_task(self.updates_handler, upd_msg)
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, upd_msg)
             return upd_msg
         except Exception as e:
             handle_exception(self.logger, e)
 
     async def cancel_order(self):
         try:
-            loop = asyncio.get_event_loop()
-            response, is_filtered = await loop.run_in_executor(None, functools.partial(
-                                                    self.api_handler.cancel_running_order, self.symbol, self.order_id))
+            response, is_filtered = await self.api_handler.cancel_running_order_async(self.symbol, self.order_id)
             status = response.get("order_status") if isinstance(response, dict) else None
 
             upd_msg = {"order_status": status, "client_order_id": self.order_id, "returned_status": response}
@@ -287,7 +368,7 @@ class LimitOrder(Order):
                 await self.handle_cancel_order_error(response, self.updates_handler)
 
             if is_filtered is not None and not is_filtered:
-                await self.create_task(self.updates_handler, upd_msg)
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, upd_msg)
 
         except Exception as e:
             handle_exception(self.logger, e)
@@ -382,9 +463,7 @@ class StopMarketOrder(Order):
                 "is_repay": self.is_repay
             }
 
-            loop = asyncio.get_event_loop()
-            upd_msg, is_filtered = await loop.run_in_executor(None,
-                                                              functools.partial(self.api_handler.place_stop_order, **arguments))
+            upd_msg, is_filtered = await self.api_handler.place_stop_order_async(**arguments)
             status = upd_msg.get("order_status") if isinstance(upd_msg, dict) else None
 
             upd_msg = {"order_status": status, "client_order_id": self.order_id, "returned_status": upd_msg}
@@ -394,7 +473,7 @@ class StopMarketOrder(Order):
                 self.logger.error(error_msg)
                 is_filtered = False
             if not is_filtered:
-                await self.create_task(self.updates_handler, upd_msg)
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, upd_msg)
             return upd_msg
 
         except Exception as e:
@@ -402,7 +481,7 @@ class StopMarketOrder(Order):
 
     async def cancel_order(self):
         try:
-            response, is_filtered = self.api_handler.cancel_running_order(self.symbol, self.order_id)
+            response, is_filtered = await self.api_handler.cancel_running_order_async(self.symbol, self.order_id)
             status = response.get("order_status") if isinstance(response, dict) else None
 
             upd_msg = {"order_status": status, "client_order_id": self.order_id, "returned_status": response}
@@ -412,7 +491,7 @@ class StopMarketOrder(Order):
                 self.logger.error(error_msg)
                 await self.handle_cancel_order_error(response, self.updates_handler)
             if not is_filtered:
-                await self.create_task(self.updates_handler, response)
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, response)
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -528,9 +607,7 @@ class StopLimitOrder(Order):
                 "is_repay": self.is_repay
             }
 
-            loop = asyncio.get_event_loop()
-            response, is_filtered = await loop.run_in_executor(None,
-                                                  functools.partial(self.api_handler.place_stop_order, **arguments))
+            response, is_filtered = await self.api_handler.place_stop_order_async(**arguments)
             status = response.get("order_status") if isinstance(response, dict) else None
 
             upd_msg = {"order_status": status, "client_order_id": self.order_id, "returned_status": response}
@@ -540,7 +617,7 @@ class StopLimitOrder(Order):
                 self.logger.error(error_msg)
                 is_filtered = False
             if not is_filtered:
-                await self.create_task(self.updates_handler, upd_msg)
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, upd_msg)
             return upd_msg
 
         except Exception as e:
@@ -548,7 +625,7 @@ class StopLimitOrder(Order):
 
     async def cancel_order(self):
         try:
-            response, is_filtered = self.api_handler.cancel_running_order(self.symbol, self.order_id)
+            response, is_filtered = await self.api_handler.cancel_running_order_async(self.symbol, self.order_id)
             status = response.get("order_status") if isinstance(response, dict) else None
 
             upd_msg = {"order_status": status, "client_order_id": self.order_id, "returned_status": response}
@@ -559,7 +636,7 @@ class StopLimitOrder(Order):
                 await self.handle_cancel_order_error(response, self.updates_handler)
 
             if not is_filtered:
-                await self.create_task(self.updates_handler, upd_msg)
+                self.api_handler.post_order_update(self.order_id, self.updates_handler, upd_msg)
 
         except Exception as e:
             handle_exception(self.logger, e)
@@ -104,6 +104,7 @@ class CombinedOrder(Order):
                 await self.construct_close_order()
                 await self.close_position_order.place_order()
                 self.close_order_was_placed = True
+                self.journal_order_state()
                 await self.order_new_status("Placed close position order")
                 return
 
@@ -161,7 +162,7 @@ class CombinedOrder(Order):
                                                                  "is_trailing": True}))
 
                     close_args["position_entrance_price"] = open_price
-                    close_args["stop_conditions"] = processed_stop_data
+                    close_args["stop_data"] = processed_stop_data
 
                 else:
                     close_args["position_entrance_price"] = open_price
@@ -172,7 +173,7 @@ class CombinedOrder(Order):
                                                                  "stop_price": float(condition.get("stop")),
                                                                  "price_step": float(condition.get("price_step")),
                                                                  "is_trailing": True}))
-                    close_args["stop_conditions"] = processed_stop_data
+                    close_args["stop_data"] = processed_stop_data
 
                 self.close_position_order = TrailingStopOrder(**close_args)
 
@@ -181,6 +182,40 @@ class CombinedOrder(Order):
         except Exception as e:
             handle_exception(self.logger, e)
 
+    def journal_state(self):
+        state = super().journal_state()
+        state["close_order_was_placed"] = self.close_order_was_placed
+        state["order_canceled"] = self.order_canceled
+        state["children"]["open_position_order"] = self.journal_child(self.open_position_order)
+        state["children"]["close_position_order"] = self.journal_child(self.close_position_order)
+        return state
+
+    def restore_journal_state(self, state):
+        super().restore_journal_state(state)
+        self.close_order_was_placed = state.get("close_order_was_placed", False)
+        self.order_canceled = state.get("order_canceled", False)
+
+    async def recover_from_journal(self, state, open_order_ids):
+        """Open position order is reconciled until it is filled, after that close position order is rebuilt from its fill"""
+        try:
+            self.restore_journal_state(state)
+            children = state["children"]
+            open_child = children["open_position_order"]
+            self.open_position_order.assign_order_id(open_child["order_id"])
+            self.is_placed = True
+
+            if not self.close_order_was_placed:
+                await self.open_position_order.recover_from_journal(open_child["state"], open_order_ids)
+                return
+
+            self.open_position_order.restore_journal_state(open_child["state"])
+            await self.construct_close_order()
+            close_child = children["close_position_order"]
+            self.close_position_order.assign_order_id(close_child["order_id"])
+            await self.close_position_order.recover_from_journal(close_child["state"], open_order_ids)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
     async def place_order(self):
         try:
             self.is_placed = True
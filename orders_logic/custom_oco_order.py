@@ -3,6 +3,8 @@ from .basic_orders import Order, LimitOrder, StopLimitOrder, StopMarketOrder
 
 #TODO totally unhandled part of partially filled
 class CustomOcoOrder(Order):
+    price_subscription_delay = 5  # s after stop order placement, before switchover starts; backtest sets 0
+
     def __init__(self, api_handler, logger,
                  symbol: str, side: str,
                  stop_type: str, limit_price: float,
@@ -59,6 +61,7 @@ class CustomOcoOrder(Order):
             print("Real price handler:", last_price, self.limit_switchover,
                   self.slt_switchover, self.limit_order.is_placed,
                   self.stop_order.is_placed, self.current_order_to_run)
+            order_to_run = self.current_order_to_run
             if self.side == "SELL":
                 if last_price >= self.limit_switchover and not self.limit_order.is_placed:
                     print("switch to limit")
@@ -84,6 +87,68 @@ class CustomOcoOrder(Order):
                         self.current_order_to_run = "stop_limit"
                         await self.create_task(self.limit_order.cancel_order)
 
+            if order_to_run != self.current_order_to_run:
+                self.journal_order_state()
+            self.refresh_price_band()
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def get_price_band(self):
+        """Price range where price_update_handler has nothing to do: (lower, upper), None - unbounded"""
+        if self.side == "SELL":
+            lower = self.slt_switchover if not self.stop_order.is_placed else None
+            upper = self.limit_switchover if not self.limit_order.is_placed else None
+        else:
+            lower = self.limit_switchover if not self.limit_order.is_placed else None
+            upper = self.slt_switchover if not self.stop_order.is_placed else None
+        return lower, upper
+
+    def refresh_price_band(self):
+        try:
+            if self.price_update_callback_id is None:
+                return
+            lower, upper = self.get_price_band()
+            self.api_handler.update_price_trigger_band(self.symbol, self.price_update_callback_id, lower, upper)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def journal_state(self):
+        state = super().journal_state()
+        state["current_order_to_run"] = self.current_order_to_run
+        state["order_canceled"] = self.order_canceled
+        state["children"]["limit_order"] = self.journal_child(self.limit_order)
+        state["children"]["stop_order"] = self.journal_child(self.stop_order)
+        return state
+
+    def restore_journal_state(self, state):
+        super().restore_journal_state(state)
+        self.current_order_to_run = state.get("current_order_to_run", self.current_order_to_run)
+        self.order_canceled = state.get("order_canceled", False)
+
+    async def recover_from_journal(self, state, open_order_ids):
+        """Child orders open on exchange are attached again; if none is open, the one which should run
+           is reconciled, its finalization callback places the other one or finalizes oco"""
+        try:
+            self.restore_journal_state(state)
+            children = state["children"]
+            self.limit_order.assign_order_id(children["limit_order"]["order_id"])
+            self.stop_order.assign_order_id(children["stop_order"]["order_id"])
+
+            orders_to_recover = [order for order in [self.limit_order, self.stop_order] if order.order_id in open_order_ids]
+            if len(orders_to_recover) == 0:
+                orders_to_recover = [self.limit_order if self.current_order_to_run == "limit" else self.stop_order]
+
+            for order in orders_to_recover:
+                child_name = "limit_order" if order is self.limit_order else "stop_order"
+                await order.recover_from_journal(children[child_name]["state"], open_order_ids)
+
+            if self.order_canceled:
+                return
+
+            self.is_placed = True
+            self.price_update_callback_id = self.api_handler.subscribe_for_price_update(self.symbol,
+                                                                                        [CustomOcoOrder.price_update_handler, self],
+                                                                                        self.get_price_band())
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -92,6 +157,7 @@ class CustomOcoOrder(Order):
             finalized_order = self.limit_order if order_id == self.limit_order.order_id else self.stop_order
             print(f"Oco child order {finalized_order.order_type}:{order_id} finalized with status {finalized_order.current_order_status}")
             self.async_tasks += tasks
+            self.refresh_price_band()
             if finalized_order.current_order_status == "CANCELED" and not self.order_canceled:
                 await self.place_child_order()
             else:
@@ -129,9 +195,10 @@ class CustomOcoOrder(Order):
     async def place_order(self):
         try:
             await self.create_task(self.stop_order.place_order)
-            await asyncio.sleep(5)
+            await asyncio.sleep(type(self).price_subscription_delay)
             self.price_update_callback_id = self.api_handler.subscribe_for_price_update(self.symbol,
-                                                                                        [CustomOcoOrder.price_update_handler, self])
+                                                                                        [CustomOcoOrder.price_update_handler, self],
+                                                                                        self.get_price_band())
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -20,6 +20,7 @@ class TrailingStopOrder(Order):
 
             self.current_price_min_step = self.default_price_min_step
 
+            stop_data = [StopParams(**stop) if isinstance(stop, dict) else stop for stop in stop_data]  # journal and backtest configs hold dicts
             sort_getter = lambda x: x.trigger_price if x.trigger_price is not None else -1
             if side == "SELL":
                 self.stop_conditions = sorted(stop_data, key=sort_getter)
@@ -48,12 +49,15 @@ class TrailingStopOrder(Order):
 
             self.current_extremal_price_reached = float(self.enter_price)
             self.price_update_callback_id = None
+            self.trailing_engine = None  # TrailingStopEngine of the symbol if price updates come from it
 
             self.liquidation_order = None
 
             self.order_is_placed = False
             self.update_needed = False
             self.liquidation_fired = False
+            self.requested_stop_price = None  # last stop move counted by trailing move policy
+            self.last_stop_move_time = None  # move policy clock time the stop move was sent to exchange
 
             for condition in self.stop_conditions:
                 stop_cond = {
@@ -93,6 +97,7 @@ class TrailingStopOrder(Order):
     async def price_update_handler(self, last_price):
         try:
             last_price = float(last_price)
+            trailing_values = (self.current_extremal_price_reached, self.current_stop_price_delta, self.update_needed, self.stop_order)
 
             if self.should_process_initial_stop:
                 self.should_process_initial_stop = False
@@ -144,21 +149,187 @@ class TrailingStopOrder(Order):
                     self.update_needed = True
                     self.logger.debug(f"Adjust stop: new price is {self.current_stop_price}")
 
-            if self.order_is_placed and self.update_needed:
+            await self.apply_stop_update(trailing_values)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def move_trailing_stop(self, last_price):
+        """New extremal price reached, no stop condition fired - called by TrailingStopEngine instead of price_update_handler"""
+        try:
+            trailing_values = (self.current_extremal_price_reached, self.current_stop_price_delta, self.update_needed, self.stop_order)
+            self.current_extremal_price_reached = last_price
+            if self.side == "SELL":
+                self.current_stop_price = self.current_extremal_price_reached - self.current_stop_price_delta
+            else:
+                self.current_stop_price = self.current_extremal_price_reached + self.current_stop_price_delta
+            self.update_needed = True
+            await self.apply_stop_update(trailing_values)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def apply_stop_update(self, trailing_values):
+        """Sends stop move to exchange when trailing move policy allows it, constructs stop order once the first stop condition fired"""
+        try:
+            move_policy = self.api_handler.trailing_move_policy
+            if self.update_needed and self.stop_order is not None and self.current_stop_price != self.requested_stop_price:
+                self.requested_stop_price = self.current_stop_price
+                move_policy.moves_requested += 1
+
+            if self.order_is_placed and self.update_needed and \
+                    move_policy.allows_move(self.last_stop_move_time, self.stop_order.trigger_price, self.current_stop_price):
                 self.order_is_placed = False
                 self.update_needed = False
-                if self.is_stop_limit:
-                    self.stop_order.action_price = self.current_stop_price
-                self.stop_order.trigger_price = self.current_stop_price
-                await self.create_task(self.stop_order.cancel_order)
+                self.last_stop_move_time = move_policy.clock()
+                self.set_child_stop_price()
+                if self.can_modify_child_order():
+                    move_policy.modifies_sent += 1
+                    await self.create_task(self.modify_child_order)
+                else:
+                    move_policy.replaces_sent += 1
+                    await self.create_task(self.stop_order.cancel_order)
 
             if self.stop_order is None and self.current_stop_price_delta is not None:
                 self.update_needed = False
                 self.construct_child_order()
                 await self.place_child_order()
 
+            if trailing_values != (self.current_extremal_price_reached, self.current_stop_price_delta, self.update_needed, self.stop_order):
+                self.journal_order_state()  # stop moved
+
+            self.refresh_price_band()
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def set_child_stop_price(self):
+        if self.is_stop_limit:
+            self.stop_order.action_price = self.current_stop_price
+        self.stop_order.trigger_price = self.current_stop_price
+
+    def can_modify_child_order(self):
+        """Stop order is not triggered yet and exchange can change its stop price in place"""
+        order_type = "STOP" if self.is_stop_limit else "STOP_MARKET"
+        return self.api_handler.trailing_move_policy.use_modify_order and self.stop_order.current_order_status == "NEW" \
+            and self.api_handler.supports_order_modify(order_type)
+
+    async def modify_child_order(self):
+        try:
+            stop_order = self.stop_order
+            order_type = "STOP" if self.is_stop_limit else "STOP_MARKET"
+            response, is_filtered = await self.api_handler.modify_order_async(self.symbol, self.side, stop_order.order_id, order_type,
+                                                                              stop_order.base_amount, stop_order.trigger_price,
+                                                                              stop_order.action_price if self.is_stop_limit else None)
+            status = response.get("order_status") if isinstance(response, dict) else None
+            if status is None:
+                self.logger.error(compose_log_msg(getframeinfo(currentframe()),
+                                                  f"{self.order_id} stop order {stop_order.order_id} failed to be modified: {response}; replacing it"))
+                move_policy = self.api_handler.trailing_move_policy
+                move_policy.modifies_failed += 1
+                move_policy.replaces_sent += 1
+                await stop_order.cancel_order()
+                return
+
+            if not is_filtered:
+                self.api_handler.post_order_update(stop_order.order_id, stop_order.updates_handler, response)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def get_price_band(self):
+        """Price range where price_update_handler has nothing to do: (lower, upper), None - unbounded
+           (inf, None) - handler should be called on every price update"""
+        if self.should_process_initial_stop or self.update_needed:
+            return float("inf"), None
+
+        not_fired_triggers = [adjust.trigger_price for adjust in self.stop_conditions if not adjust.was_triggered]
+        if self.side == "SELL":
+            upper = self.current_extremal_price_reached + self.current_price_min_step
+            if len(not_fired_triggers) != 0:
+                upper = min(upper, min(not_fired_triggers))
+            return None, upper
+
+        lower = self.current_extremal_price_reached - self.current_price_min_step
+        if len(not_fired_triggers) != 0:
+            lower = max(lower, max(not_fired_triggers))
+        return lower, None
+
+    def subscribe_for_price_updates(self):
+        """Joins trailing stop engine of the symbol, or subscribes with own price band if there is no engine"""
+        self.trailing_engine = self.api_handler.get_trailing_stop_engine(self.symbol)
+        if self.trailing_engine is not None:
+            self.trailing_engine.add(self)
+            return
+        self.price_update_callback_id = self.api_handler.subscribe_for_price_update(self.symbol, [TrailingStopOrder.price_update_handler, self],
+                                                                                    self.get_price_band())
+
+    def unsubscribe_from_price_updates(self):
+        if self.trailing_engine is not None:
+            self.trailing_engine.remove(self)
+            self.trailing_engine = None
+        if self.price_update_callback_id:
+            self.api_handler.unsubscribe_from_price_update(self.symbol, self.price_update_callback_id)
+            self.price_update_callback_id = None
+
+    def refresh_price_band(self):
+        try:
+            if self.trailing_engine is not None:
+                self.trailing_engine.sync(self)
+                return
+            if self.price_update_callback_id is None:
+                return
+            lower, upper = self.get_price_band()
+            self.api_handler.update_price_trigger_band(self.symbol, self.price_update_callback_id, lower, upper)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def journal_state(self):
+        state = super().journal_state()
+        state["current_stop_price"] = getattr(self, "current_stop_price", None)
+        state["current_stop_price_delta"] = self.current_stop_price_delta
+        state["current_price_min_step"] = self.current_price_min_step
+        state["current_extremal_price_reached"] = self.current_extremal_price_reached
+        state["triggered_conditions"] = [condition.was_triggered for condition in self.stop_conditions]
+        state["should_process_initial_stop"] = self.should_process_initial_stop
+        state["update_needed"] = self.update_needed
+        state["order_canceled"] = self.order_canceled
+        state["children"]["stop_order"] = self.journal_child(self.stop_order)
+        return state
+
+    def restore_journal_state(self, state):
+        super().restore_journal_state(state)
+        if state.get("current_stop_price") is not None:
+            self.current_stop_price = state["current_stop_price"]
+        self.current_stop_price_delta = state.get("current_stop_price_delta")
+        self.current_price_min_step = state.get("current_price_min_step", self.current_price_min_step)
+        self.current_extremal_price_reached = state.get("current_extremal_price_reached", self.current_extremal_price_reached)
+        for condition, was_triggered in zip(self.stop_conditions, state.get("triggered_conditions", [])):
+            condition.was_triggered = was_triggered
+        self.should_process_initial_stop = state.get("should_process_initial_stop", False)
+        self.update_needed = state.get("update_needed", False)
+        self.order_canceled = state.get("order_canceled", False)
+
+    async def recover_from_journal(self, state, open_order_ids):
+        """Stop order is reconciled with exchange first, trailing continues from journaled extremal price"""
+        try:
+            self.restore_journal_state(state)
+            child = state["children"].get("stop_order")
+            if child is not None:
+                if self.stop_order is None:
+                    self.construct_child_order()
+                self.stop_order.assign_order_id(child["order_id"])
+                self.stop_order.trigger_price = self.current_stop_price
+                if self.is_stop_limit:
+                    self.stop_order.action_price = self.current_stop_price
 
+                self.should_process_initial_stop = False
+                await self.stop_order.recover_from_journal(child["state"], open_order_ids)
+                self.order_is_placed = self.stop_order.is_placed
+            elif self.stop_order is not None and not self.should_process_initial_stop:
+                self.stop_order = None  # will be constructed once stop is triggered
 
+            if self.order_canceled:
+                return
+
+            self.is_placed = True
+            self.subscribe_for_price_updates()
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -188,12 +359,17 @@ class TrailingStopOrder(Order):
                                               f"{self.order_id} Trailing child order {finalized_order.order_type}:{order_id} finalized with status {finalized_order.current_order_status}"))
 
             if finalized_order.current_order_status == "CANCELED" and not self.order_canceled:
+                move_policy = self.api_handler.trailing_move_policy
+                if move_policy.coalesce_moves and self.update_needed:
+                    self.update_needed = False  # moves made while cancel was in flight go with the re-placed stop
+                    self.last_stop_move_time = move_policy.clock()
+                    self.set_child_stop_price()
+                    self.journal_order_state()
+                    self.refresh_price_band()
                 await self.place_child_order()
             else:
                 self.is_placed = False
-                if self.price_update_callback_id:
-                    self.api_handler.unsubscribe_from_price_update(self.symbol, self.price_update_callback_id)
-                    self.price_update_callback_id = None
+                self.unsubscribe_from_price_updates()
 
                 if self.liquidation_fired and finalized_order.order_type != "MARKET":
                     return
@@ -220,7 +396,7 @@ class TrailingStopOrder(Order):
         try:
             await self.order_new_status("Place CMD received")
             self.is_placed = True
-            self.price_update_callback_id = self.api_handler.subscribe_for_price_update(self.symbol, [TrailingStopOrder.price_update_handler, self])
+            self.subscribe_for_price_updates()
         except Exception as e:
             handle_exception(self.logger, e)
 
@@ -228,9 +404,7 @@ class TrailingStopOrder(Order):
         try:
             await self.order_new_status("Cancel CMD was received")
             self.order_canceled = True
-            if self.price_update_callback_id:
-                self.api_handler.unsubscribe_from_price_update(self.symbol, self.price_update_callback_id)
-                self.price_update_callback_id = None
+            self.unsubscribe_from_price_updates()
             if self.stop_order.is_placed:
                 self.order_is_placed = False
                 await self.stop_order.cancel_order()
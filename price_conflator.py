@@ -0,0 +1,83 @@
+from common import *
+
+
+class ConflatingPriceBuffer:
+    """
+    Latest-value buffer between market ws thread and the main loop.
+    Keeps only the newest mark price per symbol until the main loop takes them, so
+    memory is bounded by symbols number and a lagging loop always acts on the freshest price.
+
+    put_frame is called from the ws thread, take from the main loop
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.pending_prices = {}  # symbol:price str
+        self.loop = None
+        self.ready_event = None
+        self.is_wakeup_scheduled = False
+        self.logger = get_logger('futures_general')
+
+        self.frames_received = 0
+        self.updates_received = 0
+        self.updates_coalesced = 0  # replaced by newer price before main loop took them
+        self.frames_dropped = 0  # not mark price frames
+        self.batches_taken = 0
+        self.max_pending_depth = 0
+
+    def attach(self, loop):
+        self.loop = loop
+        self.ready_event = asyncio.Event()
+        self.is_wakeup_scheduled = False
+
+    def put_frame(self, message):
+        try:
+            msg_data = message.get("data")
+            if isinstance(msg_data, dict):
+                msg_data = [msg_data]
+            if msg_data is None or not isinstance(msg_data, list) or len(msg_data) == 0 or msg_data[0].get("e") != "markPriceUpdate":
+                self.frames_dropped += 1
+                return
+
+            with self.lock:
+                self.frames_received += 1
+                pending_prices = self.pending_prices
+                for symbol_data in msg_data:
+                    symbol = symbol_data["s"]
+                    if symbol in pending_prices:
+                        self.updates_coalesced += 1
+                    pending_prices[symbol] = symbol_data["p"]
+                self.updates_received += len(msg_data)
+
+                if len(pending_prices) > self.max_pending_depth:
+                    self.max_pending_depth = len(pending_prices)
+
+                if self.is_wakeup_scheduled or self.loop is None:
+                    return
+                self.is_wakeup_scheduled = True
+
+            self.loop.call_soon_threadsafe(self.ready_event.set)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    async def take(self):
+        """waits for new prices and returns {symbol: price str} with only the newest price for each symbol"""
+        await self.ready_event.wait()
+        self.ready_event.clear()
+        with self.lock:
+            prices = self.pending_prices
+            self.pending_prices = {}
+            self.is_wakeup_scheduled = False
+            self.batches_taken += 1
+        return prices
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "pending_depth": len(self.pending_prices),
+                "max_pending_depth": self.max_pending_depth,
+                "frames_received": self.frames_received,
+                "frames_dropped": self.frames_dropped,
+                "updates_received": self.updates_received,
+                "updates_coalesced": self.updates_coalesced,
+                "batches_taken": self.batches_taken,
+            }
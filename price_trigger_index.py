@@ -0,0 +1,66 @@
+import bisect
+
+INFINITY = float("inf")
+_MIN_ID = ""
+_MAX_ID = "\U0010ffff"  # greater than any callback id
+
+
+class PriceTriggerIndex:
+    """
+    Per symbol index of price bands of price update subscribers.
+    Subscriber has nothing to do while price stays inside of its band (lower, upper),
+    so it is woken only when price <= lower or price >= upper.
+
+    Subscriber without a band (lower = +inf) is woken on every price update.
+    Bands are kept in two sorted arrays of (level, callback_id), so getting woken subscribers is O(log n + woken);
+    unbounded sides (-inf lower, +inf upper) are not stored at all
+    """
+    def __init__(self):
+        self.bands = {}  # callback_id: (lower, upper)
+        self.lowers = []
+        self.uppers = []
+
+    def __len__(self):
+        return len(self.bands)
+
+    def set_band(self, callback_id, lower=INFINITY, upper=INFINITY):
+        if lower is None:
+            lower = -INFINITY
+        if upper is None:
+            upper = INFINITY
+
+        band = self.bands.get(callback_id)
+        if band == (lower, upper):
+            return
+        if band is not None:
+            self.remove(callback_id)
+
+        self.bands[callback_id] = (lower, upper)
+        if lower != -INFINITY:
+            bisect.insort(self.lowers, (lower, callback_id))
+        if upper != INFINITY:
+            bisect.insort(self.uppers, (upper, callback_id))
+
+    def remove(self, callback_id):
+        band = self.bands.pop(callback_id, None)
+        if band is None:
+            return
+
+        lower, upper = band
+        if lower != -INFINITY:
+            del self.lowers[bisect.bisect_left(self.lowers, (lower, callback_id))]
+        if upper != INFINITY:
+            del self.uppers[bisect.bisect_left(self.uppers, (upper, callback_id))]
+
+    def get_woken(self, price):
+        """callback ids whose band does not contain price"""
+        upper_position = bisect.bisect_right(self.uppers, (price, _MAX_ID))
+        lower_position = bisect.bisect_left(self.lowers, (price, _MIN_ID))
+
+        woken = [callback_id for level, callback_id in self.uppers[:upper_position]]
+        if lower_position < len(self.lowers):
+            woken_ids = set(woken)
+            for level, callback_id in self.lowers[lower_position:]:
+                if callback_id not in woken_ids:
+                    woken.append(callback_id)
+        return woken
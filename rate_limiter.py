@@ -0,0 +1,273 @@
+import re
+
+from common import *
+from binance_futures_async_rest import AsyncRestApiException
+
+PRIORITY_CANCEL = 0
+PRIORITY_PROTECTIVE = 1  # reduce only / closing orders and modifies of placed orders
+PRIORITY_QUERY = 2
+PRIORITY_ENTRY = 3  # new position orders
+priority_names = {PRIORITY_CANCEL: "cancel", PRIORITY_PROTECTIVE: "protective", PRIORITY_QUERY: "query", PRIORITY_ENTRY: "entry"}
+
+# endpoint:(ip weight, order count); USD-M futures, weights of calls with symbol
+endpoint_weights = {
+    "create_order": (0, 1),
+    "modify_order": (0, 1),
+    "cancel_order": (1, 0),
+    "cancel_all_open_orders": (1, 0),
+    "get_order": (1, 0),
+    "get_open_orders": (1, 0),  # 40 without symbol
+    "get_all_orders": (5, 0),
+    "account": (5, 0),
+    "position_information": (5, 0),
+    "mark_price": (1, 0),  # 10 without symbol
+    "exchange_info": (1, 0),
+    "time": (1, 0),
+    "change_leverage": (1, 0),
+    "change_position_mode": (1, 0),
+}
+
+# (method, path without version) of REST calls:endpoint
+rest_endpoints = {
+    ("POST", "order"): "create_order",
+    ("PUT", "order"): "modify_order",
+    ("DELETE", "order"): "cancel_order",
+    ("GET", "order"): "get_order",
+    ("POST", "algoOrder"): "create_order",  # conditional orders in recent python-binance
+    ("DELETE", "algoOrder"): "cancel_order",
+    ("DELETE", "allOpenOrders"): "cancel_all_open_orders",
+    ("GET", "openOrders"): "get_open_orders",
+    ("GET", "allOrders"): "get_all_orders",
+    ("GET", "account"): "account",
+    ("GET", "positionRisk"): "position_information",
+    ("GET", "premiumIndex"): "mark_price",
+    ("GET", "exchangeInfo"): "exchange_info",
+    ("GET", "time"): "time",
+    ("POST", "leverage"): "change_leverage",
+    ("POST", "positionSide/dual"): "change_position_mode",
+}
+_version_prefix = re.compile(r"^/?(v\d+/)?")
+
+
+def get_rest_endpoint(method, path):
+    return rest_endpoints.get((method.upper(), _version_prefix.sub("", path, count=1)), path)
+
+
+def get_request_weight(endpoint, params):
+    """(ip weight, order count) of the call"""
+    ip_weight, order_count = endpoint_weights.get(endpoint, (1, 0))
+    if endpoint == "get_open_orders" and params.get("symbol") is None:
+        ip_weight = 40
+    if endpoint == "mark_price" and params.get("symbol") is None:
+        ip_weight = 10
+    return ip_weight, order_count
+
+
+def get_request_priority(endpoint, params):
+    if endpoint in ["cancel_order", "cancel_all_open_orders"]:
+        return PRIORITY_CANCEL
+    if endpoint == "modify_order":
+        return PRIORITY_PROTECTIVE
+    if endpoint == "create_order":
+        if str(params.get("reduceOnly")).lower() == "true":
+            return PRIORITY_PROTECTIVE
+        position_side = params.get("positionSide")
+        if position_side == "LONG" and params.get("side") == "SELL" or position_side == "SHORT" and params.get("side") == "BUY":
+            return PRIORITY_PROTECTIVE  # hedge mode close
+        return PRIORITY_ENTRY
+    return PRIORITY_QUERY
+
+
+def get_window_suffix(window_s):
+    return f"{int(window_s // 60)}M" if window_s >= 60 and window_s % 60 == 0 else f"{int(window_s)}S"
+
+
+class TokenBucket:
+    """
+    limit tokens per window_s, refilled continuously.
+    Exchange counter of the window from response headers can only lower the local estimate:
+    other processes on the same IP are seen this way, reordered responses can't give tokens back
+    """
+    def __init__(self, limit, window_s, header=None):
+        self.limit = float(limit)
+        self.window_s = float(window_s)
+        self.rate = self.limit / self.window_s
+        self.header = header  # response header with the exchange counter
+        self.tokens = self.limit
+        self.updated_at = time.monotonic()
+        self.blocked_until = 0  # exchange answered 429 / 418
+        self.waiting = [0] * len(priority_names)  # waiting requests by priority
+
+    def refill(self, now):
+        if now > self.updated_at:
+            self.tokens = min(self.limit, self.tokens + (now - self.updated_at) * self.rate)
+            self.updated_at = now
+
+    def sync_used(self, used, now):
+        self.refill(now)
+        self.tokens = min(self.tokens, self.limit - float(used))
+
+    def get_wait(self, amount, reserve, now):
+        """s until amount can be taken leaving reserve (fraction of limit) untouched, 0 - now"""
+        if now < self.blocked_until:
+            return self.blocked_until - now
+        self.refill(now)
+        missing = amount + reserve * self.limit - self.tokens
+        return 0 if missing <= 0 else missing / self.rate
+
+    def get_stats(self, now):
+        self.refill(now)
+        used = self.limit - self.tokens
+        return {"limit": self.limit, "window_s": self.window_s, "used": round(used, 2), "utilization": round(used / self.limit, 4),
+                "blocked_for_s": round(max(0.0, self.blocked_until - now), 3), "waiting": sum(self.waiting)}
+
+
+class RateLimiter:
+    """
+    REST request weight and order rate limits shared by all accounts of the process:
+    one IP weight bucket, order count buckets per API key. Limits as on USD-M futures by default,
+    buckets are synced with X-MBX-USED-WEIGHT-* / X-MBX-ORDER-COUNT-* response headers, 429 / 418 stop the bucket for Retry-After.
+
+    Requests get priority by endpoint and params: cancel > protective (reduce only, modify) > query > entry.
+    Lower priority may only use the bucket down to its reserve, so cancels and stops find tokens in a burst of entries,
+    and waits while a higher priority request of the same bucket waits.
+    Request which would wait longer than max_waits of its priority is shed: AsyncRestApiException -1003 without a call.
+
+    Used from the main loop (acquire) and executor threads (acquire_blocking), so guarded by a lock
+    """
+    reserves = {PRIORITY_CANCEL: 0.0, PRIORITY_PROTECTIVE: 0.05, PRIORITY_QUERY: 0.15, PRIORITY_ENTRY: 0.25}  # fraction of limit
+    max_waits = {PRIORITY_CANCEL: None, PRIORITY_PROTECTIVE: 30.0, PRIORITY_QUERY: 10.0, PRIORITY_ENTRY: 2.0}  # s, None - never shed
+    max_sleep = 0.25  # s between rechecks of a waiting request
+
+    def __init__(self, ip_limits=((2400, 60),), order_limits=((300, 10), (1200, 60)), logger=None):
+        self.ip_limits = [tuple(limit) for limit in ip_limits]
+        self.order_limits = [tuple(limit) for limit in order_limits]
+        self.logger = get_logger('default') if logger is None else logger
+        self.lock = threading.Lock()
+        self.ip_buckets = [TokenBucket(limit, window_s, f"X-MBX-USED-WEIGHT-{get_window_suffix(window_s)}") for limit, window_s in self.ip_limits]
+        self.account_buckets = {}  # api key:[TokenBucket]
+
+        self.requests = 0
+        self.waited = [0] * len(priority_names)
+        self.wait_time = [0.0] * len(priority_names)
+        self.shed = [0] * len(priority_names)
+        self.rate_limited_responses = 0
+
+    @staticmethod
+    def get_rest_endpoint(method, path):
+        return get_rest_endpoint(method, path)
+
+    def get_account_buckets(self, api_key):
+        buckets = self.account_buckets.get(api_key)
+        if buckets is None:
+            buckets = [TokenBucket(limit, window_s, f"X-MBX-ORDER-COUNT-{get_window_suffix(window_s)}") for limit, window_s in self.order_limits]
+            self.account_buckets[api_key] = buckets
+        return buckets
+
+    def get_demands(self, api_key, ip_weight, order_count):
+        demands = [(bucket, ip_weight) for bucket in self.ip_buckets if ip_weight]
+        demands += [(bucket, order_count) for bucket in self.get_account_buckets(api_key) if order_count]
+        return demands
+
+    def try_take(self, demands, priority, now):
+        """Takes from all buckets at once and returns 0 or returns s to wait"""
+        wait = 0
+        for bucket, amount in demands:
+            if any(bucket.waiting[:priority]):
+                wait = max(wait, self.max_sleep / 5)  # higher priority goes first
+            wait = max(wait, bucket.get_wait(amount, self.reserves[priority], now))
+        if wait == 0:
+            for bucket, amount in demands:
+                bucket.tokens -= amount
+        return wait
+
+    def start_request(self, api_key, endpoint, params):
+        """(demands, priority, wait); request is registered as waiting if wait != 0"""
+        ip_weight, order_count = get_request_weight(endpoint, params)
+        priority = get_request_priority(endpoint, params)
+        with self.lock:
+            self.requests += 1
+            demands = self.get_demands(api_key, ip_weight, order_count)
+            wait = self.try_take(demands, priority, time.monotonic())
+            if wait != 0:
+                self.waited[priority] += 1
+                for bucket, amount in demands:
+                    bucket.waiting[priority] += 1
+        return demands, priority, wait
+
+    def retry_request(self, demands, priority, started_at):
+        """wait s or 0 if taken, None if shed; request stops waiting unless wait is returned"""
+        with self.lock:
+            now = time.monotonic()
+            wait = self.try_take(demands, priority, now)
+            max_wait = self.max_waits[priority]
+            if wait != 0 and (max_wait is None or now + wait - started_at <= max_wait):
+                return wait
+
+            for bucket, amount in demands:
+                bucket.waiting[priority] -= 1
+            self.wait_time[priority] += now - started_at
+            if wait == 0:
+                return 0
+            self.shed[priority] += 1
+            return None
+
+    def raise_shed(self, endpoint, priority):
+        self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                            f"{priority_names[priority]} {endpoint} request shed by rate limiter"))
+        raise AsyncRestApiException(429, -1003, f"Too many requests; {priority_names[priority]} {endpoint} request shed by local rate limiter.")
+
+    async def acquire(self, api_key, endpoint, params):
+        """Waits until the request fits into limits; raises AsyncRestApiException -1003 if it is shed"""
+        demands, priority, wait = self.start_request(api_key, endpoint, params)
+        started_at = time.monotonic()
+        while wait:
+            await asyncio.sleep(min(wait, self.max_sleep))
+            wait = self.retry_request(demands, priority, started_at)
+            if wait is None:
+                self.raise_shed(endpoint, priority)
+
+    def acquire_blocking(self, api_key, endpoint, params):
+        """acquire for executor threads"""
+        demands, priority, wait = self.start_request(api_key, endpoint, params)
+        started_at = time.monotonic()
+        while wait:
+            time.sleep(min(wait, self.max_sleep))
+            wait = self.retry_request(demands, priority, started_at)
+            if wait is None:
+                self.raise_shed(endpoint, priority)
+
+    def on_response(self, api_key, headers, status=None):
+        """Exchange counters from response headers; 429 / 418 stop the exceeded buckets (IP ones if unknown) for Retry-After"""
+        try:
+            with self.lock:
+                now = time.monotonic()
+                if headers:
+                    for bucket in self.ip_buckets + self.get_account_buckets(api_key):
+                        used = headers.get(bucket.header)
+                        if used is not None:
+                            bucket.sync_used(used, now)
+                if status in [418, 429]:
+                    self.rate_limited_responses += 1
+                    retry_after = float((headers or {}).get("Retry-After") or 1)
+                    buckets = self.ip_buckets + self.get_account_buckets(api_key)
+                    full_buckets = [bucket for bucket in buckets if float((headers or {}).get(bucket.header) or 0) >= bucket.limit]
+                    for bucket in full_buckets or self.ip_buckets:  # unknown limit - IP ban
+                        bucket.blocked_until = max(bucket.blocked_until, now + retry_after)
+        except Exception as e:
+            handle_exception(self.logger, e)
+
+    def get_stats(self, api_key=None):
+        """Utilization of IP buckets and order buckets of api_key (all accounts if None)"""
+        with self.lock:
+            now = time.monotonic()
+            api_keys = list(self.account_buckets) if api_key is None else [api_key]
+            return {
+                "ip": [bucket.get_stats(now) for bucket in self.ip_buckets],
+                "accounts": {f"{key[:8]}...": [bucket.get_stats(now) for bucket in self.get_account_buckets(key)] for key in api_keys},
+                "requests": self.requests,
+                "waited": {priority_names[p]: self.waited[p] for p in priority_names},
+                "wait_time_s": {priority_names[p]: round(self.wait_time[p], 3) for p in priority_names},
+                "shed": {priority_names[p]: self.shed[p] for p in priority_names},
+                "rate_limited_responses": self.rate_limited_responses,
+            }
@@ -0,0 +1,208 @@
+import collections
+
+from common import *
+
+TOPIC_DEAL_REPORTS = "deal_reports"  # DEAL_REPORT of finished, cancelled and refused orders
+TOPIC_ORDER_STATUS = "order_status"  # ORDER_STATUS of every exchange order update, conflated per client order id
+TOPIC_ACCOUNT = "account"  # BALANCE per asset and POSITION per symbol updates, conflated per asset / symbol
+TOPIC_REPLIES = "replies"  # replies to commands (GET_INFO, balance)
+PRICE_TOPIC_PREFIX = "prices:"  # prices:<SYMBOL> - PRICE of the symbol, conflated per symbol
+default_topics = (TOPIC_DEAL_REPORTS, TOPIC_REPLIES)  # what a client got before topics
+slow_consumer_policies = ("drop_oldest", "disconnect", "conflate")
+
+
+class ReportSubscriber:
+    """
+    Client connection side of a ReportHub: bounded buffer of messages of its topics.
+    When the buffer is full, slow_consumer policy:
+        drop_oldest - the oldest buffered message is dropped
+        disconnect  - subscriber is closed, get_batch returns None and the client is disconnected
+        conflate    - message with a key (price of a symbol, status of an order, balance of an asset) replaces
+                      the buffered one with the same key at its place in the buffer; the oldest message is dropped
+                      if there is none
+    Messages are put from the publisher loop thread, consumer waits on its own loop: it is woken with
+    call_soon_threadsafe only when a message comes to an empty buffer
+    """
+    def __init__(self, topics=default_topics, max_buffer=1000, slow_consumer="drop_oldest"):
+        if slow_consumer not in slow_consumer_policies:
+            raise ValueError(f"Unknown slow consumer policy {slow_consumer}, one of {slow_consumer_policies}")
+        self.topics = frozenset(topics)
+        self.max_buffer = max_buffer
+        self.slow_consumer = slow_consumer
+        self.loop = asyncio.get_running_loop()
+        self.loop_thread_id = threading.get_ident()
+        self.has_data = asyncio.Event()
+        self.lock = threading.Lock()
+        self.buffer = collections.deque()  # [key, data, put perf_counter]
+        self.keyed = {}  # key:buffered [key, data, put perf_counter] of the key
+        self.batch_put_at = None  # put time of the oldest message of the last batch taken
+        self.is_closed = False
+        self.received = 0
+        self.dropped = 0
+        self.conflated = 0
+        self.max_depth = 0
+
+    def put(self, data, key=None):
+        with self.lock:
+            if self.is_closed:
+                return
+            self.received += 1
+            if key is not None and self.slow_consumer == "conflate":
+                entry = self.keyed.get(key)
+                if entry is not None:
+                    entry[1] = data
+                    self.conflated += 1
+                    return
+            if len(self.buffer) >= self.max_buffer:
+                if self.slow_consumer == "disconnect":
+                    self.is_closed = True
+                    self.buffer.clear()
+                    self.keyed.clear()
+                    self.wake()
+                    return
+                dropped = self.buffer.popleft()
+                if dropped[0] is not None:
+                    self.keyed.pop(dropped[0], None)
+                self.dropped += 1
+            entry = [key, data, time.perf_counter()]
+            self.buffer.append(entry)
+            if key is not None:
+                self.keyed[key] = entry
+            if len(self.buffer) > self.max_depth:
+                self.max_depth = len(self.buffer)
+            if len(self.buffer) == 1:
+                self.wake()
+
+    def wake(self):
+        if threading.get_ident() == self.loop_thread_id:
+            self.has_data.set()
+        else:
+            self.loop.call_soon_threadsafe(self.has_data.set)
+
+    async def get_batch(self, max_messages=None):
+        """Buffered messages, waits for at least one; None when the subscriber is closed"""
+        while True:
+            with self.lock:
+                if self.is_closed:
+                    return None
+                if len(self.buffer) != 0:
+                    count = len(self.buffer) if max_messages is None else min(max_messages, len(self.buffer))
+                    batch = []
+                    self.batch_put_at = self.buffer[0][2]
+                    for _ in range(count):
+                        key, data, put_at = self.buffer.popleft()
+                        if key is not None:
+                            self.keyed.pop(key, None)
+                        batch.append(data)
+                    return batch
+                self.has_data.clear()
+            await self.has_data.wait()
+
+    def close(self):
+        with self.lock:
+            self.is_closed = True
+            self.buffer.clear()
+            self.keyed.clear()
+        self.wake()
+
+    def get_depth(self):
+        return len(self.buffer)
+
+    def get_stats(self):
+        return {"topics": sorted(self.topics), "slow_consumer": self.slow_consumer, "depth": len(self.buffer),
+                "max_depth": self.max_depth, "received": self.received, "dropped": self.dropped,
+                "conflated": self.conflated, "is_closed": self.is_closed}
+
+
+class ReportHub:
+    """
+    Reports of one account by topic. The account manager publishes every report once, it goes to the buffer of
+    every subscriber of its topic - O(subscribers of the topic), no threads or queues between.
+    Subscribers come and go from the websocket server thread: topic subscriber tuples are replaced, never changed,
+    so publish iterates them without a lock.
+    topics_callbacks - [func, obj] called on the publisher loop with the set of subscribed topics when it changes
+    (the account subscribes price updates of prices:<SYMBOL> topics, a shard forwards only subscribed topics)
+    """
+    def __init__(self, loop=None, logger=None):
+        self.loop = loop
+        self.logger = get_logger('default') if logger is None else logger
+        self.lock = threading.Lock()
+        self.subscribers = {}  # topic:(ReportSubscriber, ...)
+        self.topics_callbacks = []
+        self.subscribed_topics = frozenset()
+        self.published = 0
+
+    def subscribe(self, subscriber, topics=None):
+        """topics - adds these topics to the subscriber, subscriber.topics if None"""
+        with self.lock:
+            if topics is not None:
+                subscriber.topics = subscriber.topics | frozenset(topics)
+            for topic in subscriber.topics:
+                if subscriber not in self.subscribers.get(topic, ()):
+                    self.subscribers[topic] = self.subscribers.get(topic, ()) + (subscriber,)
+        self.on_topics_changed()
+
+    def unsubscribe(self, subscriber, topics=None):
+        """topics - removes these topics of the subscriber, all of them if None"""
+        with self.lock:
+            removed_topics = subscriber.topics if topics is None else subscriber.topics & frozenset(topics)
+            subscriber.topics = subscriber.topics - removed_topics
+            for topic in removed_topics:
+                topic_subscribers = tuple(item for item in self.subscribers.get(topic, ()) if item is not subscriber)
+                if len(topic_subscribers) != 0:
+                    self.subscribers[topic] = topic_subscribers
+                else:
+                    self.subscribers.pop(topic, None)
+        self.on_topics_changed()
+
+    def on_topics_changed(self):
+        with self.lock:
+            topics = frozenset(self.subscribers)
+            if topics == self.subscribed_topics:
+                return
+            self.subscribed_topics = topics
+        for callback in self.topics_callbacks:
+            if self.loop is None:
+                self.logger.error(compose_log_msg(getframeinfo(currentframe()), "Subscribed topics changed, report hub has no loop"))
+                return
+            asyncio.run_coroutine_threadsafe(callback[0](callback[1], set(topics)), self.loop)
+
+    def has_subscribers(self, topic):
+        return topic in self.subscribers
+
+    def publish(self, topic, data, key=None):
+        """data - json string of the report; key - reports with the same key are conflated by conflate subscribers"""
+        subscribers = self.subscribers.get(topic)
+        if subscribers is None:
+            return
+        self.published += 1
+        for subscriber in subscribers:
+            subscriber.put(data, key)
+
+    def close(self):
+        """Account is gone: subscribers are closed and their clients disconnected"""
+        with self.lock:
+            subscribers = {id(subscriber): subscriber for topic_subscribers in self.subscribers.values() for subscriber in topic_subscribers}
+            self.subscribers = {}
+        for subscriber in subscribers.values():
+            subscriber.close()
+
+    def get_stats(self):
+        subscribers = {id(subscriber): subscriber for topic_subscribers in list(self.subscribers.values()) for subscriber in topic_subscribers}
+        return {"published": self.published, "subscribers": [subscriber.get_stats() for subscriber in subscribers.values()]}
+
+
+def get_price_symbols(topics):
+    return {topic[len(PRICE_TOPIC_PREFIX):] for topic in topics if topic.startswith(PRICE_TOPIC_PREFIX)}
+
+
+class PriceTopic:
+    """Price callback of an account publishing prices of one symbol to its prices:<SYMBOL> topic"""
+    def __init__(self, symbol, report_hub):
+        self.symbol = symbol
+        self.topic = PRICE_TOPIC_PREFIX + symbol
+        self.report_hub = report_hub
+        self.callback_id = None
+
+    async def on_price(self, price):
+        self.report_hub.publish(self.topic, json.dumps({"type": "PRICE", "symbol": self.symbol, "price": price}), key=self.topic)
@@ -0,0 +1,101 @@
+import random
+
+from common import *
+
+
+class RetryPolicy:
+    """
+    How failed new order requests of an account are retried, one per api handler.
+        max_attempts          - requests per order, placements and lookups, the first one included
+        base_delay, max_delay - s; retry n waits uniform(0, min(max_delay, base_delay * 2 ** n)): exponential backoff with
+                                full jitter, so requests failed by the same exchange hiccup don't come back all at once
+        deadline              - s since the first attempt; retries that would start later are not made
+        budget_ratio, budget_cap - retry budget: every successful request adds budget_ratio retries up to budget_cap,
+                                   every retry takes one, so while exchange fails most requests retries stop instead of
+                                   multiplying the load by max_attempts
+        final_lookups         - lookups by client order id of an order which may have been placed (send status unknown,
+                                duplicate id) when it is not retried anymore; made outside of max_attempts, deadline
+                                and budget, so an order live on the exchange is not reported failed
+    Retries with fixed parameters (price trimmed to tick size) and order lookups after duplicate id errors don't wait.
+    Used from the loop and executor threads, guarded by a lock
+    """
+    def __init__(self, max_attempts=6, base_delay=0.05, max_delay=2.0, deadline=10.0, budget_ratio=0.2, budget_cap=10,
+                 final_lookups=10, clock=time.monotonic, seed=None):
+        self.max_attempts = int(max_attempts)
+        self.base_delay = float(base_delay)
+        self.max_delay = float(max_delay)
+        self.deadline = float(deadline)
+        self.budget_ratio = float(budget_ratio)
+        self.budget_cap = float(budget_cap)
+        self.final_lookups = int(final_lookups)
+        self.clock = clock
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.budget = self.budget_cap
+
+        self.requests = 0
+        self.retries = 0
+        self.retry_wait_time = 0.0
+        self.attempts_exhausted = 0
+        self.deadlines_exceeded = 0
+        self.budget_exhausted = 0
+        self.lookups = 0  # orders looked up by client order id after send status unknown / duplicate id
+        self.found_by_lookup = 0  # placed by an earlier attempt - not sent again
+        self.final_lookups_made = 0  # lookups made after retries were over
+
+    def on_request(self):
+        with self.lock:
+            self.requests += 1
+
+    def on_success(self):
+        with self.lock:
+            self.budget = min(self.budget_cap, self.budget + self.budget_ratio)
+
+    def get_retry_delay(self, attempt, started_at, immediate=False):
+        """s to wait before the next attempt (0 - right away) or None if the request should not be retried"""
+        with self.lock:
+            if attempt + 1 >= self.max_attempts:
+                self.attempts_exhausted += 1
+                return None
+            delay = 0.0 if immediate else self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+            if self.clock() + delay - started_at > self.deadline:
+                self.deadlines_exceeded += 1
+                return None
+            if self.budget < 1:
+                self.budget_exhausted += 1
+                return None
+            self.budget -= 1
+            self.retries += 1
+            self.retry_wait_time += delay
+            return delay
+
+    def get_final_lookup_delay(self, final_lookup):
+        """s to wait before final lookup number final_lookup (0 - the first one, right away) or None if none is left"""
+        with self.lock:
+            if final_lookup >= self.final_lookups:
+                return None
+            self.final_lookups_made += 1
+            return 0.0 if final_lookup == 0 else self.random.uniform(0, min(self.max_delay, self.base_delay * 2 ** final_lookup))
+
+    def on_lookup(self, is_found):
+        with self.lock:
+            self.lookups += 1
+            if is_found:
+                self.found_by_lookup += 1
+
+    def get_stats(self):
+        with self.lock:
+            return {
+                "max_attempts": self.max_attempts,
+                "deadline": self.deadline,
+                "requests": self.requests,
+                "retries": self.retries,
+                "retry_wait_time_s": round(self.retry_wait_time, 3),
+                "budget": round(self.budget, 2),
+                "attempts_exhausted": self.attempts_exhausted,
+                "deadlines_exceeded": self.deadlines_exceeded,
+                "budget_exhausted": self.budget_exhausted,
+                "lookups": self.lookups,
+                "found_by_lookup": self.found_by_lookup,
+                "final_lookups": self.final_lookups_made,
+            }
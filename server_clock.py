@@ -0,0 +1,121 @@
+import weakref
+
+from common import *
+
+
+class ServerClockTracker:
+    """
+    Exchange clock offset vs local clock, applied to signed requests of all accounts of the process.
+    Every sync_interval s server time is sampled samples_per_sync times, NTP style: offset = serverTime - midpoint
+    of the request, error within rtt / 2. Sample with the lowest rtt is taken and smoothed into offset (EWMA alpha);
+    change larger than max_step_ms (local clock stepped, machine suspended) replaces the offset at once.
+    Applied offset is the smoothed one minus safety_margin_ms: exchange takes timestamps up to 1000 ms ahead of its clock
+    but recv_window behind it, so estimation errors are pushed to the safe side.
+    Clients registered with add_client (python-binance Client, AsyncFuturesRestClient) get timestamp_offset
+    set after every sync; -1021 reported with on_timestamp_error makes the next sync start right away
+    """
+    def __init__(self, sync_interval=60, samples_per_sync=3, alpha=0.3, max_step_ms=1000, safety_margin_ms=100,
+                 clock=time.time, logger=None):
+        self.sync_interval = sync_interval
+        self.samples_per_sync = samples_per_sync
+        self.alpha = alpha
+        self.max_step_ms = max_step_ms
+        self.safety_margin_ms = safety_margin_ms
+        self.clock = clock
+        self.logger = get_logger('default') if logger is None else logger
+        self.clients = weakref.WeakSet()
+        self.loop = None
+        self.sync_requested = None  # asyncio.Event of the loop running syncs
+
+        self.offset_ms = None  # smoothed, None until the first sync
+        self.last_sample_offset_ms = None
+        self.rtt_ms = None  # of the sample taken by the last sync
+        self.min_rtt_ms = None
+        self.synced_at = None
+        self.syncs = 0
+        self.sync_failures = 0
+        self.steps = 0
+        self.timestamp_errors = 0
+
+    def add_client(self, client):
+        self.clients.add(client)
+        if self.offset_ms is not None:
+            client.timestamp_offset = self.get_timestamp_offset()
+
+    def remove_client(self, client):
+        self.clients.discard(client)
+
+    def get_timestamp_offset(self):
+        """ms to add to local time for request timestamp"""
+        if self.offset_ms is None:
+            return 0
+        return int(round(self.offset_ms - self.safety_margin_ms))
+
+    def measure(self, get_server_time):
+        """(offset ms, rtt ms) of one blocking GET /v1/time call"""
+        sent_at = self.clock() * 1000
+        server_time = get_server_time()["serverTime"]
+        received_at = self.clock() * 1000
+        return server_time - (sent_at + received_at) / 2, received_at - sent_at
+
+    async def measure_async(self, get_server_time):
+        sent_at = self.clock() * 1000
+        server_time = (await get_server_time())["serverTime"]
+        received_at = self.clock() * 1000
+        return server_time - (sent_at + received_at) / 2, received_at - sent_at
+
+    def update(self, samples):
+        """Takes [(offset ms, rtt ms)] of one sync and sets timestamp_offset of the clients"""
+        sample_offset, rtt = min(samples, key=lambda sample: sample[1])
+        if self.offset_ms is None or abs(sample_offset - self.offset_ms) > self.max_step_ms:
+            if self.offset_ms is not None:
+                self.steps += 1
+                self.logger.warning(compose_log_msg(getframeinfo(currentframe()),
+                                                    f"Server clock offset stepped from {self.offset_ms:.1f} to {sample_offset:.1f} ms"))
+            self.offset_ms = sample_offset
+        else:
+            self.offset_ms += self.alpha * (sample_offset - self.offset_ms)
+        self.last_sample_offset_ms = sample_offset
+        self.rtt_ms = rtt
+        self.min_rtt_ms = rtt if self.min_rtt_ms is None else min(self.min_rtt_ms, rtt)
+        self.synced_at = self.clock()
+        self.syncs += 1
+
+        timestamp_offset = self.get_timestamp_offset()
+        for client in list(self.clients):
+            client.timestamp_offset = timestamp_offset
+
+    def on_timestamp_error(self):
+        """-1021 got by a signed request; called from the loop or executor threads"""
+        self.timestamp_errors += 1
+        self.request_sync()
+
+    def request_sync(self):
+        if self.loop is not None and not self.loop.is_closed():
+            self.loop.call_soon_threadsafe(self.sync_requested.set)
+
+    async def wait_next_sync(self, timeout=None):
+        """Until sync_interval passes or a sync is requested"""
+        if self.sync_requested is None or self.loop is not asyncio.get_running_loop():
+            self.loop = asyncio.get_running_loop()
+            self.sync_requested = asyncio.Event()
+        try:
+            await asyncio.wait_for(self.sync_requested.wait(), self.sync_interval if timeout is None else timeout)
+        except asyncio.TimeoutError:
+            pass
+        self.sync_requested.clear()
+
+    def get_stats(self):
+        return {
+            "offset_ms": None if self.offset_ms is None else round(self.offset_ms, 1),
+            "applied_offset_ms": self.get_timestamp_offset(),
+            "last_sample_offset_ms": None if self.last_sample_offset_ms is None else round(self.last_sample_offset_ms, 1),
+            "rtt_ms": None if self.rtt_ms is None else round(self.rtt_ms, 2),
+            "min_rtt_ms": None if self.min_rtt_ms is None else round(self.min_rtt_ms, 2),
+            "last_sync_age_s": None if self.synced_at is None else round(self.clock() - self.synced_at, 1),
+            "syncs": self.syncs,
+            "sync_failures": self.sync_failures,
+            "steps": self.steps,
+            "timestamp_errors": self.timestamp_errors,
+            "clients": len(self.clients),
+        }
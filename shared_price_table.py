@@ -0,0 +1,225 @@
+import struct
+from multiprocessing import shared_memory
+
+from common import *
+
+INFINITY = float("inf")
+MAGIC = b"OMSP"
+LAYOUT_VERSION = 1
+NAME_SIZE = 32
+
+_header = struct.Struct("<4sIIIIQ")  # magic, layout version, capacity, max workers, symbols count, frames
+_HEADER_SIZE = 64
+_SYMBOLS_COUNT_OFFSET = 16
+_FRAMES_OFFSET = 20
+_count = struct.Struct("<I")
+_seq = struct.Struct("<Q")
+_price = struct.Struct("<dqQ")  # price, event time ms, updates
+_PRICE_SLOT_SIZE = 32
+_band = struct.Struct("<dd")  # lower, upper
+_BAND_SLOT_SIZE = 24
+_worker_header = struct.Struct("<QQ")  # flags - written by the worker, doorbells rung - by market data process
+_WORKER_HEADER_SIZE = 16
+
+WORKER_ATTACHED = 1
+WORKER_FULL_MARKET = 2  # has "update_finished" subscribers - woken after every frame
+
+
+class SharedPriceTable:
+    """
+    Latest mark prices of all symbols in one shared memory block: written by the market data process,
+    read in place by account worker processes, no copies or messages per price.
+
+    Symbols get slots in the order the writer first sees them; slot names are written before symbols count is raised,
+    so readers see a symbol only once its name is complete. Every price slot is a seqlock (sequence, price, event time, updates):
+    writer makes sequence odd, writes, makes it even again; reader retries while sequence is odd or changed under it.
+
+    Every worker has a row of wake bands, one per symbol slot, written by the worker (seqlock as well): the union
+    of its subscribers' bands - (max lower, min upper) - so market data process knows which prices it has to be told of,
+    and pending flags set by market data process for prices that crossed the band, cleared by the worker when it takes them.
+    Each slot has one writer: prices - market data process, bands - their worker, so no locks are needed
+    """
+    def __init__(self, shm, is_owner):
+        self.shm = shm
+        self.is_owner = is_owner
+        self.buf = shm.buf
+        magic, version, self.capacity, self.max_workers, symbols_count, frames = _header.unpack_from(self.buf, 0)
+        if magic != MAGIC or version != LAYOUT_VERSION:
+            raise ValueError(f"{shm.name} is not a shared price table of layout {LAYOUT_VERSION}")
+        self.names_offset = _HEADER_SIZE
+        self.prices_offset = self.names_offset + self.capacity * NAME_SIZE
+        self.workers_offset = self.prices_offset + self.capacity * _PRICE_SLOT_SIZE
+        self.worker_row_size = _WORKER_HEADER_SIZE + self.capacity * (_BAND_SLOT_SIZE + 1)
+        self.slots = {}  # symbol:slot, local cache of the names area
+        self.symbols = []
+        self.torn_reads = 0  # reads retried because the writer was in the middle of the slot
+
+    @staticmethod
+    def get_size(capacity, max_workers):
+        return _HEADER_SIZE + capacity * (NAME_SIZE + _PRICE_SLOT_SIZE) + \
+            max_workers * (_WORKER_HEADER_SIZE + capacity * (_BAND_SLOT_SIZE + 1))
+
+    @classmethod
+    def create(cls, capacity=4096, max_workers=16, name=None):
+        shm = shared_memory.SharedMemory(name=name, create=True, size=cls.get_size(capacity, max_workers))
+        shm.buf[:shm.size] = bytes(shm.size)
+        _header.pack_into(shm.buf, 0, MAGIC, LAYOUT_VERSION, capacity, max_workers, 0, 0)
+        self = cls(shm, is_owner=True)
+        for worker_id in range(max_workers):
+            for slot in range(capacity):
+                _band.pack_into(self.buf, self.get_band_offset(worker_id, slot) + 8, -INFINITY, INFINITY)  # never woken
+        return self
+
+    @classmethod
+    def attach(cls, name):
+        return cls(shared_memory.SharedMemory(name=name), is_owner=False)
+
+    @property
+    def name(self):
+        return self.shm.name
+
+    def close(self):
+        self.buf = None
+        self.shm.close()
+        if self.is_owner:
+            self.shm.unlink()
+
+    # ----- symbols -----
+
+    def get_symbols_count(self):
+        return _count.unpack_from(self.buf, _SYMBOLS_COUNT_OFFSET)[0]
+
+    def refresh_symbols(self):
+        symbols_count = self.get_symbols_count()
+        for slot in range(len(self.symbols), symbols_count):
+            offset = self.names_offset + slot * NAME_SIZE
+            symbol = bytes(self.buf[offset:offset + NAME_SIZE]).rstrip(b"\0").decode()
+            self.symbols.append(symbol)
+            self.slots[symbol] = slot
+
+    def find_slot(self, symbol):
+        slot = self.slots.get(symbol)
+        if slot is None and len(self.symbols) != self.get_symbols_count():
+            self.refresh_symbols()
+            slot = self.slots.get(symbol)
+        return slot
+
+    def add_symbol(self, symbol):
+        """writer only; slot of the symbol, None if the table is full"""
+        slot = self.slots.get(symbol)
+        if slot is not None:
+            return slot
+        slot = len(self.symbols)
+        if slot >= self.capacity:
+            return None
+        offset = self.names_offset + slot * NAME_SIZE
+        self.buf[offset:offset + NAME_SIZE] = symbol.encode()[:NAME_SIZE].ljust(NAME_SIZE, b"\0")
+        self.symbols.append(symbol)
+        self.slots[symbol] = slot
+        _count.pack_into(self.buf, _SYMBOLS_COUNT_OFFSET, slot + 1)  # symbols count is published after the name
+        return slot
+
+    # ----- prices -----
+
+    def write_price(self, slot, price, event_time):
+        offset = self.prices_offset + slot * _PRICE_SLOT_SIZE
+        seq = _seq.unpack_from(self.buf, offset)[0]
+        updates = _price.unpack_from(self.buf, offset + 8)[2]
+        _seq.pack_into(self.buf, offset, seq + 1)
+        _price.pack_into(self.buf, offset + 8, price, event_time, updates + 1)
+        _seq.pack_into(self.buf, offset, seq + 2)
+
+    def read_slot(self, slot):
+        """(price, event time ms, updates); price is None if the slot was never written"""
+        offset = self.prices_offset + slot * _PRICE_SLOT_SIZE
+        while True:
+            seq = _seq.unpack_from(self.buf, offset)[0]
+            if not seq & 1:
+                price, event_time, updates = _price.unpack_from(self.buf, offset + 8)
+                if _seq.unpack_from(self.buf, offset)[0] == seq:
+                    return (None if seq == 0 else price), event_time, updates
+            self.torn_reads += 1
+
+    def get_price(self, symbol):
+        slot = self.find_slot(symbol)
+        return None if slot is None else self.read_slot(slot)[0]
+
+    def get_prices(self):
+        """symbol:price snapshot of all written symbols"""
+        self.refresh_symbols()
+        prices = {}
+        for slot, symbol in enumerate(self.symbols):
+            price = self.read_slot(slot)[0]
+            if price is not None:
+                prices[symbol] = price
+        return prices
+
+    def finish_frame(self):
+        _seq.pack_into(self.buf, _FRAMES_OFFSET, _seq.unpack_from(self.buf, _FRAMES_OFFSET)[0] + 1)
+
+    def get_frames(self):
+        return _seq.unpack_from(self.buf, _FRAMES_OFFSET)[0]
+
+    # ----- worker bands -----
+
+    def get_band_offset(self, worker_id, slot):
+        return self.workers_offset + worker_id * self.worker_row_size + _WORKER_HEADER_SIZE + slot * _BAND_SLOT_SIZE
+
+    def get_pending_offset(self, worker_id):
+        return self.workers_offset + worker_id * self.worker_row_size + _WORKER_HEADER_SIZE + self.capacity * _BAND_SLOT_SIZE
+
+    def write_band(self, worker_id, slot, lower, upper):
+        """worker only; woken when price <= lower or price >= upper, lower = +inf - on every price"""
+        offset = self.get_band_offset(worker_id, slot)
+        seq = _seq.unpack_from(self.buf, offset)[0]
+        _seq.pack_into(self.buf, offset, seq + 1)
+        _band.pack_into(self.buf, offset + 8, -INFINITY if lower is None else lower, INFINITY if upper is None else upper)
+        _seq.pack_into(self.buf, offset, seq + 2)
+
+    def read_band(self, worker_id, slot):
+        offset = self.get_band_offset(worker_id, slot)
+        while True:
+            seq = _seq.unpack_from(self.buf, offset)[0]
+            if not seq & 1:
+                band = _band.unpack_from(self.buf, offset + 8)
+                if _seq.unpack_from(self.buf, offset)[0] == seq:
+                    return band
+            self.torn_reads += 1
+
+    def is_woken(self, worker_id, slot, price):
+        lower, upper = self.read_band(worker_id, slot)
+        return price <= lower or price >= upper
+
+    def set_pending(self, worker_id, slot):
+        self.buf[self.get_pending_offset(worker_id) + slot] = 1
+
+    def take_pending(self, worker_id):
+        """worker only; slots with prices crossed the band since the last call, flags are cleared before prices are read"""
+        offset = self.get_pending_offset(worker_id)
+        flags = bytes(self.buf[offset:offset + self.get_symbols_count()])
+        slots = []
+        slot = flags.find(1)
+        while slot != -1:
+            self.buf[offset + slot] = 0
+            slots.append(slot)
+            slot = flags.find(1, slot + 1)
+        return slots
+
+    def get_worker_flags(self, worker_id):
+        return _worker_header.unpack_from(self.buf, self.workers_offset + worker_id * self.worker_row_size)[0]
+
+    def set_worker_flags(self, worker_id, flags):
+        _seq.pack_into(self.buf, self.workers_offset + worker_id * self.worker_row_size, flags)
+
+    def count_doorbell(self, worker_id):
+        offset = self.workers_offset + worker_id * self.worker_row_size + 8
+        _seq.pack_into(self.buf, offset, _seq.unpack_from(self.buf, offset)[0] + 1)
+
+    def get_stats(self):
+        workers = {}
+        for worker_id in range(self.max_workers):
+            flags, rung = _worker_header.unpack_from(self.buf, self.workers_offset + worker_id * self.worker_row_size)
+            if flags & WORKER_ATTACHED:
+                workers[worker_id] = {"full_market": bool(flags & WORKER_FULL_MARKET), "doorbells": rung}
+        return {"name": self.name, "capacity": self.capacity, "symbols": self.get_symbols_count(),
+                "frames": self.get_frames(), "torn_reads": self.torn_reads, "workers": workers}
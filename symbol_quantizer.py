@@ -0,0 +1,73 @@
+import math
+from decimal import Decimal
+
+_ROUND_UP_EPS = 1 + 1e-12
+_ROUND_DOWN_EPS = 1 - 1e-12
+
+
+def _parse_step(step):
+    """"0.00100000" -> (decimals=3, step_units=1); "10" -> (0, 10)"""
+    step = Decimal(str(step)).normalize()
+    decimals = max(0, -step.as_tuple().exponent)
+    step_units = int(step.scaleb(decimals))
+    return decimals, max(step_units, 1)
+
+
+def _quantize(value, scale, step_units, fmt):
+    """Truncates value down to step multiple, returns it as str without trailing zeros"""
+    scaled = float(value) * scale
+    # relative epsilon absorbs float representation error of exact values, e.g. 0.29 * 100 = 28.999999999999996
+    units = math.floor(scaled * _ROUND_UP_EPS if scaled >= 0 else scaled * _ROUND_DOWN_EPS)
+    if step_units != 1:
+        units -= units % step_units
+    if fmt is None:
+        return str(units)
+    return (fmt % (units / scale)).rstrip("0").rstrip(".")
+
+
+class SymbolQuantizer:
+    """
+    Immutable precision rules of a symbol, precomputed from exchange filters once.
+    Price and amount are truncated to tick/step multiples in integer units, no string slicing involved
+    """
+    __slots__ = ("symbol", "price_decimals", "price_scale", "price_tick_units", "price_format",
+                 "amount_decimals", "amount_scale", "lot_step_units", "amount_format", "min_lot_size", "min_notional")
+
+    def __init__(self, symbol, price_tick, lot_size_step, min_lot_size=None, min_notional=None):
+        price_decimals, price_tick_units = _parse_step(price_tick)
+        amount_decimals, lot_step_units = _parse_step(lot_size_step)
+
+        values = {
+            "symbol": symbol,
+            "price_decimals": price_decimals,
+            "price_scale": 10 ** price_decimals,
+            "price_tick_units": price_tick_units,
+            "price_format": f"%.{price_decimals}f" if price_decimals > 0 else None,
+            "amount_decimals": amount_decimals,
+            "amount_scale": 10 ** amount_decimals,
+            "lot_step_units": lot_step_units,
+            "amount_format": f"%.{amount_decimals}f" if amount_decimals > 0 else None,
+            "min_lot_size": float(min_lot_size) if min_lot_size is not None else None,
+            "min_notional": float(min_notional) if min_notional is not None else None,
+        }
+        for name, value in values.items():
+            object.__setattr__(self, name, value)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f"{type(self).__name__} is immutable")
+
+    def __repr__(self):
+        return f"SymbolQuantizer({self.symbol}, tick={self.price_tick_units}e-{self.price_decimals}, step={self.lot_step_units}e-{self.amount_decimals})"
+
+    @classmethod
+    def from_symbol_data(cls, symbol, data):
+        """data - symbols_data entry of BinanceFuturesApiHandler.load_exchange_assets_info"""
+        if data.get("price_tick") is None or data.get("lot_size_step") is None:
+            return None
+        return cls(symbol, data["price_tick"], data["lot_size_step"], data.get("min_lot_size"), data.get("min_notional"))
+
+    def price(self, price):
+        return _quantize(price, self.price_scale, self.price_tick_units, self.price_format)
+
+    def amount(self, amount):
+        return _quantize(amount, self.amount_scale, self.lot_step_units, self.amount_format)
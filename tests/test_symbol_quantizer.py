@@ -0,0 +1,74 @@
+"""
+SymbolQuantizer output vs Decimal truncation on the recorded exchangeInfo of benchmarks/data.
+
+Run from the repository root:
+    python -m unittest discover -s tests
+"""
+import json
+import random
+import unittest
+from decimal import Decimal
+
+from binance_futures_api_handler import BinanceFuturesApiHandler
+from symbol_quantizer import SymbolQuantizer
+from benchmarks.precision_quantizer import DEFAULT_EXCHANGE_INFO, decimal_truncate
+
+
+class SymbolQuantizerTest(unittest.TestCase):
+    samples_per_symbol = 2000
+
+    @classmethod
+    def setUpClass(cls):
+        with open(DEFAULT_EXCHANGE_INFO, "r") as f:
+            symbols_data, assets_precision = BinanceFuturesApiHandler.parse_exchange_info(json.load(f))
+        cls.symbols_data = symbols_data
+
+    def assert_matches_decimal(self, quantizer, data, price, amount):
+        self.assertEqual(Decimal(quantizer.price(price)), decimal_truncate(price, data["price_tick"]),
+                         f"{quantizer.symbol} price {price!r}")
+        self.assertEqual(Decimal(quantizer.amount(amount)), decimal_truncate(amount, data["lot_size_step"]),
+                         f"{quantizer.symbol} amount {amount!r}")
+
+    def test_recorded_symbols_random_values(self):
+        random.seed(0)
+        for symbol, data in self.symbols_data.items():
+            quantizer = SymbolQuantizer.from_symbol_data(symbol, data)
+            tick = float(data["price_tick"])
+            step = float(data["lot_size_step"])
+            for i in range(self.samples_per_symbol):
+                price = round(random.uniform(1, 100000) * tick, random.randint(0, 12))
+                amount = round(random.uniform(1, 100000) * step, random.randint(0, 12))
+                self.assert_matches_decimal(quantizer, data, price, amount)
+
+    def test_recorded_symbols_exact_multiples(self):
+        """Values already on the grid must stay there, e.g. 0.29 with tick 0.01 is not 0.28"""
+        for symbol, data in self.symbols_data.items():
+            quantizer = SymbolQuantizer.from_symbol_data(symbol, data)
+            tick = Decimal(data["price_tick"])
+            step = Decimal(data["lot_size_step"])
+            for units in list(range(1, 1000)) + [12345, 99999, 1000001]:
+                price = float(tick * units)
+                amount = float(step * units)
+                self.assertEqual(Decimal(quantizer.price(price)), tick * units, f"{symbol} price {price!r}")
+                self.assertEqual(Decimal(quantizer.amount(amount)), step * units, f"{symbol} amount {amount!r}")
+
+    def test_min_lot_and_notional(self):
+        for symbol, data in self.symbols_data.items():
+            quantizer = SymbolQuantizer.from_symbol_data(symbol, data)
+            self.assertEqual(quantizer.min_lot_size, float(data["min_lot_size"]))
+            self.assertEqual(quantizer.min_notional, float(data["min_notional"]))
+
+    def test_steps_not_power_of_ten(self):
+        """No recorded symbol has such filters, the exchange allows them"""
+        random.seed(1)
+        for tick, step in (("5", "10"), ("0.0005", "0.05"), ("0.25", "2.5")):
+            data = {"price_tick": tick, "lot_size_step": step}
+            quantizer = SymbolQuantizer.from_symbol_data("TEST", data)
+            for i in range(self.samples_per_symbol):
+                price = round(random.uniform(1, 100000) * float(tick), random.randint(0, 12))
+                amount = round(random.uniform(1, 100000) * float(step), random.randint(0, 12))
+                self.assert_matches_decimal(quantizer, data, price, amount)
+
+
+if __name__ == "__main__":
+    unittest.main()
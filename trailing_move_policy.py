@@ -0,0 +1,59 @@
+from common import *
+
+
+class TrailingMovePolicy:
+    """
+    When trailing stop orders of an account send their stop moves to exchange, one per api handler.
+        min_interval     - s since previous stop move of the order; earlier moves are held, the latest stop price is sent later
+        min_improvement  - min stop price change vs stop price on exchange, fraction of price; smaller moves are held
+                           until price goes further
+        coalesce_moves   - moves made while cancel of the previous stop is in flight are merged into its re-placement,
+                           instead of re-placing the old price and replacing it again right after
+        use_modify_order - stop price is changed in place (1 REST call instead of cancel + new) if api handler
+                           can modify orders of the stop type (order_modify_types)
+    Held moves keep order woken on every price update, so they are sent once allowed even if price stands still.
+    Defaults send every move right away, as before, only coalescing is on
+    """
+    def __init__(self, min_interval=0, min_improvement=0, coalesce_moves=True, use_modify_order=True, clock=time.monotonic):
+        self.min_interval = float(min_interval)
+        self.min_improvement = float(min_improvement)
+        self.coalesce_moves = coalesce_moves
+        self.use_modify_order = use_modify_order
+        self.clock = clock
+
+        self.moves_requested = 0  # stop price changes decided by trailing logic, while stop order exists
+        self.moves_held = 0  # checks that held a move back
+        self.replaces_sent = 0  # cancel + new
+        self.modifies_sent = 0
+        self.modifies_failed = 0  # fell back to cancel + new
+
+    def allows_move(self, last_move_time, exchange_stop_price, new_stop_price):
+        now = self.clock()
+        if last_move_time is not None and now - last_move_time < self.min_interval:
+            self.moves_held += 1
+            return False
+        if self.min_improvement and exchange_stop_price:
+            improvement = abs(new_stop_price - float(exchange_stop_price)) / float(exchange_stop_price)
+            if improvement < self.min_improvement:
+                self.moves_held += 1
+                return False
+        return True
+
+    def get_rest_calls_saved(self):
+        """vs cancel + new for every requested move"""
+        sent_calls = 2 * self.replaces_sent + self.modifies_sent
+        return max(0, 2 * self.moves_requested - sent_calls)
+
+    def get_stats(self):
+        return {
+            "min_interval": self.min_interval,
+            "min_improvement": self.min_improvement,
+            "coalesce_moves": self.coalesce_moves,
+            "use_modify_order": self.use_modify_order,
+            "moves_requested": self.moves_requested,
+            "moves_held": self.moves_held,
+            "replaces_sent": self.replaces_sent,
+            "modifies_sent": self.modifies_sent,
+            "modifies_failed": self.modifies_failed,
+            "rest_calls_saved": self.get_rest_calls_saved(),
+        }
@@ -0,0 +1,213 @@
+from common import *
+
+try:
+    import numpy as np
+except ImportError:  # optional, trailing stops are woken one by one by price trigger index without it
+    np = None
+
+
+class TrailingStopEngine:
+    """
+    Shared per symbol state of trailing stop orders, updated for all of them in one vectorized pass per price update.
+
+    Every TrailingStopOrder of the symbol has a slot in arrays of: side, extremal price reached, stop delta,
+    min step, nearest not fired stop condition trigger and "needs handler call" flag
+    (initial stop to place or stop update pending while stop order is replaced).
+    On price update:
+        price moved extremal price by min step, no trigger crossed - extremal price is updated in the array
+                                                                     and the order only moves its stop (move_trailing_stop)
+        trigger crossed or handler call needed                     - order.price_update_handler as before
+        otherwise                                                   - order is not touched at all
+    Order objects stay the source of truth: slot is rewritten from the order after it handled the update (sync).
+
+    Engine is subscribed for price updates once, with band (max of BUY wake levels, min of SELL wake levels),
+    so it is called only when at least one order has something to do
+    """
+    initial_capacity = 64
+
+    def __init__(self, api_handler, symbol):
+        self.api_handler = api_handler
+        self.symbol = symbol
+        self.price_update_callback_id = None
+
+        capacity = self.initial_capacity
+        self.is_sell = np.zeros(capacity, dtype=bool)
+        self.extremal_prices = np.zeros(capacity)
+        self.stop_deltas = np.full(capacity, np.nan)
+        self.min_steps = np.zeros(capacity)
+        self.next_triggers = np.full(capacity, np.nan)
+        self.needs_call = np.zeros(capacity, dtype=bool)
+        self.is_active = np.zeros(capacity, dtype=bool)
+
+        self.orders = [None] * capacity
+        self.slots = {}  # order id:slot
+        self.free_slots = list(range(capacity - 1, -1, -1))
+        self.is_updating = False
+        self.price_band = (None, None)  # last band given to the api handler
+
+        self.passes = 0
+        self.handler_calls = 0
+        self.stop_moves = 0
+
+    def __len__(self):
+        return len(self.slots)
+
+    @staticmethod
+    def is_available():
+        return np is not None
+
+    def grow(self):
+        capacity = len(self.orders)
+        for name, fill_value in [("is_sell", False), ("extremal_prices", 0.0), ("stop_deltas", np.nan), ("min_steps", 0.0),
+                                 ("next_triggers", np.nan), ("needs_call", False), ("is_active", False)]:
+            array = getattr(self, name)
+            setattr(self, name, np.concatenate([array, np.full(capacity, fill_value, dtype=array.dtype)]))
+        self.orders += [None] * capacity
+        self.free_slots = list(range(2 * capacity - 1, capacity - 1, -1)) + self.free_slots
+
+    def add(self, order):
+        if order.order_id in self.slots:
+            self.sync(order)
+            return
+        if len(self.free_slots) == 0:
+            self.grow()
+        slot = self.free_slots.pop()
+        self.slots[order.order_id] = slot
+        self.orders[slot] = order
+        self.is_active[slot] = True
+        self.is_updating = True
+        try:
+            self.sync(order)
+        finally:
+            self.is_updating = False
+
+        if self.price_update_callback_id is None:
+            self.price_band = self.get_price_band()
+            self.price_update_callback_id = self.api_handler.subscribe_for_price_update(self.symbol, [TrailingStopEngine.price_update_handler, self],
+                                                                                        self.price_band)
+        else:
+            self.tighten_price_band(slot)  # new slot can only narrow the band, no pass over all slots
+
+    def remove(self, order):
+        slot = self.slots.pop(order.order_id, None)
+        if slot is None:
+            return
+        self.orders[slot] = None
+        self.is_active[slot] = False
+        self.needs_call[slot] = False
+        self.free_slots.append(slot)
+
+        if len(self.slots) == 0 and self.price_update_callback_id is not None:
+            self.api_handler.unsubscribe_from_price_update(self.symbol, self.price_update_callback_id)
+            self.price_update_callback_id = None
+        else:
+            self.refresh_price_band()
+
+    def sync(self, order):
+        """Rewrites order slot from order state"""
+        slot = self.slots.get(order.order_id)
+        if slot is None:
+            return
+        is_sell = order.side == "SELL"
+        not_fired_triggers = [condition.trigger_price for condition in order.stop_conditions if not condition.was_triggered]
+
+        self.is_sell[slot] = is_sell
+        self.extremal_prices[slot] = order.current_extremal_price_reached
+        self.stop_deltas[slot] = np.nan if order.current_stop_price_delta is None else order.current_stop_price_delta
+        self.min_steps[slot] = order.current_price_min_step
+        if len(not_fired_triggers) == 0:
+            self.next_triggers[slot] = np.nan
+        else:
+            self.next_triggers[slot] = min(not_fired_triggers) if is_sell else max(not_fired_triggers)
+        self.needs_call[slot] = order.should_process_initial_stop or order.update_needed
+
+        if not self.is_updating:
+            self.refresh_price_band()
+
+    def get_price_band(self):
+        """(lower, upper) where no order has anything to do, (inf, None) - some order needs every update"""
+        is_active = self.is_active
+        if np.any(self.needs_call & is_active):
+            return float("inf"), None
+
+        is_sell = self.is_sell & is_active
+        is_buy = ~self.is_sell & is_active
+        upper = None
+        lower = None
+        if np.any(is_sell):
+            upper = float(np.min(np.fmin(self.extremal_prices[is_sell] + self.min_steps[is_sell], self.next_triggers[is_sell])))
+        if np.any(is_buy):
+            lower = float(np.max(np.fmax(self.extremal_prices[is_buy] - self.min_steps[is_buy], self.next_triggers[is_buy])))
+        return lower, upper
+
+    def set_price_band(self, lower, upper):
+        if self.price_update_callback_id is None:
+            return
+        self.price_band = (lower, upper)
+        self.api_handler.update_price_trigger_band(self.symbol, self.price_update_callback_id, lower, upper)
+
+    def refresh_price_band(self):
+        self.set_price_band(*self.get_price_band())
+
+    def tighten_price_band(self, slot):
+        lower, upper = self.price_band
+        if self.needs_call[slot]:
+            self.set_price_band(float("inf"), None)
+        elif self.is_sell[slot]:
+            level = float(np.fmin(self.extremal_prices[slot] + self.min_steps[slot], self.next_triggers[slot]))
+            self.set_price_band(lower, level if upper is None else min(upper, level))
+        else:
+            level = float(np.fmax(self.extremal_prices[slot] - self.min_steps[slot], self.next_triggers[slot]))
+            self.set_price_band(level if lower is None else max(lower, level), upper)
+
+    def update(self, last_price):
+        """Vectorized pass: returns (slots to move stop only, slots to call handler of);
+           extremal price of the first ones is already updated"""
+        is_active = self.is_active
+        is_sell = self.is_sell
+        extremal_prices = self.extremal_prices
+        min_steps = self.min_steps
+
+        with np.errstate(invalid="ignore"):
+            is_moved = np.where(is_sell, last_price >= extremal_prices + min_steps, last_price <= extremal_prices - min_steps)
+            is_triggered = np.where(is_sell, last_price >= self.next_triggers, last_price <= self.next_triggers)
+
+        to_call = is_active & (self.needs_call | is_triggered | (is_moved & np.isnan(self.stop_deltas)))
+        to_move = is_active & is_moved & ~to_call
+        extremal_prices[to_move] = last_price
+        self.passes += 1
+        return np.flatnonzero(to_move), np.flatnonzero(to_call)
+
+    async def price_update_handler(self, last_price):
+        try:
+            last_price = float(last_price)
+            moved_slots, called_slots = self.update(last_price)
+            touched = [self.orders[slot] for slot in moved_slots] + [self.orders[slot] for slot in called_slots]
+
+            self.is_updating = True
+            try:
+                for order in touched[:len(moved_slots)]:
+                    await order.move_trailing_stop(last_price)
+                for order in touched[len(moved_slots):]:
+                    await order.price_update_handler(last_price)
+                for order in touched:
+                    self.sync(order)  # removed orders are skipped
+            finally:
+                self.is_updating = False
+
+            self.stop_moves += len(moved_slots)
+            self.handler_calls += len(called_slots)
+            self.refresh_price_band()
+        except Exception as e:
+            self.is_updating = False
+            handle_exception(self.api_handler.logger, e)
+
+    def get_stats(self):
+        return {
+            "symbol": self.symbol,
+            "orders": len(self.slots),
+            "capacity": len(self.orders),
+            "passes": self.passes,
+            "stop_moves": self.stop_moves,
+            "handler_calls": self.handler_calls,
+        }